@@ -0,0 +1,352 @@
+"""
+AGENDA DE SESSÕES
+
+  agendamentos            um horário avulso (intervalo_semanas NULL) ou uma série
+                          semanal (a cada intervalo_semanas semanas, até repetir_ate
+                          ou sem fim), numa linha só: as repetições não são gravadas
+  agendamentos_excecoes   ocorrências canceladas de uma série (atendimento_id NULL)
+                          ou que já viraram atendimento (atendimento_id)
+Horários em hora local, sem fuso ('AAAA-MM-DDTHH:MM'): a série mantém a hora do
+relógio, com ou sem horário de verão. Nenhum agendamento passa de
+AGENDA_DURACAO_MAXIMA_MINUTOS, e isso limita todas as faixas abaixo.
+
+Calendário (dia, semana, mês): os avulsos saem de um range scan em
+(usuario_id, inicio), a partir de inicio - duração máxima (quem começou antes
+já terminou); as séries, de dois range scans em (usuario_id, repetir_ate,
+inicio): as sem fim que já começaram e as que terminam depois do início da
+janela (anos de séries encerradas ficam fora). Cada uma é expandida só dentro
+da janela, com a primeira ocorrência calculada, sem percorrer as anteriores.
+
+Conflito ao agendar, pelos índices (O(log n) mais os vizinhos de horário):
+  avulso x avulsos    range scan em inicio, na mesma faixa
+  série x avulsos     range scan em minuto_semana (minuto da semana em que
+                      começa; segunda 00:00 = 0): só o mesmo horário da semana
+  qualquer x séries   range scan em minuto_semana das séries; se as semanas
+                      coincidem é aritmética (o padrão se repete a cada MMC dos intervalos)
+"""
+import math
+from datetime import date, datetime, time, timedelta
+
+from config import AGENDA_DURACAO_MAXIMA_MINUTOS, AGENDA_ANO_MINIMO, AGENDA_ANO_MAXIMO
+
+EPOCA = datetime(2001, 1, 1)  # UMA SEGUNDA-FEIRA: O MINUTO 0 DA SEMANA
+MINUTOS_SEMANA = 7 * 24 * 60
+MAXIMO_CONFLITOS = 10  # conflitos devolvidos ao recusar um horário
+
+SQL_TABELAS_AGENDA = '''
+    CREATE TABLE IF NOT EXISTS agendamentos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        cliente_id INTEGER NOT NULL,
+        inicio TEXT NOT NULL,
+        fim TEXT NOT NULL,
+        duracao_minutos INTEGER NOT NULL,
+        minuto_semana INTEGER NOT NULL,
+        intervalo_semanas INTEGER,
+        repetir_ate DATE,
+        observacao TEXT,
+        data_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios (id),
+        FOREIGN KEY (cliente_id) REFERENCES clientes (id)
+    );
+    CREATE TABLE IF NOT EXISTS agendamentos_excecoes (
+        agendamento_id INTEGER NOT NULL,
+        ocorrencia TEXT NOT NULL,
+        usuario_id INTEGER NOT NULL,
+        atendimento_id INTEGER,
+        PRIMARY KEY (agendamento_id, ocorrencia)
+    ) WITHOUT ROWID;
+    -- calendário e conflito entre avulsos
+    CREATE INDEX IF NOT EXISTS idx_agendamentos_avulsos ON agendamentos(usuario_id, inicio)
+        WHERE intervalo_semanas IS NULL;
+    -- série nova x avulsos no mesmo horário da semana
+    CREATE INDEX IF NOT EXISTS idx_agendamentos_avulsos_semana ON agendamentos(usuario_id, minuto_semana, inicio)
+        WHERE intervalo_semanas IS NULL;
+    -- séries: conflito pelo horário da semana
+    CREATE INDEX IF NOT EXISTS idx_agendamentos_series ON agendamentos(usuario_id, minuto_semana)
+        WHERE intervalo_semanas IS NOT NULL;
+    -- séries: as que cruzam a janela do calendário (repetir_ate NULL = sem fim)
+    CREATE INDEX IF NOT EXISTS idx_agendamentos_series_periodo ON agendamentos(usuario_id, repetir_ate, inicio)
+        WHERE intervalo_semanas IS NOT NULL;
+    CREATE INDEX IF NOT EXISTS idx_agendamentos_excecoes_usuario ON agendamentos_excecoes(usuario_id, ocorrencia);
+'''
+
+
+def criar_agendamentos(conn):
+    """CRIA AS TABELAS DA AGENDA E OS TRIGGERS DE versoes_usuario (ETags DO CALENDÁRIO)"""
+    conn.executescript(SQL_TABELAS_AGENDA)
+    for tabela in ('agendamentos', 'agendamentos_excecoes'):
+        for evento, linha in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{tabela}_versao_{evento.lower()}
+                AFTER {evento} ON {tabela}
+                BEGIN
+                    INSERT INTO versoes_usuario (usuario_id, versao) VALUES ({linha}.usuario_id, 1)
+                    ON CONFLICT (usuario_id) DO UPDATE SET versao = versao + 1;
+                END;
+            ''')
+    conn.commit()
+
+
+# HORÁRIOS: TEXTO NO BANCO, MINUTOS DESDE A EPOCA NAS CONTAS
+def hora_local(momento: datetime) -> datetime:
+    """SEM FUSO (CONVERTIDO PARA A HORA LOCAL) E SEM SEGUNDOS"""
+    if momento.tzinfo is not None:
+        momento = momento.astimezone().replace(tzinfo=None)
+    return momento.replace(second=0, microsecond=0)
+
+
+def formatar(momento: datetime) -> str:
+    return momento.strftime('%Y-%m-%dT%H:%M')
+
+
+def em_minutos(momento) -> int:
+    if isinstance(momento, str):
+        momento = datetime.fromisoformat(momento)
+    return (momento - EPOCA) // timedelta(minutes=1)
+
+
+def de_minutos(minutos: int) -> datetime:
+    return EPOCA + timedelta(minutes=minutos)
+
+
+def validar_data_agenda(momento):
+    """ValueError FORA DE AGENDA_ANO_MINIMO..AGENDA_ANO_MAXIMO: AS CONTAS DA AGENDA NÃO ESTOURAM O date DO PYTHON"""
+    if momento is not None and not AGENDA_ANO_MINIMO <= momento.year <= AGENDA_ANO_MAXIMO:
+        raise ValueError(f'Data fora do período aceito pela agenda ({AGENDA_ANO_MINIMO} a {AGENDA_ANO_MAXIMO}).')
+    return momento
+
+
+def janela_calendario(visao: str, dia: date) -> tuple:
+    """[inicio, fim) DO DIA, DA SEMANA (SEGUNDA A DOMINGO) OU DO MÊS QUE CONTÉM dia"""
+    if visao == 'dia':
+        inicio, fim = dia, dia + timedelta(days=1)
+    elif visao == 'semana':
+        inicio = dia - timedelta(days=dia.weekday())
+        fim = inicio + timedelta(days=7)
+    else:
+        inicio = dia.replace(day=1)
+        fim = (inicio + timedelta(days=32)).replace(day=1)
+    return datetime.combine(inicio, time.min), datetime.combine(fim, time.min)
+
+
+def parametros(inicio, duracao: int, intervalo_semanas, repetir_ate) -> tuple:
+    """(t0, periodo, limite, duracao) EM MINUTOS: AS OCORRÊNCIAS SÃO t0 + k * periodo < limite"""
+    t0 = em_minutos(inicio)
+    if not intervalo_semanas:
+        return t0, None, t0 + 1, duracao
+    limite = None
+    if repetir_ate is not None:
+        if isinstance(repetir_ate, str):
+            repetir_ate = date.fromisoformat(repetir_ate)
+        limite = em_minutos(datetime.combine(repetir_ate + timedelta(days=1), time.min))
+    return t0, intervalo_semanas * MINUTOS_SEMANA, limite, duracao
+
+
+def ocorrencias(t0: int, periodo, limite, duracao: int, a: int, b):
+    """INÍCIOS DAS OCORRÊNCIAS QUE CRUZAM [a, b): A SÉRIE SÓ É EXPANDIDA DENTRO DA JANELA"""
+    if periodo is None:
+        if t0 < b and t0 + duracao > a:
+            yield t0
+        return
+    # PRIMEIRA OCORRÊNCIA QUE TERMINA DEPOIS DE a, SEM PASSAR PELAS ANTERIORES
+    inicio = t0 + max(0, (a - duracao - t0) // periodo + 1) * periodo
+    while inicio < b and (limite is None or inicio < limite):
+        yield inicio
+        inicio += periodo
+
+
+def faixas_da_semana(minuto: int, duracao: int) -> list:
+    """FAIXAS DE minuto_semana (INCLUSIVAS) DE QUEM PODE CRUZAR [minuto, minuto + duracao) NUMA SEMANA"""
+    baixo, alto = minuto - AGENDA_DURACAO_MAXIMA_MINUTOS + 1, minuto + duracao - 1
+    if baixo < 0:
+        return [(baixo + MINUTOS_SEMANA, MINUTOS_SEMANA - 1), (0, alto)]
+    if alto >= MINUTOS_SEMANA:
+        return [(baixo, MINUTOS_SEMANA - 1), (0, alto - MINUTOS_SEMANA)]
+    return [(baixo, alto)]
+
+
+def primeira_sobreposicao(nova: tuple, existente: tuple, canceladas: set):
+    """INÍCIO DA PRIMEIRA OCORRÊNCIA DE existente (NÃO CANCELADA) QUE CRUZA ALGUMA DE nova; None SE NENHUMA"""
+    t0, periodo, limite, duracao = nova
+    if periodo is None:
+        passos = 1
+    else:
+        # O ENCONTRO DAS DUAS SE REPETE A CADA MMC DOS PERÍODOS; CADA CANCELADA PODE ESCONDER UM CICLO
+        passos = (math.lcm(periodo, existente[1]) // periodo) * (1 + len(canceladas)) + 1
+    for indice, inicio in enumerate(ocorrencias(t0, periodo, limite, duracao, existente[0], math.inf)):
+        if indice >= passos:
+            break
+        for encontro in ocorrencias(*existente, inicio, inicio + duracao):
+            if formatar(de_minutos(encontro)) not in canceladas:
+                return encontro
+    return None
+
+
+def buscar_conflitos(conn, usuario_id: int, inicio: datetime, duracao: int, intervalo_semanas, repetir_ate) -> list:
+    """OCORRÊNCIAS JÁ AGENDADAS QUE SE SOBREPÕEM AO HORÁRIO NOVO (OU A ALGUMA REPETIÇÃO DA SÉRIE NOVA)"""
+    nova = parametros(inicio, duracao, intervalo_semanas, repetir_ate)
+    t0, periodo, limite, _ = nova
+    faixas = faixas_da_semana(t0 % MINUTOS_SEMANA, duracao)
+    antes = formatar(de_minutos(t0 - AGENDA_DURACAO_MAXIMA_MINUTOS))
+    conflitos = []
+
+    def conflito(agendamento_id: int, encontro: int, duracao_existente: int):
+        conflitos.append({'agendamento_id': agendamento_id, 'inicio': formatar(de_minutos(encontro)),
+                          'fim': formatar(de_minutos(encontro + duracao_existente))})
+
+    if periodo is None:
+        for linha in conn.execute(
+            """SELECT id, inicio, duracao_minutos FROM agendamentos
+               WHERE usuario_id = ? AND intervalo_semanas IS NULL AND inicio > ? AND inicio < ? AND fim > ?
+               ORDER BY inicio LIMIT ?""",
+            (usuario_id, antes, formatar(de_minutos(t0 + duracao)), formatar(inicio), MAXIMO_CONFLITOS)
+        ):
+            conflito(linha[0], em_minutos(linha[1]), linha[2])
+    else:
+        fim_serie = formatar(de_minutos(limite)) if limite is not None else '9999'
+        for baixo, alto in faixas:
+            for linha in conn.execute(
+                """SELECT id, inicio, duracao_minutos FROM agendamentos
+                   WHERE usuario_id = ? AND intervalo_semanas IS NULL AND minuto_semana BETWEEN ? AND ?
+                     AND inicio > ? AND inicio < ?
+                   ORDER BY inicio""",
+                (usuario_id, baixo, alto, antes, fim_serie)
+            ):
+                avulso = em_minutos(linha[1])
+                # MESMO HORÁRIO DA SEMANA, MAS SÓ CONFLITA NAS SEMANAS EM QUE A SÉRIE ACONTECE
+                if any(ocorrencias(*nova, avulso, avulso + linha[2])):
+                    conflito(linha[0], avulso, linha[2])
+                    if len(conflitos) >= MAXIMO_CONFLITOS:
+                        return sorted(conflitos, key=lambda item: item['inicio'])
+
+    for baixo, alto in faixas:
+        for linha in conn.execute(
+            """SELECT id, inicio, duracao_minutos, intervalo_semanas, repetir_ate FROM agendamentos
+               WHERE usuario_id = ? AND intervalo_semanas IS NOT NULL AND minuto_semana BETWEEN ? AND ?""",
+            (usuario_id, baixo, alto)
+        ).fetchall():
+            canceladas = {ocorrencia for (ocorrencia,) in conn.execute(
+                "SELECT ocorrencia FROM agendamentos_excecoes WHERE agendamento_id = ? AND atendimento_id IS NULL",
+                (linha[0],)
+            )}
+            encontro = primeira_sobreposicao(nova, parametros(linha[1], linha[2], linha[3], linha[4]), canceladas)
+            if encontro is not None:
+                conflito(linha[0], encontro, linha[2])
+                if len(conflitos) >= MAXIMO_CONFLITOS:
+                    return sorted(conflitos, key=lambda item: item['inicio'])
+    return sorted(conflitos, key=lambda item: item['inicio'])
+
+
+def gravar_agendamento(conn, usuario_id: int, cliente_id: int, inicio: datetime, duracao: int,
+                       intervalo_semanas, repetir_ate, observacao) -> tuple:
+    """(id, []) SE GRAVOU; (None, conflitos) SE O HORÁRIO ESTÁ OCUPADO; (None, []) SE O CLIENTE NÃO É DO USUÁRIO.
+    NÃO FAZ COMMIT: RODA NA FAIXA DE ESCRITA, ENTÃO NINGUÉM AGENDA NO MEIO DA VERIFICAÇÃO"""
+    conflitos = buscar_conflitos(conn, usuario_id, inicio, duracao, intervalo_semanas, repetir_ate)
+    if conflitos:
+        return None, conflitos
+    cursor = conn.execute(
+        """INSERT INTO agendamentos
+            (usuario_id, cliente_id, inicio, fim, duracao_minutos, minuto_semana, intervalo_semanas, repetir_ate,
+             observacao, data_registro)
+            SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+            WHERE EXISTS (SELECT 1 FROM clientes WHERE id = ? AND usuario_id = ?)""",
+        (usuario_id, cliente_id, formatar(inicio), formatar(inicio + timedelta(minutes=duracao)), duracao,
+         em_minutos(inicio) % MINUTOS_SEMANA, intervalo_semanas, repetir_ate, observacao,
+         datetime.now().isoformat(), cliente_id, usuario_id)
+    )
+    return (cursor.lastrowid if cursor.rowcount else None), []
+
+
+def consultar_agenda(conn, usuario_id: int, inicio: datetime, fim: datetime) -> list:
+    """OCORRÊNCIAS QUE CRUZAM [inicio, fim), EM ORDEM: AVULSOS PELO ÍNDICE, SÉRIES EXPANDIDAS NA JANELA"""
+    a, b = em_minutos(inicio), em_minutos(fim)
+    antes = inicio - timedelta(minutes=AGENDA_DURACAO_MAXIMA_MINUTOS)
+    excecoes = {(linha[0], linha[1]): linha[2] for linha in conn.execute(
+        """SELECT agendamento_id, ocorrencia, atendimento_id FROM agendamentos_excecoes
+           WHERE usuario_id = ? AND ocorrencia > ? AND ocorrencia < ?""",
+        (usuario_id, formatar(antes), formatar(fim))
+    )}
+    itens = []
+
+    def ocorrencia(linha, comeco: int, recorrente: bool):
+        chave = (linha[0], formatar(de_minutos(comeco)))
+        atendimento_id = excecoes.get(chave)
+        if chave in excecoes and atendimento_id is None:
+            return  # CANCELADA
+        itens.append({
+            'agendamento_id': linha[0], 'cliente_id': linha[1], 'nome_cliente': linha[2],
+            'inicio': formatar(de_minutos(comeco)), 'fim': formatar(de_minutos(comeco + linha[4])),
+            'duracao_minutos': linha[4], 'recorrente': recorrente, 'atendimento_id': atendimento_id,
+            'observacao': linha[5],
+        })
+
+    for linha in conn.execute(
+        """SELECT a.id, a.cliente_id, c.nome_completo, a.inicio, a.duracao_minutos, a.observacao
+           FROM agendamentos a JOIN clientes c ON c.id = a.cliente_id
+           WHERE a.usuario_id = ? AND a.intervalo_semanas IS NULL AND a.inicio > ? AND a.inicio < ? AND a.fim > ?
+           ORDER BY a.inicio""",
+        (usuario_id, formatar(antes), formatar(fim), formatar(inicio))
+    ):
+        ocorrencia(linha, em_minutos(linha[3]), False)
+
+    # UM RANGE SCAN PARA CADA LADO DO "repetir_ate IS NULL OR repetir_ate >= ?" (COM O OR, O
+    # SQLITE FICARIA SÓ COM usuario_id E LERIA TODAS AS SÉRIES JÁ CRIADAS PELO PROFISSIONAL)
+    series = """SELECT a.id, a.cliente_id, c.nome_completo, a.inicio, a.duracao_minutos, a.observacao,
+                       a.intervalo_semanas, a.repetir_ate
+                FROM agendamentos a JOIN clientes c ON c.id = a.cliente_id
+                WHERE a.usuario_id = ? AND a.intervalo_semanas IS NOT NULL AND a.inicio < ?"""
+    for linha in conn.execute(
+        f"{series} AND a.repetir_ate IS NULL UNION ALL {series} AND a.repetir_ate >= ?",
+        (usuario_id, formatar(fim), usuario_id, formatar(fim), antes.date().isoformat())
+    ):
+        for comeco in ocorrencias(*parametros(linha[3], linha[4], linha[6], linha[7]), a, b):
+            ocorrencia(linha, comeco, True)
+
+    itens.sort(key=lambda item: (item['inicio'], item['agendamento_id']))
+    return itens
+
+
+def localizar_ocorrencia(conn, usuario_id: int, agendamento_id: int, ocorrencia) -> dict:
+    """A OCORRÊNCIA QUE COMEÇA EM ocorrencia (None = A DO AVULSO) COM A SITUAÇÃO DELA; None SE NÃO EXISTE"""
+    linha = conn.execute(
+        """SELECT cliente_id, inicio, duracao_minutos, intervalo_semanas, repetir_ate FROM agendamentos
+           WHERE id = ? AND usuario_id = ?""",
+        (agendamento_id, usuario_id)
+    ).fetchone()
+    if linha is None:
+        return None
+    if ocorrencia is None:
+        if linha[3] is not None:
+            return None  # NUMA SÉRIE É PRECISO DIZER QUAL
+        comeco = em_minutos(linha[1])
+    else:
+        comeco = em_minutos(ocorrencia)
+        if comeco not in ocorrencias(*parametros(linha[1], linha[2], linha[3], linha[4]), comeco, comeco + 1):
+            return None
+    inicio = formatar(de_minutos(comeco))
+    excecao = conn.execute(
+        "SELECT atendimento_id FROM agendamentos_excecoes WHERE agendamento_id = ? AND ocorrencia = ?",
+        (agendamento_id, inicio)
+    ).fetchone()
+    situacao = 'agendada' if excecao is None else ('cancelada' if excecao[0] is None else 'realizada')
+    return {'cliente_id': linha[0], 'inicio': inicio, 'duracao_minutos': linha[2],
+            'recorrente': linha[3] is not None, 'situacao': situacao}
+
+
+def registrar_excecao(conn, usuario_id: int, agendamento_id: int, ocorrencia: str, atendimento_id=None):
+    """CANCELA (atendimento_id None) OU MARCA COMO REALIZADA UMA OCORRÊNCIA. NÃO FAZ COMMIT"""
+    conn.execute(
+        """INSERT INTO agendamentos_excecoes (agendamento_id, ocorrencia, usuario_id, atendimento_id)
+           VALUES (?, ?, ?, ?)""",
+        (agendamento_id, ocorrencia, usuario_id, atendimento_id)
+    )
+
+
+def remover_agendamento(conn, usuario_id: int, agendamento_id: int) -> bool:
+    """APAGA O AVULSO OU A SÉRIE INTEIRA (OS ATENDIMENTOS JÁ GERADOS FICAM). NÃO FAZ COMMIT"""
+    cursor = conn.execute("DELETE FROM agendamentos WHERE id = ? AND usuario_id = ?", (agendamento_id, usuario_id))
+    if not cursor.rowcount:
+        return False
+    conn.execute("DELETE FROM agendamentos_excecoes WHERE agendamento_id = ?", (agendamento_id,))
+    return True
@@ -0,0 +1,279 @@
+"""
+ARQUIVO DE ANOTAÇÕES ANTIGAS (ARMAZENAMENTO FRIO COMPRIMIDO)
+
+O conteudo dos atendimentos com data anterior a ARQUIVO_IDADE_DIAS vai, em
+lotes, para atendimentos_arquivo, comprimido com zlib (ou zstd) e um
+dicionário treinado com as anotações do próprio profissional. A linha em
+atendimentos continua lá (datas, duração, resumos, paginação) com
+conteudo = '': a listagem percorre linhas pequenas e só descomprime as
+anotações da página que vai devolver.
+  atendimentos_arquivo   id do atendimento -> anotação comprimida
+  arquivo_dicionarios    dicionários por profissional (id aleatório: não colide entre shards)
+Anotações arquivadas saem do índice de busca textual. Anotações cifradas
+(CRIPTOGRAFIA=1) não comprimem e nunca são arquivadas.
+
+O arquivo de banco só diminui depois de um VACUUM (até lá, as páginas
+liberadas são reaproveitadas pelas próximas escritas):
+
+    cd backend
+    python arquivo.py --dias 730 --vacuum      # banco principal (DB_NAME)
+    python arquivo.py --dias 730 --shards      # cada banco em DB_SHARDS_DIR
+    python arquivo.py --restaurar --usuario 7  # devolve as anotações para atendimentos
+"""
+import argparse
+import glob
+import os
+import secrets
+import time
+import zlib
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from cache import CacheLRU
+from config import (
+    DB_NAME, DB_SHARDS_DIR, ARQUIVO_IDADE_DIAS, ARQUIVO_COMPRESSAO, ARQUIVO_DICIONARIO,
+    ARQUIVO_DICIONARIO_BYTES, ARQUIVO_DICIONARIO_AMOSTRAS, ARQUIVO_LOTE
+)
+from database import abrir_conexao
+
+try:
+    import zstandard
+except ImportError:  # zlib (biblioteca padrão) continua disponível
+    zstandard = None
+
+if ARQUIVO_COMPRESSAO not in ('zlib', 'zstd'):
+    raise RuntimeError("ARQUIVO_COMPRESSAO deve ser 'zlib' ou 'zstd'")
+if ARQUIVO_COMPRESSAO == 'zstd' and zstandard is None:
+    raise RuntimeError("ARQUIVO_COMPRESSAO=zstd exige o pacote 'zstandard' (pip install zstandard)")
+
+SQL_TABELAS_ARQUIVO = '''
+    CREATE TABLE IF NOT EXISTS arquivo_dicionarios (
+        id INTEGER PRIMARY KEY,
+        usuario_id INTEGER NOT NULL,
+        compressao TEXT NOT NULL,
+        criado_em TIMESTAMP NOT NULL,
+        dados BLOB NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_arquivo_dicionarios_usuario ON arquivo_dicionarios(usuario_id, compressao, criado_em);
+    CREATE TABLE IF NOT EXISTS atendimentos_arquivo (
+        id INTEGER PRIMARY KEY,
+        usuario_id INTEGER NOT NULL,
+        compressao TEXT NOT NULL,
+        dicionario_id INTEGER,
+        conteudo BLOB NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_atendimentos_arquivo_usuario ON atendimentos_arquivo(usuario_id);
+'''
+
+# DICIONÁRIOS JÁ LIDOS DO BANCO (O id É ALEATÓRIO, ÚNICO ENTRE OS SHARDS)
+dicionarios = CacheLRU(256)
+
+
+def criar_arquivo(conn):
+    conn.executescript(SQL_TABELAS_ARQUIVO)
+
+
+def treinar_dicionario(amostras: list, compressao: str = ARQUIVO_COMPRESSAO,
+                       tamanho: int = ARQUIVO_DICIONARIO_BYTES) -> bytes:
+    """DICIONÁRIO DE COMPRESSÃO A PARTIR DE ANOTAÇÕES DE EXEMPLO"""
+    if compressao == 'zstd':
+        return zstandard.train_dictionary(tamanho, [texto.encode('utf-8') for texto in amostras]).as_bytes()
+    # zlib: OS TRECHOS DE 1 A 3 PALAVRAS QUE MAIS ECONOMIZAM (VEZES x TAMANHO), OS
+    # MELHORES NO FIM, ONDE A DISTÂNCIA ATÉ O TEXTO É MENOR
+    contagem = Counter()
+    for texto in amostras:
+        palavras = texto.split()
+        for n in (1, 2, 3):
+            contagem.update(' '.join(palavras[i:i + n]) for i in range(len(palavras) - n + 1))
+    escolhidos, total = [], 0
+    for trecho, vezes in sorted(contagem.items(), key=lambda item: item[1] * len(item[0]), reverse=True):
+        if vezes < 2 or total >= tamanho - 8:
+            break
+        dados = (trecho + ' ').encode('utf-8')
+        if total + len(dados) <= tamanho:
+            escolhidos.append(dados)
+            total += len(dados)
+    return b''.join(reversed(escolhidos))
+
+
+def criar_compressor(compressao: str, dicionario: bytes = None):
+    """FUNÇÃO texto -> bytes COMPRIMIDOS; O DICIONÁRIO É PROCESSADO UMA VEZ SÓ PARA O LOTE INTEIRO"""
+    if compressao == 'zstd':
+        dicionario_zstd = zstandard.ZstdCompressionDict(dicionario) if dicionario else None
+        compressor_zstd = zstandard.ZstdCompressor(level=9, dict_data=dicionario_zstd)
+        return lambda texto: compressor_zstd.compress(texto.encode('utf-8'))
+    # DEFLATE SEM CABEÇALHO (wbits NEGATIVO): 6 BYTES A MENOS POR ANOTAÇÃO. CADA TEXTO
+    # PARTE DE UMA CÓPIA DO COMPRESSOR JÁ CARREGADO COM O DICIONÁRIO (METADE DO CUSTO)
+    base = zlib.compressobj(6, zlib.DEFLATED, -15, **({'zdict': dicionario} if dicionario else {}))
+
+    def comprimir(texto: str) -> bytes:
+        compressor = base.copy()
+        return compressor.compress(texto.encode('utf-8')) + compressor.flush()
+    return comprimir
+
+
+def descomprimir(dados: bytes, compressao: str, dicionario: bytes = None) -> str:
+    if compressao == 'zstd':
+        dicionario_zstd = zstandard.ZstdCompressionDict(dicionario) if dicionario else None
+        return zstandard.ZstdDecompressor(dict_data=dicionario_zstd).decompress(dados).decode('utf-8')
+    descompressor = zlib.decompressobj(-15, **({'zdict': dicionario} if dicionario else {}))
+    return (descompressor.decompress(dados) + descompressor.flush()).decode('utf-8')
+
+
+def obter_dicionario(conn, dicionario_id: int) -> bytes:
+    dados = dicionarios.obter(dicionario_id)
+    if dados is None:
+        dados = conn.execute("SELECT dados FROM arquivo_dicionarios WHERE id = ?", (dicionario_id,)).fetchone()[0]
+        dicionarios.guardar(dicionario_id, dados)
+    return dados
+
+
+def dicionario_do_usuario(conn, usuario_id: int, limite_data: str):
+    """(id, dados) DO DICIONÁRIO MAIS RECENTE DO USUÁRIO; TREINA UM NA PRIMEIRA VEZ. None SEM AMOSTRAS SUFICIENTES"""
+    linha = conn.execute(
+        "SELECT id FROM arquivo_dicionarios WHERE usuario_id = ? AND compressao = ? ORDER BY criado_em DESC LIMIT 1",
+        (usuario_id, ARQUIVO_COMPRESSAO)
+    ).fetchone()
+    if linha is not None:
+        return linha[0], obter_dicionario(conn, linha[0])
+    if not ARQUIVO_DICIONARIO:
+        return None
+    # AMOSTRAS DO QUE VAI SER ARQUIVADO: AS PRÓPRIAS ANOTAÇÕES ANTIGAS DO PROFISSIONAL
+    amostras = [linha[0] for linha in conn.execute(
+        """SELECT conteudo FROM atendimentos WHERE usuario_id = ? AND data_atendimento < ?
+            AND typeof(conteudo) = 'text' AND conteudo <> '' ORDER BY data_atendimento DESC LIMIT ?""",
+        (usuario_id, limite_data, ARQUIVO_DICIONARIO_AMOSTRAS)
+    )]
+    if len(amostras) < 50:
+        return None
+    dicionario_id, dados = secrets.randbits(62), treinar_dicionario(amostras)
+    conn.execute(
+        "INSERT INTO arquivo_dicionarios (id, usuario_id, compressao, criado_em, dados) VALUES (?, ?, ?, ?, ?)",
+        (dicionario_id, usuario_id, ARQUIVO_COMPRESSAO, datetime.now().isoformat(), dados)
+    )
+    dicionarios.guardar(dicionario_id, dados)
+    return dicionario_id, dados
+
+
+def arquivar_lote(conn, limite_data: str, posicao: tuple = None, tamanho: int = ARQUIVO_LOTE) -> tuple:
+    """MOVE ATÉ `tamanho` ANOTAÇÕES COM data_atendimento < limite_data PARA O ARQUIVO (SEM COMMIT).
+    DEVOLVE (arquivadas, posição do próximo lote ou None no fim); percorre da data mais recente
+    para a mais antiga pelo índice de data"""
+    filtro, parametros = "data_atendimento < ?", [limite_data]
+    if posicao is not None:
+        # O <= DÁ O INTERVALO NO ÍNDICE; O OR SÓ DESEMPATA A ÚLTIMA DATA DO LOTE ANTERIOR
+        filtro, parametros = "data_atendimento <= ? AND (data_atendimento < ? OR id > ?)", list(posicao[:1] + posicao)
+    linhas = conn.execute(f"""
+        SELECT id, usuario_id, data_atendimento, conteudo FROM atendimentos
+        WHERE {filtro} AND typeof(conteudo) = 'text' AND conteudo <> ''
+        ORDER BY data_atendimento DESC, id LIMIT ?
+    """, (*parametros, tamanho)).fetchall()
+    if not linhas:
+        return 0, None
+
+    escolhidos = {}
+    for usuario_id in {linha['usuario_id'] for linha in linhas}:
+        escolhidos[usuario_id] = dicionario_do_usuario(conn, usuario_id, limite_data) or (None, None)
+    compressores = {usuario_id: criar_compressor(ARQUIVO_COMPRESSAO, dicionario)
+                    for usuario_id, (_, dicionario) in escolhidos.items()}
+    arquivadas = [(linha['id'], linha['usuario_id'], ARQUIVO_COMPRESSAO, escolhidos[linha['usuario_id']][0],
+                   compressores[linha['usuario_id']](linha['conteudo'])) for linha in linhas]
+    conn.executemany(
+        "INSERT OR REPLACE INTO atendimentos_arquivo (id, usuario_id, compressao, dicionario_id, conteudo) VALUES (?, ?, ?, ?, ?)",
+        arquivadas
+    )
+    # O TRIGGER DO FTS TIRA A ANOTAÇÃO DO ÍNDICE DE BUSCA COM O TEXTO ANTIGO
+    conn.executemany("UPDATE atendimentos SET conteudo = '' WHERE id = ?", [(linha['id'],) for linha in linhas])
+    ultima = linhas[-1]
+    return len(linhas), ((ultima['data_atendimento'], ultima['id']) if len(linhas) == tamanho else None)
+
+
+def carregar_conteudos(conn, ids: list) -> dict:
+    """{id: anotação} DESCOMPRIMIDA DOS ATENDIMENTOS ARQUIVADOS PEDIDOS"""
+    linhas = conn.execute(
+        f"SELECT id, compressao, dicionario_id, conteudo FROM atendimentos_arquivo WHERE id IN ({', '.join('?' * len(ids))})",
+        ids
+    ).fetchall()
+    return {
+        linha[0]: descomprimir(linha[3], linha[1], obter_dicionario(conn, linha[2]) if linha[2] is not None else None)
+        for linha in linhas
+    }
+
+
+def preencher_arquivados(conn, itens: list, ids: list) -> list:
+    """COMPLETA, NO LUGAR, O conteudo DOS ITENS ARQUIVADOS (conteudo == ''); ids[i] É O id DE itens[i]"""
+    posicoes = [i for i, item in enumerate(itens) if item.get('conteudo') == '']
+    if posicoes:
+        textos = carregar_conteudos(conn, [ids[i] for i in posicoes])
+        for i in posicoes:
+            itens[i]['conteudo'] = textos.get(ids[i], '')
+    return itens
+
+
+def restaurar_lote(conn, usuario_id: int = None, tamanho: int = ARQUIVO_LOTE) -> int:
+    """DEVOLVE ATÉ `tamanho` ANOTAÇÕES ARQUIVADAS PARA atendimentos (SEM COMMIT; VOLTAM PARA A BUSCA)"""
+    filtro, parametros = ("WHERE usuario_id = ?", (usuario_id,)) if usuario_id is not None else ("", ())
+    ids = [linha[0] for linha in conn.execute(f"SELECT id FROM atendimentos_arquivo {filtro} LIMIT ?", (*parametros, tamanho))]
+    if not ids:
+        return 0
+    textos = carregar_conteudos(conn, ids)
+    conn.executemany("UPDATE atendimentos SET conteudo = ? WHERE id = ? AND conteudo = ''",
+                     [(texto, id_) for id_, texto in textos.items()])
+    conn.executemany("DELETE FROM atendimentos_arquivo WHERE id = ?", [(id_,) for id_ in ids])
+    return len(ids)
+
+
+def tamanhos(conn) -> dict:
+    """BYTES DAS ANOTAÇÕES NO BANCO: ATIVAS (TEXTO) E ARQUIVADAS (COMPRIMIDAS)"""
+    ativas, quantidade = conn.execute(
+        "SELECT COALESCE(SUM(length(CAST(conteudo AS BLOB))), 0), COUNT(*) FROM atendimentos WHERE conteudo <> ''"
+    ).fetchone()
+    arquivadas, quantidade_arquivadas = conn.execute(
+        "SELECT COALESCE(SUM(length(conteudo)), 0), COUNT(*) FROM atendimentos_arquivo"
+    ).fetchone()
+    return {'ativas': quantidade, 'ativas_bytes': ativas,
+            'arquivadas': quantidade_arquivadas, 'arquivadas_bytes': arquivadas}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--banco", default=DB_NAME, help="banco a arquivar (padrão: DB_NAME)")
+    parser.add_argument("--shards", action="store_true", help="arquiva cada banco em DB_SHARDS_DIR")
+    parser.add_argument("--dias", type=int, default=ARQUIVO_IDADE_DIAS or 730, help="idade mínima das anotações arquivadas")
+    parser.add_argument("--restaurar", action="store_true", help="devolve as anotações arquivadas para atendimentos")
+    parser.add_argument("--usuario", type=int, help="com --restaurar: só deste usuário")
+    parser.add_argument("--vacuum", action="store_true", help="devolve ao disco o espaço liberado")
+    args = parser.parse_args()
+
+    from main import criar_schema_dados
+
+    limite = (date.today() - timedelta(days=args.dias)).isoformat()
+    bancos = sorted(glob.glob(os.path.join(DB_SHARDS_DIR, '*_atendimentos.db'))) if args.shards else [args.banco]
+    for banco in bancos:
+        conn = abrir_conexao(banco)
+        try:
+            criar_schema_dados(conn)
+            inicio, total, posicao = time.perf_counter(), 0, None
+            while True:
+                with conn:
+                    if args.restaurar:
+                        quantidade = restaurar_lote(conn, args.usuario)
+                        fim = quantidade == 0
+                    else:
+                        quantidade, posicao = arquivar_lote(conn, limite, posicao)
+                        fim = posicao is None
+                total += quantidade
+                if fim:
+                    break
+            tamanho_antes = os.path.getsize(banco)
+            if args.vacuum:
+                conn.execute("VACUUM")
+            print({"banco": banco, "restauradas" if args.restaurar else "arquivadas": total,
+                   "segundos": round(time.perf_counter() - inicio, 2), **tamanhos(conn),
+                   "arquivo_mb": round(tamanho_antes / 2**20, 1), "apos_vacuum_mb": round(os.path.getsize(banco) / 2**20, 1)})
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# BENCHMARKS DA API - rodar a partir de backend/: python -m benchmarks.<nome>
@@ -0,0 +1,178 @@
+"""
+BENCHMARK: CALENDÁRIO (GET /agendamentos/?visao=) COM ANOS DE SÉRIES SEMANAIS
+
+Um profissional com --clientes clientes, cada um com uma série semanal ou
+quinzenal que durou de 6 meses a 3 anos, espalhadas por --anos anos (até hoje;
+as ainda ativas não têm fim), mais uma sessão avulsa por semana. A mesma agenda
+em dois formatos, um profissional para cada:
+  series:        uma linha por série, expandida só na janela pedida (agendamentos.py)
+  materializado: uma linha por ocorrência (as séries sem fim até --horizonte
+                 semanas à frente), como seria sem a expansão preguiçosa
+Mede dia/semana/mês em janelas sorteadas (cache de respostas limpo antes de
+cada requisição) e a verificação de conflito de um horário avulso e de uma
+série nova, direto em buscar_conflitos.
+
+Por último, o histórico: de 0 a --encerradas séries encerradas antes da agenda
+acima (anos de clientes que já saíram) somadas ao profissional das séries, e a
+semana do último ano consultada direto em consultar_agenda a cada passo. Com o
+índice (usuario_id, repetir_ate, inicio) a latência não acompanha o total.
+
+    cd backend
+    python -m benchmarks.bench_agendamentos --clientes 120 --anos 5 --encerradas 20000
+"""
+import argparse
+import asyncio
+import importlib
+import os
+import random
+import time
+from datetime import date, datetime, timedelta
+
+import httpx
+
+from benchmarks.comum import preparar_ambiente, popular_banco, percentis
+
+HORARIOS = [(dia, hora) for dia in range(5) for hora in range(8, 20)]  # SEGUNDA A SEXTA, 8h ÀS 19h
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clientes", type=int, default=120)
+    parser.add_argument("--anos", type=int, default=5)
+    parser.add_argument("--horizonte", type=int, default=52)
+    parser.add_argument("--consultas", type=int, default=300)
+    parser.add_argument("--encerradas", type=int, default=20000)
+    args = parser.parse_args()
+
+    preparar_ambiente()
+    api = importlib.import_module("main")
+    import agendamentos
+
+    conn = api.abrir_conexao()
+    mapa = popular_banco(conn, usuarios=2, clientes_por_usuario=args.clientes, sessoes_por_cliente=1)
+    (usuario_series, clientes_series), (usuario_materializado, clientes_materializado) = mapa.items()
+    rng = random.Random(42)
+    hoje = date.today()
+    comeco = hoje - timedelta(days=365 * args.anos)
+    segunda = comeco - timedelta(days=comeco.weekday())
+
+    # AS SÉRIES PASSAM PELA VERIFICAÇÃO DE CONFLITO (AS QUE BATEM NUM HORÁRIO OCUPADO SÃO RECUSADAS)
+    inicio_carga, recusadas = time.perf_counter(), 0
+    for cliente_id in clientes_series:
+        dia, hora = rng.choice(HORARIOS)
+        semana = rng.randrange(args.anos * 52)
+        inicio = datetime.combine(segunda + timedelta(weeks=semana, days=dia), datetime.min.time()).replace(hour=hora)
+        fim = inicio.date() + timedelta(weeks=rng.randint(26, 156))
+        agendamento_id, _ = agendamentos.gravar_agendamento(
+            conn, usuario_series, cliente_id, inicio, 50, rng.choice((1, 1, 1, 2)),
+            fim if fim < hoje else None, None)
+        recusadas += agendamento_id is None
+    for semana in range(args.anos * 52):  # UM AVULSO POR SEMANA, DEPOIS DO ÚLTIMO HORÁRIO DAS SÉRIES
+        dia = segunda + timedelta(weeks=semana, days=rng.randrange(5))
+        agendamentos.gravar_agendamento(conn, usuario_series, rng.choice(clientes_series),
+                                        datetime.combine(dia, datetime.min.time()).replace(hour=20), 30, None, None, None)
+    conn.commit()
+    carga_ms = (time.perf_counter() - inicio_carga) * 1000
+
+    # A MESMA AGENDA, UMA LINHA POR OCORRÊNCIA, NO OUTRO PROFISSIONAL
+    ate = agendamentos.em_minutos(datetime.combine(hoje + timedelta(weeks=args.horizonte), datetime.min.time()))
+    equivalente = dict(zip(clientes_series, clientes_materializado))
+    linhas = []
+    for cliente_id, inicio, duracao, intervalo, repetir_ate in conn.execute(
+        "SELECT cliente_id, inicio, duracao_minutos, intervalo_semanas, repetir_ate FROM agendamentos WHERE usuario_id = ?",
+        (usuario_series,)
+    ).fetchall():
+        for minuto in agendamentos.ocorrencias(*agendamentos.parametros(inicio, duracao, intervalo, repetir_ate), 0, ate):
+            momento = agendamentos.de_minutos(minuto)
+            linhas.append((usuario_materializado, equivalente[cliente_id], agendamentos.formatar(momento),
+                           agendamentos.formatar(momento + timedelta(minutes=duracao)), duracao,
+                           minuto % agendamentos.MINUTOS_SEMANA, datetime.now().isoformat()))
+    conn.executemany(
+        """INSERT INTO agendamentos (usuario_id, cliente_id, inicio, fim, duracao_minutos, minuto_semana, data_registro)
+           VALUES (?, ?, ?, ?, ?, ?, ?)""", linhas)
+    conn.commit()
+    contagem = dict(conn.execute("SELECT usuario_id, count(*) FROM agendamentos GROUP BY usuario_id").fetchall())
+    print({"linhas_series": contagem[usuario_series], "series_recusadas_por_conflito": recusadas,
+           "linhas_materializadas": contagem[usuario_materializado], "carga_com_conflitos_ms": round(carga_ms, 1)})
+
+    # CONFLITOS: UM AVULSO E UMA SÉRIE SEM FIM, EM HORÁRIOS SORTEADOS DO ÚLTIMO ANO
+    for usuario_id, modo in ((usuario_series, "series"), (usuario_materializado, "materializado")):
+        for tipo, intervalo in (("avulso", None), ("serie", 1)):
+            rng_conflitos, latencias, ocupados = random.Random(7), [], 0
+            for _ in range(args.consultas):
+                dia, hora = rng_conflitos.choice(HORARIOS)
+                inicio = datetime.combine(hoje - timedelta(days=hoje.weekday() + 7 * rng_conflitos.randrange(52) - dia),
+                                          datetime.min.time()).replace(hour=hora, minute=rng_conflitos.choice((0, 30)))
+                t = time.perf_counter()
+                ocupados += bool(agendamentos.buscar_conflitos(conn, usuario_id, inicio, 50, intervalo, None))
+                latencias.append(time.perf_counter() - t)
+            print({"conflito": tipo, "modo": modo, **percentis(latencias), "ocupados": ocupados})
+    conn.close()
+    tamanho_banco = os.path.getsize("atendimentos.db")
+
+    tokens = {usuario_series: api.criar_token_jwt(usuario_series, "bench"),
+              usuario_materializado: api.criar_token_jwt(usuario_materializado, "bench")}
+
+    async def rodar():
+        async with api.app.router.lifespan_context(api.app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://teste") as http:
+                for visao in ("dia", "semana", "mes"):
+                    for usuario_id, modo in ((usuario_series, "series"), (usuario_materializado, "materializado")):
+                        headers = {"Authorization": f"Bearer {tokens[usuario_id]}"}
+                        rng_janelas, latencias, ocorrencias = random.Random(11), [], 0
+                        for _ in range(args.consultas):
+                            dia = comeco + timedelta(days=rng_janelas.randrange(365 * args.anos))
+                            if api.cache_respostas is not None:
+                                api.cache_respostas.limpar()
+                            t = time.perf_counter()
+                            resposta = await http.get("/agendamentos/", params={"visao": visao, "data": dia.isoformat()},
+                                                      headers=headers)
+                            resposta.raise_for_status()
+                            latencias.append(time.perf_counter() - t)
+                            ocorrencias += len(resposta.json())
+                        print({"visao": visao, "modo": modo, **percentis(latencias),
+                               "ocorrencias_por_consulta": round(ocorrencias / args.consultas, 1)})
+
+    asyncio.run(rodar())
+    print({"banco_bytes": tamanho_banco})
+
+    # HISTÓRICO: SÉRIES ENCERRADAS ANTES DE "comeco", EM 4 LEVAS, GRAVADAS DIRETO (SEM CONFLITO)
+    conn = api.abrir_conexao()
+    plano = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM agendamentos WHERE usuario_id = ? AND intervalo_semanas IS NOT NULL"
+        " AND inicio < ? AND repetir_ate >= ?", (usuario_series, "", "")
+    ).fetchall()
+    print({"plano_series_com_fim": [linha[-1] for linha in plano]})
+    rng_historico, leva = random.Random(13), args.encerradas // 4
+    for passo in range(5):
+        if passo:
+            linhas = []
+            for _ in range(leva):
+                dia, hora = rng_historico.choice(HORARIOS)
+                semanas_antes = rng_historico.randrange(26, 52 * 30)
+                inicio = datetime.combine(segunda - timedelta(weeks=semanas_antes) + timedelta(days=dia),
+                                          datetime.min.time()).replace(hour=hora)
+                repetir_ate = min(inicio.date() + timedelta(weeks=rng_historico.randint(4, 156)), comeco - timedelta(days=1))
+                linhas.append((usuario_series, rng_historico.choice(clientes_series), agendamentos.formatar(inicio),
+                               agendamentos.formatar(inicio + timedelta(minutes=50)), 50,
+                               agendamentos.em_minutos(inicio) % agendamentos.MINUTOS_SEMANA, 1,
+                               repetir_ate.isoformat(), datetime.now().isoformat()))
+            conn.executemany(
+                """INSERT INTO agendamentos (usuario_id, cliente_id, inicio, fim, duracao_minutos, minuto_semana,
+                                             intervalo_semanas, repetir_ate, data_registro)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""", linhas)
+            conn.commit()
+        rng_janelas, latencias = random.Random(17), []
+        for _ in range(args.consultas):
+            inicio, fim = agendamentos.janela_calendario("semana", hoje - timedelta(days=rng_janelas.randrange(365)))
+            t = time.perf_counter()
+            agendamentos.consultar_agenda(conn, usuario_series, inicio, fim)
+            latencias.append(time.perf_counter() - t)
+        series = conn.execute("SELECT count(*) FROM agendamentos WHERE usuario_id = ? AND intervalo_semanas IS NOT NULL",
+                              (usuario_series,)).fetchone()[0]
+        print({"historico": "semana", "series_do_profissional": series, **percentis(latencias)})
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
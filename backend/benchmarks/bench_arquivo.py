@@ -0,0 +1,124 @@
+"""
+BENCHMARK: ARQUIVO COMPRIMIDO DAS ANOTAÇÕES ANTIGAS
+
+Num banco sintético grande (anotações com tamanho realista, uma sessão por
+semana por cliente), mede:
+  compressao: bytes das anotações em texto, zlib sem dicionário e zlib com
+              dicionário treinado (amostra das anotações a arquivar)
+  arquivo:    tempo de arquivar tudo que é mais antigo que --dias (lotes de
+              ARQUIVO_LOTE, cada um uma transação) e tamanho do banco depois do VACUUM
+  listagem:   paginar_atendimentos antes e depois do arquivo, numa conexão nova
+              (cache do SQLite frio), para a primeira página (recente) e uma
+              página antiga (arquivada), com todos os campos e só com
+              id,data_atendimento,duracao_minutos
+
+Os textos sintéticos vêm de um vocabulário pequeno e comprimem mais que
+anotações reais; a proporção entre os modos é o que importa.
+
+    cd backend
+    python -m benchmarks.bench_arquivo --clientes 250 --sessoes 200 --dias 365
+"""
+import argparse
+import importlib
+import os
+import random
+import time
+import zlib
+from datetime import date, timedelta
+
+from benchmarks.carga import conteudo_realista
+from benchmarks.comum import preparar_ambiente, popular_banco, percentis
+
+CAMPOS_CURTOS = "id,data_atendimento,duracao_minutos"
+
+
+def tamanho_mb(conn) -> float:
+    conn.execute("VACUUM")
+    return round(os.path.getsize("atendimentos.db") / 2**20, 1)
+
+
+def medir_listagens(api, usuario_id: int, clientes: list, limite: str, paginas: int) -> dict:
+    """p50 DE CADA TIPO DE PÁGINA, CADA UM NUMA CONEXÃO NOVA (CACHE DO SQLITE VAZIO)"""
+    resultado = {}
+    antiga = api.codificar_cursor(limite, 0)
+    for rotulo, cursor, campos in (("recente", None, None), ("recente_campos", None, CAMPOS_CURTOS),
+                                   ("antiga", antiga, None), ("antiga_campos", antiga, CAMPOS_CURTOS)):
+        conn = api.abrir_conexao()
+        rng = random.Random(11)
+        latencias = []
+        for _ in range(paginas):
+            inicio = time.perf_counter()
+            api.paginar_atendimentos(conn, usuario_id, rng.choice(clientes), 20, cursor, campos, None, None)
+            latencias.append(time.perf_counter() - inicio)
+        conn.close()
+        resultado[rotulo] = percentis(latencias)["p50_ms"]
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clientes", type=int, default=250)
+    parser.add_argument("--sessoes", type=int, default=200, help="sessões semanais por cliente (200 = ~4 anos)")
+    parser.add_argument("--dias", type=int, default=365, help="idade mínima das anotações arquivadas")
+    parser.add_argument("--paginas", type=int, default=500)
+    args = parser.parse_args()
+
+    preparar_ambiente()
+    api = importlib.import_module("main")
+    import arquivo
+
+    conn = api.abrir_conexao()
+    inicio = time.perf_counter()
+    mapa = popular_banco(conn, clientes_por_usuario=args.clientes, sessoes_por_cliente=args.sessoes,
+                         gerar_conteudo=conteudo_realista)
+    usuario_id, clientes = next(iter(mapa.items()))
+    limite = (date.today() - timedelta(days=args.dias)).isoformat()
+    print({"massa": {"sessoes": args.clientes * args.sessoes, "segundos_gerando": round(time.perf_counter() - inicio, 1),
+                     "banco_mb": tamanho_mb(conn)}})
+
+    # COMPRESSÃO DAS ANOTAÇÕES QUE SERÃO ARQUIVADAS, COM E SEM DICIONÁRIO
+    textos = [linha[0] for linha in conn.execute(
+        "SELECT conteudo FROM atendimentos WHERE data_atendimento < ? ORDER BY data_atendimento DESC", (limite,))]
+    dicionario = arquivo.treinar_dicionario(textos[:1000], 'zlib')
+    bytes_texto = sum(len(texto.encode('utf-8')) for texto in textos)
+    for rotulo, dic in (("zlib", None), ("zlib_dicionario", dicionario)):
+        inicio = time.perf_counter()
+        comprimir = arquivo.criar_compressor('zlib', dic)
+        comprimidos = [comprimir(texto) for texto in textos]
+        duracao_comprimir = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        for dados in comprimidos[:5000]:
+            arquivo.descomprimir(dados, 'zlib', dic)
+        duracao_descomprimir = (time.perf_counter() - inicio) / min(5000, len(comprimidos))
+        total = sum(map(len, comprimidos))
+        print({"compressao": rotulo, "anotacoes": len(textos), "texto_mb": round(bytes_texto / 2**20, 1),
+               "comprimido_mb": round(total / 2**20, 1), "razao": round(bytes_texto / total, 2),
+               "us_comprimir": round(duracao_comprimir / len(textos) * 1e6, 1),
+               "us_descomprimir": round(duracao_descomprimir * 1e6, 1)})
+    # REFERÊNCIA: O TEXTO INTEIRO COMO UM SÓ BLOCO (O MÁXIMO QUE O zlib CONSEGUE)
+    print({"compressao": "zlib_bloco_unico", "razao": round(bytes_texto / len(zlib.compress(''.join(textos).encode('utf-8'), 9)), 2)})
+
+    antes = medir_listagens(api, usuario_id, clientes, limite, args.paginas)
+
+    # ARQUIVA EM LOTES, COMO O LAÇO EM SEGUNDO PLANO
+    inicio, total, posicao, lotes = time.perf_counter(), 0, None, []
+    while True:
+        inicio_lote = time.perf_counter()
+        with conn:
+            quantidade, posicao = arquivo.arquivar_lote(conn, limite, posicao)
+        lotes.append(time.perf_counter() - inicio_lote)
+        total += quantidade
+        if posicao is None:
+            break
+    duracao = time.perf_counter() - inicio
+    print({"arquivo": {"arquivadas": total, "segundos": round(duracao, 1), "por_segundo": round(total / duracao),
+                       "lote_p95_ms": percentis(lotes)["p95_ms"], "banco_mb_apos_vacuum": tamanho_mb(conn),
+                       **arquivo.tamanhos(conn)}})
+
+    depois = medir_listagens(api, usuario_id, clientes, limite, args.paginas)
+    for rotulo in antes:
+        print({"listagem_p50_ms": rotulo, "antes": antes[rotulo], "depois": depois[rotulo]})
+
+
+if __name__ == "__main__":
+    main()
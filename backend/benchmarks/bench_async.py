@@ -0,0 +1,80 @@
+"""
+BENCHMARK: HANDLERS SÍNCRONOS (THREADPOOL) vs MODO ASSÍNCRONO (DB_MODO=async)
+
+Sobe a API com uvicorn em cada modo e dispara N clientes concorrentes
+(asyncio + httpx) misturando listagem de clientes, listagem de atendimentos
+e ~10% de novos atendimentos.
+
+    cd backend
+    python -m benchmarks.bench_async --concorrencia 10 100 500 --segundos 10
+"""
+import argparse
+import asyncio
+import importlib
+import random
+import time
+
+import httpx
+
+from benchmarks.comum import preparar_ambiente, popular_banco, percentis, servidor_uvicorn
+
+
+async def cliente_virtual(http, headers, cliente_ids, fim, rng, latencias, erros):
+    while time.perf_counter() < fim:
+        cliente_id = rng.choice(cliente_ids)
+        sorteio = rng.random()
+        inicio = time.perf_counter()
+        try:
+            if sorteio < 0.1:
+                resposta = await http.post(f"/clientes/{cliente_id}/atendimentos/", headers=headers, json={
+                    "data_atendimento": "2026-01-01", "conteudo": "Sessão de benchmark", "duracao_minutos": 50})
+            elif sorteio < 0.55:
+                resposta = await http.get("/clientes/", params={"limit": 20}, headers=headers)
+            else:
+                resposta = await http.get(f"/clientes/{cliente_id}/atendimentos/", params={"limit": 20}, headers=headers)
+        except httpx.HTTPError:
+            erros["rede"] += 1
+            continue
+        if resposta.status_code >= 400:
+            erros[str(resposta.status_code)] = erros.get(str(resposta.status_code), 0) + 1
+            continue
+        latencias.append(time.perf_counter() - inicio)
+
+
+async def rodar_carga(url, headers, cliente_ids, concorrencia, segundos):
+    latencias, erros = [], {"rede": 0}
+    limites = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limites) as http:
+        fim = time.perf_counter() + segundos
+        await asyncio.gather(*(
+            cliente_virtual(http, headers, cliente_ids, fim, random.Random(i), latencias, erros)
+            for i in range(concorrencia)
+        ))
+    return {"requisicoes_por_segundo": round(len(latencias) / segundos, 1), "erros": erros, **percentis(latencias)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concorrencia", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--clientes", type=int, default=200)
+    parser.add_argument("--sessoes", type=int, default=20)
+    args = parser.parse_args()
+
+    pasta = preparar_ambiente()
+    api = importlib.import_module("main")
+    conn = api.abrir_conexao()
+    mapa = popular_banco(conn, clientes_por_usuario=args.clientes, sessoes_por_cliente=args.sessoes)
+    conn.close()
+    usuario_id, cliente_ids = next(iter(mapa.items()))
+    headers = {"Authorization": f"Bearer {api.criar_token_jwt(usuario_id, 'bench')}"}
+
+    for modo in ("sync", "async"):
+        with servidor_uvicorn(pasta, ambiente={"DB_MODO": modo}) as url:
+            for concorrencia in args.concorrencia:
+                resultado = asyncio.run(rodar_carga(url, headers, cliente_ids, concorrencia, args.segundos))
+                print({"modo": modo, "clientes_concorrentes": concorrencia, **resultado})
+
+
+if __name__ == "__main__":
+    main()
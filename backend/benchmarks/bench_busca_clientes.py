@@ -0,0 +1,135 @@
+"""
+BENCHMARK: AUTOCOMPLETE DE CLIENTES (GET /clientes/busca?q=) POR TECLA DIGITADA
+
+Um profissional com --clientes clientes de nomes brasileiros (com acentos);
+cada sequência digita, letra por letra, o começo de um nome ou de um
+sobrenome sem acentos ("conc" acha "Conceição"). Latência por tecla, em
+três situações:
+  fria:      caches vazios antes de cada tecla (toda tecla vai ao SQL)
+  digitando: caches vazios antes de cada sequência; da segunda tecla em
+             diante, o resultado completo do prefixo anterior é filtrado em memória
+  sessao:    caches vazios só no começo: as primeiras letras, as mais
+             digitadas, ficam no cache de uma sequência para a outra
+Comparação: o que o frontend teria de fazer sem a rota, baixar a lista inteira
+(GET /clientes/ paginado) e filtrar no navegador.
+
+    cd backend
+    python -m benchmarks.bench_busca_clientes --clientes 2000 --sequencias 200
+"""
+import argparse
+import asyncio
+import importlib
+import random
+import time
+
+import httpx
+
+from benchmarks.comum import preparar_ambiente, popular_banco, percentis
+
+PRENOMES = ("João José Maria Ana Antônio Márcia Luís Luíza Cecília Otávio Íris Júlia Renê Sérgio Flávia "
+            "Lúcia Inês Mônica Fábio Vânia Cláudio Patrícia Letícia Vitória Caetano Benedito Gisele Pedro "
+            "Paulo Carla Beatriz Bruno Rafael Gabriela Larissa Thiago Mateus Heloísa Valéria Rogério Débora "
+            "Estêvão Tânia Simone Wagner Yasmin Zélia Henrique Igor Kátia Nathália Úrsula Ênio Álvaro").split()
+SOBRENOMES = ("Silva Souza Conceição Araújo Simões Gonçalves Lima Assunção Brandão Mello Peçanha Guimarães "
+              "Magalhães Nóbrega Côrtes Ribeiro Falcão Romão Sampaio Fontes Barbosa Queiroz Tavares Oliveira "
+              "Santos Pereira Costa Rodrigues Almeida Nascimento Carvalho Gomes Martins Rocha Dias Moreira "
+              "Cardoso Teixeira Correia Pinto Cavalcanti Monteiro Mendes Freitas Vieira Batista Castro Andrade "
+              "Farias Nunes Moura Lopes Macedo Bezerra Siqueira Leão Antunes Prado Xavier").split()
+
+
+def sequencias_de_teclas(rng: random.Random, nomes: list, quantidade: int) -> list:
+    """CADA SEQUÊNCIA: OS PREFIXOS DE UMA PALAVRA DE UM NOME EXISTENTE, SEM ACENTOS (ATÉ 6 LETRAS)"""
+    from nomes import normalizar_nome
+    sequencias = []
+    for _ in range(quantidade):
+        palavra = rng.choice(normalizar_nome(rng.choice(nomes)).split())
+        sequencias.append([palavra[:tamanho] for tamanho in range(1, min(len(palavra), 6) + 1)])
+    return sequencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clientes", type=int, default=2000)
+    parser.add_argument("--sequencias", type=int, default=200)
+    args = parser.parse_args()
+
+    preparar_ambiente()
+    api = importlib.import_module("main")
+    import nomes
+
+    conn = api.abrir_conexao()
+    mapa = popular_banco(conn, clientes_por_usuario=args.clientes, sessoes_por_cliente=1)
+    usuario_id, clientes = next(iter(mapa.items()))
+    rng = random.Random(42)
+    nomes_gerados = []
+    for cliente_id in clientes:  # A COLUNA NORMALIZADA É GRAVADA JUNTO (O TRIGGER DO FTS SEGUE ELA)
+        nome = f"{rng.choice(PRENOMES)} {rng.choice(SOBRENOMES)} {rng.choice(SOBRENOMES)}"
+        nomes_gerados.append(nome)
+        conn.execute("UPDATE clientes SET nome_completo = ?, nome_normalizado = ? WHERE id = ?",
+                     (nome, nomes.normalizar_nome(nome), cliente_id))
+    # ÚLTIMA SESSÃO ESPALHADA POR DOIS ANOS, PARA A ORDEM POR RECÊNCIA TER O QUE ORDENAR
+    conn.executemany("UPDATE atendimentos SET data_atendimento = date('now', ?) WHERE cliente_id = ?",
+                     [(f"-{rng.randrange(730)} days", cliente_id) for cliente_id in clientes])
+    conn.commit()
+    conn.close()
+    headers = {"Authorization": f"Bearer {api.criar_token_jwt(usuario_id, 'bench')}"}
+    sequencias = sequencias_de_teclas(rng, nomes_gerados, args.sequencias)
+
+    consultas_sql = [0]
+    consultar_nomes = nomes.consultar_nomes
+
+    def consultar_contando(*args):  # TECLAS QUE FORAM AO BANCO (AS OUTRAS SAÍRAM DOS CACHES)
+        consultas_sql[0] += 1
+        return consultar_nomes(*args)
+    nomes.consultar_nomes = consultar_contando
+
+    def limpar_caches():
+        nomes.cache_nomes.limpar()
+        if api.cache_respostas is not None:
+            api.cache_respostas.limpar()
+
+    async def rodar():
+        async with api.app.router.lifespan_context(api.app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://teste") as http:
+                async def tecla(termo):
+                    inicio = time.perf_counter()
+                    resposta = await http.get("/clientes/busca", params={"q": termo}, headers=headers)
+                    resposta.raise_for_status()
+                    return time.perf_counter() - inicio
+
+                await tecla("a")  # AQUECIMENTO
+                for modo in ("fria", "digitando", "sessao"):
+                    limpar_caches()
+                    consultas_sql[0] = 0
+                    latencias = []
+                    for sequencia in sequencias:
+                        if modo == "digitando":
+                            limpar_caches()
+                        for termo in sequencia:
+                            if modo == "fria":
+                                limpar_caches()
+                            latencias.append(await tecla(termo))
+                    print({"modo": modo, "teclas": len(latencias), **percentis(latencias),
+                           "consultas_sql": consultas_sql[0]})
+
+                # SEM A ROTA: A LISTA INTEIRA, PÁGINA A PÁGINA, E O FILTRO NO NAVEGADOR
+                limpar_caches()
+                inicio, recebidos, paginas, cursor = time.perf_counter(), 0, 0, None
+                while True:
+                    resposta = await http.get("/clientes/", headers=headers,
+                                              params={"limit": 500, **({"cursor": cursor} if cursor else {})})
+                    recebidos += len(resposta.content)
+                    paginas += 1
+                    cursor = resposta.headers.get("x-proximo-cursor")
+                    if not cursor:
+                        break
+                print({"modo": "lista_completa", "paginas": paginas, "bytes": recebidos,
+                       "ms": round((time.perf_counter() - inicio) * 1000, 1)})
+                resposta = await http.get("/clientes/busca", params={"q": sequencias[0][-1]}, headers=headers)
+                print({"modo": "busca", "bytes_por_tecla": len(resposta.content)})
+
+    asyncio.run(rodar())
+
+
+if __name__ == "__main__":
+    main()
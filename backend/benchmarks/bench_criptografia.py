@@ -0,0 +1,113 @@
+"""
+BENCHMARK: CUSTO DA CRIPTOGRAFIA DE CAMPOS (AES-GCM) NAS LEITURAS E ESCRITAS
+
+Compara, com os mesmos dados, o caminho em texto puro e o cifrado:
+  listagem: SELECT -> dicts -> (decifrar em lote) -> bytes JSON
+  escrita:  executemany de N atendimentos (cifrando o conteúdo antes)
+  login:    derivação da chave com scrypt (uma vez por login)
+e confere que a listagem decifrada é igual à de texto puro.
+
+    cd backend
+    python -m benchmarks.bench_criptografia --linhas 1000
+"""
+import argparse
+import importlib
+import json
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from benchmarks.comum import preparar_ambiente, popular_banco, texto_aleatorio
+
+
+def cronometrar(funcao, repeticoes: int):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        resultado = funcao()
+    return (time.perf_counter() - inicio) / repeticoes * 1000, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=1000)
+    parser.add_argument("--repeticoes", type=int, default=20)
+    args = parser.parse_args()
+
+    preparar_ambiente()
+    api = importlib.import_module("main")
+    from criptografia import (Cifrador, CAMPOS_ATENDIMENTO_CIFRADOS, CAMPOS_CLIENTE_CIFRADOS,
+                              derivar_chave, nova_chave_dados, novo_salt)
+    from serializacao import RespostaJSON, linhas_para_dicts
+
+    cifrador = Cifrador(nova_chave_dados())
+    rng = random.Random(3)
+    conn = api.abrir_conexao()
+    mapa = popular_banco(conn, clientes_por_usuario=args.linhas, sessoes_por_cliente=0)
+    usuario_id, cliente_ids = next(iter(mapa.items()))
+    agora = datetime.now().isoformat()
+    sessoes = [(usuario_id, cliente_ids[0], (date.today() - timedelta(days=i)).isoformat(),
+                texto_aleatorio(rng, 200, 3000), 50, agora) for i in range(args.linhas)]
+    sql_inserir = """INSERT INTO atendimentos (usuario_id, cliente_id, data_atendimento, conteudo, duracao_minutos, data_registro)
+        VALUES (?, ?, ?, ?, ?, ?)"""
+
+    # ESCRITA: O MESMO LOTE EM TEXTO PURO E CIFRADO (NUM CLIENTE PRÓPRIO CADA)
+    def gravar(cliente_id, cifrar):
+        linhas = [(u, cliente_id, d, cifrador.cifrar(texto, 'conteudo') if cifrar else texto, m, r)
+                  for u, _, d, texto, m, r in sessoes]
+        conn.executemany(sql_inserir, linhas)
+        conn.commit()
+
+    # TRÊS RODADAS ALTERNADAS (A PRIMEIRA ESQUENTA O CACHE); VALE A MELHOR DE CADA
+    duracoes = {"texto_puro": [], "cifrado": []}
+    for _ in range(3):
+        for rotulo, cliente_id, cifrar in (("texto_puro", cliente_ids[1], False), ("cifrado", cliente_ids[2], True)):
+            inicio = time.perf_counter()
+            gravar(cliente_id, cifrar)
+            duracoes[rotulo].append(time.perf_counter() - inicio)
+    for rotulo, tempos in duracoes.items():
+        print({"cenario": f"escrita_{rotulo}", "linhas": args.linhas, "ms": round(min(tempos) * 1000, 1),
+               "linhas_por_segundo": round(args.linhas / min(tempos))})
+
+    # LEITURA: A MESMA LISTAGEM DE ATENDIMENTOS, EM TEXTO PURO E CIFRADA
+    sql_atendimentos = (f"SELECT {', '.join(api.CAMPOS_ATENDIMENTO)} FROM atendimentos "
+                        "WHERE usuario_id = ? AND cliente_id = ? ORDER BY data_atendimento DESC, id DESC LIMIT ?")
+
+    def listar(sql, parametros, campos, cifrados, decifrar):
+        itens = linhas_para_dicts(conn.execute(sql, parametros).fetchall(), campos)
+        if decifrar:
+            cifrador.decifrar_itens(itens, cifrados)
+        return RespostaJSON(content=itens).body
+
+    ms_puro, corpo_puro = cronometrar(lambda: listar(sql_atendimentos, (usuario_id, cliente_ids[1], args.linhas),
+                                                     api.CAMPOS_ATENDIMENTO, CAMPOS_ATENDIMENTO_CIFRADOS, False), args.repeticoes)
+    ms_cifrado, corpo_cifrado = cronometrar(lambda: listar(sql_atendimentos, (usuario_id, cliente_ids[2], args.linhas),
+                                                           api.CAMPOS_ATENDIMENTO, CAMPOS_ATENDIMENTO_CIFRADOS, True), args.repeticoes)
+    conteudos = lambda corpo: [item['conteudo'] for item in json.loads(corpo)]
+    print({"lista": "atendimentos", "itens": args.linhas, "texto_puro_ms": round(ms_puro, 2),
+           "cifrado_ms": round(ms_cifrado, 2), "sobrecusto": f"{(ms_cifrado / ms_puro - 1) * 100:.0f}%",
+           "conteudo_identico": conteudos(corpo_puro) == conteudos(corpo_cifrado)})
+
+    # CLIENTES: A MESMA CONSULTA ANTES E DEPOIS DE CIFRAR email, telefone E endereco
+    sql_clientes = f"SELECT {', '.join(api.CAMPOS_CLIENTE)} FROM clientes WHERE usuario_id = ? ORDER BY nome_completo, id"
+    ms_puro, corpo_puro = cronometrar(lambda: listar(sql_clientes, (usuario_id,), api.CAMPOS_CLIENTE,
+                                                     CAMPOS_CLIENTE_CIFRADOS, False), args.repeticoes)
+    conn.executemany(
+        "UPDATE clientes SET email = ?, telefone = ?, endereco = ? WHERE id = ?",
+        [(cifrador.cifrar(linha['email'], 'email'), cifrador.cifrar(linha['telefone'], 'telefone'),
+          cifrador.cifrar(linha['endereco'], 'endereco'), linha['id'])
+         for linha in conn.execute("SELECT id, email, telefone, endereco FROM clientes WHERE usuario_id = ?", (usuario_id,))]
+    )
+    conn.commit()
+    ms_cifrado, corpo_cifrado = cronometrar(lambda: listar(sql_clientes, (usuario_id,), api.CAMPOS_CLIENTE,
+                                                           CAMPOS_CLIENTE_CIFRADOS, True), args.repeticoes)
+    print({"lista": "clientes", "itens": args.linhas, "texto_puro_ms": round(ms_puro, 2),
+           "cifrado_ms": round(ms_cifrado, 2), "sobrecusto": f"{(ms_cifrado / ms_puro - 1) * 100:.0f}%",
+           "json_identico": json.loads(corpo_puro) == json.loads(corpo_cifrado)})
+
+    # LOGIN: UMA DERIVAÇÃO scrypt POR LOGIN (MAIS O bcrypt QUE JÁ EXISTIA)
+    ms_scrypt, _ = cronometrar(lambda: derivar_chave("senha_bench", novo_salt(), 'senha'), 5)
+    print({"cenario": "derivacao_chave_login", "ms": round(ms_scrypt, 1)})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+BENCHMARK: PÁGINA DO CLIENTE EM UMA REQUISIÇÃO E ATENDIMENTO GRAVADO EM UM COMANDO
+
+  pagina:  GET /clientes/{id}/ + GET /clientes/{id}/atendimentos/ (como o front fazia)
+           vs GET /clientes/{id}/detalhes/ (cliente, estatísticas e primeira página)
+  escrita: SELECT de dono + INSERT vs INSERT ... SELECT ... WHERE EXISTS
+
+O cache de respostas é limpo antes de cada abertura (mede o caminho até o banco).
+Os comandos SQL por abertura vêm do cabeçalho Server-Timing (METRICAS=1).
+
+    cd backend
+    python -m benchmarks.bench_detalhes --aberturas 500
+"""
+import argparse
+import importlib
+import random
+import re
+import time
+from datetime import date, datetime
+
+from benchmarks.comum import preparar_ambiente, popular_banco, percentis
+
+DONO = "SELECT id FROM clientes WHERE id = ? AND usuario_id = ?"
+INSERIR = """INSERT INTO atendimentos (usuario_id, cliente_id, data_atendimento, conteudo, duracao_minutos, data_registro)
+    VALUES (?, ?, ?, ?, 50, ?)"""
+INSERIR_SE_DONO = """INSERT INTO atendimentos (usuario_id, cliente_id, data_atendimento, conteudo, duracao_minutos, data_registro)
+    SELECT ?, ?, ?, ?, 50, ? WHERE EXISTS (SELECT 1 FROM clientes WHERE id = ? AND usuario_id = ?)"""
+
+
+def consultas_sql(resposta) -> int:
+    encontrado = re.search(r'desc="(\d+) consultas"', resposta.headers.get('server-timing', ''))
+    return int(encontrado.group(1)) if encontrado else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--aberturas", type=int, default=500)
+    parser.add_argument("--clientes", type=int, default=200)
+    parser.add_argument("--sessoes", type=int, default=40)
+    parser.add_argument("--escritas", type=int, default=5000)
+    args = parser.parse_args()
+
+    preparar_ambiente()
+    api = importlib.import_module("main")
+    from fastapi.testclient import TestClient
+
+    conn = api.abrir_conexao()
+    mapa = popular_banco(conn, clientes_por_usuario=args.clientes, sessoes_por_cliente=args.sessoes)
+    usuario_id, cliente_ids = next(iter(mapa.items()))
+    headers = {"Authorization": f"Bearer {api.criar_token_jwt(usuario_id, 'bench')}"}
+
+    with TestClient(api.app) as cliente:
+        def separadas(cliente_id):
+            respostas = [cliente.get(f"/clientes/{cliente_id}/", headers=headers),
+                         cliente.get(f"/clientes/{cliente_id}/atendimentos/", params={"limit": 20}, headers=headers)]
+            return respostas
+
+        def combinada(cliente_id):
+            return [cliente.get(f"/clientes/{cliente_id}/detalhes/", params={"limit": 20}, headers=headers)]
+
+        for rotulo, abrir in (("separadas", separadas), ("combinada", combinada)):
+            rng = random.Random(9)
+            latencias, comandos, bytes_recebidos = [], 0, 0
+            for _ in range(args.aberturas):
+                if api.cache_respostas is not None:
+                    api.cache_respostas.limpar()
+                inicio = time.perf_counter()
+                respostas = abrir(rng.choice(cliente_ids))
+                latencias.append(time.perf_counter() - inicio)
+                assert all(r.status_code == 200 for r in respostas)
+                comandos += sum(consultas_sql(r) for r in respostas)
+                bytes_recebidos += sum(len(r.content) for r in respostas)
+            print({"pagina": rotulo, "requisicoes_por_abertura": len(respostas),
+                   "sql_por_abertura": round(comandos / args.aberturas, 1),
+                   "kb_por_abertura": round(bytes_recebidos / args.aberturas / 1024, 1), **percentis(latencias)})
+
+    # ESCRITA: A MESMA SEQUÊNCIA DE INSERTS COM A VERIFICAÇÃO SEPARADA E EMBUTIDA
+    for rotulo in ("select_e_insert", "insert_where_exists"):
+        rng = random.Random(4)
+        inicio = time.perf_counter()
+        for _ in range(args.escritas):
+            cliente_id = rng.choice(cliente_ids)
+            valores = (usuario_id, cliente_id, date.today().isoformat(), "Sessão de benchmark", datetime.now().isoformat())
+            if rotulo == "select_e_insert":
+                if conn.execute(DONO, (cliente_id, usuario_id)).fetchone():
+                    conn.execute(INSERIR, valores)
+            else:
+                conn.execute(INSERIR_SE_DONO, (*valores, cliente_id, usuario_id))
+            conn.commit()
+        duracao = time.perf_counter() - inicio
+        print({"escrita": rotulo, "us_por_atendimento": round(duracao / args.escritas * 1e6, 1)})
+
+
+if __name__ == "__main__":
+    main()
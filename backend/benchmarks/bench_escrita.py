@@ -0,0 +1,100 @@
+"""
+BENCHMARK: ESCRITA AGRUPADA (GROUP COMMIT) vs UM COMMIT POR REQUISIÇÃO
+
+N escritores simultâneos (POST /clientes/{id}/sessoes/, 1 em cada 10 é um
+POST /clientes/) contra a API em processo, para cada combinação de
+  ESCRITA_AGRUPADA = 0 | 1
+  DB_DURABILIDADE  = total (fsync a cada commit) | normal
+Mede escritas por segundo e a latência (p50/p95/p99) de cada escrita.
+Cada combinação roda num processo novo (a configuração é lida na importação).
+
+O fsync só custa de verdade em disco: rode com --pasta num diretório do disco
+onde o banco fica em produção (em tmpfs "total" e "normal" quase empatam).
+
+    cd backend
+    python -m benchmarks.bench_escrita --escritas 3000 --concorrencia 1 16 64
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.comum import BACKEND_DIR
+
+CODIGO_ESCRITA = """
+import asyncio, json, random, sys, time
+sys.path.insert(0, {backend!r})
+import httpx
+import main
+from benchmarks.comum import popular_banco, percentis
+
+async def rodar():
+    conn = main.abrir_conexao()
+    mapa = popular_banco(conn, clientes_por_usuario=200, sessoes_por_cliente=5)
+    conn.close()
+    usuario_id, clientes = next(iter(mapa.items()))
+    headers = {{"Authorization": f"Bearer {{main.criar_token_jwt(usuario_id, 'bench')}}"}}
+    rng = random.Random(7)
+    fila = list(range({escritas}))
+    latencias = []
+
+    async with main.app.router.lifespan_context(main.app):
+        transporte = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+            async def escritor():
+                while fila:
+                    n = fila.pop()
+                    if n % 10 == 0:
+                        pedido = cliente.post("/clientes/", headers=headers, json={{
+                            "nome_completo": f"Cliente novo {{n}}", "email": f"novo{{n}}@bench.local",
+                            "telefone": "11999999999", "data_nascimento": "1990-05-17"}})
+                    else:
+                        pedido = cliente.post(f"/clientes/{{rng.choice(clientes)}}/sessoes/", headers=headers, json={{
+                            "data_atendimento": "2026-03-02", "duracao_minutos": 50,
+                            "conteudo": "Sessão de benchmark " * rng.randint(5, 60)}})
+                    inicio = time.perf_counter()
+                    resposta = await pedido
+                    latencias.append(time.perf_counter() - inicio)
+                    assert resposta.status_code == 201, resposta.text
+
+            inicio = time.perf_counter()
+            await asyncio.gather(*(escritor() for _ in range({concorrencia})))
+            duracao = time.perf_counter() - inicio
+        escritor = main.pool_escrita._escritor  # O SHUTDOWN DESCARTA O ESCRITOR
+
+    grupo = round(escritor.operacoes / escritor.grupos, 1) if escritor is not None and escritor.grupos else 1
+    print(json.dumps({{"escritas_por_segundo": round(len(latencias) / duracao), "media_por_commit": grupo,
+                      **percentis(latencias)}}))
+
+asyncio.run(rodar())
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escritas", type=int, default=3000)
+    parser.add_argument("--concorrencia", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--durabilidade", nargs="+", default=["total", "normal"])
+    parser.add_argument("--pasta", default=None, help="diretório dos bancos temporários (padrão: o do sistema)")
+    args = parser.parse_args()
+
+    for durabilidade in args.durabilidade:
+        for concorrencia in args.concorrencia:
+            for agrupada in ("0", "1"):
+                pasta = tempfile.mkdtemp(prefix="prontuario-bench-escrita-", dir=args.pasta)
+                saida = subprocess.run(
+                    [sys.executable, "-c", CODIGO_ESCRITA.format(backend=BACKEND_DIR, escritas=args.escritas,
+                                                                 concorrencia=concorrencia)],
+                    cwd=pasta, capture_output=True, text=True, check=True,
+                    env={**os.environ, "ESCRITA_AGRUPADA": agrupada, "DB_DURABILIDADE": durabilidade,
+                         "METRICAS": "0", "CRIPTOGRAFIA": "0", "DB_SHARDS": "0", "DB_MODO": "sync"}
+                ).stdout
+                print({"durabilidade": durabilidade, "concorrencia": concorrencia,
+                       "escrita": "agrupada" if agrupada == "1" else "commit_por_requisicao",
+                       **json.loads(saida.strip().splitlines()[-1])})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+BENCHMARK: EXPORTAÇÃO EM STREAMING vs MONTAR O ARQUIVO INTEIRO EM MEMÓRIA
+
+1) Memória: pico do tracemalloc ao serializar o prontuário completo com
+   fetchall + json.dumps vs o gerador de streaming (NDJSON e NDJSON gzip).
+2) Servidor real (uvicorn): vazão da exportação e p99 de GET /clientes/
+   de outros usuários sem e com exportações rodando ao mesmo tempo.
+
+    cd backend
+    python -m benchmarks.bench_exportacao --clientes 500 --sessoes 40
+"""
+import argparse
+import importlib
+import json
+import threading
+import time
+import tracemalloc
+
+import httpx
+
+from benchmarks.comum import preparar_ambiente, popular_banco, percentis, servidor_uvicorn
+
+
+def pico_memoria(funcao) -> tuple:
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    total = funcao()
+    duracao = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return total, round(pico / 2**20, 1), round(duracao, 2)
+
+
+def listar_clientes(url, headers, fim, latencias, lock):
+    locais = []
+    with httpx.Client(base_url=url, timeout=60) as cliente:
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            cliente.get("/clientes/", params={"limit": 50}, headers=headers).raise_for_status()
+            locais.append(time.perf_counter() - inicio)
+    with lock:
+        latencias.extend(locais)
+
+
+def exportar(url, headers, fim, resultados, lock, gzip):
+    with httpx.Client(base_url=url, timeout=300) as cliente:
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            total = 0
+            with cliente.stream("GET", "/exportacao", params={"gzip": gzip}, headers=headers) as resposta:
+                if resposta.status_code == 503:
+                    time.sleep(0.5)
+                    continue
+                for bloco in resposta.iter_raw():
+                    total += len(bloco)
+            with lock:
+                resultados.append((total, time.perf_counter() - inicio))
+
+
+def medir_crud(url, headers, segundos, exportacoes, gzip, headers_exportacao):
+    lock = threading.Lock()
+    latencias, exportados = [], []
+    fim = time.perf_counter() + segundos
+    threads = [threading.Thread(target=listar_clientes, args=(url, headers, fim, latencias, lock)) for _ in range(4)]
+    threads += [threading.Thread(target=exportar, args=(url, headers_exportacao, fim, exportados, lock, gzip))
+                for _ in range(exportacoes)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    resultado = {"exportacoes_simultaneas": exportacoes, "gzip": gzip,
+                 "crud_requisicoes_por_segundo": round(len(latencias) / segundos, 1), **percentis(latencias)}
+    if exportados:
+        megabytes = sum(total for total, _ in exportados) / 2**20
+        resultado.update({"exportacoes_concluidas": len(exportados),
+                          "mb_por_exportacao": round(exportados[0][0] / 2**20, 1),
+                          "mb_por_segundo": round(megabytes / segundos, 1)})
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clientes", type=int, default=500)
+    parser.add_argument("--sessoes", type=int, default=40)
+    parser.add_argument("--segundos", type=float, default=10)
+    args = parser.parse_args()
+
+    pasta = preparar_ambiente()
+    api = importlib.import_module("main")
+    from exportacao import consultar_prontuario, gerar_ndjson, em_blocos, comprimir_gzip
+
+    conn = api.abrir_conexao()
+    mapa = popular_banco(conn, usuarios=2, clientes_por_usuario=args.clientes, sessoes_por_cliente=args.sessoes)
+    usuario_exportacao, usuario_crud = list(mapa)
+
+    # MEMÓRIA: TUDO EM MEMÓRIA vs STREAMING
+    def materializado():
+        clientes = [dict(linha) for linha in conn.execute("SELECT * FROM clientes WHERE usuario_id = ?", (usuario_exportacao,))]
+        atendimentos = [dict(linha) for linha in conn.execute("SELECT * FROM atendimentos WHERE usuario_id = ?", (usuario_exportacao,))]
+        return len(json.dumps({"clientes": clientes, "atendimentos": atendimentos}, ensure_ascii=False).encode())
+
+    def streaming(gzip=False):
+        blocos = em_blocos(gerar_ndjson(consultar_prontuario(conn, usuario_exportacao)))
+        if gzip:
+            blocos = comprimir_gzip(blocos)
+        return sum(len(bloco) for bloco in blocos)
+
+    for nome, funcao in (("materializado", materializado), ("streaming_ndjson", streaming),
+                         ("streaming_ndjson_gzip", lambda: streaming(True))):
+        total, pico, duracao = pico_memoria(funcao)
+        print({"cenario": nome, "atendimentos": args.clientes * args.sessoes,
+               "mb_gerados": round(total / 2**20, 1), "pico_memoria_mb": pico, "segundos": duracao})
+    conn.close()
+
+    # SERVIDOR REAL: IMPACTO NAS OUTRAS ROTAS
+    headers_crud = {"Authorization": f"Bearer {api.criar_token_jwt(usuario_crud, 'crud')}"}
+    headers_exportacao = {"Authorization": f"Bearer {api.criar_token_jwt(usuario_exportacao, 'exportacao')}"}
+    with servidor_uvicorn(pasta) as url:
+        for exportacoes, gzip in ((0, False), (1, False), (2, True)):
+            print(medir_crud(url, headers_crud, args.segundos, exportacoes, gzip, headers_exportacao))
+
+
+if __name__ == "__main__":
+    main()
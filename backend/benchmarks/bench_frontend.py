@@ -0,0 +1,179 @@
+"""
+BENCHMARK: CARREGAMENTO DAS PÁGINAS — FRONTEND SEPARADO vs SERVIDO PELA API
+
+Simula o navegador percorrendo login.html -> login -> index.html ->
+detalhe.html?id=N, com um cache HTTP que segue Cache-Control e ETag:
+  antes:  frontend num servidor de arquivos à parte (StaticFiles do Starlette:
+          ETag e Last-Modified, sem Cache-Control nem compressão) e API em
+          outra origem; cada fetch com Authorization ou JSON passa antes por
+          um preflight OPTIONS
+  depois: FRONTEND=1, tudo na origem da API; CSS/JS com hash no nome e
+          immutable, páginas com no-cache + ETag, gzip/brotli
+Duas visitas: a primeira com o cache vazio e a seguinte no outro dia (o
+cache HTTP continua valendo, o de preflights do navegador, no máximo 10 min
+pelo Access-Control-Max-Age do CORS, não). Sem Cache-Control, o "antes"
+usa o frescor heurístico dos navegadores: 10% da idade do Last-Modified
+(arquivos alterados há pouco são revalidados, os antigos não).
+Conta requisições e bytes recebidos (linha de status + headers + corpo
+como veio pela rede, comprimido ou não).
+
+    cd backend
+    python -m benchmarks.bench_frontend
+"""
+import asyncio
+import importlib
+import os
+import re
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urljoin
+
+import httpx
+
+from benchmarks.comum import preparar_ambiente, popular_banco
+
+ORIGEM_FRONTEND = "http://127.0.0.1:5500"
+ACCEPT_ENCODING = "gzip, deflate, br"
+RECURSOS_DA_PAGINA = re.compile(r'<(?:link[^>]+href|script[^>]+src)="([^"]+)"')
+
+
+class Navegador:
+    """CACHE HTTP MÍNIMO: FRESCOR POR max-age, REVALIDAÇÃO POR ETag, PREFLIGHT ANTES DE FETCH CROSS-ORIGIN"""
+
+    def __init__(self):
+        self.cache = {}  # url -> (etag, expira_em, corpo)
+        self.requisicoes = 0
+        self.bytes = {"arquivos": 0, "api": 0}
+        self.preflights = 0
+        self.relogio = 0.0  # segundos simulados desde a primeira visita
+
+    def contar(self, resposta: httpx.Response, tipo: str):
+        cabecalhos = sum(len(nome) + len(valor) + 4 for nome, valor in resposta.headers.raw)
+        self.requisicoes += 1
+        self.bytes[tipo] += len("HTTP/1.1 200 OK\r\n") + cabecalhos + 2 + resposta.num_bytes_downloaded
+
+    async def baixar(self, http, url: str) -> str:
+        """UMA NAVEGAÇÃO OU UM <link>/<script>: SÓ VAI À REDE SE O CACHE NÃO ESTIVER FRESCO"""
+        guardado = self.cache.get(url)
+        if guardado is not None and guardado[1] > self.relogio:
+            return guardado[2]
+        headers = {"Accept-Encoding": ACCEPT_ENCODING}
+        if guardado is not None and guardado[0]:
+            headers["If-None-Match"] = guardado[0]
+        resposta = await http.get(url, headers=headers)
+        self.contar(resposta, "arquivos")
+        if resposta.status_code == 304:
+            corpo = guardado[2]
+        else:
+            resposta.raise_for_status()
+            corpo = resposta.text
+        expira = self.relogio + self.frescor(resposta)
+        self.cache[url] = (resposta.headers.get("etag"), expira, corpo)
+        return corpo
+
+    @staticmethod
+    def frescor(resposta: httpx.Response) -> float:
+        """SEGUNDOS SEM PERGUNTAR DE NOVO: max-age OU, SEM Cache-Control, 10% DA IDADE DO Last-Modified (RFC 9111)"""
+        controle = resposta.headers.get("cache-control")
+        if controle is not None:
+            idade = re.search(r"max-age=(\d+)", controle)
+            return int(idade.group(1)) if idade and "no-cache" not in controle else 0
+        modificado = resposta.headers.get("last-modified")
+        if modificado is None:
+            return 0
+        return max(0.0, time.time() - parsedate_to_datetime(modificado).timestamp()) * 0.1
+
+    async def abrir_pagina(self, http, url: str):
+        corpo = await self.baixar(http, url)
+        for recurso in RECURSOS_DA_PAGINA.findall(corpo):
+            await self.baixar(http, urljoin(url, recurso))
+
+    async def fetch(self, http, metodo: str, url: str, origem: str, headers: dict, **kwargs) -> httpx.Response:
+        """fetch() DO auth.js: CROSS-ORIGIN, COM Authorization OU JSON, PEDE PREFLIGHT"""
+        cross_origin = httpx.URL(url).netloc != httpx.URL(origem).netloc
+        if cross_origin:
+            preflight = await http.request("OPTIONS", url, headers={
+                "Origin": origem, "Access-Control-Request-Method": metodo,
+                "Access-Control-Request-Headers": ", ".join(sorted(nome.lower() for nome in headers))})
+            self.contar(preflight, "api")
+            self.preflights += 1
+        extras = {"Origin": origem} if cross_origin else {}
+        guardado = self.cache.get(url) if metodo == "GET" else None
+        if guardado is not None and guardado[0]:
+            extras["If-None-Match"] = guardado[0]
+        resposta = await http.request(metodo, url, headers={**headers, **extras, "Accept-Encoding": ACCEPT_ENCODING},
+                                      **kwargs)
+        self.contar(resposta, "api")
+        if metodo == "GET" and resposta.status_code == 200:
+            self.cache[url] = (resposta.headers.get("etag"), self.relogio, resposta.text)
+        return resposta
+
+
+async def visitar(navegador: Navegador, http, base_paginas: str, base_api: str, credenciais: dict, cliente_id: int):
+    json_headers = {"Content-Type": "application/json"}
+    await navegador.abrir_pagina(http, f"{base_paginas}/login.html")
+    resposta = await navegador.fetch(http, "POST", f"{base_api}/auth/login", base_paginas, json_headers, json=credenciais)
+    headers = {**json_headers, "Authorization": f"Bearer {resposta.json()['access_token']}"}
+    await navegador.abrir_pagina(http, f"{base_paginas}/index.html")
+    await navegador.fetch(http, "GET", f"{base_api}/clientes/aniversariantes-proximos-30-dias/", base_paginas, headers)
+    await navegador.abrir_pagina(http, f"{base_paginas}/detalhe.html?id={cliente_id}")
+    await navegador.fetch(http, "GET", f"{base_api}/clientes/{cliente_id}/detalhes/", base_paginas, headers)
+
+
+def main():
+    preparar_ambiente()
+    os.environ["FRONTEND"] = "1"
+    api = importlib.import_module("main")
+    from starlette.applications import Starlette
+    from starlette.routing import Mount
+    from starlette.staticfiles import StaticFiles
+    from config import FRONTEND_DIR
+
+    conn = api.abrir_conexao()
+    mapa = popular_banco(conn, clientes_por_usuario=50, sessoes_por_cliente=30)
+    usuario_id, clientes = next(iter(mapa.items()))
+    senha_hash = asyncio.run(api.hash_senha_async("senha_bench"))
+    username = conn.execute("UPDATE usuarios SET senha_hash = ? WHERE id = ? RETURNING username",
+                            (senha_hash, usuario_id)).fetchone()[0]
+    conn.commit()
+    conn.close()
+    credenciais = {"username": username, "senha": "senha_bench"}
+
+    estatico = Starlette(routes=[Mount("/", app=StaticFiles(directory=FRONTEND_DIR))])
+
+    async def rodar():
+        # UM SÓ CICLO DE VIDA: O SHUTDOWN FECHA O POOL DO BCRYPT
+        async with api.app.router.lifespan_context(api.app):
+            for modo in ("antes", "depois"):
+                if modo == "antes":
+                    app = _por_origem({ORIGEM_FRONTEND: estatico, "http://127.0.0.1:8000": api.app})
+                    base_paginas = ORIGEM_FRONTEND
+                else:
+                    app, base_paginas = api.app, "http://127.0.0.1:8000/app"
+                navegador = Navegador()
+                async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app)) as http:
+                    for visita in ("primeira", "seguinte"):
+                        navegador.relogio += 0 if visita == "primeira" else 24 * 3600
+                        antes = (navegador.requisicoes, dict(navegador.bytes), navegador.preflights)
+                        await visitar(navegador, http, base_paginas, "http://127.0.0.1:8000", credenciais, clientes[0])
+                        print({"modo": modo, "visita": visita,
+                               "requisicoes": navegador.requisicoes - antes[0],
+                               "preflights": navegador.preflights - antes[2],
+                               "bytes_arquivos": navegador.bytes["arquivos"] - antes[1]["arquivos"],
+                               "bytes_api": navegador.bytes["api"] - antes[1]["api"]})
+
+    asyncio.run(rodar())
+
+
+def _por_origem(apps: dict):
+    """UM ASGI QUE ENCAMINHA PELO HOST:PORTA, PARA SIMULAR DUAS ORIGENS NO MESMO TRANSPORTE"""
+    async def aplicacao(scope, receive, send):
+        if scope["type"] != "http":
+            return await apps["http://127.0.0.1:8000"](scope, receive, send)
+        host = dict(scope["headers"]).get(b"host", b"").decode()
+        return await apps[f"http://{host}"](scope, receive, send)
+    return aplicacao
+
+
+if __name__ == "__main__":
+    main()
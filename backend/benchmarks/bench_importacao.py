@@ -0,0 +1,85 @@
+"""
+BENCHMARK: IMPORTAÇÃO EM MASSA vs UM POST POR LINHA
+
+Gera um CSV de clientes e um NDJSON de atendimentos, envia para
+/importacao/clientes e /importacao/atendimentos e compara a vazão com uma
+amostra de POST /clientes/ individuais.
+
+    cd backend
+    python -m benchmarks.bench_importacao --linhas 100000
+"""
+import argparse
+import importlib
+import io
+import json
+import random
+import time
+
+from fastapi.testclient import TestClient
+
+from benchmarks.comum import preparar_ambiente, texto_aleatorio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=100000, help="clientes e atendimentos a importar")
+    parser.add_argument("--amostra-post", type=int, default=300, help="POSTs individuais para comparação")
+    args = parser.parse_args()
+
+    preparar_ambiente()
+    api = importlib.import_module("main")
+    conn = api.abrir_conexao()
+    usuario_id = conn.execute(
+        """INSERT INTO usuarios (username, nome, senha_hash, pergunta_seguranca, resposta_seguranca_hash)
+        VALUES ('bench_import', 'Bench', 'x', 'p', 'x')"""
+    ).lastrowid
+    conn.commit()
+    headers = {"Authorization": f"Bearer {api.criar_token_jwt(usuario_id, 'bench_import')}"}
+    cliente = TestClient(api.app)
+    rng = random.Random(7)
+
+    # CLIENTES VIA CSV
+    csv_texto = io.StringIO()
+    csv_texto.write("nome_completo,email,telefone,data_nascimento,endereco\n")
+    for i in range(args.linhas):
+        csv_texto.write(f"Cliente {i},cliente{i}@import.local,11999999999,19{rng.randint(50, 99)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)},Rua {i}\n")
+    inicio = time.perf_counter()
+    resposta = cliente.post("/importacao/clientes", headers=headers,
+                            files={"arquivo": ("clientes.csv", csv_texto.getvalue().encode(), "text/csv")})
+    duracao_clientes = time.perf_counter() - inicio
+    relatorio = resposta.json()
+    print({"cenario": "importacao_clientes_csv", "linhas": args.linhas, "importados": relatorio["importados"],
+           "segundos": round(duracao_clientes, 2), "linhas_por_segundo": round(args.linhas / duracao_clientes)})
+
+    # ATENDIMENTOS VIA NDJSON
+    codigos = [linha[0] for linha in conn.execute("SELECT codigo_cliente FROM clientes WHERE usuario_id = ?", (usuario_id,))]
+    ndjson = io.StringIO()
+    for i in range(args.linhas):
+        ndjson.write(json.dumps({
+            "codigo_cliente": rng.choice(codigos),
+            "data_atendimento": f"20{rng.randint(10, 25)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+            "conteudo": texto_aleatorio(rng, 100, 1500),
+            "duracao_minutos": 50,
+        }) + "\n")
+    inicio = time.perf_counter()
+    resposta = cliente.post("/importacao/atendimentos", headers=headers,
+                            files={"arquivo": ("atendimentos.ndjson", ndjson.getvalue().encode(), "application/x-ndjson")})
+    duracao_atendimentos = time.perf_counter() - inicio
+    print({"cenario": "importacao_atendimentos_ndjson", "linhas": args.linhas, "importados": resposta.json()["importados"],
+           "segundos": round(duracao_atendimentos, 2), "linhas_por_segundo": round(args.linhas / duracao_atendimentos)})
+
+    # REFERÊNCIA: UM POST POR CLIENTE
+    inicio = time.perf_counter()
+    for i in range(args.amostra_post):
+        cliente.post("/clientes/", headers=headers, json={
+            "nome_completo": f"Avulso {i}", "email": f"avulso{i}@import.local",
+            "telefone": "11999999999", "data_nascimento": "1990-01-01",
+        })
+    duracao_post = time.perf_counter() - inicio
+    por_segundo = args.amostra_post / duracao_post
+    print({"cenario": "post_individual", "linhas": args.amostra_post, "linhas_por_segundo": round(por_segundo),
+           "estimativa_segundos_para_import": round(args.linhas / por_segundo, 1)})
+
+
+if __name__ == "__main__":
+    main()
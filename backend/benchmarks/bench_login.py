@@ -0,0 +1,89 @@
+"""
+BENCHMARK: LOGIN SOB CARGA CONCORRENTE COM TRÁFEGO DE CRUD EM PARALELO
+
+Sobe a API com uvicorn e dispara logins e GET /clientes/ ao mesmo tempo.
+Mede vazão e p99 dos logins e quanto a latência do CRUD é afetada.
+
+    cd backend
+    python -m benchmarks.bench_login --logins 32 --crud 8 --segundos 10
+"""
+import argparse
+import importlib
+import threading
+import time
+
+import httpx
+
+from benchmarks.comum import preparar_ambiente, popular_banco, percentis, servidor_uvicorn
+
+
+def carga(url, caminho, metodo, corpo, headers, fim, resultados, chave):
+    latencias, recusas = [], 0
+    with httpx.Client(base_url=url, timeout=60) as cliente:
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            resposta = cliente.request(metodo, caminho, json=corpo, headers=headers)
+            if resposta.status_code == 503:
+                recusas += 1
+                continue
+            resposta.raise_for_status()
+            latencias.append(time.perf_counter() - inicio)
+    with resultados["lock"]:
+        resultados[chave]["latencias"].extend(latencias)
+        resultados[chave]["recusas_503"] += recusas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=32, help="clientes HTTP fazendo login")
+    parser.add_argument("--crud", type=int, default=8, help="clientes HTTP listando clientes")
+    parser.add_argument("--segundos", type=float, default=10)
+    args = parser.parse_args()
+
+    pasta = preparar_ambiente()
+    api = importlib.import_module("main")
+    from config import BCRYPT_ROUNDS
+    from senhas import hash_senha
+
+    conn = api.abrir_conexao()
+    senha_hash = hash_senha("senha_bench")
+    usuario_id = next(iter(popular_banco(conn, clientes_por_usuario=100, sessoes_por_cliente=1, senha_hash=senha_hash)))
+    username = conn.execute("SELECT username FROM usuarios WHERE id = ?", (usuario_id,)).fetchone()[0]
+    conn.close()
+    token = api.criar_token_jwt(usuario_id, username)
+
+    resultados = {"lock": threading.Lock(),
+                  "login": {"latencias": [], "recusas_503": 0},
+                  "crud": {"latencias": [], "recusas_503": 0}}
+
+    with servidor_uvicorn(pasta) as url:
+        fim = time.perf_counter() + args.segundos
+        threads = [
+            threading.Thread(target=carga, args=(url, "/auth/login", "POST",
+                                                 {"username": username, "senha": "senha_bench"},
+                                                 None, fim, resultados, "login"))
+            for _ in range(args.logins)
+        ] + [
+            threading.Thread(target=carga, args=(url, "/clientes/", "GET", None,
+                                                 {"Authorization": f"Bearer {token}"},
+                                                 fim, resultados, "crud"))
+            for _ in range(args.crud)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    print(f"bcrypt rounds={BCRYPT_ROUNDS}")
+    for chave in ("login", "crud"):
+        dados = resultados[chave]
+        print({
+            "cenario": chave,
+            "requisicoes_por_segundo": round(len(dados["latencias"]) / args.segundos, 1),
+            "recusas_503": dados["recusas_503"],
+            **percentis(dados["latencias"]),
+        })
+
+
+if __name__ == "__main__":
+    main()
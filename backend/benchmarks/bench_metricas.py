@@ -0,0 +1,78 @@
+"""
+BENCHMARK: CUSTO DA INSTRUMENTAÇÃO (MIDDLEWARE DE MÉTRICAS + RASTREIO DE SQL)
+
+  sql:  o mesmo SELECT curto N vezes numa conexão comum e numa rastreada
+  api:  GET /clientes/{id}/atendimentos/ em processo com METRICAS=0 e METRICAS=1
+
+    cd backend
+    python -m benchmarks.bench_metricas --consultas 20000 --requisicoes 2000
+"""
+import argparse
+import importlib
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+from benchmarks.comum import BACKEND_DIR, preparar_ambiente, popular_banco, percentis
+
+CODIGO_API = """
+import json, sys, time
+sys.path.insert(0, {backend!r})
+from fastapi.testclient import TestClient
+import main
+from benchmarks.comum import popular_banco, percentis
+conn = main.abrir_conexao()
+mapa = popular_banco(conn, clientes_por_usuario=10, sessoes_por_cliente=20)
+usuario_id, clientes = next(iter(mapa.items()))
+headers = {{"Authorization": f"Bearer {{main.criar_token_jwt(usuario_id, 'bench')}}"}}
+cliente = TestClient(main.app)
+latencias = []
+for i in range({requisicoes}):
+    inicio = time.perf_counter()
+    cliente.get(f"/clientes/{{clientes[i % len(clientes)]}}/atendimentos/?limit=20&data_fim=2100-01-0{{1 + i % 9}}", headers=headers)
+    latencias.append(time.perf_counter() - inicio)
+print(json.dumps({{"requisicoes_por_segundo": round(len(latencias) / sum(latencias)), **percentis(latencias)}}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--consultas", type=int, default=20000)
+    parser.add_argument("--requisicoes", type=int, default=2000)
+    args = parser.parse_args()
+
+    pasta = preparar_ambiente()
+    importlib.import_module("main")
+    from database import ConexaoRastreada, ConexaoSQLite, abrir_conexao
+
+    conn = abrir_conexao()
+    mapa = popular_banco(conn, clientes_por_usuario=100, sessoes_por_cliente=0)
+    usuario_id, clientes = next(iter(mapa.items()))
+    conn.close()
+
+    for nome, fabrica in (("comum", ConexaoSQLite), ("rastreada", ConexaoRastreada)):
+        conn = sqlite3.connect("atendimentos.db", factory=fabrica, check_same_thread=False)
+        inicio = time.perf_counter()
+        for i in range(args.consultas):
+            conn.execute("SELECT id FROM clientes WHERE id = ? AND usuario_id = ?",
+                         (clientes[i % len(clientes)], usuario_id)).fetchone()
+        duracao = time.perf_counter() - inicio
+        conn.close()
+        print({"sql": nome, "consultas": args.consultas, "us_por_consulta": round(duracao / args.consultas * 1e6, 2)})
+
+    # CADA MODO NUM PROCESSO NOVO (A CONFIGURAÇÃO É LIDA NA IMPORTAÇÃO)
+    for valor in ("0", "1"):
+        os.makedirs(os.path.join(pasta, f"api_{valor}"), exist_ok=True)
+        saida = subprocess.run(
+            [sys.executable, "-c", CODIGO_API.format(backend=BACKEND_DIR, requisicoes=args.requisicoes)],
+            cwd=os.path.join(pasta, f"api_{valor}"), env={**os.environ, "METRICAS": valor},
+            capture_output=True, text=True, check=True
+        ).stdout
+        print({"api_metricas": valor == "1", **json.loads(saida.strip().splitlines()[-1])})
+
+
+if __name__ == "__main__":
+    main()
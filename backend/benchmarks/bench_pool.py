@@ -0,0 +1,123 @@
+"""
+BENCHMARK: CONEXÃO POR REQUISIÇÃO vs POOL WAL + FAIXA ÚNICA DE ESCRITA
+
+Simula o trabalho das rotas (checagem de dono do cliente + listagem de
+atendimentos, e ~10% de inserções) com várias threads, como o threadpool
+do FastAPI faz.
+
+    cd backend
+    python -m benchmarks.bench_pool --threads 16 --segundos 5
+"""
+import argparse
+import importlib
+import random
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+
+from benchmarks.comum import preparar_ambiente, popular_banco, percentis
+
+LEITURA_DONO = "SELECT id FROM clientes WHERE id = ? AND usuario_id = ?"
+LEITURA_LISTA = "SELECT * FROM atendimentos WHERE cliente_id = ? AND usuario_id = ? ORDER BY data_atendimento DESC"
+ESCRITA = """INSERT INTO atendimentos
+    (usuario_id, cliente_id, data_atendimento, conteudo, duracao_minutos, data_registro)
+    VALUES (?, ?, ?, ?, ?, ?)"""
+
+
+def requisicao(conn_leitura, conn_escrita, usuario_id, cliente_id, escrever):
+    if escrever:
+        conn_escrita.execute(LEITURA_DONO, (cliente_id, usuario_id)).fetchone()
+        conn_escrita.execute(ESCRITA, (usuario_id, cliente_id, date.today().isoformat(),
+                                       "Sessão de benchmark", 50, datetime.now().isoformat()))
+        conn_escrita.commit()
+    else:
+        conn_leitura.execute(LEITURA_DONO, (cliente_id, usuario_id)).fetchone()
+        conn_leitura.execute(LEITURA_LISTA, (cliente_id, usuario_id)).fetchall()
+
+
+def executar(modo, db_name, mapa, threads, segundos, fracao_escrita):
+    from database import PoolConexoes
+
+    pool_leitura = PoolConexoes(threads, db_name)
+    pool_escrita = PoolConexoes(1, db_name)
+    pares = [(u, c) for u, clientes in mapa.items() for c in clientes]
+    latencias, erros_lock = [], [0]
+    lock_stats = threading.Lock()
+    fim = time.perf_counter() + segundos
+
+    def trabalhador(seed):
+        rng = random.Random(seed)
+        locais = []
+        while time.perf_counter() < fim:
+            usuario_id, cliente_id = rng.choice(pares)
+            escrever = rng.random() < fracao_escrita
+            inicio = time.perf_counter()
+            try:
+                if modo == "antes":
+                    conn = sqlite3.connect(db_name)
+                    conn.row_factory = sqlite3.Row
+                    try:
+                        requisicao(conn, conn, usuario_id, cliente_id, escrever)
+                    finally:
+                        conn.close()
+                elif escrever:
+                    with pool_escrita.conexao() as conn:
+                        requisicao(None, conn, usuario_id, cliente_id, True)
+                else:
+                    with pool_leitura.conexao() as conn:
+                        requisicao(conn, None, usuario_id, cliente_id, False)
+            except sqlite3.OperationalError:
+                with lock_stats:
+                    erros_lock[0] += 1
+                continue
+            locais.append(time.perf_counter() - inicio)
+        with lock_stats:
+            latencias.extend(locais)
+
+    workers = [threading.Thread(target=trabalhador, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    pool_leitura.fechar()
+    pool_escrita.fechar()
+
+    return {
+        "modo": modo,
+        "requisicoes_por_segundo": round(len(latencias) / segundos, 1),
+        "erros_database_locked": erros_lock[0],
+        **percentis(latencias),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--segundos", type=float, default=5)
+    parser.add_argument("--clientes", type=int, default=200)
+    parser.add_argument("--sessoes", type=int, default=20)
+    parser.add_argument("--escrita", type=float, default=0.1, help="fração de requisições de escrita")
+    args = parser.parse_args()
+
+    preparar_ambiente()
+    importlib.import_module("main")  # cria o schema no diretório temporário
+    from config import DB_NAME
+    from database import abrir_conexao
+
+    conn = abrir_conexao()
+    mapa = popular_banco(conn, clientes_por_usuario=args.clientes, sessoes_por_cliente=args.sessoes)
+    conn.execute("VACUUM INTO 'antes.db'")
+    conn.close()
+
+    # O BANCO "ANTES" USA O JOURNAL PADRÃO (SEM WAL), COMO NA VERSÃO ANTIGA
+    antigo = sqlite3.connect("antes.db")
+    antigo.execute("PRAGMA journal_mode = DELETE")
+    antigo.close()
+
+    for modo, db_name in (("antes", "antes.db"), ("depois", DB_NAME)):
+        print(executar(modo, db_name, mapa, args.threads, args.segundos, args.escrita))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+BENCHMARK: DASHBOARD PELAS TABELAS DE RESUMO vs AGREGAÇÃO DO HISTÓRICO
+
+Para históricos de tamanhos crescentes, mede:
+  historico: os mesmos números calculados direto de clientes/atendimentos
+             (COUNT/SUM/MAX do usuário, série de 12 meses, últimos atendidos)
+  resumo:    consultar_resumo (lê só as tabelas mantidas pelos triggers)
+e o custo dos triggers nas escritas (executemany com e sem os triggers de resumo).
+
+    cd backend
+    python -m benchmarks.bench_resumo --sessoes 1000 10000 100000
+"""
+import argparse
+import importlib
+import random
+import time
+from datetime import date, timedelta
+
+from benchmarks.comum import preparar_ambiente, popular_banco
+
+SQL_HISTORICO = (
+    ("SELECT COUNT(*), SUM(status = 'ativo') FROM clientes WHERE usuario_id = ?", 1),
+    ("SELECT COUNT(*), SUM(duracao_minutos), MAX(data_atendimento) FROM atendimentos WHERE usuario_id = ?", 1),
+    ("""SELECT substr(data_atendimento, 1, 7), COUNT(*), SUM(duracao_minutos) FROM atendimentos
+        WHERE usuario_id = ? AND data_atendimento >= ? GROUP BY 1""", 2),
+    ("""SELECT a.cliente_id, c.nome_completo, MAX(a.data_atendimento) AS ultima, COUNT(*) FROM atendimentos a
+        JOIN clientes c ON c.id = a.cliente_id WHERE a.usuario_id = ? GROUP BY a.cliente_id ORDER BY ultima DESC LIMIT 5""", 1),
+)
+INSERIR = """INSERT INTO atendimentos (usuario_id, cliente_id, data_atendimento, conteudo, duracao_minutos, data_registro)
+    VALUES (?, ?, ?, 'Sessão de benchmark', 50, '2026-01-01')"""
+
+
+def cronometrar(funcao, repeticoes: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessoes", type=int, nargs="+", default=[1000, 10000, 100000], help="atendimentos do usuário")
+    parser.add_argument("--clientes", type=int, default=200)
+    parser.add_argument("--repeticoes", type=int, default=50)
+    parser.add_argument("--escritas", type=int, default=5000)
+    args = parser.parse_args()
+
+    preparar_ambiente()
+    api = importlib.import_module("main")
+    from resumos import consultar_resumo, criar_resumos
+
+    conn = api.abrir_conexao()
+    mapa = popular_banco(conn, clientes_por_usuario=args.clientes, sessoes_por_cliente=0)
+    usuario_id, cliente_ids = next(iter(mapa.items()))
+    hoje = date.today()
+    inicio_serie = (hoje.replace(day=1) - timedelta(days=335)).replace(day=1).isoformat()
+    rng = random.Random(5)
+    existentes = 0
+
+    for alvo in sorted(args.sessoes):
+        # COMPLETA O HISTÓRICO ATÉ `alvo` SESSÕES (ATÉ ~10 ANOS PARA TRÁS)
+        conn.executemany(INSERIR, [(usuario_id, rng.choice(cliente_ids), (hoje - timedelta(days=rng.randrange(3650))).isoformat())
+                                   for _ in range(alvo - existentes)])
+        conn.commit()
+        existentes = alvo
+
+        def historico():
+            for sql, quantidade in SQL_HISTORICO:
+                conn.execute(sql, (usuario_id, inicio_serie)[:quantidade]).fetchall()
+
+        ms_historico = cronometrar(historico, args.repeticoes)
+        ms_resumo = cronometrar(lambda: consultar_resumo(conn, usuario_id, hoje), args.repeticoes)
+        print({"sessoes": alvo, "historico_ms": round(ms_historico, 3), "resumo_ms": round(ms_resumo, 3),
+               "aceleracao": f"{ms_historico / ms_resumo:.0f}x"})
+
+    # CUSTO DOS TRIGGERS: O MESMO LOTE COM E SEM OS TRIGGERS DE RESUMO
+    def lote():
+        return [(usuario_id, rng.choice(cliente_ids), (hoje - timedelta(days=rng.randrange(3650))).isoformat())
+                for _ in range(args.escritas)]
+
+    tempos = {}
+    for rotulo in ("com_triggers", "sem_triggers", "com_triggers_2"):
+        if rotulo == "sem_triggers":
+            for evento in ("insert", "update", "delete"):
+                conn.execute(f"DROP TRIGGER trg_atendimentos_resumo_{evento}")
+        elif rotulo == "com_triggers_2":
+            criar_resumos(conn)
+        linhas = lote()
+        inicio = time.perf_counter()
+        conn.executemany(INSERIR, linhas)
+        conn.commit()
+        tempos[rotulo] = (time.perf_counter() - inicio) / args.escritas * 1e6
+    com = min(tempos["com_triggers"], tempos["com_triggers_2"])
+    print({"escritas": args.escritas, "us_por_insert_sem_triggers": round(tempos["sem_triggers"], 1),
+           "us_por_insert_com_triggers": round(com, 1),
+           "sobrecusto": f"{(com / tempos['sem_triggers'] - 1) * 100:.0f}%"})
+
+
+if __name__ == "__main__":
+    main()
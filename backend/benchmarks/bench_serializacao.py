@@ -0,0 +1,87 @@
+"""
+BENCHMARK: SERIALIZAÇÃO DAS LISTAGENS — PYDANTIC POR LINHA vs CAMINHO RÁPIDO
+
+Compara, para a mesma lista de atendimentos e de clientes:
+  antes:  formatar_* por linha + validação/serialização do response_model
+          pelo FastAPI + JSONResponse (o caminho antigo das rotas)
+  depois: linhas do SQLite -> dicts -> bytes JSON (orjson)
+e confere que os dois produzem o mesmo JSON.
+
+    cd backend
+    python -m benchmarks.bench_serializacao --linhas 5000
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import time
+from datetime import date, datetime, timedelta
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from benchmarks.comum import preparar_ambiente, popular_banco
+
+
+def cronometrar(funcao, repeticoes: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        resultado = funcao()
+    return (time.perf_counter() - inicio) / repeticoes * 1000, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=5000)
+    parser.add_argument("--repeticoes", type=int, default=10)
+    args = parser.parse_args()
+
+    preparar_ambiente()
+    api = importlib.import_module("main")
+    from serializacao import RespostaJSON, linhas_para_dicts, orjson
+
+    conn = api.abrir_conexao()
+    mapa = popular_banco(conn, clientes_por_usuario=args.linhas, sessoes_por_cliente=0)
+    usuario_id, cliente_ids = next(iter(mapa.items()))
+    conn.executemany(
+        """INSERT INTO atendimentos (usuario_id, cliente_id, data_atendimento, conteudo, duracao_minutos, data_registro)
+        VALUES (?, ?, ?, ?, 50, ?)""",
+        [(usuario_id, cliente_ids[0], (date.today() - timedelta(days=i)).isoformat(),
+          f"Anotação da sessão {i} " * 20, datetime.now().isoformat()) for i in range(args.linhas)]
+    )
+    conn.commit()
+
+    cenarios = (
+        ("atendimentos", api.AtendimentoResponse, api.formatar_atendimento, api.CAMPOS_ATENDIMENTO,
+         "SELECT {} FROM atendimentos WHERE usuario_id = ? AND cliente_id = ? ORDER BY data_atendimento DESC, id DESC",
+         (usuario_id, cliente_ids[0])),
+        ("clientes", api.ClienteResponse, api.formatar_cliente, api.CAMPOS_CLIENTE,
+         "SELECT {} FROM clientes WHERE usuario_id = ? ORDER BY nome_completo, id", (usuario_id,)),
+    )
+    for nome, modelo, formatar, campos, sql, parametros in cenarios:
+        campo_resposta = create_response_field(name="resposta", type_=List[modelo])
+
+        def antes():
+            linhas = conn.execute(sql.format("*"), parametros).fetchall()
+            itens = [formatar(linha) for linha in linhas]
+            conteudo = asyncio.run(serialize_response(field=campo_resposta, response_content=itens, is_coroutine=True))
+            return JSONResponse(content=conteudo).body
+
+        def depois():
+            linhas = conn.execute(sql.format(", ".join(campos)), parametros).fetchall()
+            return RespostaJSON(content=linhas_para_dicts(linhas, campos)).body
+
+        ms_antes, corpo_antes = cronometrar(antes, args.repeticoes)
+        ms_depois, corpo_depois = cronometrar(depois, args.repeticoes)
+        print({
+            "lista": nome, "itens": args.linhas, "orjson": orjson is not None,
+            "antes_ms": round(ms_antes, 1), "depois_ms": round(ms_depois, 1),
+            "aceleracao": round(ms_antes / ms_depois, 1),
+            "json_identico": json.loads(corpo_antes) == json.loads(corpo_depois),
+        })
+
+
+if __name__ == "__main__":
+    main()
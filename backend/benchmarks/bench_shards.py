@@ -0,0 +1,100 @@
+"""
+BENCHMARK: BANCO ÚNICO vs UM BANCO POR PROFISSIONAL (DB_SHARDS=1)
+
+Um profissional importa atendimentos em massa sem parar enquanto outro
+registra atendimentos um a um. No banco único os dois disputam a mesma faixa
+de escrita; com shards cada um tem a sua. Mede a latência das escritas do
+segundo profissional e a vazão da importação do primeiro.
+
+    cd backend
+    python -m benchmarks.bench_shards --segundos 10 --lote 20000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+import httpx
+
+from benchmarks.comum import preparar_ambiente, percentis, servidor_uvicorn, texto_aleatorio
+
+
+def cadastrar(http, username):
+    resposta = http.post("/auth/cadastro", json={"username": username, "nome": username, "senha": "senha_bench",
+                                                  "pergunta_seguranca": "pet?", "resposta_seguranca": "rex"})
+    resposta.raise_for_status()
+    headers = {"Authorization": f"Bearer {resposta.json()['access_token']}"}
+    cliente = http.post("/clientes/", headers=headers, json={"nome_completo": f"Cliente de {username}",
+                                                           "email": f"{username}@bench.local", "telefone": "11999999999",
+                                                           "data_nascimento": "1990-01-01"})
+    cliente.raise_for_status()
+    return headers, cliente.json()["id"]
+
+
+def importar_sem_parar(url, headers, arquivo, fim, resultado):
+    with httpx.Client(base_url=url, timeout=300) as http:
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            resposta = http.post("/importacao/atendimentos", headers=headers,
+                                 files={"arquivo": ("lote.ndjson", arquivo, "application/x-ndjson")})
+            resposta.raise_for_status()
+            resultado["linhas"] += resposta.json()["importados"]
+            resultado["segundos"] += time.perf_counter() - inicio
+
+
+def escrever_um_a_um(url, headers, cliente_id, fim, latencias):
+    with httpx.Client(base_url=url, timeout=60) as http:
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            http.post(f"/clientes/{cliente_id}/atendimentos/", headers=headers, json={
+                "data_atendimento": "2026-01-01", "conteudo": "Sessão registrada durante a importação",
+                "duracao_minutos": 50}).raise_for_status()
+            latencias.append(time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--lote", type=int, default=20000, help="atendimentos por arquivo importado")
+    args = parser.parse_args()
+
+    preparar_ambiente()
+    rng = random.Random(3)
+    for shards in ("0", "1"):
+        pasta = tempfile.mkdtemp()
+        with servidor_uvicorn(pasta, ambiente={"DB_SHARDS": shards}) as url:
+            with httpx.Client(base_url=url, timeout=60) as http:
+                headers_importacao, cliente_importacao = cadastrar(http, "importador")
+                headers_escrita, cliente_escrita = cadastrar(http, "escritor")
+            arquivo = "".join(json.dumps({
+                "cliente_id": cliente_importacao, "data_atendimento": "2025-06-01",
+                "conteudo": texto_aleatorio(rng, 200, 1500), "duracao_minutos": 50,
+            }) + "\n" for _ in range(args.lote)).encode()
+
+            # REFERÊNCIA SEM IMPORTAÇÃO
+            latencias_sozinho = []
+            escrever_um_a_um(url, headers_escrita, cliente_escrita, time.perf_counter() + args.segundos / 2, latencias_sozinho)
+
+            fim = time.perf_counter() + args.segundos
+            importacao, latencias = {"linhas": 0, "segundos": 0.0}, []
+            threads = [
+                threading.Thread(target=importar_sem_parar, args=(url, headers_importacao, arquivo, fim, importacao)),
+                threading.Thread(target=escrever_um_a_um, args=(url, headers_escrita, cliente_escrita, fim, latencias)),
+            ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        print({"shards": shards == "1", "escritas_sem_importacao": percentis(latencias_sozinho)})
+        print({"shards": shards == "1", "escritas_durante_importacao": percentis(latencias),
+               "escritas_por_segundo": round(len(latencias) / args.segundos, 1),
+               "importacao_linhas_por_segundo": round(importacao["linhas"] / max(importacao["segundos"], 1e-9))})
+        print({"arquivos_shards": sorted(os.listdir(os.path.join(pasta, "shards"))) if shards == "1" else None})
+
+
+if __name__ == "__main__":
+    main()
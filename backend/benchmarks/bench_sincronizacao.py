@@ -0,0 +1,94 @@
+"""
+BENCHMARK: BACKUP INCREMENTAL — BYTES ENVIADOS E IMPACTO NAS ESCRITAS
+
+Popula um banco, faz a primeira cópia completa e depois simula um dia de
+trabalho (novos atendimentos) antes de cada nova cópia. Para cada tamanho de
+bloco mostra quanto foi enviado em relação ao banco inteiro. Em paralelo a
+uma cópia, mede a latência de escritas para conferir que elas não esperam.
+
+    cd backend
+    python -m benchmarks.bench_sincronizacao --clientes 2000 --sessoes 10 --novas 50
+"""
+import argparse
+import importlib
+import random
+import threading
+import time
+from datetime import date, datetime
+
+from benchmarks.comum import preparar_ambiente, popular_banco, percentis, texto_aleatorio
+
+ESCRITA = """INSERT INTO atendimentos (usuario_id, cliente_id, data_atendimento, conteudo, duracao_minutos, data_registro)
+    VALUES (?, ?, ?, ?, 50, ?)"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clientes", type=int, default=2000)
+    parser.add_argument("--sessoes", type=int, default=10)
+    parser.add_argument("--novas", type=int, default=50, help="atendimentos novos entre uma cópia e outra")
+    parser.add_argument("--dias", type=int, default=3, help="cópias incrementais por tamanho de bloco")
+    args = parser.parse_args()
+
+    preparar_ambiente()
+    api = importlib.import_module("main")
+    from sincronizacao import ArmazenamentoLocal, Sincronizador
+
+    conn = api.abrir_conexao()
+    mapa = popular_banco(conn, clientes_por_usuario=args.clientes, sessoes_por_cliente=args.sessoes)
+    usuario_id, cliente_ids = next(iter(mapa.items()))
+    rng = random.Random(11)
+
+    def dia_de_trabalho():
+        for _ in range(args.novas):
+            conn.execute(ESCRITA, (usuario_id, rng.choice(cliente_ids), date.today().isoformat(),
+                                   texto_aleatorio(rng, 200, 3000), datetime.now().isoformat()))
+            conn.commit()
+
+    for bloco_kb in (64, 256, 1024):
+        sincronizador = Sincronizador(ArmazenamentoLocal(f"destino_{bloco_kb}"), lambda: [api.DB_NAME],
+                                      bloco_bytes=bloco_kb * 1024)
+        completa = sincronizador.sincronizar()
+        incrementais = []
+        for _ in range(args.dias):
+            dia_de_trabalho()
+            incrementais.append(sincronizador.sincronizar())
+        enviado = sum(m['bytes_enviados_ultima'] for m in incrementais) / len(incrementais)
+        print({
+            "bloco_kb": bloco_kb, "banco_mb": round(completa['bytes_bancos_ultima'] / 2**20, 1),
+            "completa_mb_enviados": round(completa['bytes_enviados_ultima'] / 2**20, 1),
+            "completa_segundos": completa['duracao_ultima_segundos'],
+            "incremental_kb_enviados": round(enviado / 1024),
+            "incremental_fracao_do_banco": f"{enviado / incrementais[-1]['bytes_bancos_ultima'] * 100:.1f}%",
+            "incremental_segundos": round(sum(m['duracao_ultima_segundos'] for m in incrementais) / len(incrementais), 3),
+        })
+
+    # ESCRITAS DURANTE A CÓPIA (OUTRA CONEXÃO, COMO A FAIXA DE ESCRITA DA API)
+    escritor = api.abrir_conexao()
+    latencias, fim = [], threading.Event()
+
+    def escrever():
+        while not fim.is_set():
+            inicio = time.perf_counter()
+            escritor.execute(ESCRITA, (usuario_id, rng.choice(cliente_ids), date.today().isoformat(),
+                                       "Sessão durante o backup", datetime.now().isoformat()))
+            escritor.commit()
+            latencias.append(time.perf_counter() - inicio)
+            time.sleep(0.002)
+
+    for rotulo, copiar in (("sem_copia", False), ("durante_copia", True)):
+        latencias.clear()
+        fim.clear()
+        thread = threading.Thread(target=escrever)
+        thread.start()
+        if copiar:
+            Sincronizador(ArmazenamentoLocal(f"destino_{rotulo}"), lambda: [api.DB_NAME]).sincronizar()
+        else:
+            time.sleep(1)
+        fim.set()
+        thread.join()
+        print({"escritas": rotulo, "quantidade": len(latencias), **percentis(latencias)})
+
+
+if __name__ == "__main__":
+    main()
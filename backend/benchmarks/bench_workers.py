@@ -0,0 +1,103 @@
+"""
+BENCHMARK: VAZÃO DE LEITURA COM 1, 2, 4... WORKERS DO UVICORN
+
+Sobe a API real com WEB_CONCURRENCY=N (uvicorn --workers N) sobre o mesmo
+banco sintético e dispara leituras (GET /clientes/{id}/atendimentos/?limit=20
+de profissionais e clientes sorteados) a partir de --geradores processos, cada
+um com --concorrencia conexões próprias, durante --segundos. Mede leituras por
+segundo, p50/p95/p99 e a aceleração em relação a um worker.
+
+Workers e geradores disputam os mesmos núcleos: a escala só aparece com
+núcleos livres para os dois (o padrão de --workers vai até os.cpu_count()).
+Numa máquina com um núcleo, mais workers só acrescentam troca de contexto.
+
+    cd backend
+    python -m benchmarks.bench_workers --workers 1 2 4 --segundos 10
+"""
+import argparse
+import asyncio
+import importlib
+import os
+import random
+import time
+from multiprocessing import Pool
+
+from benchmarks.comum import preparar_ambiente, popular_banco, percentis, servidor_uvicorn
+
+
+def gerar_leituras(url: str, usuarios: list, concorrencia: int, segundos: float, seed: int) -> dict:
+    """UM PROCESSO GERADOR: concorrencia CONEXÕES LENDO ATÉ O FIM DO TEMPO"""
+    import httpx
+
+    async def rodar():
+        latencias, erros = [], 0
+        fim = time.perf_counter() + segundos
+
+        async def cliente_virtual(indice):
+            nonlocal erros
+            rng = random.Random(seed * 1000 + indice)
+            # UMA CONEXÃO POR CLIENTE VIRTUAL: O KERNEL ESPALHA AS CONEXÕES ENTRE OS WORKERS
+            async with httpx.AsyncClient(base_url=url, timeout=60,
+                                         limits=httpx.Limits(max_connections=1)) as http:
+                while time.perf_counter() < fim:
+                    headers, clientes = rng.choice(usuarios)
+                    inicio = time.perf_counter()
+                    resposta = await http.get(f"/clientes/{rng.choice(clientes)}/atendimentos/",
+                                              params={"limit": 20}, headers=headers)
+                    if resposta.status_code == 200:
+                        latencias.append(time.perf_counter() - inicio)
+                    else:
+                        erros += 1
+
+        await asyncio.gather(*(cliente_virtual(i) for i in range(concorrencia)))
+        return {"leituras": len(latencias), "erros": erros, "latencias": latencias}
+
+    return asyncio.run(rodar())
+
+
+def medir(url: str, usuarios: list, geradores: int, concorrencia: int, segundos: float) -> dict:
+    with Pool(geradores) as pool:
+        parciais = pool.starmap(gerar_leituras, [(url, usuarios, concorrencia, segundos, g) for g in range(geradores)])
+    latencias = [latencia for parcial in parciais for latencia in parcial["latencias"]]
+    return {"leituras_por_segundo": round(len(latencias) / segundos),
+            "erros": sum(parcial["erros"] for parcial in parciais), **percentis(latencias)}
+
+
+def main():
+    nucleos = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, *(n for n in (2, 4, 8, 16) if n <= nucleos)}))
+    parser.add_argument("--geradores", type=int, default=max(1, nucleos // 2), help="processos gerando carga")
+    parser.add_argument("--concorrencia", type=int, default=16, help="conexões por gerador")
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--usuarios", type=int, default=8)
+    parser.add_argument("--clientes", type=int, default=200)
+    parser.add_argument("--sessoes", type=int, default=20)
+    args = parser.parse_args()
+
+    pasta = preparar_ambiente()
+    api = importlib.import_module("main")
+    conn = api.abrir_conexao()
+    mapa = popular_banco(conn, usuarios=args.usuarios, clientes_por_usuario=args.clientes,
+                         sessoes_por_cliente=args.sessoes)
+    conn.close()
+    usuarios = [({"Authorization": f"Bearer {api.criar_token_jwt(usuario_id, 'bench')}"}, clientes)
+                for usuario_id, clientes in mapa.items()]
+    print({"nucleos": nucleos, "geradores": args.geradores, "conexoes": args.geradores * args.concorrencia})
+
+    base = None
+    for workers in args.workers:
+        ambiente = {"WEB_CONCURRENCY": str(workers), "METRICAS": "0", "CRIPTOGRAFIA": "0",
+                    "DB_SHARDS": "0", "SYNC": "0", "ARQUIVO_IDADE_DIAS": "0"}
+        with servidor_uvicorn(pasta, workers=workers, ambiente=ambiente) as url:
+            medir(url, usuarios, args.geradores, args.concorrencia, min(2, args.segundos))  # AQUECIMENTO
+            resultado = medir(url, usuarios, args.geradores, args.concorrencia, args.segundos)
+        base = base or resultado["leituras_por_segundo"]
+        aceleracao = resultado["leituras_por_segundo"] / base if base else 0
+        print({"workers": workers, **resultado, "aceleracao": round(aceleracao, 2),
+               "eficiencia": round(aceleracao / workers, 2)})
+
+
+if __name__ == "__main__":
+    main()
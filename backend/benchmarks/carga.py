@@ -0,0 +1,279 @@
+"""
+SUÍTE DE CARGA REPRODUZÍVEL DA API (RESULTADOS EM JSON PARA COMPARAR ENTRE COMMITS)
+
+Popula um banco sintético a partir de uma semente fixa (usuários x clientes x
+sessões, com anotações de tamanho realista) e roda os mesmos cenários contra
+a API real em dois alvos, cada um partindo de uma cópia idêntica do banco:
+  processo: o app FastAPI neste processo (httpx.ASGITransport, sem rede)
+  uvicorn:  o servidor real num subprocesso, por HTTP em 127.0.0.1
+
+Cenários (número fixo de operações, depois de um aquecimento descartado;
+cada medida é a mediana de --repeticoes rodadas):
+  login            rajada de POST /auth/login (bcrypt)
+  dashboard        abertura do painel: aniversariantes + primeira página de clientes
+  resumo           GET /dashboard/resumo (totais, 12 meses, últimos atendidos)
+  aniversariantes  GET /clientes/aniversariantes-proximos-30-dias/
+  sessoes          GET /clientes/{id}/atendimentos/?limit=20
+  escritas         POST /clientes/{id}/atendimentos/ concorrentes
+
+Roda offline numa máquina só; o gerador de carga divide a CPU com a API,
+então compare apenas resultados da mesma máquina.
+
+    cd backend
+    python -m benchmarks.carga                              # salva em benchmarks/resultados/
+    python -m benchmarks.carga --usuarios 20 --clientes 500 --sessoes 30 --alvos uvicorn
+    python -m benchmarks.carga --comparar benchmarks/resultados/<base>.json            # roda e compara
+    python -m benchmarks.carga --comparar <base>.json <atual>.json                     # só compara
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import date, datetime
+
+import httpx
+
+from benchmarks.comum import BACKEND_DIR, preparar_ambiente, popular_banco, percentis, servidor_uvicorn, texto_aleatorio
+
+CENARIOS = ("login", "dashboard", "resumo", "aniversariantes", "sessoes", "escritas")
+ALVOS = ("processo", "uvicorn")
+SENHA = "senha_bench"
+RESULTADOS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "resultados")
+
+
+def conteudo_realista(rng: random.Random) -> str:
+    """ANOTAÇÃO DE SESSÃO: LOG-NORMAL COM MEDIANA ~1200 CARACTERES, DE 80 ATÉ O LIMITE DA API (5000)"""
+    tamanho = int(min(5000, max(80, rng.lognormvariate(math.log(1200), 0.8))))
+    return texto_aleatorio(rng, tamanho, tamanho)
+
+
+async def operacao(http, cenario: str, usuario: dict, rng: random.Random) -> list:
+    """UMA OPERAÇÃO DO CENÁRIO (O DASHBOARD FAZ DUAS REQUISIÇÕES EM PARALELO, COMO O NAVEGADOR). RETORNA OS STATUS"""
+    if cenario == "login":
+        resposta = await http.post("/auth/login", json={"username": usuario["username"], "senha": SENHA})
+        return [resposta.status_code]
+    headers = usuario["headers"]
+    if cenario == "dashboard":
+        respostas = await asyncio.gather(
+            http.get("/clientes/aniversariantes-proximos-30-dias/", headers=headers),
+            http.get("/clientes/", params={"limit": 50}, headers=headers),
+        )
+        return [resposta.status_code for resposta in respostas]
+    if cenario in ("resumo", "aniversariantes"):
+        caminho = "/dashboard/resumo" if cenario == "resumo" else "/clientes/aniversariantes-proximos-30-dias/"
+        resposta = await http.get(caminho, headers=headers)
+        return [resposta.status_code]
+    cliente_id = rng.choice(usuario["clientes"])
+    if cenario == "sessoes":
+        resposta = await http.get(f"/clientes/{cliente_id}/atendimentos/", params={"limit": 20}, headers=headers)
+    else:
+        resposta = await http.post(f"/clientes/{cliente_id}/atendimentos/", headers=headers, json={
+            "data_atendimento": date.today().isoformat(), "conteudo": conteudo_realista(rng), "duracao_minutos": 50})
+    return [resposta.status_code]
+
+
+async def executar_cenario(http, cenario: str, usuarios: list, total: int, concorrencia: int, seed: int) -> dict:
+    """total OPERAÇÕES DIVIDIDAS ENTRE concorrencia CLIENTES VIRTUAIS; SÓ AS BEM-SUCEDIDAS ENTRAM NOS PERCENTIS"""
+    pendentes = iter(range(total))
+    latencias, status = [], Counter()
+
+    async def cliente_virtual(indice):
+        rng = random.Random(seed * 1000 + indice)
+        for _ in pendentes:
+            usuario = usuarios[rng.randrange(len(usuarios))]
+            inicio = time.perf_counter()
+            try:
+                codigos = await operacao(http, cenario, usuario, rng)
+            except httpx.HTTPError:
+                status["rede"] += 1
+                continue
+            duracao = time.perf_counter() - inicio
+            status.update(str(codigo) for codigo in codigos)
+            if all(codigo < 400 for codigo in codigos):
+                latencias.append(duracao)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente_virtual(i) for i in range(concorrencia)))
+    duracao = time.perf_counter() - inicio
+    return {
+        "cenario": cenario, "operacoes": total, "concorrencia": concorrencia,
+        "segundos": round(duracao, 3), "operacoes_por_segundo": round(len(latencias) / duracao, 1),
+        "status": dict(sorted(status.items())), **percentis(latencias),
+    }
+
+
+async def rodar_cenarios(http, alvo: str, args, usuarios: list) -> list:
+    resultados = []
+    for cenario in args.cenarios:
+        total = args.logins if cenario == "login" else args.operacoes
+        concorrencia = min(args.concorrencia, total)
+        await executar_cenario(http, cenario, usuarios, min(args.aquecimento, total), concorrencia, args.seed + 1)
+        rodadas = [await executar_cenario(http, cenario, usuarios, total, concorrencia, args.seed + 2 + r)
+                   for r in range(args.repeticoes)]
+        # MEDIANA DE CADA MEDIDA ENTRE AS RODADAS (UMA RODADA RUIM NÃO DESLOCA O RESULTADO)
+        resultado = {"alvo": alvo, **rodadas[0], "repeticoes": args.repeticoes,
+                     "status": dict(sum((Counter(rodada["status"]) for rodada in rodadas), Counter()))}
+        for chave in ("segundos", "operacoes_por_segundo", "p50_ms", "p95_ms", "p99_ms"):
+            resultado[chave] = statistics.median(rodada[chave] for rodada in rodadas)
+        print(resultado)
+        resultados.append(resultado)
+    return resultados
+
+
+async def alvo_processo(api, args, usuarios: list) -> list:
+    """O APP NO PRÓPRIO PROCESSO, COM O CICLO DE VIDA (POOLS, TAREFAS) COMO NO SERVIDOR"""
+    async with api.app.router.lifespan_context(api.app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app),
+                                     base_url="http://processo", timeout=120) as http:
+            return await rodar_cenarios(http, "processo", args, usuarios)
+
+
+async def alvo_uvicorn(url: str, args, usuarios: list) -> list:
+    limites = httpx.Limits(max_connections=args.concorrencia * 2, max_keepalive_connections=args.concorrencia * 2)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limites) as http:
+        return await rodar_cenarios(http, "uvicorn", args, usuarios)
+
+
+def git(*comando) -> str:
+    try:
+        return subprocess.run(["git", *comando], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def metadados(args, massa: dict) -> dict:
+    import config
+
+    return {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "commit": git("rev-parse", "--short", "HEAD") or None,
+        "alteracoes_locais": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "sistema": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parametros": {chave: valor for chave, valor in vars(args).items() if chave not in ("comparar", "saida")},
+        "configuracao": {
+            "DB_MODO": config.DB_MODO, "DB_POOL_SIZE": config.DB_POOL_SIZE, "BCRYPT_ROUNDS": config.BCRYPT_ROUNDS,
+            "HASH_WORKERS": config.HASH_WORKERS, "RESPOSTAS_CACHE_TAMANHO": config.RESPOSTAS_CACHE_TAMANHO,
+            "METRICAS_ATIVAS": config.METRICAS_ATIVAS,
+        },
+        "massa": massa,
+    }
+
+
+def semear(api, args) -> tuple:
+    """BANCO SINTÉTICO DETERMINÍSTICO (MESMA SEMENTE -> MESMOS DADOS) E CREDENCIAIS DOS USUÁRIOS"""
+    from senhas import hash_senha
+
+    conn = api.abrir_conexao()
+    mapa = popular_banco(conn, usuarios=args.usuarios, clientes_por_usuario=args.clientes,
+                         sessoes_por_cliente=args.sessoes, senha_hash=hash_senha(SENHA),
+                         seed=args.seed, gerar_conteudo=conteudo_realista)
+    usuarios = []
+    for usuario_id, clientes in mapa.items():
+        username = conn.execute("SELECT username FROM usuarios WHERE id = ?", (usuario_id,)).fetchone()[0]
+        usuarios.append({"username": username, "clientes": clientes,
+                         "headers": {"Authorization": f"Bearer {api.criar_token_jwt(usuario_id, username)}"}})
+    sessoes, media = conn.execute("SELECT COUNT(*), AVG(LENGTH(conteudo)) FROM atendimentos").fetchone()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    massa = {"usuarios": len(usuarios), "clientes": sum(len(u["clientes"]) for u in usuarios),
+             "sessoes": sessoes, "conteudo_medio_caracteres": round(media or 0),
+             "banco_mb": round(os.path.getsize(api.DB_NAME) / 2**20, 1)}
+    # CÓPIA PARA O ALVO uvicorn ANTES QUE O ALVO processo ESCREVA NO BANCO
+    os.makedirs("uvicorn", exist_ok=True)
+    conn.execute("VACUUM INTO ?", (os.path.join("uvicorn", api.DB_NAME),))
+    conn.close()
+    return usuarios, massa
+
+
+def comparar(base: dict, atual: dict, tolerancia: float) -> int:
+    """IMPRIME A VARIAÇÃO POR ALVO/CENÁRIO E DEVOLVE QUANTAS MEDIDAS PIORARAM ALÉM DA TOLERÂNCIA (%)"""
+    print(f"base: {base['meta']['commit']} ({base['meta']['data']})  atual: {atual['meta']['commit']} ({atual['meta']['data']})")
+    if base["meta"]["massa"] != atual["meta"]["massa"]:
+        print("aviso: as massas de dados são diferentes, a comparação não é direta")
+    anteriores = {(r["alvo"], r["cenario"]): r for r in base["resultados"]}
+    regressoes = 0
+    for resultado in atual["resultados"]:
+        anterior = anteriores.get((resultado["alvo"], resultado["cenario"]))
+        if anterior is None:
+            continue
+        linha = {"alvo": resultado["alvo"], "cenario": resultado["cenario"]}
+        for chave, maior_e_pior in (("operacoes_por_segundo", False), ("p50_ms", True), ("p95_ms", True), ("p99_ms", True)):
+            antes, depois = anterior[chave], resultado[chave]
+            variacao = (depois / antes - 1) * 100 if antes else 0.0
+            piorou = variacao > tolerancia if maior_e_pior else variacao < -tolerancia
+            regressoes += piorou
+            linha[chave] = f"{antes} -> {depois} ({variacao:+.0f}%){' REGRESSÃO' if piorou else ''}"
+        print(linha)
+    return regressoes
+
+
+def carregar(caminho: str) -> dict:
+    with open(caminho, encoding="utf-8") as arquivo:
+        return json.load(arquivo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--usuarios", type=int, default=5)
+    parser.add_argument("--clientes", type=int, default=200, help="clientes por usuário")
+    parser.add_argument("--sessoes", type=int, default=20, help="sessões por cliente")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--operacoes", type=int, default=1000, help="operações medidas por cenário")
+    parser.add_argument("--logins", type=int, default=32, help="operações medidas no cenário login (bcrypt é caro)")
+    parser.add_argument("--aquecimento", type=int, default=20, help="operações descartadas antes de cada cenário")
+    parser.add_argument("--repeticoes", type=int, default=3, help="rodadas medidas por cenário (vale a mediana)")
+    parser.add_argument("--concorrencia", type=int, default=16, help="clientes virtuais simultâneos")
+    parser.add_argument("--alvos", nargs="+", choices=ALVOS, default=list(ALVOS))
+    parser.add_argument("--cenarios", nargs="+", choices=CENARIOS, default=list(CENARIOS))
+    parser.add_argument("--saida", help="arquivo JSON de resultados (padrão: benchmarks/resultados/<data>-<commit>.json)")
+    parser.add_argument("--comparar", nargs="+", metavar="JSON",
+                        help="BASE: roda e compara com ela; BASE ATUAL: só compara os dois arquivos")
+    parser.add_argument("--tolerancia", type=float, default=20, help="variação (%%) aceita antes de apontar regressão")
+    args = parser.parse_args()
+
+    if args.comparar and len(args.comparar) == 2:
+        sys.exit(1 if comparar(carregar(args.comparar[0]), carregar(args.comparar[1]), args.tolerancia) else 0)
+    base = carregar(args.comparar[0]) if args.comparar else None
+    saida = os.path.abspath(args.saida) if args.saida else None
+
+    pasta = preparar_ambiente()
+    api = importlib.import_module("main")
+    if api.CRIPTOGRAFIA_ATIVA or api.DB_SHARDS_ATIVO:
+        sys.exit("A massa sintética é gravada no banco principal em texto puro: rode sem CRIPTOGRAFIA=1 e DB_SHARDS=1")
+    usuarios, massa = semear(api, args)
+    print({"massa": massa})
+
+    resultados = []
+    if "uvicorn" in args.alvos:
+        with servidor_uvicorn(os.path.join(pasta, "uvicorn")) as url:
+            resultados += asyncio.run(alvo_uvicorn(url, args, usuarios))
+    if "processo" in args.alvos:
+        resultados += asyncio.run(alvo_processo(api, args, usuarios))
+
+    relatorio = {"meta": metadados(args, massa), "resultados": resultados}
+    if saida is None:
+        os.makedirs(RESULTADOS_DIR, exist_ok=True)
+        nome = f"{datetime.now():%Y%m%d-%H%M%S}-{relatorio['meta']['commit'] or 'sem-git'}.json"
+        saida = os.path.join(RESULTADOS_DIR, nome)
+    with open(saida, "w", encoding="utf-8") as arquivo:
+        json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+    print(f"resultados salvos em {saida}")
+
+    if base is not None:
+        sys.exit(1 if comparar(base, relatorio, args.tolerancia) else 0)
+
+
+if __name__ == "__main__":
+    main()
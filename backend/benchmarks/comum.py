@@ -0,0 +1,138 @@
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+# FUNÇÕES COMPARTILHADAS PELOS BENCHMARKS
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PALAVRAS = (
+    "cliente relatou ansiedade melhora sono trabalho família sessão foco respiração "
+    "medicação sertralina rotina humor conflito objetivo tarefa semana progresso "
+    "terapia exercício memória infância relacionamento autoestima limite escuta"
+).split()
+
+
+def preparar_ambiente() -> str:
+    """CRIA UM DIRETÓRIO TEMPORÁRIO PARA O BANCO E COLOCA O BACKEND NO PATH"""
+    pasta = tempfile.mkdtemp(prefix="prontuario-bench-")
+    os.chdir(pasta)
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    return pasta
+
+
+def texto_aleatorio(rng: random.Random, minimo: int = 200, maximo: int = 5000) -> str:
+    alvo = rng.randint(minimo, maximo)
+    partes, tamanho = [], 0
+    while tamanho < alvo:
+        palavra = rng.choice(PALAVRAS)
+        partes.append(palavra)
+        tamanho += len(palavra) + 1
+    return " ".join(partes)[:alvo]
+
+
+def popular_banco(conn, usuarios: int = 1, clientes_por_usuario: int = 100,
+                  sessoes_por_cliente: int = 10, senha_hash: str = "x", seed: int = 42,
+                  gerar_conteudo=None) -> dict:
+    """INSERE DADOS SINTÉTICOS DIRETAMENTE NO BANCO. RETORNA {usuario_id: [cliente_ids]}
+    gerar_conteudo: função (rng) -> texto do atendimento; padrão: texto_aleatorio"""
+    from nomes import normalizar_nome  # O BACKEND SÓ ENTRA NO PATH EM preparar_ambiente
+
+    rng = random.Random(seed)
+    gerar_conteudo = gerar_conteudo or texto_aleatorio
+    hoje = date.today()
+    agora = datetime.now().isoformat()
+    mapa = {}
+    for u in range(usuarios):
+        cur = conn.execute(
+            """INSERT INTO usuarios (username, nome, senha_hash, pergunta_seguranca, resposta_seguranca_hash, data_criacao)
+            VALUES (?, ?, ?, ?, ?, ?)""",
+            (f"bench_{u}_{rng.randrange(10**9)}", f"Profissional {u}", senha_hash, "pet?", senha_hash, agora)
+        )
+        usuario_id = cur.lastrowid
+        mapa[usuario_id] = []
+        for c in range(clientes_por_usuario):
+            nascimento = date(1950, 1, 1) + timedelta(days=rng.randrange(365 * 55))
+            nome = f"Cliente {rng.choice(PALAVRAS)} {c}"
+            cur = conn.execute(
+                """INSERT INTO clientes
+                (usuario_id, codigo_cliente, nome_completo, nome_normalizado, email, telefone, data_nascimento,
+                 endereco, data_registro)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (usuario_id, f"{hoje.year}/{c + 1:04d}", nome, normalizar_nome(nome),
+                 f"c{usuario_id}_{c}@bench.local", "11999999999", nascimento.isoformat(), None, agora)
+            )
+            cliente_id = cur.lastrowid
+            mapa[usuario_id].append(cliente_id)
+            conn.executemany(
+                """INSERT INTO atendimentos
+                (usuario_id, cliente_id, data_atendimento, conteudo, duracao_minutos, data_registro)
+                VALUES (?, ?, ?, ?, ?, ?)""",
+                [
+                    (usuario_id, cliente_id, (hoje - timedelta(days=7 * s)).isoformat(),
+                     gerar_conteudo(rng), rng.choice((30, 45, 50, 60)), agora)
+                    for s in range(sessoes_por_cliente)
+                ]
+            )
+        # MANTÉM A SEQUÊNCIA DE CÓDIGOS ALINHADA COM OS CLIENTES INSERIDOS
+        conn.execute(
+            "INSERT OR REPLACE INTO sequencias_clientes (usuario_id, ano, ultimo_numero) VALUES (?, ?, ?)",
+            (usuario_id, hoje.year, clientes_por_usuario)
+        )
+    conn.commit()
+    return mapa
+
+
+def percentis(latencias: list) -> dict:
+    """p50/p95/p99 EM MILISSEGUNDOS"""
+    if not latencias:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+    ordenadas = sorted(latencias)
+
+    def p(q):
+        return round(ordenadas[min(len(ordenadas) - 1, int(q * len(ordenadas)))] * 1000, 3)
+
+    return {"p50_ms": p(0.50), "p95_ms": p(0.95), "p99_ms": p(0.99)}
+
+
+def porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def servidor_uvicorn(pasta: str, workers: int = 1, porta: int = None, ambiente: dict = None):
+    """SOBE A API REAL COM UVICORN (BANCO NA PASTA INFORMADA) E DEVOLVE A URL BASE.
+    ambiente: variáveis extras para o processo do servidor (ex.: {"DB_MODO": "async"})"""
+    import httpx
+
+    porta = porta or porta_livre()
+    comando = [
+        sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR,
+        "--host", "127.0.0.1", "--port", str(porta), "--log-level", "warning",
+    ]
+    if workers > 1:
+        comando += ["--workers", str(workers)]
+    processo = subprocess.Popen(comando, cwd=pasta, env={**os.environ, **(ambiente or {})})
+    url = f"http://127.0.0.1:{porta}"
+    try:
+        for _ in range(200):
+            try:
+                httpx.get(f"{url}/openapi.json", timeout=1)
+                break
+            except httpx.HTTPError:
+                time.sleep(0.05)
+        else:
+            raise RuntimeError("Servidor não respondeu")
+        yield url
+    finally:
+        processo.terminate()
+        processo.wait(timeout=10)
@@ -0,0 +1,71 @@
+"""
+TESTE DE ESTRESSE: CADASTRO CONCORRENTE DE CLIENTES
+
+Dispara centenas de POST /clientes/ em paralelo contra a API real (uvicorn),
+para dois profissionais ao mesmo tempo, e confere que todas as respostas são
+201 e que nenhum codigo_cliente se repete para o mesmo profissional.
+
+    cd backend
+    python -m benchmarks.stress_codigo_cliente --requisicoes 400 --threads 64
+"""
+import argparse
+import importlib
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from benchmarks.comum import preparar_ambiente, servidor_uvicorn
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requisicoes", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=64)
+    args = parser.parse_args()
+
+    pasta = preparar_ambiente()
+    api = importlib.import_module("main")
+    conn = api.abrir_conexao()
+    tokens = []
+    for username in ("stress_a", "stress_b"):
+        usuario_id = conn.execute(
+            """INSERT INTO usuarios (username, nome, senha_hash, pergunta_seguranca, resposta_seguranca_hash)
+            VALUES (?, ?, 'x', 'p', 'x')""", (username, username)
+        ).lastrowid
+        tokens.append((usuario_id, api.criar_token_jwt(usuario_id, username)))
+    conn.commit()
+    conn.close()
+
+    with servidor_uvicorn(pasta) as url, httpx.Client(base_url=url, timeout=60,
+                                                      limits=httpx.Limits(max_connections=args.threads)) as cliente:
+        def cadastrar(i):
+            usuario_id, token = tokens[i % len(tokens)]
+            resposta = cliente.post("/clientes/", headers={"Authorization": f"Bearer {token}"}, json={
+                "nome_completo": f"Cliente Estresse {i}",
+                "email": f"estresse{i}@teste.local",
+                "telefone": "11999999999",
+                "data_nascimento": "1990-01-01",
+            })
+            return usuario_id, resposta.status_code, resposta.json().get("codigo_cliente")
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as executor:
+            resultados = list(executor.map(cadastrar, range(args.requisicoes)))
+        duracao = time.perf_counter() - inicio
+
+    status = Counter(codigo for _, codigo, _ in resultados)
+    duplicados = [chave for chave, total in Counter((u, c) for u, status_http, c in resultados if status_http == 201).items() if total > 1]
+    print({"requisicoes": args.requisicoes, "segundos": round(duracao, 2),
+           "status": dict(status), "codigos_duplicados": len(duplicados)})
+
+    if set(status) != {201} or duplicados:
+        print("FALHOU")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
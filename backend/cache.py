@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import OrderedDict
+
+# CACHE EM MEMÓRIA LRU COM EXPIRAÇÃO POR ITEM
+# Seguro para uso pelas várias threads do threadpool do FastAPI.
+
+
+class CacheLRU:
+    """CACHE LRU LIMITADO, COM TTL PADRÃO E EXPIRAÇÃO OPCIONAL POR ITEM"""
+
+    def __init__(self, tamanho_maximo: int, ttl_segundos: float = None, ao_remover=None):
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl_segundos = ttl_segundos
+        # ao_remover(chave, valor): CHAMADA (FORA DO LOCK) PARA CADA ITEM QUE VENCE, SAI POR FALTA DE ESPAÇO OU É REMOVIDO
+        self.ao_remover = ao_remover
+        self._itens = OrderedDict()  # chave -> (valor, expira_em)
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def _avisar(self, removidos: list):
+        if self.ao_remover is not None:
+            for chave, valor in removidos:
+                self.ao_remover(chave, valor)
+
+    def obter(self, chave):
+        agora = time.time()
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self.falhas += 1
+                return None
+            valor, expira_em = item
+            if expira_em is None or expira_em > agora:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return valor
+            del self._itens[chave]
+            self.falhas += 1
+        self._avisar([(chave, valor)])
+        return None
+
+    def guardar(self, chave, valor, expira_em: float = None):
+        # O ITEM VENCE NO QUE CHEGAR PRIMEIRO: TTL PADRÃO OU expira_em (timestamp unix)
+        if self.ttl_segundos is not None:
+            limite = time.time() + self.ttl_segundos
+            expira_em = limite if expira_em is None else min(expira_em, limite)
+        removidos = []
+        with self._lock:
+            self._itens[chave] = (valor, expira_em)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho_maximo:
+                antiga, (valor_antigo, _) = self._itens.popitem(last=False)
+                removidos.append((antiga, valor_antigo))
+        self._avisar(removidos)
+
+    def remover(self, chave):
+        with self._lock:
+            item = self._itens.pop(chave, None)
+        if item is not None:
+            self._avisar([(chave, item[0])])
+
+    def remover_se(self, predicado) -> int:
+        """REMOVE OS ITENS EM QUE predicado(chave, valor) FOR VERDADEIRO"""
+        with self._lock:
+            removidos = [(chave, valor) for chave, (valor, _) in self._itens.items() if predicado(chave, valor)]
+            for chave, _ in removidos:
+                del self._itens[chave]
+        self._avisar(removidos)
+        return len(removidos)
+
+    def remover_vencidos(self) -> int:
+        """A EXPIRAÇÃO É PREGUIÇOSA (NO obter); ISTO TIRA DA MEMÓRIA OS VENCIDOS QUE NINGUÉM PEDIU MAIS"""
+        agora = time.time()
+        with self._lock:
+            removidos = [(chave, valor) for chave, (valor, expira_em) in self._itens.items()
+                         if expira_em is not None and expira_em <= agora]
+            for chave, _ in removidos:
+                del self._itens[chave]
+        self._avisar(removidos)
+        return len(removidos)
+
+    def limpar(self):
+        with self._lock:
+            removidos = [(chave, valor) for chave, (valor, _) in self._itens.items()]
+            self._itens.clear()
+        self._avisar(removidos)
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {"acertos": self.acertos, "falhas": self.falhas, "tamanho": len(self._itens)}
@@ -0,0 +1,180 @@
+"""
+COERÊNCIA ENTRE WORKERS (uvicorn --workers N / gunicorn -w N NO MESMO SERVIDOR)
+
+Cada worker é um processo com seus próprios pools, caches e tarefas de fundo.
+  trava_entre_processos: lock exclusivo num arquivo ao lado do banco (fcntl no
+      Linux/macOS, msvcrt no Windows). O schema é criado/migrado por um worker
+      de cada vez; os outros esperam e encontram tudo pronto.
+  Lideranca: só um worker roda as tarefas de fundo (backup, arquivo). O lock
+      fica preso enquanto o processo viver e o sistema operacional o solta se
+      o processo cair; outro worker assume na próxima tentativa.
+  CanalInvalidacao: avisos entre workers ("descarte os tokens do usuário 7"),
+      gravados na tabela invalidacoes do banco principal na mesma transação da
+      mudança. Cada worker consulta PRAGMA data_version na sua conexão: o valor
+      só muda quando outra conexão fez commit, então sem escritas a verificação
+      custa um PRAGMA e nenhuma leitura de tabela.
+"""
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from config import DB_NAME, DB_BUSY_TIMEOUT_MS, INVALIDACAO_RETENCAO_SECONDS
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:  # WINDOWS
+    fcntl = None
+    import msvcrt
+
+
+def _travar(arquivo, bloquear: bool) -> bool:
+    if fcntl is not None:
+        try:
+            fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX | (0 if bloquear else fcntl.LOCK_NB))
+            return True
+        except BlockingIOError:
+            return False
+    # msvcrt.locking TRAVA A PARTIR DA POSIÇÃO ATUAL E NÃO TEM MODO BLOQUEANTE SEM LIMITE
+    while True:
+        try:
+            arquivo.seek(0)
+            msvcrt.locking(arquivo.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if not bloquear:
+                return False
+            time.sleep(0.05)
+
+
+def _soltar(arquivo):
+    try:
+        if fcntl is not None:
+            fcntl.flock(arquivo.fileno(), fcntl.LOCK_UN)
+        else:
+            arquivo.seek(0)
+            msvcrt.locking(arquivo.fileno(), msvcrt.LK_UNLCK, 1)
+    finally:
+        arquivo.close()
+
+
+@contextmanager
+def trava_entre_processos(caminho: str):
+    """EXCLUSÃO MÚTUA ENTRE PROCESSOS EM TORNO DE {caminho}.lock (BLOQUEANTE)"""
+    arquivo = open(f"{caminho}.lock", 'a+b')
+    try:
+        _travar(arquivo, bloquear=True)
+    except BaseException:
+        arquivo.close()
+        raise
+    try:
+        yield
+    finally:
+        _soltar(arquivo)
+
+
+class Lideranca:
+    """UM SÓ WORKER POR BANCO FICA COM AS TAREFAS DE FUNDO ({caminho}.lider)"""
+
+    def __init__(self, caminho: str = None):
+        self.caminho = f"{caminho or DB_NAME}.lider"
+        self._arquivo = None
+
+    @property
+    def lider(self) -> bool:
+        return self._arquivo is not None
+
+    def tentar(self) -> bool:
+        """NÃO BLOQUEIA: True SE ESTE PROCESSO É (OU ACABOU DE VIRAR) O LÍDER"""
+        if self._arquivo is None:
+            arquivo = open(self.caminho, 'a+b')
+            if _travar(arquivo, bloquear=False):
+                self._arquivo = arquivo
+            else:
+                arquivo.close()
+        return self.lider
+
+    def soltar(self):
+        if self._arquivo is not None:
+            _soltar(self._arquivo)
+            self._arquivo = None
+
+
+# AVISOS ENTRE WORKERS
+SQL_TABELA_INVALIDACOES = '''
+    CREATE TABLE IF NOT EXISTS invalidacoes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tipo TEXT NOT NULL,
+        chave INTEGER,
+        criado_em REAL NOT NULL
+    );
+'''
+
+
+def criar_invalidacoes(conn):
+    """CRIA A TABELA DE AVISOS (BANCO PRINCIPAL)"""
+    conn.execute(SQL_TABELA_INVALIDACOES)
+    conn.commit()
+
+
+def publicar_invalidacao(conn, tipo: str, chave: int = None):
+    """AVISA OS OUTROS WORKERS NA TRANSAÇÃO DE QUEM CHAMA: SE ELA FOR DESFEITA, NINGUÉM É AVISADO.
+    Avisos mais velhos que INVALIDACAO_RETENCAO_SECONDS são apagados (os caches vencem antes disso)"""
+    agora = time.time()
+    conn.execute("DELETE FROM invalidacoes WHERE criado_em < ?", (agora - INVALIDACAO_RETENCAO_SECONDS,))
+    conn.execute("INSERT INTO invalidacoes (tipo, chave, criado_em) VALUES (?, ?, ?)", (tipo, chave, agora))
+
+
+class CanalInvalidacao:
+    """LÊ OS AVISOS NOVOS QUANDO O PRAGMA data_version DO BANCO PRINCIPAL MUDA E CHAMA OS ASSINANTES"""
+
+    def __init__(self, db_name: str = None):
+        self.db_name = db_name or DB_NAME
+        self._assinantes = {}  # tipo -> [funcao(chave)]
+        self._conn = None
+        self._versao = None
+        self._ultimo_id = 0
+        self._lock = threading.Lock()
+        self.verificacoes = 0
+        self.avisos_recebidos = 0
+
+    def assinar(self, tipo: str, funcao):
+        self._assinantes.setdefault(tipo, []).append(funcao)
+
+    def _abrir(self):
+        # CONEXÃO PRÓPRIA E FORA DAS MÉTRICAS: O PRAGMA RODA A CADA REQUISIÇÃO AUTENTICADA.
+        # OS AVISOS ANTERIORES À ABERTURA NÃO INTERESSAM (OS CACHES AINDA ESTÃO VAZIOS)
+        conn = sqlite3.connect(self.db_name, timeout=DB_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        self._ultimo_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM invalidacoes").fetchone()[0]
+        self._versao = conn.execute("PRAGMA data_version").fetchone()[0]
+        self._conn = conn
+
+    def verificar(self) -> int:
+        """APLICA OS AVISOS GRAVADOS POR OUTRAS CONEXÕES DESDE A ÚLTIMA VERIFICAÇÃO; DEVOLVE QUANTOS"""
+        with self._lock:
+            if self._conn is None:
+                self._abrir()
+                return 0
+            self.verificacoes += 1
+            versao = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if versao == self._versao:
+                return 0
+            # LÊ A VERSÃO ANTES DOS AVISOS: UM COMMIT NO MEIO MUDA A VERSÃO DE NOVO E É LIDO NA PRÓXIMA
+            self._versao = versao
+            avisos = self._conn.execute(
+                "SELECT id, tipo, chave FROM invalidacoes WHERE id > ? ORDER BY id", (self._ultimo_id,)
+            ).fetchall()
+            if avisos:
+                self._ultimo_id = avisos[-1][0]
+        for _, tipo, chave in avisos:
+            for funcao in self._assinantes.get(tipo, ()):
+                funcao(chave)
+        self.avisos_recebidos += len(avisos)
+        return len(avisos)
+
+    def fechar(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -11,11 +11,153 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
 # CRIPTOGRAFIA DO DB
-CIPTHER_SUITE_PASSWORD = "senha-padrao-criptografada" #será substituída pela senha do usuário
+# Segredo do servidor (índice cego dos emails e cópia de recuperação das contas
+# antigas; ver criptografia.py). Com CRIPTOGRAFIA=1 a API não sobe com o padrão.
+CIPTHER_SUITE_PASSWORD_PADRAO = "senha-padrao-criptografada"
+CIPTHER_SUITE_PASSWORD = os.environ.get("CIPTHER_SUITE_PASSWORD", CIPTHER_SUITE_PASSWORD_PADRAO)
 
 # CORS
 CORS_ORIGINS = ["*"] # EM PRODUÇÃO, MUDE PARA DOMÍNIOS ESPECÍFICOS
 
+# FRONTEND SERVIDO PELA API (VER frontend.py)
+# Com FRONTEND=1 as páginas ficam em http://127.0.0.1:8000/app/, na mesma
+# origem da API (sem preflights de CORS), com CSS/JS versionados pelo hash e
+# comprimidos uma vez na inicialização (brotli com pip install brotli).
+FRONTEND_ATIVO = os.environ.get("FRONTEND", "0") == "1"
+FRONTEND_DIR = os.environ.get("FRONTEND_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'frontend'))
+FRONTEND_PREFIXO = '/app'
+FRONTEND_CACHE_MAX_AGE = 365 * 24 * 3600  # CSS/JS com hash no nome nunca mudam
+FRONTEND_COMPRESSAO_MINIMA = 256  # bytes; arquivos menores vão sem compressão
+
 # SINCRONIZAÇÃO DO GOOGLE DRIVE
+# Com SYNC=1 a API envia, em segundo plano, cópias incrementais dos bancos
+# (só os blocos alterados, compactados). SYNC_DESTINO=local grava numa pasta
+# (útil para testes ou para um disco externo).
 SYNC_INTERVAL_SECONDS = 300  # 5 minutos
-ENABLE_GOOGLE_DRIVE_SYNC = False  # Defina como True para ativar a sincronização
+ENABLE_GOOGLE_DRIVE_SYNC = os.environ.get("SYNC", "0") == "1"  # Defina SYNC=1 para ativar a sincronização
+SYNC_DESTINO = os.environ.get("SYNC_DESTINO", "google_drive")  # "google_drive" ou "local"
+SYNC_DIR_LOCAL = os.environ.get("SYNC_DIR_LOCAL", "backups")
+GOOGLE_DRIVE_CREDENCIAIS = os.environ.get("GOOGLE_DRIVE_CREDENCIAIS", "credenciais_drive.json")  # conta de serviço
+GOOGLE_DRIVE_PASTA_ID = os.environ.get("GOOGLE_DRIVE_PASTA_ID", "")
+SYNC_BLOCO_BYTES = 64 * 1024     # unidade do envio incremental (múltiplo do tamanho de página)
+SYNC_NIVEL_COMPRESSAO = 6        # zlib
+SYNC_MANTER_VERSOES = 30         # cópias mantidas por banco; blocos sem referência são apagados
+
+# POOL DE CONEXÕES SQLITE
+DB_POOL_SIZE = 16                # conexões de leitura mantidas abertas
+DB_POOL_TIMEOUT_SECONDS = 10     # espera máxima por uma conexão livre
+DB_BUSY_TIMEOUT_MS = 5000        # espera pelo lock de escrita antes de "database is locked"
+DB_CACHE_SIZE_KB = 16384         # cache de páginas por conexão (16 MB)
+DB_MMAP_SIZE = 256 * 1024 * 1024 # janela de memory-map (256 MB)
+DB_CACHED_STATEMENTS = 256       # statements preparados em cache por conexão
+# MODO DAS ROTAS: "sync" (handlers no threadpool do AnyIO) ou "async" (handlers
+# async def; o trabalho no banco roda na thread dedicada de cada conexão)
+DB_MODO = os.environ.get("DB_MODO", "sync")
+# DURABILIDADE DOS COMMITS (PRAGMA synchronous, SEMPRE EM WAL):
+#   "total"    FULL: fsync a cada commit; nada confirmado se perde nem com queda de energia
+#   "normal"   NORMAL: fsync só nos checkpoints; sobrevive à queda do processo, a energia pode levar os últimos commits
+#   "relaxada" OFF: sem fsync; sobrevive à queda do processo, o sistema operacional pode levar mais
+DB_DURABILIDADE = os.environ.get("DB_DURABILIDADE", "normal")
+
+# ESCRITA AGRUPADA (GROUP COMMIT): cadastros de clientes e atendimentos de várias
+# requisições entram numa só transação da faixa de escrita; cada requisição só
+# responde depois do COMMIT do seu grupo (a durabilidade acima vale para todas)
+ESCRITA_AGRUPADA = os.environ.get("ESCRITA_AGRUPADA", "1") == "1"
+ESCRITA_GRUPO_ESPERA_MS = float(os.environ.get("ESCRITA_GRUPO_ESPERA_MS", "2"))  # janela para juntar escritas quando já há fila (escrita solitária não espera)
+ESCRITA_GRUPO_MAXIMO = 256       # operações por transação
+
+# PAGINAÇÃO DAS LISTAGENS
+PAGINACAO_LIMITE_PADRAO = 100
+PAGINACAO_LIMITE_MAXIMO = 500
+
+# BUSCA TEXTUAL (FTS5)
+FTS_LOTE_BACKFILL = 1000  # atendimentos indexados por transação na migração
+
+# BUSCA DE CLIENTES PELO NOME (AUTOCOMPLETE; VER nomes.py)
+BUSCA_NOMES_LIMITE_PADRAO = 10
+BUSCA_NOMES_LIMITE_MAXIMO = 50
+BUSCA_NOMES_CANDIDATOS = 200     # resultados guardados por termo; se couberem todos, a próxima tecla filtra em memória
+BUSCA_NOMES_CACHE_TAMANHO = 4096 # termos (usuário, termo) em memória
+
+# AGENDA (VER agendamentos.py)
+AGENDA_DURACAO_MAXIMA_MINUTOS = 480   # a mesma dos atendimentos; limita as faixas do calendário e dos conflitos
+AGENDA_INTERVALO_MAXIMO_SEMANAS = 4   # séries semanais, quinzenais... até mensais de 4 em 4 semanas
+AGENDA_ANO_MINIMO = 1900             # datas aceitas na agenda (e nas janelas do calendário); fora disso é 400/422
+AGENDA_ANO_MAXIMO = 9000
+
+# HASH DE SENHAS (BCRYPT)
+BCRYPT_ROUNDS = 12               # custo do bcrypt; hashes com outro custo são refeitos no próximo login
+HASH_WORKERS = min(4, os.cpu_count() or 1)  # threads dedicadas ao bcrypt
+HASH_FILA_MAXIMA = 64            # hashes aguardando na fila antes de responder 503
+
+# CACHE DE TOKENS JWT JÁ VERIFICADOS
+TOKEN_CACHE_TAMANHO = 1024       # tokens distintos mantidos em memória
+TOKEN_CACHE_TTL_SECONDS = 300    # nunca passa do 'exp' do próprio token
+
+# IMPORTAÇÃO EM MASSA (CSV / NDJSON)
+IMPORTACAO_LOTE = 5000            # linhas por transação
+IMPORTACAO_MAX_ERROS = 1000       # erros detalhados no relatório (o total é sempre contado)
+
+# EXPORTAÇÃO DO PRONTUÁRIO
+EXPORTACAO_MAX_SIMULTANEAS = 2   # exportações em andamento ao mesmo tempo (cada uma usa sua conexão)
+EXPORTACAO_BLOCO_BYTES = 64 * 1024
+
+# ARQUIVO DE ANOTAÇÕES ANTIGAS (VER arquivo.py)
+# Com ARQUIVO_IDADE_DIAS > 0, um laço em segundo plano move o conteudo dos
+# atendimentos mais antigos que isso, comprimido, para uma tabela à parte; a
+# listagem e a exportação descomprimem só o que devolvem. Anotações arquivadas
+# saem da busca textual.
+ARQUIVO_IDADE_DIAS = int(os.environ.get("ARQUIVO_IDADE_DIAS", "0"))  # 0 = desligado
+ARQUIVO_COMPRESSAO = os.environ.get("ARQUIVO_COMPRESSAO", "zlib")  # "zlib" ou "zstd" (pip install zstandard)
+ARQUIVO_DICIONARIO = True        # dicionário de compressão treinado com as anotações de cada profissional
+ARQUIVO_DICIONARIO_BYTES = 32 * 1024  # o zlib usa no máximo 32 KB de dicionário
+ARQUIVO_DICIONARIO_AMOSTRAS = 1000    # anotações lidas para treinar (menos de 50: sem dicionário)
+ARQUIVO_LOTE = 200               # atendimentos arquivados por transação (~0,1 s com a faixa de escrita)
+ARQUIVO_INTERVALO_SECONDS = 6 * 3600
+
+# REQUISIÇÕES CONDICIONAIS (ETag) E CACHE DE RESPOSTAS
+RESPOSTAS_CACHE_TAMANHO = 512    # respostas serializadas em memória; 0 desliga o cache (os ETags continuam)
+
+# UM BANCO POR PROFISSIONAL (SHARDS)
+# Com DB_SHARDS=1, DB_NAME vira só o catálogo de usuários e os dados de cada
+# profissional ficam em DB_SHARDS_DIR/{usuario_id}_atendimentos.db
+# (python dividir_banco.py separa um banco único existente).
+DB_SHARDS_ATIVO = os.environ.get("DB_SHARDS", "0") == "1"
+DB_SHARDS_DIR = 'shards'
+DB_SHARDS_MAX_ABERTOS = 64       # shards com conexões abertas; os ociosos mais antigos são fechados
+DB_SHARD_POOL_SIZE = 4           # conexões de leitura por shard
+
+# VÁRIOS WORKERS NO MESMO SERVIDOR (VER coerencia.py)
+# WEB_CONCURRENCY é o número padrão de workers do uvicorn e do gunicorn:
+# WEB_CONCURRENCY=4 python -m uvicorn main:app sobe 4 processos. O schema é
+# criado por um worker de cada vez, só um deles roda as tarefas de fundo e os
+# caches em memória recebem os avisos de invalidação dos outros.
+WORKERS = int(os.environ.get("WEB_CONCURRENCY", "1"))
+LIDERANCA_INTERVALO_SECONDS = 5  # workers sem as tarefas de fundo tentam assumir a cada N segundos
+INVALIDACAO_RETENCAO_SECONDS = 24 * 3600  # avisos entre workers guardados no banco
+
+# CRIPTOGRAFIA DE CAMPOS (ANOTAÇÕES E DADOS PESSOAIS DOS CLIENTES)
+# Com CRIPTOGRAFIA=1, conteudo dos atendimentos e email/telefone/endereco dos
+# clientes são gravados com AES-256-GCM usando uma chave por usuário, liberada
+# no login pela senha. CIPTHER_SUITE_PASSWORD (variável de ambiente, obrigatória
+# aqui) protege a chave de recuperação das contas criadas antes da criptografia
+# (até a primeira troca de senha) e o índice cego dos emails.
+CRIPTOGRAFIA_ATIVA = os.environ.get("CRIPTOGRAFIA", "0") == "1"
+CRIPTOGRAFIA_SCRYPT_N = 2 ** 15  # custo do scrypt (uma derivação por login, ~150 ms)
+CRIPTOGRAFIA_CHAVE_TTL_SECONDS = ACCESS_TOKEN_EXPIRE_MINUTES * 60  # chave decifrada fica em memória pela duração do token
+CRIPTOGRAFIA_CACHE_TAMANHO = 1024  # usuários com chave em memória
+CRIPTOGRAFIA_LOTE_MIGRACAO = 500   # linhas antigas (texto puro) cifradas por transação após o login
+
+# MÉTRICAS E DIAGNÓSTICO (GET /metrics NO FORMATO DO PROMETHEUS)
+METRICAS_ATIVAS = os.environ.get("METRICAS", "1") == "1"
+# /metrics tem os tempos por rota e o texto dos comandos SQL: sem METRICAS_TOKEN só
+# responde a conexões da própria máquina (127.0.0.1/::1; atrás de um proxy reverso
+# na mesma máquina, defina o token); com ele, exige "Authorization: Bearer <token>"
+METRICAS_TOKEN = os.environ.get("METRICAS_TOKEN", "")
+METRICAS_SERVER_TIMING = True    # header Server-Timing (sql/hash/json/total) em cada resposta
+METRICAS_LIMITE_REPETICOES = 3   # o mesmo comando SQL N vezes numa requisição conta como suspeita de N+1
+METRICAS_MAX_COMANDOS = 300      # comandos SQL distintos com série própria; os demais entram em "outros"
+SQL_LENTO_MS = float(os.environ.get("SQL_LENTO_MS", "0"))  # > 0: registra comandos mais lentos que isso, com EXPLAIN QUERY PLAN
+# Mensagens da API no logger "prontuario" (prontuario.metricas, prontuario.sincronizacao...).
+# Sem configuração de logging própria (uvicorn --log-config), vão para o stderr a partir deste nível
+LOG_NIVEL = os.environ.get("LOG_NIVEL", "INFO")
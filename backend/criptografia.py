@@ -0,0 +1,134 @@
+import hashlib
+import hmac
+import os
+from functools import lru_cache
+from typing import Optional
+
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:  # SÓ É NECESSÁRIO COM CRIPTOGRAFIA=1 (main.py RECUSA SUBIR SEM ELE)
+    InvalidTag = AESGCM = None
+
+from config import CRIPTOGRAFIA_SCRYPT_N, CIPTHER_SUITE_PASSWORD, CIPTHER_SUITE_PASSWORD_PADRAO
+from senhas import executar_no_pool_hash
+
+# CRIPTOGRAFIA DE CAMPOS (AES-256-GCM)
+# Cada usuário tem uma chave de dados aleatória. No banco ela só aparece
+# "embrulhada" (cifrada) por chaves derivadas com scrypt: uma vem da senha
+# (login) e outra da resposta de segurança (recuperação de senha, que recupera
+# a chave de dados e a embrulha de novo com a senha nova). O scrypt roda uma
+# vez por login, no pool do bcrypt; a chave aberta fica só em memória.
+#
+# Valor cifrado = BLOB b'\x01' + nonce (12 bytes) + texto cifrado + tag. O nome
+# do campo entra como dado associado, então um valor não pode ser trocado de
+# coluna. Valores TEXT continuam sendo lidos como estão (linhas antigas).
+#
+# Com um nonce novo a cada gravação, o mesmo email nunca gera o mesmo valor
+# cifrado e o UNIQUE de clientes.email deixa de pegar duplicados. A unicidade
+# fica no índice cego clientes.email_indice: HMAC-SHA256 do email normalizado
+# (strip + casefold: Ana@X.com e ana@x.com são o mesmo email) com uma chave
+# derivada de CIPTHER_SUITE_PASSWORD (não muda com as senhas).
+#
+# Quem tem o arquivo do banco e o código pode testar emails contra o índice e
+# abrir as cópias de recuperação das contas antigas se souber o segredo do
+# servidor: por isso ele vem do ambiente e a API não sobe com o padrão quando a
+# criptografia está ligada. Cada banco guarda a impressão do segredo que gerou
+# o índice e cada conta a do que embrulhou a recuperação; trocado o segredo,
+# o índice é refeito e as cópias são embrulhadas de novo no login.
+
+VERSAO = b'\x01'
+TAMANHO_NONCE = 12
+CAMPOS_CLIENTE_CIFRADOS = ('email', 'telefone', 'endereco')
+CAMPOS_ATENDIMENTO_CIFRADOS = ('conteudo',)
+CAMPOS_AGENDAMENTO_CIFRADOS = ('observacao',)
+
+
+def derivar_chave(segredo: str, salt: bytes, finalidade: str) -> bytes:
+    """CHAVE DE 256 BITS A PARTIR DE UM SEGREDO (LENTO DE PROPÓSITO)"""
+    return hashlib.scrypt(
+        f"{finalidade}:{segredo}".encode('utf-8'), salt=salt,
+        n=CRIPTOGRAFIA_SCRYPT_N, r=8, p=1, maxmem=256 * CRIPTOGRAFIA_SCRYPT_N * 8, dklen=32
+    )
+
+
+async def derivar_chave_async(segredo: str, salt: bytes, finalidade: str) -> bytes:
+    return await executar_no_pool_hash(derivar_chave, segredo, salt, finalidade)
+
+
+def chave_do_servidor(salt: bytes, segredo: str = CIPTHER_SUITE_PASSWORD) -> bytes:
+    return derivar_chave(segredo, salt, 'servidor')
+
+
+def chave_do_servidor_padrao(salt: bytes) -> bytes:
+    # CÓPIAS DE RECUPERAÇÃO FEITAS QUANDO A API AINDA SUBIA COM O SEGREDO PADRÃO
+    return chave_do_servidor(salt, CIPTHER_SUITE_PASSWORD_PADRAO)
+
+
+@lru_cache(maxsize=1)
+def _chave_indice() -> bytes:
+    return derivar_chave(CIPTHER_SUITE_PASSWORD, b'indice-cego-email', 'indice')  # UMA VEZ POR PROCESSO
+
+
+def impressao_segredo() -> bytes:
+    """IDENTIFICA O SEGREDO DO SERVIDOR ATUAL SEM REVELÁ-LO (TESTAR UM PALPITE CUSTA UM SCRYPT)"""
+    return hmac.new(_chave_indice(), b'impressao', hashlib.sha256).digest()[:16]
+
+
+def normalizar_email(email: str) -> str:
+    return email.strip().casefold()
+
+
+def indice_email(email: Optional[str]) -> Optional[bytes]:
+    """ÍNDICE CEGO DO EMAIL (O MESMO PARA O MESMO EMAIL, COM OU SEM CRIPTOGRAFIA)"""
+    if email is None:
+        return None
+    return hmac.new(_chave_indice(), normalizar_email(email).encode('utf-8'), hashlib.sha256).digest()
+
+
+class Cifrador:
+    """CIFRA E DECIFRA OS CAMPOS DE UM USUÁRIO (UM OBJETO AES-GCM REAPROVEITADO EM TODAS AS LINHAS)"""
+
+    def __init__(self, chave: bytes):
+        self._aes = AESGCM(chave)
+
+    def cifrar(self, valor: Optional[str], campo: str) -> Optional[bytes]:
+        if valor is None:
+            return None
+        nonce = os.urandom(TAMANHO_NONCE)
+        return VERSAO + nonce + self._aes.encrypt(nonce, valor.encode('utf-8'), campo.encode())
+
+    def decifrar(self, valor, campo: str):
+        if not isinstance(valor, bytes):
+            return valor  # TEXTO PURO (ANTERIOR À CRIPTOGRAFIA) OU NULL
+        return self._aes.decrypt(valor[1:1 + TAMANHO_NONCE], valor[1 + TAMANHO_NONCE:], campo.encode()).decode('utf-8')
+
+    def decifrar_itens(self, itens: list, campos: tuple) -> list:
+        """DECIFRA EM LOTE, NO LUGAR, OS CAMPOS DE UMA LISTA DE DICTS (LISTAGENS E EXPORTAÇÃO)"""
+        decifrar = self._aes.decrypt
+        associados = [(campo, campo.encode()) for campo in campos]
+        inicio_texto = 1 + TAMANHO_NONCE
+        for item in itens:
+            for campo, associado in associados:
+                valor = item.get(campo)
+                if type(valor) is bytes:
+                    item[campo] = decifrar(valor[1:inicio_texto], valor[inicio_texto:], associado).decode('utf-8')
+        return itens
+
+    def cifrar_chave(self, chave: bytes) -> bytes:
+        nonce = os.urandom(TAMANHO_NONCE)
+        return VERSAO + nonce + self._aes.encrypt(nonce, chave, b'chave')
+
+    def decifrar_chave(self, embrulhada: bytes) -> Optional[bytes]:
+        try:
+            return self._aes.decrypt(embrulhada[1:1 + TAMANHO_NONCE], embrulhada[1 + TAMANHO_NONCE:], b'chave')
+        except InvalidTag:
+            return None
+
+
+def nova_chave_dados() -> bytes:
+    return AESGCM.generate_key(bit_length=256)
+
+
+def novo_salt() -> bytes:
+    return os.urandom(16)
@@ -0,0 +1,455 @@
+import asyncio
+import contextvars
+import functools
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+
+from fastapi import HTTPException
+from config import (
+    DB_NAME, DB_POOL_SIZE, DB_POOL_TIMEOUT_SECONDS, DB_BUSY_TIMEOUT_MS,
+    DB_CACHE_SIZE_KB, DB_MMAP_SIZE, DB_CACHED_STATEMENTS, DB_MODO,
+    DB_SHARDS_MAX_ABERTOS, DB_SHARD_POOL_SIZE, METRICAS_ATIVAS,
+    DB_DURABILIDADE, ESCRITA_GRUPO_ESPERA_MS, ESCRITA_GRUPO_MAXIMO
+)
+from metricas import CursorRastreado
+from coerencia import trava_entre_processos
+from starlette.concurrency import run_in_threadpool
+
+# POOL DE CONEXÕES SQLITE
+# As rotas do FastAPI rodam no threadpool, então uma conexão pode ser aberta
+# numa thread (dependency) e usada em outra (handler). Por isso as conexões
+# são "emprestadas" de uma fila e nunca presas a uma thread específica.
+# Leituras usam o pool de leitores; escritas passam por uma única conexão
+# (pool de tamanho 1), então escritores nunca disputam o lock entre si e o
+# modo WAL deixa os leitores trabalhando em paralelo.
+#
+# As dependencies esperam por uma conexão livre no event loop (obter_async),
+# nunca numa thread do threadpool: se as threads ficassem bloqueadas esperando,
+# quem está com a conexão não teria thread para rodar o handler e devolvê-la.
+#
+# MODO ASSÍNCRONO (DB_MODO = "async")
+# Cada conexão ganha uma thread própria (o mesmo desenho do aiosqlite, sem a
+# dependência): os handlers viram async def e mandam o trabalho no banco para
+# a thread da conexão que pegaram. O limite de requisições simultâneas deixa
+# de ser o threadpool do AnyIO (40 threads) e passa a ser o número de
+# conexões; quem espera por conexão ou pelo lock de escrita espera no event
+# loop, sem ocupar thread nenhuma.
+#
+# ESCRITA AGRUPADA (GROUP COMMIT)
+# Cada pool de escrita pode ter um EscritorAgrupado: uma thread que junta as
+# operações enviadas por várias requisições durante ESCRITA_GRUPO_ESPERA_MS e
+# grava todas numa só transação (um SAVEPOINT por operação, então o erro de
+# uma não desfaz as outras). O custo do COMMIT (fsync com DB_DURABILIDADE =
+# "total", escrita das páginas de índice/FTS/resumos no WAL) é dividido pelo
+# grupo. A thread pega a conexão do próprio pool: continua existindo uma
+# única faixa de escrita.
+
+NIVEIS_SYNCHRONOUS = {"total": "FULL", "normal": "NORMAL", "relaxada": "OFF"}
+if DB_DURABILIDADE not in NIVEIS_SYNCHRONOUS:
+    raise RuntimeError(f"DB_DURABILIDADE deve ser um de {', '.join(NIVEIS_SYNCHRONOUS)}")
+
+
+class ConexaoSQLite(sqlite3.Connection):
+    """CONEXÃO SQLITE COM THREAD DEDICADA PARA O MODO ASSÍNCRONO"""
+
+    _thread = None
+
+    async def rodar(self, funcao, /, *args, **kwargs):
+        """EXECUTA funcao(*args) NA THREAD DA CONEXÃO E AGUARDA O RESULTADO"""
+        if self._thread is None:
+            self._thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        loop = asyncio.get_running_loop()
+        # LEVA O CONTEXTO (RASTRO DA REQUISIÇÃO PARA AS MÉTRICAS) PARA A THREAD DA CONEXÃO
+        contexto = contextvars.copy_context()
+        return await loop.run_in_executor(self._thread, contexto.run, functools.partial(funcao, *args, **kwargs))
+
+    def close(self):
+        super().close()
+        if self._thread is not None:
+            self._thread.shutdown(wait=False)
+            self._thread = None
+
+
+class ConexaoRastreada(ConexaoSQLite):
+    """CONEXÃO CUJOS CURSORES (INCLUSIVE OS DE conn.execute) ALIMENTAM AS MÉTRICAS DE SQL"""
+
+    def cursor(self, factory=CursorRastreado):
+        return super().cursor(factory)
+
+    # O conn.execute NATIVO CRIA O CURSOR EM C, SEM PASSAR POR self.cursor()
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, sequencia):
+        return self.cursor().executemany(sql, sequencia)
+
+
+async def rodar_no_banco(conn: sqlite3.Connection, funcao, /, *args, **kwargs):
+    """RODA TRABALHO BLOQUEANTE DE BANCO: THREAD DA CONEXÃO (ASYNC) OU THREADPOOL (SYNC)"""
+    if DB_MODO == "async" and isinstance(conn, ConexaoSQLite):
+        return await conn.rodar(funcao, *args, **kwargs)
+    return await run_in_threadpool(funcao, *args, **kwargs)
+
+
+async def iterar_no_banco(conn: sqlite3.Connection, iterador):
+    """CONSOME UM ITERADOR SÍNCRONO QUE LÊ DO BANCO, UM ITEM POR VEZ, SEM TRAVAR O EVENT LOOP"""
+    fim = object()
+    try:
+        while True:
+            item = await rodar_no_banco(conn, next, iterador, fim)
+            if item is fim:
+                break
+            yield item
+    finally:
+        iterador.close()
+
+
+def handler_banco(funcao):
+    """DECORA UM HANDLER SÍNCRONO QUE RECEBE conn: NO MODO ASYNC ELE VIRA async def
+    E O CORPO RODA NA THREAD DA CONEXÃO. ASSINATURA E OPENAPI NÃO MUDAM."""
+    if DB_MODO != "async":
+        return funcao
+
+    @functools.wraps(funcao)
+    async def handler(*args, **kwargs):
+        return await rodar_no_banco(kwargs["conn"], funcao, *args, **kwargs)
+
+    return handler
+
+
+def abrir_conexao(db_name: str = None) -> sqlite3.Connection:
+    """ABRE UMA CONEXÃO COM OS PRAGMAS DE PERFORMANCE APLICADOS"""
+    conn = sqlite3.connect(
+        db_name or DB_NAME,
+        timeout=DB_BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,
+        cached_statements=DB_CACHED_STATEMENTS,
+        factory=ConexaoRastreada if METRICAS_ATIVAS else ConexaoSQLite,
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute(f"PRAGMA synchronous = {NIVEIS_SYNCHRONOUS[DB_DURABILIDADE]}")
+    conn.execute(f"PRAGMA busy_timeout = {int(DB_BUSY_TIMEOUT_MS)}")
+    conn.execute(f"PRAGMA cache_size = -{int(DB_CACHE_SIZE_KB)}")
+    conn.execute(f"PRAGMA mmap_size = {int(DB_MMAP_SIZE)}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+class PoolConexoes:
+    """POOL DE CONEXÕES REUTILIZÁVEIS (CHECKOUT/CHECKIN)"""
+
+    def __init__(self, tamanho: int, db_name: str = None):
+        self.tamanho = tamanho
+        self.db_name = db_name
+        self._livres = queue.LifoQueue()
+        self._aguardando = deque()  # (loop, future) de quem espera no event loop
+        self._abertas = 0
+        self._lock = threading.Lock()
+        self._escritor = None
+
+    def _tentar_obter(self):
+        # CHAMAR COM self._lock: CONEXÃO LIVRE, OU UMA NOVA SE AINDA HÁ VAGA
+        try:
+            return self._livres.get_nowait()
+        except queue.Empty:
+            pass
+        if self._abertas < self.tamanho:
+            self._abertas += 1
+            try:
+                return abrir_conexao(self.db_name)
+            except sqlite3.Error:
+                self._abertas -= 1
+                raise
+        return None
+
+    def obter(self, timeout: float = DB_POOL_TIMEOUT_SECONDS) -> sqlite3.Connection:
+        """CHECKOUT BLOQUEANTE (SCRIPTS E THREADS DE SEGUNDO PLANO)"""
+        with self._lock:
+            conn = self._tentar_obter()
+        if conn is not None:
+            return conn
+        try:
+            return self._livres.get(timeout=timeout)
+        except queue.Empty:
+            raise HTTPException(status_code=503, detail="Banco de dados ocupado, tente novamente.")
+
+    async def obter_async(self, timeout: float = DB_POOL_TIMEOUT_SECONDS) -> sqlite3.Connection:
+        """CHECKOUT NO EVENT LOOP: ESPERA SEM OCUPAR THREAD"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            conn = self._tentar_obter()
+            if conn is not None:
+                return conn
+            futuro = loop.create_future()
+            self._aguardando.append((loop, futuro))
+        try:
+            return await asyncio.wait_for(futuro, timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail="Banco de dados ocupado, tente novamente.")
+
+    def _entregar(self, futuro, conn):
+        # RODA NO LOOP DE QUEM ESPERA; SE DESISTIU (TIMEOUT), PASSA A CONEXÃO ADIANTE
+        if futuro.done():
+            self.devolver(conn)
+        else:
+            futuro.set_result(conn)
+
+    def devolver(self, conn: sqlite3.Connection):
+        # NUNCA DEVOLVE UMA TRANSAÇÃO ABERTA PARA O POOL
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            while self._aguardando:
+                loop, futuro = self._aguardando.popleft()
+                if not futuro.done():
+                    loop.call_soon_threadsafe(self._entregar, futuro, conn)
+                    return
+            self._livres.put_nowait(conn)
+
+    def estado(self) -> dict:
+        with self._lock:
+            return {'abertas': self._abertas, 'livres': self._livres.qsize(), 'aguardando': len(self._aguardando)}
+
+    def ocioso(self) -> bool:
+        """NENHUMA CONEXÃO EMPRESTADA, NINGUÉM ESPERANDO E NENHUMA ESCRITA AGRUPADA PENDENTE"""
+        with self._lock:
+            livre = self._livres.qsize() == self._abertas and not self._aguardando
+            return livre and (self._escritor is None or self._escritor.ocioso())
+
+    @property
+    def escritor(self) -> 'EscritorAgrupado':
+        """GROUP COMMIT SOBRE ESTE POOL (CRIADO NO PRIMEIRO USO; SÓ FAZ SENTIDO NO POOL DE ESCRITA)"""
+        with self._lock:
+            if self._escritor is None:
+                self._escritor = EscritorAgrupado(self)
+            return self._escritor
+
+    def descartar(self, conn: sqlite3.Connection):
+        with self._lock:
+            self._abertas -= 1
+        conn.close()
+
+    @contextmanager
+    def conexao(self):
+        conn = self.obter()
+        try:
+            yield conn
+        finally:
+            self.devolver(conn)
+
+    def fechar(self):
+        # GRAVA O QUE JÁ ESTAVA NA FILA DO GROUP COMMIT ANTES DE FECHAR AS CONEXÕES
+        with self._lock:
+            escritor, self._escritor = self._escritor, None
+        if escritor is not None:
+            escritor.parar()
+        while True:
+            try:
+                conn = self._livres.get_nowait()
+            except queue.Empty:
+                break
+            self.descartar(conn)
+
+
+class EscritorAgrupado:
+    """GROUP COMMIT: OPERAÇÕES DE VÁRIAS REQUISIÇÕES NUMA SÓ TRANSAÇÃO DA FAIXA DE ESCRITA.
+    funcao(conn, *args) NÃO FAZ COMMIT; O RESULTADO (EX.: lastrowid) CHEGA DEPOIS DO COMMIT DO GRUPO"""
+
+    def __init__(self, pool: PoolConexoes, espera_ms: float = ESCRITA_GRUPO_ESPERA_MS,
+                 maximo: int = ESCRITA_GRUPO_MAXIMO):
+        self.pool = pool
+        self.espera = espera_ms / 1000
+        self.maximo = maximo
+        self.grupos = 0      # transações gravadas
+        self.operacoes = 0   # operações gravadas (operacoes / grupos = tamanho médio do grupo)
+        self._fila = queue.SimpleQueue()
+        self._ocupado = False
+        self._thread = threading.Thread(target=self._laco, name="escritor-agrupado", daemon=True)
+        self._thread.start()
+
+    def enviar(self, funcao, /, *args) -> Future:
+        futuro = Future()
+        # O CONTEXTO LEVA O RASTRO DA REQUISIÇÃO: O SQL DE CADA OPERAÇÃO CONTA PARA QUEM A ENVIOU
+        self._fila.put((funcao, args, futuro, contextvars.copy_context()))
+        return futuro
+
+    async def executar(self, funcao, /, *args):
+        """ENVIA A OPERAÇÃO E ESPERA O COMMIT NO EVENT LOOP, SEM OCUPAR THREAD"""
+        return await asyncio.wrap_future(self.enviar(funcao, *args))
+
+    def ocioso(self) -> bool:
+        return not self._ocupado and self._fila.empty()
+
+    def parar(self, timeout: float = 10):
+        self._fila.put(None)
+        self._thread.join(timeout)
+
+    def _laco(self):
+        while True:
+            item = self._fila.get()
+            if item is None:
+                return
+            self._ocupado = True
+            grupo, parar = [item], False
+            # SÓ ESPERA A JANELA COM CONCORRÊNCIA (JÁ HÁ OUTRA NA FILA); ESCRITA SOLITÁRIA GRAVA NA HORA
+            limite = time.monotonic() + (self.espera if not self._fila.empty() else 0)
+            while len(grupo) < self.maximo:
+                try:
+                    restante = limite - time.monotonic()
+                    proximo = self._fila.get(timeout=restante) if restante > 0 else self._fila.get_nowait()
+                except queue.Empty:
+                    break
+                if proximo is None:
+                    parar = True
+                    break
+                grupo.append(proximo)
+            self._gravar(grupo)
+            self._ocupado = False
+            if parar:
+                return
+
+    def _gravar(self, grupo: list):
+        resultados = []
+        try:
+            with self.pool.conexao() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                for funcao, args, futuro, contexto in grupo:
+                    if not futuro.set_running_or_notify_cancel():
+                        continue
+                    conn.execute("SAVEPOINT operacao")
+                    try:
+                        resultado = contexto.run(funcao, conn, *args)
+                    except Exception as erro:
+                        conn.execute("ROLLBACK TO operacao")
+                        conn.execute("RELEASE operacao")
+                        resultados.append((futuro, erro, True))
+                        continue
+                    conn.execute("RELEASE operacao")
+                    resultados.append((futuro, resultado, False))
+                conn.commit()
+        except Exception as erro:
+            # BEGIN/COMMIT FALHOU (DISCO CHEIO, LOCK): NADA DO GRUPO FOI GRAVADO
+            for _, _, futuro, _ in grupo:
+                if not futuro.done():
+                    futuro.set_exception(erro)
+            return
+        self.grupos += 1
+        self.operacoes += len(resultados)
+        for futuro, valor, falhou in resultados:
+            if falhou:
+                futuro.set_exception(valor)
+            else:
+                futuro.set_result(valor)
+
+
+class RoteadorShards:
+    """UM ARQUIVO SQLITE POR usuario_id: POOLS ABERTOS SOB DEMANDA, OS OCIOSOS MAIS ANTIGOS SÃO FECHADOS"""
+
+    def __init__(self, diretorio: str, preparar, max_abertos: int = DB_SHARDS_MAX_ABERTOS,
+                 tamanho_pool: int = DB_SHARD_POOL_SIZE):
+        self.diretorio = diretorio
+        self.preparar = preparar  # preparar(conn): cria/migra o schema de dados do shard
+        self.max_abertos = max_abertos
+        self.tamanho_pool = tamanho_pool
+        self._abertos = OrderedDict()  # usuario_id -> (pool_leitura, pool_escrita), do menos para o mais recente
+        self._preparados = set()
+        self._lock = threading.Lock()
+        self._lock_preparo = threading.Lock()
+        os.makedirs(diretorio, exist_ok=True)
+
+    def caminho(self, usuario_id: int) -> str:
+        return os.path.join(self.diretorio, f"{int(usuario_id)}_atendimentos.db")
+
+    def _aberto(self, usuario_id: int):
+        with self._lock:
+            pools = self._abertos.get(usuario_id)
+            if pools is not None:
+                self._abertos.move_to_end(usuario_id)
+            return pools
+
+    def pools(self, usuario_id: int) -> tuple:
+        """(pool_leitura, pool_escrita) DO SHARD; NO PRIMEIRO ACESSO DO PROCESSO, CRIA/MIGRA O SCHEMA (BLOQUEANTE)"""
+        pools = self._aberto(usuario_id)
+        if pools is not None:
+            return pools
+
+        caminho = self.caminho(usuario_id)
+        if usuario_id not in self._preparados:
+            with self._lock_preparo:
+                if usuario_id not in self._preparados:
+                    # OUTROS WORKERS PODEM ESTAR ABRINDO O MESMO SHARD AO MESMO TEMPO
+                    with trava_entre_processos(caminho):
+                        conn = abrir_conexao(caminho)
+                        try:
+                            self.preparar(conn)
+                        finally:
+                            conn.close()
+                    self._preparados.add(usuario_id)
+
+        with self._lock:
+            pools = self._abertos.get(usuario_id)
+            if pools is None:
+                pools = (PoolConexoes(self.tamanho_pool, caminho), PoolConexoes(1, caminho))
+                self._abertos[usuario_id] = pools
+                self._despejar_ociosos()
+            return pools
+
+    async def pools_async(self, usuario_id: int) -> tuple:
+        pools = self._aberto(usuario_id)
+        if pools is not None:
+            return pools
+        return await run_in_threadpool(self.pools, usuario_id)
+
+    def _despejar_ociosos(self):
+        # CHAMAR COM self._lock. SHARDS EM USO NUNCA SÃO FECHADOS: SE TODOS ESTIVEREM
+        # OCUPADOS, O LIMITE É ULTRAPASSADO ATÉ ALGUM FICAR OCIOSO. UM POOL DESPEJADO
+        # CONTINUA VÁLIDO PARA QUEM JÁ TINHA A REFERÊNCIA (AS CONEXÕES FECHAM NO GC)
+        for usuario_id in list(self._abertos):
+            if len(self._abertos) <= self.max_abertos:
+                break
+            leitura, escrita = self._abertos[usuario_id]
+            if leitura.ocioso() and escrita.ocioso():
+                del self._abertos[usuario_id]
+                leitura.fechar()
+                escrita.fechar()
+
+    def fechar(self):
+        with self._lock:
+            for leitura, escrita in self._abertos.values():
+                leitura.fechar()
+                escrita.fechar()
+            self._abertos.clear()
+
+
+pool_leitura = PoolConexoes(DB_POOL_SIZE)
+pool_escrita = PoolConexoes(1)  # faixa única de escrita
+
+
+async def obter_conexao():
+    """DEPENDENCY: CONEXÃO DE LEITURA DO POOL"""
+    conn = await pool_leitura.obter_async()
+    try:
+        yield conn
+    finally:
+        pool_leitura.devolver(conn)
+
+
+async def obter_conexao_escrita():
+    """DEPENDENCY: CONEXÃO DA FAIXA ÚNICA DE ESCRITA"""
+    conn = await pool_escrita.obter_async()
+    try:
+        yield conn
+    finally:
+        pool_escrita.devolver(conn)
+
+
+def fechar_conexoes():
+    pool_leitura.fechar()
+    pool_escrita.fechar()
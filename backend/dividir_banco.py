@@ -0,0 +1,100 @@
+"""
+SEPARA O BANCO ÚNICO EM UM BANCO POR PROFISSIONAL (SHARDS)
+
+Copia clientes, atendimentos (com as anotações arquivadas), agenda, sequências
+de código e versão de cada usuário de DB_NAME para
+DB_SHARDS_DIR/{usuario_id}_atendimentos.db, com o schema
+completo (índices, triggers e busca). O banco de origem continua sendo o
+catálogo de usuários; os dados copiados só são apagados dele com --limpar.
+
+    cd backend
+    python dividir_banco.py            # depois: DB_SHARDS=1 python -m uvicorn main:app
+"""
+import argparse
+import os
+import time
+
+from config import DB_NAME, DB_SHARDS_DIR
+from database import abrir_conexao, RoteadorShards
+from nomes import normalizar_nome
+
+TABELAS_DADOS = ('clientes', 'atendimentos', 'sequencias_clientes', 'arquivo_dicionarios', 'atendimentos_arquivo',
+                 'agendamentos', 'agendamentos_excecoes')
+
+
+def colunas(conn, esquema: str, tabela: str) -> list:
+    return [linha[1] for linha in conn.execute(f"PRAGMA {esquema}.table_info({tabela})")]
+
+
+def copiar_usuario(origem: str, caminho_shard: str, usuario_id: int, criar_schema_dados) -> dict:
+    """COPIA OS DADOS DE UM USUÁRIO PARA O SHARD (QUE DEVE ESTAR VAZIO) NUMA ÚNICA TRANSAÇÃO"""
+    conn = abrir_conexao(caminho_shard)
+    try:
+        criar_schema_dados(conn)
+        if conn.execute("SELECT 1 FROM clientes LIMIT 1").fetchone():
+            raise RuntimeError(f"{caminho_shard} já tem dados; apague o arquivo para copiar de novo")
+        conn.execute("ATTACH DATABASE ? AS origem", (origem,))
+        copiadas = {}
+        with conn:
+            for tabela in TABELAS_DADOS:
+                comuns = [c for c in colunas(conn, 'main', tabela) if c in colunas(conn, 'origem', tabela)
+                          and c != 'nome_normalizado']
+                lista = ', '.join(comuns)
+                cursor = conn.execute(
+                    f"INSERT OR REPLACE INTO main.{tabela} ({lista}) SELECT {lista} FROM origem.{tabela} WHERE usuario_id = ?",
+                    (usuario_id,)
+                )
+                copiadas[tabela] = cursor.rowcount
+                if tabela == 'clientes':
+                    # CALCULADO AQUI, COMO NO CADASTRO (A ORIGEM PODE SER ANTERIOR À COLUNA)
+                    conn.executemany("UPDATE main.clientes SET nome_normalizado = ? WHERE id = ?", [
+                        (normalizar_nome(nome), cliente_id)
+                        for cliente_id, nome in conn.execute("SELECT id, nome_completo FROM main.clientes").fetchall()
+                    ])
+            # VERSÃO ACIMA DA ORIGEM: ETAGS EMITIDOS PELO BANCO ÚNICO NÃO CONFEREM COM O SHARD
+            conn.execute("""
+                INSERT OR REPLACE INTO versoes_usuario (usuario_id, versao)
+                SELECT ?, COALESCE((SELECT versao FROM origem.versoes_usuario WHERE usuario_id = ?), 0) + 1
+            """, (usuario_id, usuario_id))
+        conn.execute("DETACH DATABASE origem")
+        return copiadas
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--origem", default=DB_NAME, help="banco único (padrão: DB_NAME)")
+    parser.add_argument("--destino", default=DB_SHARDS_DIR, help="pasta dos shards (padrão: DB_SHARDS_DIR)")
+    parser.add_argument("--limpar", action="store_true", help="apaga da origem os dados copiados e faz VACUUM")
+    args = parser.parse_args()
+
+    from main import criar_schema_dados
+
+    roteador = RoteadorShards(args.destino, criar_schema_dados)
+    origem = os.path.abspath(args.origem)
+    conn = abrir_conexao(origem)
+    criar_schema_dados(conn)  # A ORIGEM PRECISA ESTAR COM AS MIGRAÇÕES EM DIA
+    usuarios = [linha[0] for linha in conn.execute(
+        "SELECT id FROM usuarios UNION SELECT DISTINCT usuario_id FROM clientes ORDER BY 1"
+    )]
+    conn.close()
+
+    inicio = time.perf_counter()
+    for usuario_id in usuarios:
+        copiadas = copiar_usuario(origem, roteador.caminho(usuario_id), usuario_id, criar_schema_dados)
+        print({"usuario_id": usuario_id, "shard": roteador.caminho(usuario_id), **copiadas})
+    print(f"{len(usuarios)} shards em {time.perf_counter() - inicio:.1f}s")
+
+    if args.limpar:
+        conn = abrir_conexao(origem)
+        with conn:
+            for tabela in ('versoes_usuario',) + TABELAS_DADOS[::-1]:
+                conn.execute(f"DELETE FROM {tabela}")
+        conn.execute("VACUUM")
+        conn.close()
+        print("Dados removidos do banco de origem (usuários mantidos).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import csv
+import io
+import json
+import zlib
+
+from arquivo import preencher_arquivados
+from config import EXPORTACAO_BLOCO_BYTES
+from criptografia import CAMPOS_CLIENTE_CIFRADOS, CAMPOS_ATENDIMENTO_CIFRADOS
+
+# EXPORTAÇÃO EM STREAMING
+# Uma única consulta (clientes LEFT JOIN atendimentos, ordenada por cliente) é
+# percorrida com fetchmany, e cada linha é serializada e enviada em blocos:
+# a memória não cresce com o número de atendimentos.
+
+COLUNAS_CLIENTE = ['id', 'codigo_cliente', 'nome_completo', 'email', 'telefone',
+                   'data_nascimento', 'endereco', 'status', 'data_registro']
+COLUNAS_ATENDIMENTO = ['id', 'data_atendimento', 'duracao_minutos', 'conteudo', 'data_registro']
+
+FORMATOS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'json': ('application/json', 'json'),
+}
+
+
+def consultar_prontuario(conn, usuario_id: int, cliente_id: int = None, tamanho_lote: int = 500, cifrador=None):
+    """GERA (cliente, atendimento_ou_None) EM ORDEM DE CLIENTE E DATA; COM cifrador, DECIFRA LOTE A LOTE"""
+    selecao = ', '.join(
+        [f'c.{coluna} AS c_{coluna}' for coluna in COLUNAS_CLIENTE]
+        + [f'a.{coluna} AS a_{coluna}' for coluna in COLUNAS_ATENDIMENTO]
+    )
+    filtro = "c.usuario_id = ?"
+    parametros = [usuario_id]
+    if cliente_id is not None:
+        filtro += " AND c.id = ?"
+        parametros.append(cliente_id)
+    cursor = conn.execute(f"""
+        SELECT {selecao}
+        FROM clientes c
+        LEFT JOIN atendimentos a ON a.usuario_id = c.usuario_id AND a.cliente_id = c.id
+        WHERE {filtro}
+        ORDER BY c.id, a.data_atendimento, a.id
+    """, parametros)
+    while True:
+        linhas = cursor.fetchmany(tamanho_lote)
+        if not linhas:
+            break
+        pares = []
+        for linha in linhas:
+            cliente = {coluna: linha[f'c_{coluna}'] for coluna in COLUNAS_CLIENTE}
+            atendimento = None
+            if linha['a_id'] is not None:
+                atendimento = {coluna: linha[f'a_{coluna}'] for coluna in COLUNAS_ATENDIMENTO}
+            pares.append((cliente, atendimento))
+        atendimentos = [atendimento for _, atendimento in pares if atendimento is not None]
+        preencher_arquivados(conn, atendimentos, [atendimento['id'] for atendimento in atendimentos])
+        if cifrador is not None:
+            cifrador.decifrar_itens([cliente for cliente, _ in pares], CAMPOS_CLIENTE_CIFRADOS)
+            cifrador.decifrar_itens(atendimentos, CAMPOS_ATENDIMENTO_CIFRADOS)
+        yield from pares
+
+
+def gerar_ndjson(linhas):
+    # UMA LINHA POR CLIENTE E UMA POR ATENDIMENTO, COM O CAMPO "tipo"
+    cliente_atual = None
+    for cliente, atendimento in linhas:
+        if cliente['id'] != cliente_atual:
+            cliente_atual = cliente['id']
+            yield json.dumps({'tipo': 'cliente', **cliente}, ensure_ascii=False) + '\n'
+        if atendimento is not None:
+            yield json.dumps({'tipo': 'atendimento', 'cliente_id': cliente_atual, **atendimento}, ensure_ascii=False) + '\n'
+
+
+def gerar_csv(linhas):
+    # PLANO: UMA LINHA POR ATENDIMENTO COM OS DADOS DO CLIENTE (CLIENTE SEM ATENDIMENTO = UMA LINHA)
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow([f'cliente_{coluna}' for coluna in COLUNAS_CLIENTE]
+                      + [f'atendimento_{coluna}' for coluna in COLUNAS_ATENDIMENTO])
+    for cliente, atendimento in linhas:
+        atendimento = atendimento or {}
+        escritor.writerow([cliente[coluna] for coluna in COLUNAS_CLIENTE]
+                          + [atendimento.get(coluna) for coluna in COLUNAS_ATENDIMENTO])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def gerar_json(linhas):
+    # {"clientes": [{..., "atendimentos": [...]}, ...]} ESCRITO AOS PEDAÇOS
+    yield '{"clientes": ['
+    cliente_atual = None
+    primeiro_atendimento = True
+    for cliente, atendimento in linhas:
+        if cliente['id'] != cliente_atual:
+            if cliente_atual is not None:
+                yield ']},'
+            cliente_atual = cliente['id']
+            yield json.dumps(cliente, ensure_ascii=False)[:-1] + ', "atendimentos": ['
+            primeiro_atendimento = True
+        if atendimento is not None:
+            yield ('' if primeiro_atendimento else ',') + json.dumps(atendimento, ensure_ascii=False)
+            primeiro_atendimento = False
+    if cliente_atual is not None:
+        yield ']}'
+    yield ']}\n'
+
+
+GERADORES = {'ndjson': gerar_ndjson, 'csv': gerar_csv, 'json': gerar_json}
+
+
+def em_blocos(textos, tamanho: int = EXPORTACAO_BLOCO_BYTES):
+    """JUNTA OS PEDAÇOS EM BLOCOS DE ~tamanho BYTES (MENOS IDAS AO THREADPOOL POR RESPOSTA)"""
+    partes, acumulado = [], 0
+    for texto in textos:
+        dados = texto.encode('utf-8')
+        partes.append(dados)
+        acumulado += len(dados)
+        if acumulado >= tamanho:
+            yield b''.join(partes)
+            partes, acumulado = [], 0
+    if partes:
+        yield b''.join(partes)
+
+
+def comprimir_gzip(blocos):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: formato gzip
+    for bloco in blocos:
+        comprimido = compressor.compress(bloco)
+        if comprimido:
+            yield comprimido
+    yield compressor.flush()
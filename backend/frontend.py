@@ -0,0 +1,157 @@
+"""
+FRONTEND SERVIDO PELA PRÓPRIA API (FRONTEND=1)
+
+Na inicialização, lê FRONTEND_DIR e monta tudo em memória:
+  - CSS/JS ganham o hash do conteúdo no nome (style.3f2a9c1b0e.css) e são
+    servidos em {FRONTEND_PREFIXO}/assets/ com Cache-Control immutable de um
+    ano: o navegador nem pergunta de novo, e uma versão nova tem outro nome
+  - as páginas HTML têm as referências reescritas para esses nomes e saem com
+    no-cache + ETag: cada visita revalida a página (304 sem corpo) e só baixa
+    o que mudou
+  - variantes gzip e brotli (pip install brotli) de cada arquivo, geradas uma
+    vez e escolhidas pelo Accept-Encoding (Vary: Accept-Encoding)
+Na mesma origem da API, o fetch do frontend deixa de ser cross-origin e os
+preflights (OPTIONS antes de cada requisição com Authorization) somem.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+from fastapi import APIRouter, Request, Response
+from fastapi.responses import RedirectResponse
+
+from config import FRONTEND_DIR, FRONTEND_PREFIXO, FRONTEND_CACHE_MAX_AGE, FRONTEND_COMPRESSAO_MINIMA
+
+try:
+    import brotli
+except ImportError:  # SÓ gzip
+    brotli = None
+
+EXTENSOES_COM_HASH = ('.css', '.js')
+PAGINA_INICIAL = 'login.html'
+CACHE_IMUTAVEL = f"public, max-age={FRONTEND_CACHE_MAX_AGE}, immutable"
+CACHE_PAGINA = "no-cache"
+
+# REFERÊNCIAS LOCAIS NAS PÁGINAS: href="style.css", src="auth.js"
+REFERENCIA = re.compile(r'''(href|src)="([^"?#:]+)"''')
+
+
+class Recurso:
+    """UM ARQUIVO PRONTO PARA SERVIR: {codificação: (corpo, ETag)}"""
+    __slots__ = ('tipo', 'cache_control', 'variantes')
+
+    def __init__(self, tipo: str, cache_control: str, dados: bytes):
+        self.tipo = tipo
+        self.cache_control = cache_control
+        digest = hashlib.sha256(dados).hexdigest()[:20]
+        self.variantes = {'identity': (dados, f'"{digest}"')}
+        if len(dados) >= FRONTEND_COMPRESSAO_MINIMA and self.comprimivel(tipo):
+            # SÓ FICA A VARIANTE QUE REALMENTE ECONOMIZA; O ETag MUDA COM A CODIFICAÇÃO
+            comprimidos = {'gzip': gzip.compress(dados, 9, mtime=0)}
+            if brotli is not None:
+                comprimidos['br'] = brotli.compress(dados, quality=11)
+            for codificacao, corpo in comprimidos.items():
+                if len(corpo) < len(dados):
+                    self.variantes[codificacao] = (corpo, f'"{digest}-{codificacao}"')
+
+    @staticmethod
+    def comprimivel(tipo: str) -> bool:
+        return tipo.startswith('text/') or tipo in ('application/javascript', 'application/json', 'image/svg+xml')
+
+
+def tipo_do_arquivo(nome: str) -> str:  # O STARLETTE ACRESCENTA O charset=utf-8 AOS text/*
+    if nome.endswith('.js'):
+        return 'text/javascript'
+    return mimetypes.guess_type(nome)[0] or 'application/octet-stream'
+
+
+def nome_com_hash(nome: str, dados: bytes) -> str:
+    base, extensao = os.path.splitext(nome)
+    return f"{base}.{hashlib.sha256(dados).hexdigest()[:10]}{extensao}"
+
+
+def montar_frontend(diretorio: str = FRONTEND_DIR, prefixo: str = FRONTEND_PREFIXO) -> dict:
+    """LÊ O DIRETÓRIO DO FRONTEND E DEVOLVE {caminho da URL (sem o prefixo): Recurso}"""
+    recursos, renomeados, paginas = {}, {}, {}
+    for nome in sorted(os.listdir(diretorio)):
+        caminho = os.path.join(diretorio, nome)
+        if not os.path.isfile(caminho) or nome.startswith('.'):
+            continue
+        with open(caminho, 'rb') as arquivo:
+            dados = arquivo.read()
+        if nome.endswith('.html'):
+            paginas[nome] = dados.decode('utf-8')
+        elif nome.endswith(EXTENSOES_COM_HASH):
+            renomeados[nome] = f"assets/{nome_com_hash(nome, dados)}"
+            recursos[renomeados[nome]] = Recurso(tipo_do_arquivo(nome), CACHE_IMUTAVEL, dados)
+        else:
+            recursos[nome] = Recurso(tipo_do_arquivo(nome), CACHE_PAGINA, dados)
+
+    def reescrever(encontrado):
+        atributo, alvo = encontrado.groups()
+        if alvo not in renomeados:
+            return encontrado.group(0)
+        return f'{atributo}="{prefixo}/{renomeados[alvo]}"'
+
+    for nome, html in paginas.items():
+        html = REFERENCIA.sub(reescrever, html)
+        # API NA MESMA ORIGEM: auth.js LÊ A BASE DAS URLs DESTA META (VAZIA = MESMA ORIGEM)
+        html = re.sub(r'<head[^>]*>', lambda cabecalho: f'{cabecalho.group(0)}\n    <meta name="api-base" content="">', html, count=1)
+        recursos[nome] = Recurso(tipo_do_arquivo(nome), CACHE_PAGINA, html.encode('utf-8'))
+    if PAGINA_INICIAL in recursos:
+        recursos[''] = recursos[PAGINA_INICIAL]
+    return recursos
+
+
+def escolher_codificacao(accept_encoding: str, disponiveis) -> str:
+    """br > gzip > identity, ENTRE AS QUE O NAVEGADOR ACEITA (q > 0)"""
+    aceitas = {}
+    for parte in (accept_encoding or '').split(','):
+        nome, _, parametros = parte.partition(';')
+        peso = 1.0
+        parametros = parametros.strip().replace(' ', '')
+        if parametros.startswith('q='):
+            try:
+                peso = float(parametros[2:])
+            except ValueError:
+                peso = 0.0
+        if nome.strip():
+            aceitas[nome.strip().lower()] = peso
+    for codificacao in ('br', 'gzip'):
+        if codificacao in disponiveis and aceitas.get(codificacao, aceitas.get('*', 0.0)) > 0:
+            return codificacao
+    return 'identity'
+
+
+def etag_confere(if_none_match, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    return any(valor.strip().removeprefix('W/') in (etag, '*') for valor in if_none_match.split(','))
+
+
+def criar_rotas(recursos: dict, prefixo: str = FRONTEND_PREFIXO) -> APIRouter:
+    router = APIRouter(include_in_schema=False)
+
+    @router.get("/")
+    async def raiz():
+        return RedirectResponse(f"{prefixo}/")
+
+    @router.api_route(prefixo + "/{caminho:path}", methods=["GET", "HEAD"])
+    async def servir_frontend(caminho: str, request: Request):
+        recurso = recursos.get(caminho)
+        if recurso is None:
+            return Response(status_code=404)
+        codificacao = escolher_codificacao(request.headers.get('accept-encoding'), recurso.variantes)
+        corpo, etag = recurso.variantes[codificacao]
+        headers = {'ETag': etag, 'Cache-Control': recurso.cache_control}
+        if len(recurso.variantes) > 1:
+            headers['Vary'] = 'Accept-Encoding'
+        if etag_confere(request.headers.get('if-none-match'), etag):
+            return Response(status_code=304, headers=headers)
+        if codificacao != 'identity':
+            headers['Content-Encoding'] = codificacao
+        return Response(content=corpo, media_type=recurso.tipo, headers=headers)
+
+    return router
@@ -0,0 +1,74 @@
+import csv
+import io
+import json
+from itertools import islice
+
+from pydantic import ValidationError
+
+# LEITURA E VALIDAÇÃO INCREMENTAL DE ARQUIVOS DE IMPORTAÇÃO
+# O arquivo é lido linha a linha (o UploadFile já fica em disco quando é
+# grande), então a memória depende do tamanho do lote, não do arquivo.
+
+FORMATOS = ('csv', 'ndjson')
+
+
+def detectar_formato(nome_arquivo: str, content_type: str, formato: str = None) -> str:
+    if formato:
+        formato = formato.lower()
+    elif (nome_arquivo or '').lower().endswith(('.ndjson', '.jsonl')) or 'ndjson' in (content_type or ''):
+        formato = 'ndjson'
+    else:
+        formato = 'csv'
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato '{formato}' não suportado. Use csv ou ndjson.")
+    return formato
+
+
+def ler_registros(arquivo, formato: str):
+    """GERA (numero_da_linha, dict_ou_erro) SEM CARREGAR O ARQUIVO INTEIRO"""
+    texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', errors='strict', newline='')
+    numero = 0
+    try:
+        if formato == 'csv':
+            leitor = csv.DictReader(texto)
+            for registro in leitor:
+                numero = leitor.line_num
+                # CÉLULA VAZIA NO CSV = CAMPO NÃO INFORMADO
+                yield numero, {chave: (valor if valor != '' else None) for chave, valor in registro.items()}
+        else:
+            for numero, linha in enumerate(texto, start=1):
+                if not linha.strip():
+                    continue
+                try:
+                    registro = json.loads(linha)
+                except json.JSONDecodeError as e:
+                    yield numero, ValueError(f"JSON inválido: {e.msg}")
+                    continue
+                if not isinstance(registro, dict):
+                    yield numero, ValueError("Cada linha deve ser um objeto JSON")
+                    continue
+                yield numero, registro
+    except UnicodeDecodeError:
+        # O ARQUIVO É DECODIFICADO EM BLOCOS: NADA DEPOIS DA ÚLTIMA LINHA ENTREGUE FOI LIDO
+        yield numero + 1, ValueError("Arquivo não está em UTF-8 (salve-o como UTF-8); a leitura parou aqui e "
+                                     "esta linha e as seguintes não foram importadas")
+    except csv.Error as e:
+        yield numero + 1, ValueError(f"CSV inválido: {e}; a leitura parou aqui e esta linha e as seguintes não foram importadas")
+    finally:
+        texto.detach()
+
+
+def validar_lote(registros, modelo, tamanho: int):
+    """LÊ ATÉ `tamanho` REGISTROS E SEPARA (validos, erros) — validos: [(linha, modelo, dict)]"""
+    validos, erros = [], []
+    for numero, registro in islice(registros, tamanho):
+        if isinstance(registro, Exception):
+            erros.append((numero, [str(registro)]))
+            continue
+        try:
+            validos.append((numero, modelo(**registro), registro))
+        except ValidationError as e:
+            erros.append((numero, [f"{'.'.join(str(p) for p in erro['loc'])}: {erro['msg']}" for erro in e.errors()]))
+        except TypeError as e:
+            erros.append((numero, [str(e)]))
+    return validos, erros
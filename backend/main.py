@@ -1,26 +1,98 @@
-from fastapi import FastAPI, HTTPException, APIRouter, Depends
+from fastapi import FastAPI, HTTPException, APIRouter, Depends, Query, Request, Response, BackgroundTasks, UploadFile, File
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer
 from fastapi import Header
 from pydantic import BaseModel, Field, field_validator
+from contextlib import asynccontextmanager
+import calendar
+import functools
 from datetime import date, datetime, timedelta
 import sqlite3
-import bcrypt
-from typing import List, Optional
+import asyncio
+import threading
+from typing import List, Optional, Literal
 from fastapi.exceptions import ResponseValidationError
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
 import jwt
 from config import (
     DB_NAME, SECRET_KEY, ALGORITHM,
     ACCESS_TOKEN_EXPIRE_MINUTES, CORS_ORIGINS,
-    #ENABLE_GOOGLE_DRIVE_SYNC, SYNC_INTERVAL_SECONDS
+    PAGINACAO_LIMITE_PADRAO, PAGINACAO_LIMITE_MAXIMO, FTS_LOTE_BACKFILL,
+    BUSCA_NOMES_LIMITE_PADRAO, BUSCA_NOMES_LIMITE_MAXIMO,
+    TOKEN_CACHE_TAMANHO, TOKEN_CACHE_TTL_SECONDS, IMPORTACAO_LOTE, IMPORTACAO_MAX_ERROS,
+    EXPORTACAO_MAX_SIMULTANEAS, RESPOSTAS_CACHE_TAMANHO, DB_SHARDS_ATIVO, DB_SHARDS_DIR,
+    CRIPTOGRAFIA_ATIVA, CIPTHER_SUITE_PASSWORD, CIPTHER_SUITE_PASSWORD_PADRAO, CRIPTOGRAFIA_CHAVE_TTL_SECONDS, CRIPTOGRAFIA_CACHE_TAMANHO, CRIPTOGRAFIA_LOTE_MIGRACAO,
+    ENABLE_GOOGLE_DRIVE_SYNC, SYNC_INTERVAL_SECONDS, METRICAS_ATIVAS, METRICAS_TOKEN, METRICAS_SERVER_TIMING,
+    ESCRITA_AGRUPADA, ARQUIVO_IDADE_DIAS, ARQUIVO_INTERVALO_SECONDS, WORKERS, LIDERANCA_INTERVALO_SECONDS,
+    FRONTEND_ATIVO, AGENDA_DURACAO_MAXIMA_MINUTOS, AGENDA_INTERVALO_MAXIMO_SEMANAS
+)
+from database import (
+    abrir_conexao, pool_leitura, pool_escrita, fechar_conexoes, RoteadorShards,
+    rodar_no_banco, iterar_no_banco, handler_banco
+)
+from cache import CacheLRU
+import metricas
+from serializacao import RespostaJSON, linhas_para_dicts
+from importacao import detectar_formato, ler_registros, validar_lote
+from exportacao import FORMATOS as FORMATOS_EXPORTACAO, GERADORES, consultar_prontuario, em_blocos, comprimir_gzip
+from senhas import (
+    hash_senha_async, verificar_senha_async,
+    precisa_rehash, fechar_pool_hash, executar_no_pool_hash
+)
+from sincronizacao import Sincronizador, criar_armazenamento
+from resumos import criar_resumos, consultar_resumo
+from arquivo import criar_arquivo, arquivar_lote, restaurar_lote, preencher_arquivados
+from nomes import criar_busca_nomes, buscar_por_nome, normalizar_nome, normalizar_termo, cache_nomes
+from agendamentos import (
+    criar_agendamentos, gravar_agendamento, consultar_agenda, janela_calendario, localizar_ocorrencia,
+    registrar_excecao, remover_agendamento, hora_local, validar_data_agenda, formatar as formatar_horario
+)
+from frontend import montar_frontend, criar_rotas as criar_rotas_frontend
+from coerencia import trava_entre_processos, Lideranca, CanalInvalidacao, criar_invalidacoes, publicar_invalidacao
+from criptografia import (
+    AESGCM, Cifrador, CAMPOS_CLIENTE_CIFRADOS, CAMPOS_ATENDIMENTO_CIFRADOS, CAMPOS_AGENDAMENTO_CIFRADOS,
+    derivar_chave_async, chave_do_servidor, chave_do_servidor_padrao, nova_chave_dados, novo_salt, indice_email,
+    impressao_segredo
 )
 
+# MENSAGENS DA API NO LOGGER "prontuario" (HANDLER PADRÃO EM metricas.configurar_log)
+log = logging.getLogger('prontuario.api')
+metricas.configurar_log()
+
+# CICLO DE VIDA DA APLICAÇÃO
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # BACKUP INCREMENTAL (SYNC=1) E ARQUIVO DAS ANOTAÇÕES ANTIGAS (ARQUIVO_IDADE_DIAS > 0)
+    # EM SEGUNDO PLANO, SÓ NO WORKER LÍDER
+    tarefas = []
+    if sincronizador is not None or ARQUIVO_IDADE_DIAS > 0:
+        tarefas.append(asyncio.create_task(assumir_tarefas_de_fundo(tarefas)))
+    yield
+    for tarefa in tarefas:
+        tarefa.cancel()
+    lideranca.soltar()
+    # FECHA AS CONEXÕES DO POOL E O POOL DO BCRYPT AO DESLIGAR O SERVIDOR
+    canal_invalidacao.fechar()
+    fechar_conexoes()
+    if roteador_shards is not None:
+        roteador_shards.fechar()
+    fechar_pool_hash()
+
 # CONFIGURAÇÃO PRINCIPAL
 app = FastAPI(
     title='API de Gestão de Atendimentos',
     description='Para gerenciar Clientes, Atendimentos e Agendamentos com segurança.',
-    version='2.0.0  '
+    version='2.0.0  ',
+    lifespan=lifespan
 )
 
 # MIDDLEARE E DEBUG
@@ -32,11 +104,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Proximo-Cursor", "ETag"],
  )
 
+# MÉTRICAS: POR FORA DO CORS, PARA MEDIR A REQUISIÇÃO INTEIRA
+if METRICAS_ATIVAS:
+    app.add_middleware(metricas.MiddlewareMetricas, server_timing=METRICAS_SERVER_TIMING)
+
 @app.exception_handler(ResponseValidationError)
 async def response_validation_exception_handler(request, exc):
-    print(f'ERRO DE VALIDAÇÃO DA RESPOSTA para a requisição: {request.url}\nDetalhes: {exc}')
+    log.error('ERRO DE VALIDAÇÃO DA RESPOSTA para a requisição: %s\nDetalhes: %s', request.url, exc)
     return PlainTextResponse(str(exc), status_code=500)
 
 # SEGURANÇA HTTP
@@ -112,6 +189,119 @@ class AtendimentoResponse(Atendimento):
     cliente_id: int
     data_registro: datetime
 
+class BuscaClienteResponse(BaseModel):
+    id: int
+    codigo_cliente: str
+    nome_completo: str
+    status: str
+    ultima_sessao: Optional[date]
+
+class BuscaAtendimentoResponse(BaseModel):
+    id: int
+    cliente_id: int
+    nome_cliente: str
+    data_atendimento: date
+    duracao_minutos: int
+    trecho: str
+    relevancia: float
+
+# MODELO DA PÁGINA DO CLIENTE
+class EstatisticasCliente(BaseModel):
+    sessoes: int
+    minutos: int
+    ultima_sessao: Optional[date]
+
+class ClienteDetalhes(BaseModel):
+    cliente: ClienteResponse
+    estatisticas: EstatisticasCliente
+    atendimentos: List[AtendimentoResponse]  # primeira página, do mais recente ao mais antigo
+    proximo_cursor: Optional[str]
+
+# MODELOS DO DASHBOARD
+class ResumoMes(BaseModel):
+    mes: str  # AAAA-MM
+    sessoes: int
+    minutos: int
+
+class ClienteRecente(BaseModel):
+    cliente_id: int
+    nome_completo: str
+    ultima_sessao: date
+    sessoes: int
+
+class DashboardResumo(BaseModel):
+    clientes: int
+    clientes_ativos: int
+    sessoes: int
+    minutos: int
+    ultima_sessao: Optional[date]
+    mes_atual: ResumoMes
+    meses: List[ResumoMes]  # últimos 12 meses, do mais antigo ao atual
+    clientes_recentes: List[ClienteRecente]
+
+# MODELOS DA AGENDA
+class Agendamento(BaseModel):
+    cliente_id: int
+    inicio: datetime  # hora local; numa série, a primeira sessão
+    duracao_minutos: int = Field(50, ge=15, le=AGENDA_DURACAO_MAXIMA_MINUTOS)
+    intervalo_semanas: Optional[int] = Field(None, ge=1, le=AGENDA_INTERVALO_MAXIMO_SEMANAS)  # None = sessão avulsa
+    repetir_ate: Optional[date] = None  # última data da série; None = sem fim
+    observacao: Optional[str] = Field(None, max_length=500)
+
+    @field_validator('inicio')
+    @classmethod
+    def validar_inicio(cls, v: datetime):
+        return validar_data_agenda(hora_local(v))
+
+    @field_validator('repetir_ate')
+    @classmethod
+    def validar_repetir_ate(cls, v: Optional[date], info):
+        if v is not None and not info.data.get('intervalo_semanas'):
+            raise ValueError('repetir_ate só vale para sessões recorrentes (intervalo_semanas).')
+        inicio = info.data.get('inicio')
+        if v is not None and inicio is not None and v < inicio.date():
+            raise ValueError('repetir_ate não pode ser antes do início.')
+        return validar_data_agenda(v)
+
+class AgendamentoResponse(Agendamento):
+    id: int
+
+class OcorrenciaAgenda(BaseModel):
+    agendamento_id: int
+    cliente_id: int
+    nome_cliente: str
+    inicio: datetime
+    fim: datetime
+    duracao_minutos: int
+    recorrente: bool
+    atendimento_id: Optional[int]  # preenchido quando a sessão já virou atendimento
+    observacao: Optional[str]
+
+class ConversaoAtendimento(BaseModel):
+    ocorrencia: Optional[datetime] = None  # início da sessão; obrigatório nas séries
+    conteudo: str = Field(..., min_length=5, max_length=5000)
+
+    @field_validator('ocorrencia')
+    @classmethod
+    def validar_ocorrencia(cls, v: Optional[datetime]):
+        return validar_data_agenda(v)
+    duracao_minutos: Optional[int] = Field(None, ge=15, le=480)  # padrão: a duração agendada
+
+# MODELOS DE IMPORTAÇÃO EM MASSA
+class AtendimentoImportacao(Atendimento):
+    cliente_id: Optional[int] = None
+    codigo_cliente: Optional[str] = None
+
+class ErroImportacao(BaseModel):
+    linha: int
+    erros: List[str]
+
+class ImportacaoResponse(BaseModel):
+    total_linhas: int
+    importados: int
+    com_erro: int
+    erros: List[ErroImportacao]
+
 class SessaoResponse(BaseModel):
     id: int
     cliente_id: int
@@ -122,15 +312,40 @@ class SessaoResponse(BaseModel):
 
 # FUNÇÕES AUXILIARES
 
-# DB_NAME = 'atendimentos.db'
-# mudar isso depois para suportar múltiplos bancos (um por cliente):
-#  DB_NAME = f'{profissional_id}_atendimentos.db'
+BUSCA_DISPONIVEL = True
+
+# TOKENS JWT JÁ VERIFICADOS, CHAVEADOS PELO SHA-256 DO TOKEN
+cache_tokens = CacheLRU(TOKEN_CACHE_TAMANHO, TOKEN_CACHE_TTL_SECONDS)
+
+# UM BANCO POR PROFISSIONAL: com DB_SHARDS=1 os dados de cada usuário ficam em
+# DB_SHARDS_DIR/{usuario_id}_atendimentos.db e DB_NAME guarda só os usuários
+
+# O código do cliente é único por usuário (cada profissional tem sua numeração 2026/0001, ...)
+SQL_TABELA_CLIENTES = '''
+    CREATE TABLE IF NOT EXISTS {nome} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        codigo_cliente TEXT NOT NULL,
+        nome_completo TEXT NOT NULL,
+        email TEXT UNIQUE,
+        telefone TEXT,
+        data_nascimento DATE NOT NULL,
+        endereco TEXT,
+        status TEXT NOT NULL DEFAULT 'ativo',
+        data_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        aniversario_chave INTEGER,
+        nome_normalizado TEXT,
+        email_indice BLOB,
+        email_repetido INTEGER NOT NULL DEFAULT 0,
+        UNIQUE (usuario_id, codigo_cliente),
+        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+    );
+'''
 
 # FUNÇÕES AUXILIARES
 def criar_tabelas():
     """CRIA TABELAS DE DATABASE - BANCO DE DADOS"""
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
+    conn = abrir_conexao()
     cursor = conn.cursor()
 
     # TABELA DE USUÁRIOS
@@ -145,22 +360,32 @@ def criar_tabelas():
             data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         );
     ''') 
+    # Chaves da criptografia de campos (sempre embrulhadas; ver criptografia.py)
+    for coluna in ('cripto_salt BLOB', 'chave_senha BLOB', 'chave_recuperacao BLOB',
+                   'dados_cifrados INTEGER NOT NULL DEFAULT 0'):
+        if not coluna_existe(cursor, 'usuarios', coluna.split()[0]):
+            cursor.execute(f"ALTER TABLE usuarios ADD COLUMN {coluna}")
+    # Impressão do segredo do servidor que embrulhou chave_recuperacao (NULL: embrulhada
+    # pela resposta de segurança; X'': anterior a esta coluna, conferida no próximo login)
+    if not coluna_existe(cursor, 'usuarios', 'recuperacao_servidor'):
+        cursor.execute("ALTER TABLE usuarios ADD COLUMN recuperacao_servidor BLOB")
+        cursor.execute("UPDATE usuarios SET recuperacao_servidor = X'' WHERE chave_recuperacao IS NOT NULL")
+    conn.commit()
+    # AVISOS DE INVALIDAÇÃO ENTRE WORKERS (coerencia.py)
+    criar_invalidacoes(conn)
+
+    # COM SHARDS, O BANCO PRINCIPAL É SÓ O CATÁLOGO DE USUÁRIOS: CADA SHARD
+    # RECEBE O SCHEMA DE DADOS QUANDO É ABERTO PELA PRIMEIRA VEZ (RoteadorShards)
+    if not DB_SHARDS_ATIVO:
+        criar_schema_dados(conn)
+    conn.close()
+
+def criar_schema_dados(conn):
+    """CRIA E MIGRA AS TABELAS DE DADOS (CLIENTES, ATENDIMENTOS, ÍNDICES, TRIGGERS, BUSCA) NUM BANCO"""
+    cursor = conn.cursor()
+
     # TABELA DE CLIENTES
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS clientes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            usuario_id INTEGER NOT NULL,
-            codigo_cliente TEXT NOT NULL UNIQUE,
-            nome_completo TEXT NOT NULL,
-            email TEXT UNIQUE,
-            telefone TEXT,
-            data_nascimento DATE NOT NULL,
-            endereco TEXT,
-            status TEXT NOT NULL DEFAULT 'ativo',
-            data_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-        );
-    ''')
+    cursor.execute(SQL_TABELA_CLIENTES.format(nome='clientes'))
     # TABELA DE ATENDIMENTOS
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS atendimentos (
@@ -176,6 +401,78 @@ def criar_tabelas():
         );
     ''')
 
+    # ============================================
+    # MIGRAÇÕES DE BANCOS JÁ EXISTENTES
+    # ============================================
+
+    # Chave de aniversário (MMDD como inteiro, ex.: 15 de maio = 515)
+    if not coluna_existe(cursor, 'clientes', 'aniversario_chave'):
+        cursor.execute("ALTER TABLE clientes ADD COLUMN aniversario_chave INTEGER")
+        cursor.execute("UPDATE clientes SET aniversario_chave = CAST(strftime('%m%d', data_nascimento) AS INTEGER)")
+
+    # Bancos antigos tinham codigo_cliente UNIQUE global: o 2026/0001 do segundo
+    # profissional colidia com o do primeiro. Reconstrói a tabela com UNIQUE por usuário.
+    sql_clientes = cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'clientes'").fetchone()[0]
+    if 'UNIQUE (usuario_id, codigo_cliente)' not in sql_clientes:
+        reconstruir_tabela_clientes(conn)
+
+    # Sequência de códigos por (usuário, ano), populada a partir dos códigos existentes
+    if not tabela_existe(cursor, 'sequencias_clientes'):
+        cursor.execute('''
+            CREATE TABLE sequencias_clientes (
+                usuario_id INTEGER NOT NULL,
+                ano INTEGER NOT NULL,
+                ultimo_numero INTEGER NOT NULL,
+                PRIMARY KEY (usuario_id, ano)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            INSERT INTO sequencias_clientes (usuario_id, ano, ultimo_numero)
+            SELECT usuario_id, CAST(substr(codigo_cliente, 1, 4) AS INTEGER),
+                   MAX(CAST(substr(codigo_cliente, 6) AS INTEGER))
+            FROM clientes
+            WHERE codigo_cliente GLOB '[0-9][0-9][0-9][0-9]/[0-9]*'
+            GROUP BY 1, 2
+        ''')
+
+    # Triggers mantêm a chave de aniversário em qualquer INSERT/UPDATE
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_clientes_aniversario_insert
+        AFTER INSERT ON clientes
+        BEGIN
+            UPDATE clientes SET aniversario_chave = CAST(strftime('%m%d', NEW.data_nascimento) AS INTEGER)
+            WHERE id = NEW.id;
+        END;
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_clientes_aniversario_update
+        AFTER UPDATE OF data_nascimento ON clientes
+        BEGIN
+            UPDATE clientes SET aniversario_chave = CAST(strftime('%m%d', NEW.data_nascimento) AS INTEGER)
+            WHERE id = NEW.id;
+        END;
+    ''')
+
+    # Versão dos dados de cada usuário: qualquer escrita em clientes ou
+    # atendimentos (rotas, importação, triggers) incrementa o contador,
+    # que alimenta os ETags das rotas de leitura
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS versoes_usuario (
+            usuario_id INTEGER PRIMARY KEY,
+            versao INTEGER NOT NULL
+        )
+    ''')
+    for tabela in ('clientes', 'atendimentos'):
+        for evento, linha in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{tabela}_versao_{evento.lower()}
+                AFTER {evento} ON {tabela}
+                BEGIN
+                    INSERT INTO versoes_usuario (usuario_id, versao) VALUES ({linha}.usuario_id, 1)
+                    ON CONFLICT (usuario_id) DO UPDATE SET versao = versao + 1;
+                END;
+            ''')
+
     # ============================================
     # CRIAR ÍNDICES PARA PERFORMANCE
     # ============================================
@@ -198,20 +495,221 @@ def criar_tabelas():
     # Índice para buscar clientes por status
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_clientes_status ON clientes(status)")
 
+    # Índices da paginação por cursor (keyset): a listagem vira um range scan
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_clientes_usuario_status_nome ON clientes(usuario_id, status, nome_completo, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_atendimentos_usuario_cliente_data ON atendimentos(usuario_id, cliente_id, data_atendimento DESC, id DESC)")
+
+    # Índice para aniversariantes: a janela de dias vira um ou dois range scans
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_clientes_aniversario ON clientes(usuario_id, status, aniversario_chave)")
+
+    conn.commit()
+
+    # UNICIDADE DO EMAIL QUE SOBREVIVE À CRIPTOGRAFIA (VER criptografia.py)
+    criar_indice_email(conn)
+
+    # RESUMOS DO DASHBOARD (TABELAS AGREGADAS MANTIDAS POR TRIGGERS; VER resumos.py)
+    criar_resumos(conn)
+
+    # ARQUIVO COMPRIMIDO DAS ANOTAÇÕES ANTIGAS (VER arquivo.py)
+    criar_arquivo(conn)
+
+    # AGENDA (VER agendamentos.py)
+    criar_agendamentos(conn)
+
+    # BUSCA DE CLIENTES PELO NOME (AUTOCOMPLETE; VER nomes.py)
+    criar_busca_nomes(conn)
+
+    # BUSCA TEXTUAL NAS ANOTAÇÕES (FTS5)
+    criar_indice_busca(conn)
+
+def criar_indice_email(conn):
+    """CRIA clientes.email_indice COM ÍNDICE ÚNICO E PREENCHE AS LINHAS COM EMAIL EM TEXTO PURO
+    (AS JÁ CIFRADAS SÃO PREENCHIDAS NO PRÓXIMO LOGIN DO PROFISSIONAL, POR cifrar_dados_antigos)"""
+    for coluna in ('email_indice BLOB', 'email_repetido INTEGER NOT NULL DEFAULT 0'):
+        if not coluna_existe(conn.cursor(), 'clientes', coluna.split()[0]):
+            conn.execute(f"ALTER TABLE clientes ADD COLUMN {coluna}")
+    # OS NULL FICAM JUNTOS NO ÍNDICE: O LOGIN ACHA OS EMAILS AINDA SEM ÍNDICE SEM VARRER OS CLIENTES
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_clientes_email_indice ON clientes(email_indice)")
+    # REPETIDOS MARCADOS COM O PRÓPRIO id ANTES DA COLUNA email_repetido
+    conn.execute("UPDATE clientes SET email_indice = NULL, email_repetido = 1 WHERE typeof(email_indice) = 'integer'")
+
+    # ÍNDICE GERADO COM OUTRO SEGREDO DO SERVIDOR (OU DE ANTES DA IMPRESSÃO): REFEITO DO ZERO
+    conn.execute("CREATE TABLE IF NOT EXISTS indice_email_chave (impressao BLOB NOT NULL)")
+    impressao = conn.execute("SELECT impressao FROM indice_email_chave").fetchone()
+    if impressao is None or impressao[0] != impressao_segredo():
+        conn.execute("UPDATE clientes SET email_indice = NULL, email_repetido = 0 "
+                     "WHERE email_indice IS NOT NULL OR email_repetido")
+        conn.execute("DELETE FROM indice_email_chave")
+        conn.execute("INSERT INTO indice_email_chave (impressao) VALUES (?)", (impressao_segredo(),))
+
+    preencher_indice_email(conn, conn.execute(
+        "SELECT id, email FROM clientes "
+        "WHERE email IS NOT NULL AND email_indice IS NULL AND NOT email_repetido AND typeof(email) = 'text'"
+    ).fetchall())
     conn.commit()
-    conn.close()
 
-def obter_conexao():
-    """ABRE CONEXÃO COM O BANDO DE DADOS"""
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    return conn
+def preencher_indice_email(conn, linhas: list):
+    """GRAVA email_indice DE CADA (id, email EM TEXTO). UM EMAIL REPETIDO GRAVADO ANTES DO ÍNDICE
+    FICA SEM ÍNDICE E COM email_repetido = 1, PARA NÃO SER REPROCESSADO. NÃO FAZ COMMIT"""
+    for cliente_id, email in linhas:
+        try:
+            conn.execute("SAVEPOINT indice_email")
+            conn.execute("UPDATE clientes SET email_indice = ? WHERE id = ?", (indice_email(email), cliente_id))
+            conn.execute("RELEASE indice_email")
+        except sqlite3.IntegrityError:
+            conn.execute("ROLLBACK TO indice_email")
+            conn.execute("RELEASE indice_email")
+            log.warning('Cliente %s: email repetido de antes do índice cego, mantido sem unicidade', cliente_id)
+            conn.execute("UPDATE clientes SET email_repetido = 1 WHERE id = ?", (cliente_id,))
+
+def criar_indice_busca(conn):
+    """CRIA O ÍNDICE FTS5 DE atendimentos.conteudo E POPULA AS LINHAS EXISTENTES EM LOTES"""
+    global BUSCA_DISPONIVEL
+    try:
+        # Tabela de conteúdo externo: o texto fica só em atendimentos, o FTS guarda o índice
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS atendimentos_fts USING fts5(
+                conteudo, usuario_id,
+                content='atendimentos', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        # SQLite compilado sem FTS5: o resto da API funciona, só a busca fica indisponível
+        log.warning('Busca textual desativada: %s', e)
+        BUSCA_DISPONIVEL = False
+        return
+
+    # Os triggers só são criados depois do backfill completo; se o processo cair no meio,
+    # a próxima inicialização continua do último id indexado
+    trigger_existe = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_atendimentos_fts_insert'"
+    ).fetchone()
+    if not trigger_existe:
+        ultimo_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM atendimentos_fts_docsize").fetchone()[0]
+        while True:
+            lote = conn.execute(
+                "SELECT id, conteudo, usuario_id FROM atendimentos WHERE id > ? AND typeof(conteudo) = 'text' ORDER BY id LIMIT ?",
+                (ultimo_id, FTS_LOTE_BACKFILL)
+            ).fetchall()
+            if not lote:
+                break
+            conn.executemany(
+                "INSERT INTO atendimentos_fts(rowid, conteudo, usuario_id) VALUES (?, ?, ?)",
+                [tuple(linha) for linha in lote]
+            )
+            conn.commit()
+            ultimo_id = lote[-1]['id']
+    else:
+        # Triggers antigos indexavam qualquer valor; os novos ignoram anotações cifradas (BLOB)
+        sql_trigger = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_atendimentos_fts_insert'"
+        ).fetchone()[0]
+        if 'typeof' not in sql_trigger:
+            conn.executescript('''
+                DROP TRIGGER trg_atendimentos_fts_insert;
+                DROP TRIGGER IF EXISTS trg_atendimentos_fts_delete;
+                DROP TRIGGER IF EXISTS trg_atendimentos_fts_update;
+            ''')
+
+    conn.executescript('''
+        CREATE TRIGGER IF NOT EXISTS trg_atendimentos_fts_insert AFTER INSERT ON atendimentos BEGIN
+            INSERT INTO atendimentos_fts(rowid, conteudo, usuario_id)
+            SELECT NEW.id, NEW.conteudo, NEW.usuario_id WHERE typeof(NEW.conteudo) = 'text';
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_atendimentos_fts_delete AFTER DELETE ON atendimentos BEGIN
+            INSERT INTO atendimentos_fts(atendimentos_fts, rowid, conteudo, usuario_id)
+            SELECT 'delete', OLD.id, OLD.conteudo, OLD.usuario_id WHERE typeof(OLD.conteudo) = 'text';
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_atendimentos_fts_update AFTER UPDATE OF conteudo, usuario_id ON atendimentos BEGIN
+            INSERT INTO atendimentos_fts(atendimentos_fts, rowid, conteudo, usuario_id)
+            SELECT 'delete', OLD.id, OLD.conteudo, OLD.usuario_id WHERE typeof(OLD.conteudo) = 'text';
+            INSERT INTO atendimentos_fts(rowid, conteudo, usuario_id)
+            SELECT NEW.id, NEW.conteudo, NEW.usuario_id WHERE typeof(NEW.conteudo) = 'text';
+        END;
+    ''')
+    conn.commit()
 
-def hash_senha(senha: str) -> str: #CRIPTOGRAFA COM BCRYPT
-    return bcrypt.hashpw(senha.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+def montar_consulta_busca(texto: str, usuario_id: int) -> str:
+    """CONVERTE O TEXTO DIGITADO NUMA EXPRESSÃO FTS5 SEGURA, RESTRITA AO USUÁRIO"""
+    # Cada palavra vira um termo entre aspas (AND implícito); "medic*" busca por prefixo
+    termos = []
+    for palavra, prefixo in re.findall(r'(\w+)(\*?)', texto):
+        termos.append(f'"{palavra}"{prefixo}')
+    if not termos:
+        raise HTTPException(status_code=400, detail="Informe ao menos uma palavra para buscar.")
+    return f'usuario_id : "{usuario_id}" AND conteudo : ({" ".join(termos)})'
+
+def reconstruir_tabela_clientes(conn):
+    """RECRIA clientes COM O SCHEMA ATUAL, PRESERVANDO IDS E DADOS (ÍNDICES E TRIGGERS SÃO RECRIADOS DEPOIS)"""
+    colunas = ', '.join(linha[1] for linha in conn.execute("PRAGMA table_info(clientes)"))
+    sequencia = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'clientes'").fetchone()
+    conn.execute("DROP TABLE IF EXISTS clientes_nova")
+    conn.execute(SQL_TABELA_CLIENTES.format(nome='clientes_nova'))
+    conn.execute(f"INSERT INTO clientes_nova ({colunas}) SELECT {colunas} FROM clientes")
+    conn.execute("DROP TABLE clientes")
+    conn.execute("ALTER TABLE clientes_nova RENAME TO clientes")
+    if sequencia:
+        conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'clientes'", (sequencia[0],))
+    conn.commit()
 
-def verificar_senha(senha: str, senha_hash: str) -> bool: # VERIFICA DE A SENHA CORRESPONDE AO HASH
-    return bcrypt.checkpw(senha.encode('utf-8'), senha_hash.encode('utf-8'))
+def tabela_existe(cursor, tabela: str) -> bool:
+    return cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (tabela,)).fetchone() is not None
+
+def reservar_numeros_cliente(conn, usuario_id: int, ano: int, quantidade: int = 1) -> int:
+    """AVANÇA A SEQUÊNCIA (usuario, ano) DENTRO DA TRANSAÇÃO CORRENTE; DEVOLVE O PRIMEIRO NÚMERO RESERVADO"""
+    conn.execute(
+        """INSERT INTO sequencias_clientes (usuario_id, ano, ultimo_numero) VALUES (?, ?, ?)
+        ON CONFLICT (usuario_id, ano) DO UPDATE SET ultimo_numero = ultimo_numero + excluded.ultimo_numero""",
+        (usuario_id, ano, quantidade)
+    )
+    ultimo = conn.execute(
+        "SELECT ultimo_numero FROM sequencias_clientes WHERE usuario_id = ? AND ano = ?",
+        (usuario_id, ano)
+    ).fetchone()[0]
+    return ultimo - quantidade + 1
+
+def proximo_codigo_cliente(conn, usuario_id: int, ano: int) -> str:
+    return f"{ano}/{reservar_numeros_cliente(conn, usuario_id, ano):04d}"
+
+def coluna_existe(cursor, tabela: str, coluna: str) -> bool:
+    return any(linha[1] == coluna for linha in cursor.execute(f"PRAGMA table_info({tabela})"))
+
+def chave_aniversario(dia: date) -> int: # MMDD COMO INTEIRO, MESMO FORMATO DA COLUNA aniversario_chave
+    return dia.month * 100 + dia.day
+
+def faixas_aniversario(inicio: date, dias: int) -> list:
+    """FAIXAS (chave_inicial, chave_final) QUE COBREM A JANELA, EM ORDEM CRONOLÓGICA"""
+    fim = inicio + timedelta(days=dias)
+    faixas = []
+    for ano in range(inicio.year, fim.year + 1):
+        primeiro = inicio if ano == inicio.year else date(ano, 1, 1)
+        ultimo = fim if ano == fim.year else date(ano, 12, 31)
+        chave_inicial = chave_aniversario(primeiro)
+        # Em ano não bissexto, quem nasceu em 29/02 comemora em 01/03
+        if chave_inicial == 301 and not calendar.isleap(ano):
+            chave_inicial = 229
+        faixas.append((chave_inicial, chave_aniversario(ultimo)))
+    return faixas
+
+async def consultar_um(sql: str, parametros: tuple): # LEITURA CURTA COM CONEXÃO DO POOL (PARA ROTAS ASYNC)
+    conn = await pool_leitura.obter_async()
+    try:
+        return await rodar_no_banco(conn, lambda: conn.execute(sql, parametros).fetchone())
+    finally:
+        pool_leitura.devolver(conn)
+
+def executar_e_commitar(conn, sql: str, parametros: tuple) -> int:
+    cursor = conn.execute(sql, parametros)
+    conn.commit()
+    return cursor.lastrowid
+
+async def executar_escrita(sql: str, parametros: tuple) -> int: # ESCRITA NA FAIXA ÚNICA, RETORNA O lastrowid
+    conn = await pool_escrita.obter_async()
+    try:
+        return await rodar_no_banco(conn, executar_e_commitar, conn, sql, parametros)
+    finally:
+        pool_escrita.devolver(conn)
 
 def criar_token_jwt(usuario_id: int, username: str) -> str:# CRIA UM TOKEN JWT PARA AUTENTICAÇÃO
     payload = {
@@ -223,20 +721,321 @@ def criar_token_jwt(usuario_id: int, username: str) -> str:# CRIA UM TOKEN JWT P
     return token
 
 def verificar_token_jwt(token: str) -> dict: #VERIFICA E CODIFICA O TOKEN JWT
+    # TOKEN JÁ VERIFICADO: PULA A CHECAGEM DE ASSINATURA (A ENTRADA VENCE NO 'exp' DO TOKEN)
+    chave = hashlib.sha256(token.encode('utf-8')).digest()
+    payload = cache_tokens.obter(chave)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail='Token expirado.')
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail='Token inválido.')
+    cache_tokens.guardar(chave, payload, expira_em=payload.get('exp'))
+    return payload
 
-def obter_usuario_atual(authorization: str = Header(None)) -> dict: # DEPENDENCY PARA OBTER O USUÁRIO AUTENTICADO
+def invalidar_tokens_usuario(usuario_id: int) -> int: # HOOK: DESCARTA OS TOKENS EM CACHE DO USUÁRIO (EX.: TROCA DE SENHA)
+    return cache_tokens.remover_se(lambda chave, payload: payload.get('usuario_id') == usuario_id)
+
+# VÁRIOS WORKERS: QUEM MUDA A SENHA DESCARTA OS TOKENS NO PRÓPRIO CACHE E PUBLICA UM
+# AVISO 'tokens' NA MESMA TRANSAÇÃO; OS OUTROS WORKERS O APLICAM NA PRÓXIMA REQUISIÇÃO
+canal_invalidacao = CanalInvalidacao()
+canal_invalidacao.assinar('tokens', invalidar_tokens_usuario)
+
+async def obter_usuario_atual(authorization: str = Header(None)) -> dict: # DEPENDENCY PARA OBTER O USUÁRIO AUTENTICADO
+    # ASYNC DE PROPÓSITO: COM O CACHE, NÃO VALE A PENA OCUPAR UMA THREAD DO THREADPOOL
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail='Token não fornecido.')
     token = authorization.split(" ")[1]  # Assume Bearer token
+    canal_invalidacao.verificar()
     return verificar_token_jwt(token)
 
+# CONEXÕES COM OS DADOS DO USUÁRIO (BANCO ÚNICO OU SHARD DO PROFISSIONAL)
+# Usuários e autenticação ficam sempre no banco principal (pool_leitura /
+# pool_escrita); clientes e atendimentos vão para o banco do usuário do token.
+roteador_shards = RoteadorShards(DB_SHARDS_DIR, criar_schema_dados) if DB_SHARDS_ATIVO else None
+
+async def pools_do_usuario(usuario_id: int) -> tuple: # (POOL DE LEITURA, POOL DE ESCRITA)
+    if roteador_shards is None:
+        return pool_leitura, pool_escrita
+    return await roteador_shards.pools_async(usuario_id)
+
+def caminho_banco_usuario(usuario_id: int) -> str:
+    return roteador_shards.caminho(usuario_id) if roteador_shards is not None else DB_NAME
+
+def gravar_e_commitar(conn, funcao, *args):
+    try:
+        resultado = funcao(conn, *args)
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+    return resultado
+
+async def executar_gravacao(usuario_id: int, funcao, *args):
+    """GRAVA funcao(conn, *args) NO BANCO DO USUÁRIO: PELO GROUP COMMIT OU, SEM ELE, NUMA TRANSAÇÃO PRÓPRIA"""
+    _, pool = await pools_do_usuario(usuario_id)
+    if ESCRITA_AGRUPADA:
+        return await pool.escritor.executar(funcao, *args)
+    conn = await pool.obter_async()
+    try:
+        return await rodar_no_banco(conn, gravar_e_commitar, conn, funcao, *args)
+    finally:
+        pool.devolver(conn)
+
+async def obter_conexao_dados(usuario_atual: dict = Depends(obter_usuario_atual)):
+    """DEPENDENCY: CONEXÃO DE LEITURA DO BANCO DE DADOS DO USUÁRIO"""
+    pool, _ = await pools_do_usuario(usuario_atual['usuario_id'])
+    conn = await pool.obter_async()
+    try:
+        yield conn
+    finally:
+        pool.devolver(conn)
+
+# CRIPTOGRAFIA DE CAMPOS: A CHAVE DE DADOS É ABERTA NO LOGIN E FICA SÓ EM MEMÓRIA
+# Sem a chave em cache (servidor reiniciado, TTL vencido) as rotas de dados
+# respondem 401 e o frontend pede login de novo, que reabre a chave.
+if CRIPTOGRAFIA_ATIVA and AESGCM is None:
+    raise RuntimeError("CRIPTOGRAFIA=1 exige o pacote 'cryptography' (pip install cryptography)")
+if CRIPTOGRAFIA_ATIVA and CIPTHER_SUITE_PASSWORD == CIPTHER_SUITE_PASSWORD_PADRAO:
+    # O PADRÃO ESTÁ NO CÓDIGO-FONTE: COM ELE, O ARQUIVO DO BANCO BASTA PARA TESTAR EMAILS
+    # CONTRA O ÍNDICE CEGO E ABRIR AS CÓPIAS DE RECUPERAÇÃO DAS CONTAS ANTIGAS
+    raise RuntimeError("CRIPTOGRAFIA=1 exige um segredo próprio em CIPTHER_SUITE_PASSWORD (variável de ambiente)")
+if CRIPTOGRAFIA_ATIVA and WORKERS > 1:
+    raise RuntimeError("CRIPTOGRAFIA=1 guarda a chave de dados só na memória do worker que fez o login; "
+                       "rode com um worker (WEB_CONCURRENCY=1)")
+
+def descartar_respostas_do_usuario(usuario_id: int, _cifrador=None):
+    # RESPOSTAS EM CACHE TÊM OS CAMPOS JÁ DECIFRADOS: NÃO FICAM NA MEMÓRIA DEPOIS DA CHAVE
+    if cache_respostas is not None:
+        cache_respostas.remover_se(lambda chave, _: chave[0] == usuario_id)
+
+chaves_dados = CacheLRU(CRIPTOGRAFIA_CACHE_TAMANHO, CRIPTOGRAFIA_CHAVE_TTL_SECONDS,
+                        ao_remover=descartar_respostas_do_usuario)
+
+def obter_cifrador(usuario_id: int) -> Optional[Cifrador]: # None COM A CRIPTOGRAFIA DESLIGADA
+    if not CRIPTOGRAFIA_ATIVA:
+        return None
+    cifrador = chaves_dados.obter(usuario_id)
+    if cifrador is None:
+        descartar_respostas_do_usuario(usuario_id)  # GUARDADAS ENTRE A ÚLTIMA LEITURA DA CHAVE E O VENCIMENTO
+        raise HTTPException(status_code=401, detail="Chave de criptografia expirada. Faça login novamente.")
+    return cifrador
+
+def cifrar_campo(cifrador: Optional[Cifrador], valor, campo: str):
+    return cifrador.cifrar(valor, campo) if cifrador is not None else valor
+
+def decifrar_itens(cifrador: Optional[Cifrador], itens: list, campos: tuple) -> list:
+    return cifrador.decifrar_itens(itens, campos) if cifrador is not None else itens
+
+async def liberar_chave_dados(usuario_id: int, senha: str) -> Cifrador:
+    """ABRE A CHAVE DE DADOS COM A SENHA (CRIANDO-A EM CONTAS ANTIGAS) E GUARDA EM CACHE"""
+    sql_chaves = "SELECT cripto_salt, chave_senha, chave_recuperacao, recuperacao_servidor FROM usuarios WHERE id = ?"
+    linha = await consultar_um(sql_chaves, (usuario_id,))
+    if linha['chave_senha'] is None:
+        # CONTA ANTERIOR À CRIPTOGRAFIA: SEM A RESPOSTA DE SEGURANÇA EM MÃOS, A CÓPIA DE
+        # RECUPERAÇÃO USA A CHAVE DO SERVIDOR ATÉ A PRÓXIMA RECUPERAÇÃO DE SENHA
+        salt, chave = novo_salt(), nova_chave_dados()
+        chave_senha, chave_servidor = await asyncio.gather(
+            derivar_chave_async(senha, salt, 'senha'),
+            executar_no_pool_hash(chave_do_servidor, salt)
+        )
+        await executar_escrita(
+            """UPDATE usuarios SET cripto_salt = ?, chave_senha = ?, chave_recuperacao = ?, recuperacao_servidor = ?
+            WHERE id = ? AND chave_senha IS NULL""",
+            (salt, Cifrador(chave_senha).cifrar_chave(chave), Cifrador(chave_servidor).cifrar_chave(chave),
+             impressao_segredo(), usuario_id)
+        )
+        # RELÊ: SE DOIS LOGINS CRIARAM AO MESMO TEMPO, VALE A CHAVE GRAVADA PRIMEIRO
+        linha = await consultar_um(sql_chaves, (usuario_id,))
+
+    chave_senha = await derivar_chave_async(senha, linha['cripto_salt'], 'senha')
+    chave = Cifrador(chave_senha).decifrar_chave(linha['chave_senha'])
+    if chave is None:
+        raise HTTPException(status_code=500, detail="Não foi possível abrir a chave de criptografia.")
+    if linha['recuperacao_servidor'] is not None and linha['recuperacao_servidor'] != impressao_segredo():
+        await reembrulhar_recuperacao(usuario_id, linha, chave)
+    cifrador = Cifrador(chave)
+    chaves_dados.remover_vencidos()  # CHAVES (E RESPOSTAS) DE QUEM NÃO VOLTOU SAEM DA MEMÓRIA
+    chaves_dados.guardar(usuario_id, cifrador)
+    return cifrador
+
+async def reembrulhar_recuperacao(usuario_id: int, linha, chave: bytes):
+    """CÓPIA DE RECUPERAÇÃO DE CONTA ANTIGA FEITA COM OUTRO SEGREDO DO SERVIDOR (OU SEM IMPRESSÃO,
+    DE ANTES DA COLUNA): EMBRULHA DE NOVO COM O SEGREDO ATUAL, JÁ QUE O LOGIN ABRIU A CHAVE DE DADOS"""
+    salt, impressao = linha['cripto_salt'], impressao_segredo()
+    chave_servidor = await executar_no_pool_hash(chave_do_servidor, salt)
+    if linha['recuperacao_servidor'] == b'':
+        # SEM IMPRESSÃO: SÓ É DO SERVIDOR SE ABRIR COM O SEGREDO ATUAL OU O PADRÃO; SENÃO É DA RESPOSTA
+        if Cifrador(chave_servidor).decifrar_chave(linha['chave_recuperacao']) is None:
+            chave_padrao = await executar_no_pool_hash(chave_do_servidor_padrao, salt)
+            if Cifrador(chave_padrao).decifrar_chave(linha['chave_recuperacao']) is None:
+                impressao = None
+    recuperacao = Cifrador(chave_servidor).cifrar_chave(chave) if impressao is not None else linha['chave_recuperacao']
+    # SÓ SE A RECUPERAÇÃO NÃO MUDOU NESSE MEIO TEMPO (UMA TROCA DE SENHA GRAVA A DA RESPOSTA)
+    await executar_escrita(
+        "UPDATE usuarios SET chave_recuperacao = ?, recuperacao_servidor = ? WHERE id = ? AND chave_recuperacao = ?",
+        (recuperacao, impressao, usuario_id, linha['chave_recuperacao'])
+    )
+
+async def cifrar_dados_antigos(usuario_id: int):
+    """CIFRA EM LOTES AS LINHAS GRAVADAS EM TEXTO PURO ANTES DA CRIPTOGRAFIA (RODA DEPOIS DO LOGIN)"""
+    cifrador = chaves_dados.obter(usuario_id)
+    if cifrador is None:
+        return
+    _, pool = await pools_do_usuario(usuario_id)
+
+    def cifrar_lote(conn, tabela: str, campos: tuple) -> int:
+        texto_puro = ' OR '.join(f"typeof({campo}) = 'text'" for campo in campos)
+        linhas = conn.execute(
+            f"SELECT id, {', '.join(campos)} FROM {tabela} WHERE usuario_id = ? AND ({texto_puro}) LIMIT ?",
+            (usuario_id, CRIPTOGRAFIA_LOTE_MIGRACAO)
+        ).fetchall()
+        conn.executemany(
+            f"UPDATE {tabela} SET {', '.join(f'{campo} = ?' for campo in campos)} WHERE id = ?",
+            [(*(cifrador.cifrar(linha[campo], campo) if isinstance(linha[campo], str) else linha[campo]
+                for campo in campos), linha['id']) for linha in linhas]
+        )
+        conn.commit()
+        return len(linhas)
+
+    def indexar_lote(conn) -> int:
+        linhas = conn.execute(
+            "SELECT id, email FROM clientes "
+            "WHERE usuario_id = ? AND email IS NOT NULL AND email_indice IS NULL AND NOT email_repetido LIMIT ?",
+            (usuario_id, CRIPTOGRAFIA_LOTE_MIGRACAO)
+        ).fetchall()
+        preencher_indice_email(conn, [(linha['id'], cifrador.decifrar(linha['email'], 'email')) for linha in linhas])
+        conn.commit()
+        return len(linhas)
+
+    # ANOTAÇÕES ARQUIVADAS ANTES DA CRIPTOGRAFIA VOLTAM PARA atendimentos PARA SEREM CIFRADAS
+    while await executar_gravacao(usuario_id, restaurar_lote, usuario_id):
+        pass
+
+    # A FAIXA DE ESCRITA É DEVOLVIDA ENTRE UM LOTE E OUTRO
+    for tabela, campos in (('clientes', CAMPOS_CLIENTE_CIFRADOS), ('atendimentos', CAMPOS_ATENDIMENTO_CIFRADOS),
+                           ('agendamentos', CAMPOS_AGENDAMENTO_CIFRADOS)):
+        while True:
+            conn = await pool.obter_async()
+            try:
+                cifradas = await rodar_no_banco(conn, cifrar_lote, conn, tabela, campos)
+            finally:
+                pool.devolver(conn)
+            if cifradas < CRIPTOGRAFIA_LOTE_MIGRACAO:
+                break
+    # ÍNDICE CEGO DOS EMAILS CIFRADOS ANTES DE ELE EXISTIR
+    while True:
+        conn = await pool.obter_async()
+        try:
+            indexadas = await rodar_no_banco(conn, indexar_lote, conn)
+        finally:
+            pool.devolver(conn)
+        if indexadas < CRIPTOGRAFIA_LOTE_MIGRACAO:
+            break
+    await executar_escrita("UPDATE usuarios SET dados_cifrados = 1 WHERE id = ?", (usuario_id,))
+
+async def emails_sem_indice(usuario_id: int) -> bool: # CLIENTES CIFRADOS ANTES DO ÍNDICE CEGO DO EMAIL
+    leitura, _ = await pools_do_usuario(usuario_id)
+    conn = await leitura.obter_async()
+    try:
+        return await rodar_no_banco(conn, lambda: conn.execute(
+            "SELECT 1 FROM clientes "
+            "WHERE usuario_id = ? AND email IS NOT NULL AND email_indice IS NULL AND NOT email_repetido LIMIT 1",
+            (usuario_id,)
+        ).fetchone() is not None)
+    finally:
+        leitura.devolver(conn)
+
+# ARQUIVO DAS ANOTAÇÕES ANTIGAS: CADA LOTE É UMA OPERAÇÃO NA FAIXA DE ESCRITA,
+# INTERCALADA COM AS ESCRITAS DA API (VER arquivo.py)
+if ARQUIVO_IDADE_DIAS > 0 and CRIPTOGRAFIA_ATIVA:
+    raise RuntimeError("ARQUIVO_IDADE_DIAS exige CRIPTOGRAFIA=0: anotações cifradas não comprimem")
+
+async def arquivar_atendimentos_antigos() -> int:
+    limite = (date.today() - timedelta(days=ARQUIVO_IDADE_DIAS)).isoformat()
+    if roteador_shards is None:
+        usuarios = [None]  # BANCO ÚNICO: UMA PASSADA ARQUIVA TODOS OS PROFISSIONAIS
+    else:
+        conn = await pool_leitura.obter_async()
+        try:
+            usuarios = await rodar_no_banco(conn, lambda: [linha[0] for linha in conn.execute("SELECT id FROM usuarios")])
+        finally:
+            pool_leitura.devolver(conn)
+    total = 0
+    for usuario_id in usuarios:
+        posicao = None
+        while True:
+            arquivadas, posicao = await executar_gravacao(usuario_id, arquivar_lote, limite, posicao)
+            total += arquivadas
+            if posicao is None:
+                break
+    return total
+
+async def arquivar_periodicamente():
+    """LAÇO DO LIFESPAN: ARQUIVA AO SUBIR E DEPOIS A CADA ARQUIVO_INTERVALO_SECONDS"""
+    while True:
+        try:
+            arquivadas = await arquivar_atendimentos_antigos()
+            if arquivadas:
+                log.info('Arquivo: %s anotações antigas comprimidas', arquivadas)
+        except Exception:
+            log.exception('Arquivo: falha ao arquivar anotações antigas')
+        await asyncio.sleep(ARQUIVO_INTERVALO_SECONDS)
+
+# REQUISIÇÕES CONDICIONAIS (ETag / 304) E CACHE DE RESPOSTAS
+# O ETag fraco vem da versão dos dados do usuário (tabela versoes_usuario,
+# mantida por triggers) e do dia (aniversariantes dependem da data). Se o
+# navegador manda o mesmo ETag, a resposta é um 304 sem consulta nenhuma além
+# da versão. A versão é lida ANTES da consulta: se uma escrita acontecer no
+# meio, a resposta fica associada à versão antiga e é descartada no próximo
+# pedido, nunca o contrário.
+cache_respostas = CacheLRU(RESPOSTAS_CACHE_TAMANHO) if RESPOSTAS_CACHE_TAMANHO > 0 else None
+
+def ler_versao_usuario(conn, usuario_id: int) -> int:
+    linha = conn.execute("SELECT versao FROM versoes_usuario WHERE usuario_id = ?", (usuario_id,)).fetchone()
+    return linha[0] if linha else 0
+
+def etag_confere(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    return any(valor.strip() in (etag, '*') for valor in if_none_match.split(','))
+
+def resposta_condicional(funcao):
+    """DECORA UMA ROTA GET QUE RECEBE request, usuario_atual E conn: ETag, 304 E CACHE POR (USUÁRIO, ROTA, VERSÃO)"""
+    @functools.wraps(funcao)
+    async def handler(*args, **kwargs):
+        request, conn = kwargs['request'], kwargs['conn']
+        usuario_id = kwargs['usuario_atual']['usuario_id']
+        # COM A CRIPTOGRAFIA, SEM A CHAVE EM MEMÓRIA NÃO HÁ 304 NEM RESPOSTA DO CACHE: 401 COMO NA ROTA
+        obter_cifrador(usuario_id)
+        versao = await rodar_no_banco(conn, ler_versao_usuario, conn, usuario_id)
+        hoje = date.today().strftime('%Y%m%d')
+        headers = {'ETag': f'W/"{usuario_id}-{versao}-{hoje}"', 'Cache-Control': 'private, no-cache'}
+
+        if etag_confere(request.headers.get('if-none-match'), headers['ETag']):
+            return Response(status_code=304, headers=headers)
+
+        chave = (usuario_id, request.url.path, request.url.query, versao, hoje)
+        guardada = cache_respostas.obter(chave) if cache_respostas is not None else None
+        if guardada is not None:
+            corpo, extras = guardada
+            return Response(content=corpo, media_type='application/json', headers={**headers, **extras})
+
+        if asyncio.iscoroutinefunction(funcao):
+            resposta = await funcao(*args, **kwargs)
+        else:
+            resposta = await rodar_no_banco(conn, funcao, *args, **kwargs)
+        if isinstance(resposta, Response) and resposta.status_code == 200:
+            resposta.headers.update(headers)
+            if cache_respostas is not None:
+                extras = {'X-Proximo-Cursor': resposta.headers['x-proximo-cursor']} if 'x-proximo-cursor' in resposta.headers else {}
+                cache_respostas.guardar(chave, (resposta.body, extras))
+        return resposta
+
+    return handler
+
 def formatar_cliente(row) -> ClienteResponse: # FORMATA DADOS DO CLIENTE PARA RESPOSTA
     return ClienteResponse(
         id=row['id'],
@@ -259,39 +1058,190 @@ def formatar_atendimento(row) -> AtendimentoResponse: # FORMATA DADOS DO ATENDIM
         data_registro=row['data_registro']
     )
 
+# PAGINAÇÃO POR CURSOR (KEYSET)
+CAMPOS_CLIENTE = list(ClienteResponse.model_fields)
+CAMPOS_ATENDIMENTO = list(AtendimentoResponse.model_fields)
+CAMPOS_BUSCA = list(BuscaAtendimentoResponse.model_fields)
+
+def codificar_cursor(*valores) -> str: # CURSOR OPACO COM A CHAVE DO ÚLTIMO ITEM DA PÁGINA
+    return base64.urlsafe_b64encode(json.dumps(valores).encode('utf-8')).decode('ascii')
+
+def valor_de_cursor(valor, tipo) -> bool:
+    # type() EXATO: bool É SUBCLASSE DE int. O int PRECISA CABER NUM INTEGER DO SQLITE
+    # E O TEXTO SER UTF-8 VÁLIDO (O JSON ACEITA SURROGATES SOLTOS, O SQLITE NÃO)
+    if type(valor) is not tipo:
+        return False
+    if tipo is int:
+        return -2 ** 63 <= valor < 2 ** 63
+    if tipo is str:
+        return not any('\ud800' <= caractere <= '\udfff' for caractere in valor)
+    return True
+
+def decodificar_cursor(cursor: str, *tipos) -> list:
+    """VALORES DO CURSOR, UM POR COLUNA DA CHAVE E DO TIPO DELA; QUALQUER OUTRA COISA É 400"""
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido.")
+    if (not isinstance(valores, list) or len(valores) != len(tipos)
+            or not all(valor_de_cursor(valor, tipo) for valor, tipo in zip(valores, tipos))):
+        raise HTTPException(status_code=400, detail="Cursor inválido.")
+    return valores
+
+def selecionar_campos(campos: Optional[str], permitidos: list) -> Optional[list]: # PROJEÇÃO: ?campos=id,nome_completo
+    if not campos:
+        return None
+    selecionados = [campo.strip() for campo in campos.split(',') if campo.strip()]
+    invalidos = [campo for campo in selecionados if campo not in permitidos]
+    if invalidos or not selecionados:
+        raise HTTPException(status_code=400, detail=f"Campos inválidos: {', '.join(invalidos)}")
+    return [campo for campo in permitidos if campo in selecionados]
+
+def colunas_da_consulta(colunas: list, chave: tuple) -> str: # CAMPOS PEDIDOS PRIMEIRO, DEPOIS A CHAVE DO CURSOR
+    return ', '.join(colunas + [coluna for coluna in chave if coluna not in colunas])
+
+def responder_pagina(itens: list, proximo_cursor: Optional[str]):
+    # DICTS DIRETO PARA JSON (SERVE TANTO PARA A PROJEÇÃO QUANTO PARA O MODELO COMPLETO)
+    headers = {'X-Proximo-Cursor': proximo_cursor} if proximo_cursor else None
+    return RespostaJSON(content=itens, headers=headers)
+
+def paginar_atendimentos(conn, usuario_id: int, cliente_id: int, limit: int, cursor: Optional[str],
+                         campos: Optional[str], data_inicio: Optional[date], data_fim: Optional[date]):
+    """LISTA UMA PÁGINA DE ATENDIMENTOS, DO MAIS RECENTE PARA O MAIS ANTIGO"""
+    colunas = selecionar_campos(campos, CAMPOS_ATENDIMENTO) or CAMPOS_ATENDIMENTO
+
+    filtros = ["usuario_id = ?", "cliente_id = ?"]
+    parametros = [usuario_id, cliente_id]
+    if data_inicio:
+        filtros.append("data_atendimento >= ?")
+        parametros.append(data_inicio.isoformat())
+    if data_fim:
+        filtros.append("data_atendimento <= ?")
+        parametros.append(data_fim.isoformat())
+    if cursor:
+        filtros.append("(data_atendimento, id) < (?, ?)")
+        parametros.extend(decodificar_cursor(cursor, str, int))
+
+    selecao = colunas_da_consulta(colunas, ('data_atendimento', 'id'))
+    linhas = conn.execute(
+        f"SELECT {selecao} FROM atendimentos WHERE {' AND '.join(filtros)} "
+        "ORDER BY data_atendimento DESC, id DESC LIMIT ?",
+        (*parametros, limit + 1)
+    ).fetchall()
+
+    # O FILTRO POR usuario_id JÁ GARANTE QUE AS LINHAS SÃO DO USUÁRIO; A VERIFICAÇÃO
+    # DE DONO DO CLIENTE SÓ É NECESSÁRIA PARA DIFERENCIAR PÁGINA VAZIA DE 404
+    if not linhas and not conn.execute(
+        "SELECT id FROM clientes WHERE id = ? AND usuario_id = ?",
+        (cliente_id, usuario_id)
+    ).fetchone():
+        raise HTTPException(status_code=404, detail="Cliente não encontrado")
+
+    proximo_cursor = None
+    if len(linhas) > limit:
+        linhas = linhas[:limit]
+        proximo_cursor = codificar_cursor(linhas[-1]['data_atendimento'], linhas[-1]['id'])
+
+    itens = decifrar_itens(obter_cifrador(usuario_id), linhas_para_dicts(linhas, colunas), CAMPOS_ATENDIMENTO_CIFRADOS)
+    if 'conteudo' in colunas:  # SÓ AS ANOTAÇÕES ARQUIVADAS DESTA PÁGINA SÃO DESCOMPRIMIDAS
+        preencher_arquivados(conn, itens, [linha['id'] for linha in linhas])
+    return responder_pagina(itens, proximo_cursor)
+
+def consultar_detalhes_cliente(conn, usuario_id: int, cliente_id: int, limit: int) -> Optional[dict]:
+    """CLIENTE + ESTATÍSTICAS + PRIMEIRA PÁGINA DE ATENDIMENTOS NUM ÚNICO SELECT (None SE O CLIENTE NÃO É DO USUÁRIO)"""
+    # OS DADOS DO CLIENTE SE REPETEM EM CADA LINHA DA PÁGINA; SEM ATENDIMENTOS, O
+    # LEFT JOIN DEVOLVE UMA LINHA SÓ COM O CLIENTE
+    linhas = conn.execute(f'''
+        SELECT {', '.join('c.' + campo for campo in CAMPOS_CLIENTE)},
+               r.sessoes, r.minutos, r.ultima_data,
+               {', '.join('a.' + campo for campo in CAMPOS_ATENDIMENTO)}
+        FROM clientes c
+        LEFT JOIN resumo_clientes r ON r.usuario_id = c.usuario_id AND r.cliente_id = c.id
+        LEFT JOIN (
+            SELECT {', '.join(CAMPOS_ATENDIMENTO)} FROM atendimentos
+            WHERE usuario_id = ? AND cliente_id = ?
+            ORDER BY data_atendimento DESC, id DESC LIMIT ?
+        ) a ON 1
+        WHERE c.id = ? AND c.usuario_id = ?
+        ORDER BY a.data_atendimento DESC, a.id DESC
+    ''', (usuario_id, cliente_id, limit + 1, cliente_id, usuario_id)).fetchall()
+    if not linhas:
+        return None
+
+    n_cliente = len(CAMPOS_CLIENTE)
+    primeira = linhas[0]
+    atendimentos = [dict(zip(CAMPOS_ATENDIMENTO, tuple(linha)[n_cliente + 3:]))
+                    for linha in linhas if linha[n_cliente + 3] is not None]
+    proximo_cursor = None
+    if len(atendimentos) > limit:
+        atendimentos = atendimentos[:limit]
+        proximo_cursor = codificar_cursor(atendimentos[-1]['data_atendimento'], atendimentos[-1]['id'])
+
+    preencher_arquivados(conn, atendimentos, [atendimento['id'] for atendimento in atendimentos])
+    cifrador = obter_cifrador(usuario_id)
+    return {
+        'cliente': decifrar_itens(cifrador, [dict(zip(CAMPOS_CLIENTE, tuple(primeira)[:n_cliente]))], CAMPOS_CLIENTE_CIFRADOS)[0],
+        'estatisticas': {'sessoes': primeira[n_cliente] or 0, 'minutos': primeira[n_cliente + 1] or 0,
+                         'ultima_sessao': primeira[n_cliente + 2]},
+        'atendimentos': decifrar_itens(cifrador, atendimentos, CAMPOS_ATENDIMENTO_CIFRADOS),
+        'proximo_cursor': proximo_cursor,
+    }
+
+def inserir_atendimento(conn, usuario_id: int, cliente_id: int, atendimento: Atendimento,
+                        cifrador: Optional[Cifrador]) -> Optional[int]:
+    """GRAVA O ATENDIMENTO SE O CLIENTE FOR DO USUÁRIO (VERIFICAÇÃO E INSERT NUM SÓ COMANDO). None = CLIENTE NÃO ENCONTRADO.
+    NÃO FAZ COMMIT: RODA DENTRO DA TRANSAÇÃO DE executar_gravacao"""
+    cursor = conn.execute(
+        """INSERT INTO atendimentos
+            (usuario_id, cliente_id, data_atendimento, conteudo, duracao_minutos, data_registro)
+            SELECT ?, ?, ?, ?, ?, ?
+            WHERE EXISTS (SELECT 1 FROM clientes WHERE id = ? AND usuario_id = ?)""",
+        (usuario_id, cliente_id, atendimento.data_atendimento,
+         cifrar_campo(cifrador, atendimento.conteudo, 'conteudo'),
+         atendimento.duracao_minutos, datetime.now().isoformat(), cliente_id, usuario_id)
+    )
+    return cursor.lastrowid if cursor.rowcount else None
+
 # ROTAS DE AUTENTICACAO
 router = APIRouter()
 
 @router.post("/auth/cadastro", response_model=TokenResponse, status_code=201)
-def cadastrar_usuario(usuario: UsuarioCadastro):
+async def cadastrar_usuario(usuario: UsuarioCadastro):
     """CADASTRA UM NOVO USUÁRIO"""
-    conn = obter_conexao()
-    cursor = conn.cursor()
-
     # VERIFICA SE O USERNAME JÁ ESTÁ CADASTRADO
-    cursor.execute("SELECT id FROM usuarios WHERE username = ?", (usuario.username,))
-    if cursor.fetchone():
-        conn.close()
+    if await consultar_um("SELECT id FROM usuarios WHERE username = ?", (usuario.username,)):
         raise HTTPException(status_code=400, detail="Username já cadastrado.")
 
-    # CRIPTOGRAFA A SENHA E RESPOSTA DE SEGURANÇA
-    senha_hash = hash_senha(usuario.senha)
-    resposta_hash = hash_senha(usuario.resposta_seguranca.lower())
+    # CRIPTOGRAFA A SENHA E RESPOSTA DE SEGURANÇA NO POOL DO BCRYPT
+    senha_hash, resposta_hash = await asyncio.gather(
+        hash_senha_async(usuario.senha),
+        hash_senha_async(usuario.resposta_seguranca.lower())
+    )
+
+    # CHAVE DE DADOS NOVA, EMBRULHADA PELA SENHA E PELA RESPOSTA DE SEGURANÇA
+    salt = chave_dados = chave_senha = chave_recuperacao = None
+    if CRIPTOGRAFIA_ATIVA:
+        salt, chave_dados = novo_salt(), nova_chave_dados()
+        chave_senha, chave_recuperacao = await asyncio.gather(
+            derivar_chave_async(usuario.senha, salt, 'senha'),
+            derivar_chave_async(usuario.resposta_seguranca.lower(), salt, 'resposta')
+        )
+        chave_senha = Cifrador(chave_senha).cifrar_chave(chave_dados)
+        chave_recuperacao = Cifrador(chave_recuperacao).cifrar_chave(chave_dados)
 
     # INSERE O NOVO USUÁRIO
     try:
-        cursor.execute(
-            """INSERT INTO usuarios (username, nome, senha_hash, pergunta_seguranca, resposta_seguranca_hash, data_criacao) 
-            VALUES (?, ?, ?, ?, ?, ?)""",
-            (usuario.username, usuario.nome, senha_hash, usuario.pergunta_seguranca, resposta_hash, datetime.now().isoformat())
+        usuario_id = await executar_escrita(
+            """INSERT INTO usuarios (username, nome, senha_hash, pergunta_seguranca, resposta_seguranca_hash, data_criacao,
+                                   cripto_salt, chave_senha, chave_recuperacao, dados_cifrados)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (usuario.username, usuario.nome, senha_hash, usuario.pergunta_seguranca, resposta_hash, datetime.now().isoformat(),
+             salt, chave_senha, chave_recuperacao, int(CRIPTOGRAFIA_ATIVA))
         )
-        conn.commit()
-        usuario_id = cursor.lastrowid
     except sqlite3.Error as e:
-        conn.close()
         raise HTTPException(status_code=400, detail=f"Erro ao cadastrar usuário: {str(e)}")
-    finally:
-        conn.close()
+    if chave_dados is not None:
+        chaves_dados.guardar(usuario_id, Cifrador(chave_dados))
 
     #  CRIA TOKEN JWT
     token = criar_token_jwt(usuario_id, usuario.username)
@@ -307,24 +1257,41 @@ def cadastrar_usuario(usuario: UsuarioCadastro):
         )
     )
 
+async def refazer_hash_senha(usuario_id: int, senha: str, hash_antigo: str):
+    """REGRAVA O HASH COM O CUSTO ATUAL DO BCRYPT (RODA DEPOIS DA RESPOSTA DO LOGIN)"""
+    novo_hash = await hash_senha_async(senha)
+    # SÓ SUBSTITUI SE A SENHA NÃO MUDOU NESSE MEIO TEMPO
+    await executar_escrita(
+        "UPDATE usuarios SET senha_hash = ? WHERE id = ? AND senha_hash = ?",
+        (novo_hash, usuario_id, hash_antigo)
+    )
+
 @router.post("/auth/login", response_model=TokenResponse)
-def fazer_login(usuario: UsuarioLogin):
+async def fazer_login(usuario: UsuarioLogin, tarefas: BackgroundTasks):
     """FAZ LOGIN DO USUÁRIO"""
-    conn = obter_conexao()
-    cursor = conn.cursor()
-
     # BUSCA USUARIO POR USERNAME
-    cursor.execute("SELECT id, username, nome, senha_hash FROM usuarios WHERE username = ?", (usuario.username,))
-    usuario_db = cursor.fetchone()
-    conn.close()
+    usuario_db = await consultar_um(
+        "SELECT id, username, nome, senha_hash, dados_cifrados FROM usuarios WHERE username = ?",
+        (usuario.username,)
+    )
 
     if not usuario_db:
         raise HTTPException(status_code=401, detail="Username ou senha incorretos")
     
     # VERIFICA SENHA
-    if not verificar_senha(usuario.senha, usuario_db['senha_hash']):
+    if not await verificar_senha_async(usuario.senha, usuario_db['senha_hash']):
         raise HTTPException(status_code=401, detail="Username ou senha incorretos")
 
+    # HASH GRAVADO COM OUTRO CUSTO: REFAZ EM SEGUNDO PLANO, SEM ATRASAR O LOGIN
+    if precisa_rehash(usuario_db['senha_hash']):
+        tarefas.add_task(refazer_hash_senha, usuario_db['id'], usuario.senha, usuario_db['senha_hash'])
+
+    # ABRE A CHAVE DE DADOS UMA VEZ POR LOGIN; LINHAS ANTIGAS SÃO CIFRADAS EM SEGUNDO PLANO
+    if CRIPTOGRAFIA_ATIVA:
+        await liberar_chave_dados(usuario_db['id'], usuario.senha)
+        if not usuario_db['dados_cifrados'] or await emails_sem_indice(usuario_db['id']):
+            tarefas.add_task(cifrar_dados_antigos, usuario_db['id'])
+
     # CRIA TOKEN JWT
     token = criar_token_jwt(usuario_db['id'], usuario_db['username'])
 
@@ -340,271 +1307,751 @@ def fazer_login(usuario: UsuarioLogin):
     )
 
 @router.post("/auth/recuperar-senha")
-def recuperar_senha(recuperacao: RecuperacaoSenha):
+async def recuperar_senha(recuperacao: RecuperacaoSenha):
     """RECUPERAÇÃO DE SENHA DO USUÁRIO USANDO A PERGUNTA DE SEGURANÇA"""
-    conn = obter_conexao()
-    cursor = conn.cursor()
-
     # BUSCA USUÁRIO
-    cursor.execute(
-        "SELECT id, resposta_seguranca_hash FROM usuarios WHERE username = ?", 
+    usuario_db = await consultar_um(
+        "SELECT id, resposta_seguranca_hash, cripto_salt, chave_recuperacao, recuperacao_servidor FROM usuarios WHERE username = ?",
         (recuperacao.username,)
     )
-    usuario_db = cursor.fetchone()
 
     if not usuario_db:
-        conn.close()
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
 
     # VERIFICA RESPOSTA DE SEGURANÇA
-    if not verificar_senha(recuperacao.resposta_seguranca.lower(), usuario_db['resposta_seguranca_hash']):
-        conn.close()
+    if not await verificar_senha_async(recuperacao.resposta_seguranca.lower(), usuario_db['resposta_seguranca_hash']):
         raise HTTPException(status_code=401, detail="Resposta de segurança incorreta")
 
     # ATUALIZA A SENHA
-    nova_senha_hash = hash_senha(recuperacao.nova_senha)
-    try:
-        cursor.execute(
-            "UPDATE usuarios SET senha_hash = ? WHERE id = ?",
-            (nova_senha_hash, usuario_db['id'])
+    nova_senha_hash = await hash_senha_async(recuperacao.nova_senha)
+    chave_senha, chave_recuperacao = None, usuario_db['chave_recuperacao']
+    if chave_recuperacao is not None:
+        # A CHAVE DE DADOS NÃO MUDA: É RECUPERADA PELA RESPOSTA (OU PELA CHAVE DO SERVIDOR,
+        # EM CONTAS ANTIGAS) E EMBRULHADA DE NOVO PELA SENHA NOVA E PELA RESPOSTA
+        salt = usuario_db['cripto_salt']
+        chave_resposta, chave_nova_senha = await asyncio.gather(
+            derivar_chave_async(recuperacao.resposta_seguranca.lower(), salt, 'resposta'),
+            derivar_chave_async(recuperacao.nova_senha, salt, 'senha')
         )
-        conn.commit()
+        chave_dados = Cifrador(chave_resposta).decifrar_chave(chave_recuperacao)
+        if chave_dados is None:
+            chave_servidor = await executar_no_pool_hash(chave_do_servidor, salt)
+            chave_dados = Cifrador(chave_servidor).decifrar_chave(chave_recuperacao)
+        if chave_dados is None and usuario_db['recuperacao_servidor'] not in (None, impressao_segredo()):
+            # CONTA ANTIGA QUE NÃO FEZ LOGIN DESDE QUE A API SUBIA COM O SEGREDO PADRÃO
+            chave_padrao = await executar_no_pool_hash(chave_do_servidor_padrao, salt)
+            chave_dados = Cifrador(chave_padrao).decifrar_chave(chave_recuperacao)
+        if chave_dados is None:
+            raise HTTPException(status_code=500, detail="Não foi possível recuperar a chave de criptografia.")
+        chave_senha = Cifrador(chave_nova_senha).cifrar_chave(chave_dados)
+        chave_recuperacao = Cifrador(chave_resposta).cifrar_chave(chave_dados)
+    def gravar_senha(conn):
+        conn.execute(
+            """UPDATE usuarios SET senha_hash = ?,
+                   chave_senha = COALESCE(?, chave_senha), chave_recuperacao = COALESCE(?, chave_recuperacao),
+                   recuperacao_servidor = CASE WHEN ? IS NULL THEN recuperacao_servidor END
+            WHERE id = ?""",
+            (nova_senha_hash, chave_senha, chave_recuperacao, chave_senha, usuario_db['id'])
+        )
+        publicar_invalidacao(conn, 'tokens', usuario_db['id'])
+
+    conn = await pool_escrita.obter_async()
+    try:
+        await rodar_no_banco(conn, gravar_e_commitar, conn, gravar_senha)
     except sqlite3.Error as e:
-        conn.close()
         raise HTTPException(status_code=400, detail=f"Erro ao atualizar senha: {str(e)}")
     finally:
-        conn.close()
+        pool_escrita.devolver(conn)
+
+    # TOKENS ANTIGOS PRECISAM PASSAR DE NOVO PELA VERIFICAÇÃO COMPLETA (OS OUTROS WORKERS PELO AVISO)
+    invalidar_tokens_usuario(usuario_db['id'])
 
     return {"detail": "Senha atualizada com sucesso."}
     
 # ROTAS DE CLIENTES
 
 @router.get("/clientes/", response_model=List[ClienteResponse])
-def listar_clientes(usuario_atual: dict = Depends(obter_usuario_atual)):
-    """Lista todos os clientes do usuário autenticado"""
-    conn = obter_conexao()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM clientes WHERE usuario_id = ? AND status = 'ativo' ORDER BY nome_completo", (usuario_atual['usuario_id'],))
-    clientes = cursor.fetchall()
-    conn.close()
-    
-    return [formatar_cliente(cliente) for cliente in clientes]
-
-
-
+@resposta_condicional
+@handler_banco
+def listar_clientes(
+    request: Request,
+    limit: int = Query(PAGINACAO_LIMITE_PADRAO, ge=1, le=PAGINACAO_LIMITE_MAXIMO),
+    cursor: Optional[str] = Query(None, description="Valor do header X-Proximo-Cursor da página anterior"),
+    campos: Optional[str] = Query(None, description="Campos separados por vírgula, ex.: id,nome_completo"),
+    status: str = 'ativo',
+    usuario_atual: dict = Depends(obter_usuario_atual),
+    conn: sqlite3.Connection = Depends(obter_conexao_dados)
+):
+    """Lista os clientes do usuário autenticado, em ordem alfabética e paginados por cursor"""
+    colunas = selecionar_campos(campos, CAMPOS_CLIENTE) or CAMPOS_CLIENTE
+
+    filtros = ["usuario_id = ?", "status = ?"]
+    parametros = [usuario_atual['usuario_id'], status]
+    if cursor:
+        filtros.append("(nome_completo, id) > (?, ?)")
+        parametros.extend(decodificar_cursor(cursor, str, int))
+
+    selecao = colunas_da_consulta(colunas, ('nome_completo', 'id'))
+    clientes = conn.execute(
+        f"SELECT {selecao} FROM clientes WHERE {' AND '.join(filtros)} ORDER BY nome_completo, id LIMIT ?",
+        (*parametros, limit + 1)
+    ).fetchall()
+
+    proximo_cursor = None
+    if len(clientes) > limit:
+        clientes = clientes[:limit]
+        proximo_cursor = codificar_cursor(clientes[-1]['nome_completo'], clientes[-1]['id'])
+
+    itens = decifrar_itens(obter_cifrador(usuario_atual['usuario_id']), linhas_para_dicts(clientes, colunas), CAMPOS_CLIENTE_CIFRADOS)
+    return responder_pagina(itens, proximo_cursor)
+
+@router.get("/clientes/busca", response_model=List[BuscaClienteResponse])
+@resposta_condicional
+@handler_banco
+def buscar_clientes(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=150, description="Começo do nome (ou de um sobrenome), sem diferença de acentos e maiúsculas"),
+    limit: int = Query(BUSCA_NOMES_LIMITE_PADRAO, ge=1, le=BUSCA_NOMES_LIMITE_MAXIMO),
+    usuario_atual: dict = Depends(obter_usuario_atual),
+    conn: sqlite3.Connection = Depends(obter_conexao_dados)
+):
+    """Autocomplete de clientes pelo nome: primeiro quem começa com o texto, depois quem tem um
+    sobrenome que começa com ele e, com 3 ou mais letras, quem o contém; em cada grupo, os atendidos mais recentemente"""
+    if not normalizar_termo(q):
+        raise HTTPException(status_code=400, detail="Informe ao menos uma letra do nome.")
+    usuario_id = usuario_atual['usuario_id']
+    return RespostaJSON(content=buscar_por_nome(conn, usuario_id, q, limit, ler_versao_usuario(conn, usuario_id)))
+
+
+@router.get("/clientes/aniversariantes/", response_model=List[ClienteResponse])
 @router.get("/clientes/aniversariantes-proximos-30-dias/", response_model=List[ClienteResponse])
-def listar_aniversariantes(usuario_atual: dict = Depends(obter_usuario_atual)):
-    """Lista clientes com aniversário nos próximos 30 dias"""
-    conn = obter_conexao()
-    cursor = conn.cursor()
-    
-    hoje = date.today()
-    daqui_30_dias = hoje + timedelta(days=30)
-    
-    # Busca todos os clientes ativos
-    cursor.execute("""
-        SELECT * FROM clientes 
-        WHERE usuario_id = ? AND status = 'ativo'
-        ORDER BY strftime('%m-%d', data_nascimento)
-    """, (usuario_atual['usuario_id'],))
-    
-    clientes = cursor.fetchall()
-    conn.close()
-    
-    # Filtra apenas aniversariantes dos próximos 30 dias
+@resposta_condicional
+@handler_banco
+def listar_aniversariantes(
+    request: Request,
+    dias: int = Query(30, ge=0, le=364, description="Tamanho da janela em dias a partir de hoje"),
+    usuario_atual: dict = Depends(obter_usuario_atual),
+    conn: sqlite3.Connection = Depends(obter_conexao_dados)
+):
+    """Lista clientes com aniversário nos próximos `dias` dias (padrão 30), do mais próximo ao mais distante"""
     aniversariantes = []
-    for cliente in clientes:
-        try:
-            data_nasc = datetime.strptime(cliente['data_nascimento'], '%Y-%m-%d').date()
-            # Próximo aniversário deste ano
-            proximo_aniv = data_nasc.replace(year=hoje.year)
-            
-            # Se já passou este ano, próximo é no ano que vem
-            if proximo_aniv < hoje:
-                proximo_aniv = proximo_aniv.replace(year=hoje.year + 1)
-            
-            # Se está nos próximos 30 dias, inclui
-            if hoje <= proximo_aniv <= daqui_30_dias:
-                aniversariantes.append(formatar_cliente(cliente))
-        except Exception as e:
-            print(f"Erro ao processar cliente {cliente['id']}: {e}")
-            continue
-    
-    return aniversariantes
+    cifrador = obter_cifrador(usuario_atual['usuario_id'])
+
+    # UMA FAIXA POR ANO COBERTO PELA JANELA (DUAS QUANDO PASSA DE DEZEMBRO PARA JANEIRO)
+    for chave_inicial, chave_final in faixas_aniversario(date.today(), dias):
+        clientes = conn.execute(f"""
+            SELECT {', '.join(CAMPOS_CLIENTE)} FROM clientes
+            WHERE usuario_id = ? AND status = 'ativo' AND aniversario_chave BETWEEN ? AND ?
+            ORDER BY aniversario_chave, nome_completo
+        """, (usuario_atual['usuario_id'], chave_inicial, chave_final)).fetchall()
+        aniversariantes.extend(decifrar_itens(cifrador, linhas_para_dicts(clientes, CAMPOS_CLIENTE), CAMPOS_CLIENTE_CIFRADOS))
+
+    return RespostaJSON(content=aniversariantes)
+
+@router.get("/dashboard/resumo", response_model=DashboardResumo)
+@resposta_condicional
+@handler_banco
+def resumo_dashboard(
+    request: Request,
+    usuario_atual: dict = Depends(obter_usuario_atual),
+    conn: sqlite3.Connection = Depends(obter_conexao_dados)
+):
+    """Totais do painel (clientes, sessões e minutos), os últimos 12 meses e os clientes atendidos por último"""
+    # LÊ SÓ AS TABELAS DE RESUMO: O CUSTO NÃO CRESCE COM O HISTÓRICO DE ATENDIMENTOS
+    return RespostaJSON(content=consultar_resumo(conn, usuario_atual['usuario_id'], date.today()))
+
+def inserir_cliente(conn, usuario_id: int, cliente: Cliente, cifrador: Optional[Cifrador]) -> tuple:
+    """GRAVA O CLIENTE COM UM CÓDIGO NOVO; DEVOLVE (id, codigo). NÃO FAZ COMMIT"""
+    # GERA CÓDIGO ÚNICO PARA O CLIENTE NA MESMA TRANSAÇÃO DO INSERT
+    # (SE O INSERT FALHAR, O ROLLBACK DEVOLVE O NÚMERO DA SEQUÊNCIA)
+    novo_codigo = proximo_codigo_cliente(conn, usuario_id, date.today().year)
+    cursor = conn.execute(
+        """INSERT INTO clientes
+        (usuario_id, codigo_cliente, nome_completo, nome_normalizado, email, email_indice, telefone, data_nascimento,
+         endereco, data_registro)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        (usuario_id, novo_codigo, cliente.nome_completo, normalizar_nome(cliente.nome_completo),
+        cifrar_campo(cifrador, cliente.email, 'email'),
+        indice_email(cliente.email), cifrar_campo(cifrador, cliente.telefone, 'telefone'), cliente.data_nascimento,
+        cifrar_campo(cifrador, cliente.endereco, 'endereco'), datetime.now().isoformat())
+    )
+    return cursor.lastrowid, novo_codigo
 
 @router.post("/clientes/", response_model=ClienteResponse, status_code=201)
-def cadastrar_cliente(cliente: Cliente, usuario_atual: dict = Depends(obter_usuario_atual)):
+async def cadastrar_cliente(cliente: Cliente, usuario_atual: dict = Depends(obter_usuario_atual)):
     """Cadastra um novo Cliente"""
-    conn = obter_conexao()
-    cursor = conn.cursor()
-
-    # GERA CÓDIGO ÚNICO PARA O CLIENTE
-    ano_atual = date.today().year
-    cursor.execute(
-        "SELECT COUNT(*) as total FROM clientes WHERE usuario_id = ? AND codigo_cliente LIKE ?",
-        (usuario_atual['usuario_id'], f"{ano_atual}/%")
-    )
-    total_no_ano = cursor.fetchone()['total']
-    novo_codigo = f"{ano_atual}/{total_no_ano + 1:04d}"
-
+    usuario_id = usuario_atual['usuario_id']
     try:
-        cursor.execute(
-            """INSERT INTO clientes
-            (usuario_id, codigo_cliente, nome_completo, email, telefone, data_nascimento, endereco, data_registro)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-            (usuario_atual['usuario_id'], novo_codigo, cliente.nome_completo, cliente.email, 
-            cliente.telefone, cliente.data_nascimento, cliente.endereco, datetime.now().isoformat())
-        )
-        conn.commit()
-        novo_id = cursor.lastrowid
+        novo_id, novo_codigo = await executar_gravacao(usuario_id, inserir_cliente, usuario_id, cliente,
+                                                       obter_cifrador(usuario_id))
     except sqlite3.IntegrityError as e:
-        conn.close()
         if 'email' in str(e):
             raise HTTPException(status_code=400, detail=f"Email '{cliente.email}' já cadastrado")
         raise HTTPException(status_code=400, detail="Erro ao cadastrar cliente")
-    finally:
-        conn.close()
 
     dados_criados = cliente.model_dump()
     dados_criados.update({'id': novo_id, 'codigo_cliente': novo_codigo, 'status': 'ativo'})
-    return dados_criados
+    return RespostaJSON(content=dados_criados, status_code=201)
 
 @router.get("/clientes/{cliente_id}/", response_model=ClienteResponse)
-def buscar_cliente(cliente_id: int, usuario_atual: dict = Depends(obter_usuario_atual)):
+@resposta_condicional
+@handler_banco
+def buscar_cliente(cliente_id: int, request: Request, usuario_atual: dict = Depends(obter_usuario_atual), conn: sqlite3.Connection = Depends(obter_conexao_dados)):
     """Busca um Cliente específico"""
-    conn = obter_conexao()
     cursor = conn.cursor()
     cursor.execute(
-        "SELECT * FROM clientes WHERE id = ? AND usuario_id = ?",
+        f"SELECT {', '.join(CAMPOS_CLIENTE)} FROM clientes WHERE id = ? AND usuario_id = ?",
         (cliente_id, usuario_atual['usuario_id'])
     )
     cliente = cursor.fetchone()
-    conn.close()
 
     if cliente is None:
         raise HTTPException(status_code=404, detail="Cliente não encontrado")
     
-    return formatar_cliente(cliente)
+    dados = decifrar_itens(obter_cifrador(usuario_atual['usuario_id']), [dict(zip(CAMPOS_CLIENTE, cliente))], CAMPOS_CLIENTE_CIFRADOS)
+    return RespostaJSON(content=dados[0])
+
+@router.get("/clientes/{cliente_id}/detalhes/", response_model=ClienteDetalhes)
+@resposta_condicional
+@handler_banco
+def detalhes_cliente(
+    cliente_id: int,
+    request: Request,
+    limit: int = Query(PAGINACAO_LIMITE_PADRAO, ge=1, le=PAGINACAO_LIMITE_MAXIMO),
+    usuario_atual: dict = Depends(obter_usuario_atual),
+    conn: sqlite3.Connection = Depends(obter_conexao_dados)
+):
+    """Página do cliente numa requisição: dados, estatísticas e a primeira página de atendimentos.
+    As páginas seguintes vêm de /clientes/{id}/atendimentos/?cursor={proximo_cursor}"""
+    detalhes = consultar_detalhes_cliente(conn, usuario_atual['usuario_id'], cliente_id, limit)
+    if detalhes is None:
+        raise HTTPException(status_code=404, detail="Cliente não encontrado")
+    return RespostaJSON(content=detalhes)
 
 # ROTAS DE ATENDIMENTOS
-@router.get("/clientes/{cliente_id}/atendimentos/", response_model=List[AtendimentoResponse])
-def listar_atendimentos(cliente_id: int, usuario_atual: dict = Depends(obter_usuario_atual)):
-    """Lista de atendimentos de um cliente"""
-    conn = obter_conexao()
-    cursor = conn.cursor()
-
-    # VERIFICA SE O CLIENTE PERTENCE AO USUARIO
-    cursor.execute(
-        "SELECT id FROM clientes WHERE id = ? AND usuario_id = ?",
-        (cliente_id, usuario_atual['usuario_id'])
-    )
-    if not cursor.fetchone():
-        conn.close()
-        raise HTTPException(status_code=404, detail="Cliente não encontrado")
-    
-    cursor.execute(
-        "SELECT * FROM atendimentos WHERE cliente_id=? AND usuario_id = ? ORDER BY data_atendimento DESC",
-        (cliente_id, usuario_atual['usuario_id'])
-    )
-    atendimentos = cursor.fetchall()
-    conn.close()
+@router.get("/atendimentos/busca", response_model=List[BuscaAtendimentoResponse])
+@resposta_condicional
+@handler_banco
+def buscar_atendimentos(
+    request: Request,
+    q: str = Query(..., min_length=2, max_length=200, description="Palavras a buscar nas anotações; use * no fim para prefixo"),
+    cliente_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=PAGINACAO_LIMITE_MAXIMO),
+    cursor: Optional[str] = Query(None, description="Valor do header X-Proximo-Cursor da página anterior"),
+    usuario_atual: dict = Depends(obter_usuario_atual),
+    conn: sqlite3.Connection = Depends(obter_conexao_dados)
+):
+    """Busca textual nas anotações de todos os atendimentos do usuário, ordenada por relevância (bm25)"""
+    if not BUSCA_DISPONIVEL:
+        raise HTTPException(status_code=503, detail="Busca textual indisponível nesta instalação.")
+    if CRIPTOGRAFIA_ATIVA: # O ÍNDICE NÃO ENXERGA O CONTEÚDO CIFRADO
+        raise HTTPException(status_code=503, detail="Busca textual indisponível com a criptografia de campos ativa.")
+
+    deslocamento = decodificar_cursor(cursor, int)[0] if cursor else 0
+    if deslocamento < 0:
+        raise HTTPException(status_code=400, detail="Cursor inválido.")
+    consulta = montar_consulta_busca(q, usuario_atual['usuario_id'])
+
+    filtros = ["atendimentos_fts MATCH ?", "a.usuario_id = ?"]
+    parametros = [consulta, usuario_atual['usuario_id']]
+    if cliente_id is not None:
+        filtros.append("a.cliente_id = ?")
+        parametros.append(cliente_id)
+
+    # bm25 com peso 0 na coluna usuario_id, que só serve para restringir o MATCH
+    linhas = conn.execute(f"""
+        SELECT a.id, a.cliente_id, c.nome_completo AS nome_cliente, a.data_atendimento, a.duracao_minutos,
+               snippet(atendimentos_fts, 0, '<mark>', '</mark>', '…', 16) AS trecho,
+               -bm25(atendimentos_fts, 1.0, 0.0) AS relevancia
+        FROM atendimentos_fts
+        JOIN atendimentos a ON a.id = atendimentos_fts.rowid
+        JOIN clientes c ON c.id = a.cliente_id
+        WHERE {' AND '.join(filtros)}
+        ORDER BY relevancia DESC, a.id
+        LIMIT ? OFFSET ?
+    """, (*parametros, limit + 1, deslocamento)).fetchall()
+
+    proximo_cursor = None
+    if len(linhas) > limit:
+        linhas = linhas[:limit]
+        proximo_cursor = codificar_cursor(deslocamento + limit)
+
+    return responder_pagina(linhas_para_dicts(linhas, CAMPOS_BUSCA), proximo_cursor)
 
-    return [formatar_atendimento(atendimento) for atendimento in atendimentos]
+@router.get("/clientes/{cliente_id}/atendimentos/", response_model=List[AtendimentoResponse])
+@resposta_condicional
+@handler_banco
+def listar_atendimentos(
+    cliente_id: int,
+    request: Request,
+    limit: int = Query(PAGINACAO_LIMITE_PADRAO, ge=1, le=PAGINACAO_LIMITE_MAXIMO),
+    cursor: Optional[str] = Query(None, description="Valor do header X-Proximo-Cursor da página anterior"),
+    campos: Optional[str] = Query(None, description="Campos separados por vírgula, ex.: id,data_atendimento,duracao_minutos"),
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    usuario_atual: dict = Depends(obter_usuario_atual),
+    conn: sqlite3.Connection = Depends(obter_conexao_dados)
+):
+    """Lista de atendimentos de um cliente, paginada por cursor"""
+    return paginar_atendimentos(conn, usuario_atual['usuario_id'], cliente_id, limit, cursor,
+                                campos, data_inicio, data_fim)
 
 @router.post("/clientes/{cliente_id}/atendimentos/", response_model=AtendimentoResponse, status_code=201)
-def criar_atendimento(cliente_id: int, atendimento: Atendimento, usuario_atual: dict = Depends(obter_usuario_atual)):
+async def criar_atendimento(cliente_id: int, atendimento: Atendimento, usuario_atual: dict = Depends(obter_usuario_atual)):
     """Criar um novo atendimento"""
-    conn = obter_conexao()
-    cursor = conn.cursor()
-
-    # VERIFICA SE CLIENTE PERTENCE AO USUARIO
-    cursor.execute(
-        "SELECT id FROM clientes WHERE id = ? AND usuario_id = ?",
-        (cliente_id, usuario_atual['usuario_id'])
-    )
-    if not cursor.fetchone():
-        conn.close()
-        raise HTTPException(status_code=404, detail="Cliente não encontrado")
-    
+    usuario_id = usuario_atual['usuario_id']
     try:
-        cursor.execute(
-            """INSERT INTO atendimentos
-                (usuario_id, cliente_id, data_atendimento, conteudo, duracao_minutos, data_registro)
-                VALUES (?, ?, ?, ?, ?, ?)""",
-                (usuario_atual['usuario_id'], cliente_id, atendimento.data_atendimento,
-                atendimento.conteudo, atendimento.duracao_minutos, datetime.now().isoformat())
-        )
-        conn.commit()
-        novo_id = cursor.lastrowid
+        novo_id = await executar_gravacao(usuario_id, inserir_atendimento, usuario_id, cliente_id, atendimento,
+                                          obter_cifrador(usuario_id))
     except sqlite3.Error as e:
-        conn.close()
         raise HTTPException(status_code=400, detail=f"Erro ao criar atendimento: {str(e)}")
-    finally:
-        conn.close()
+    if novo_id is None:
+        raise HTTPException(status_code=404, detail="Cliente não encontrado")
 
     dados_criados = atendimento.model_dump()
     dados_criados.update({'id': novo_id, 'cliente_id': cliente_id, 'data_registro': datetime.now().isoformat()})
-    return dados_criados
+    return RespostaJSON(content=dados_criados, status_code=201)
 
 @router.get("/clientes/{cliente_id}/sessoes/", response_model=List[AtendimentoResponse])
-def listar_sessoes_cliente(cliente_id: int, usuario_atual: dict = Depends(obter_usuario_atual)):
-    """Lista todas as sessões de um cliente"""
-    conn = obter_conexao()
-    cursor = conn.cursor()
-    
-    # VERIFICA SE O CLIENTE PERTENCE AO USUARIO
-    cursor.execute(
-        "SELECT id FROM clientes WHERE id = ? AND usuario_id = ?",
-        (cliente_id, usuario_atual['usuario_id'])
-    )
-    if not cursor.fetchone():
-        conn.close()
-        raise HTTPException(status_code=404, detail="Cliente não encontrado")
-    
-    cursor.execute("SELECT * FROM atendimentos WHERE cliente_id = ? AND usuario_id = ? ORDER BY data_atendimento DESC", (cliente_id, usuario_atual['usuario_id']))
-    sessoes = cursor.fetchall()
-    conn.close()
-    
-    return [formatar_atendimento(sessao) for sessao in sessoes]
+@resposta_condicional
+@handler_banco
+def listar_sessoes_cliente(
+    cliente_id: int,
+    request: Request,
+    limit: int = Query(PAGINACAO_LIMITE_PADRAO, ge=1, le=PAGINACAO_LIMITE_MAXIMO),
+    cursor: Optional[str] = Query(None, description="Valor do header X-Proximo-Cursor da página anterior"),
+    campos: Optional[str] = Query(None, description="Campos separados por vírgula, ex.: id,data_atendimento,duracao_minutos"),
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    usuario_atual: dict = Depends(obter_usuario_atual),
+    conn: sqlite3.Connection = Depends(obter_conexao_dados)
+):
+    """Lista as sessões de um cliente, paginada por cursor"""
+    return paginar_atendimentos(conn, usuario_atual['usuario_id'], cliente_id, limit, cursor,
+                                campos, data_inicio, data_fim)
 
 
 @router.post("/clientes/{cliente_id}/sessoes/", response_model=AtendimentoResponse, status_code=201)
-def criar_sessao_cliente(cliente_id: int, sessao: Atendimento, usuario_atual: dict = Depends(obter_usuario_atual)):
+async def criar_sessao_cliente(cliente_id: int, sessao: Atendimento, usuario_atual: dict = Depends(obter_usuario_atual)):
     """Cria uma nova sessão para um cliente"""
-    conn = obter_conexao()
-    cursor = conn.cursor()
-    
-    # VERIFICA SE O CLIENTE PERTENCE AO USUARIO
-    cursor.execute(
-        "SELECT id FROM clientes WHERE id = ? AND usuario_id = ?",
-        (cliente_id, usuario_atual['usuario_id'])
-    )
-    if not cursor.fetchone():
-        conn.close()
-        raise HTTPException(status_code=404, detail="Cliente não encontrado")
-    
+    usuario_id = usuario_atual['usuario_id']
     try:
-        cursor.execute(
-            """INSERT INTO atendimentos (usuario_id, cliente_id, data_atendimento, conteudo, duracao_minutos, data_registro)
-               VALUES (?, ?, ?, ?, ?, ?)""",
-            (usuario_atual['usuario_id'], cliente_id, sessao.data_atendimento, sessao.conteudo, sessao.duracao_minutos, datetime.now().isoformat())
-        )
-        conn.commit()
-        sessao_id = cursor.lastrowid
+        sessao_id = await executar_gravacao(usuario_id, inserir_atendimento, usuario_id, cliente_id, sessao,
+                                            obter_cifrador(usuario_id))
     except sqlite3.Error as e:
-        conn.close()
         raise HTTPException(status_code=400, detail=f"Erro ao criar sessão: {str(e)}")
-    finally:
-        conn.close()
+    if sessao_id is None:
+        raise HTTPException(status_code=404, detail="Cliente não encontrado")
     
     dados_criados = sessao.model_dump()
     dados_criados.update({'id': sessao_id, 'cliente_id': cliente_id, 'data_registro': datetime.now().isoformat()})
-    return dados_criados
+    return RespostaJSON(content=dados_criados, status_code=201)
+
+
+# ROTAS DA AGENDA
+@router.get("/agendamentos/", response_model=List[OcorrenciaAgenda])
+@resposta_condicional
+@handler_banco
+def listar_agenda(
+    request: Request,
+    visao: Literal['dia', 'semana', 'mes'] = 'semana',
+    data: Optional[date] = Query(None, description="Um dia do período (padrão: hoje); a semana vai de segunda a domingo"),
+    usuario_atual: dict = Depends(obter_usuario_atual),
+    conn: sqlite3.Connection = Depends(obter_conexao_dados)
+):
+    """Calendário do dia, da semana ou do mês, em ordem de horário, com as sessões recorrentes já expandidas.
+    Sessões canceladas não aparecem; as que viraram atendimento trazem o atendimento_id"""
+    usuario_id = usuario_atual['usuario_id']
+    try:
+        inicio, fim = janela_calendario(visao, validar_data_agenda(data or date.today()))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    itens = consultar_agenda(conn, usuario_id, inicio, fim)
+    return RespostaJSON(content=decifrar_itens(obter_cifrador(usuario_id), itens, CAMPOS_AGENDAMENTO_CIFRADOS))
+
+@router.post("/agendamentos/", response_model=AgendamentoResponse, status_code=201)
+async def agendar(agendamento: Agendamento, usuario_atual: dict = Depends(obter_usuario_atual)):
+    """Agenda uma sessão (ou uma série semanal com intervalo_semanas). Horário ocupado: 409 com os conflitos"""
+    usuario_id = usuario_atual['usuario_id']
+    novo_id, conflitos = await executar_gravacao(
+        usuario_id, gravar_agendamento, usuario_id, agendamento.cliente_id, agendamento.inicio,
+        agendamento.duracao_minutos, agendamento.intervalo_semanas, agendamento.repetir_ate,
+        cifrar_campo(obter_cifrador(usuario_id), agendamento.observacao, 'observacao')
+    )
+    if conflitos:
+        raise HTTPException(status_code=409, detail={"mensagem": "Horário ocupado", "conflitos": conflitos})
+    if novo_id is None:
+        raise HTTPException(status_code=404, detail="Cliente não encontrado")
+
+    dados_criados = agendamento.model_dump(mode='json')
+    dados_criados['id'] = novo_id
+    return RespostaJSON(content=dados_criados, status_code=201)
+
+@router.delete("/agendamentos/{agendamento_id}", status_code=204)
+async def cancelar_agendamento(
+    agendamento_id: int,
+    ocorrencia: Optional[datetime] = Query(None, description="Início de uma sessão da série: cancela só ela"),
+    usuario_atual: dict = Depends(obter_usuario_atual)
+):
+    """Cancela a sessão avulsa ou a série inteira; com `ocorrencia`, só aquela sessão da série.
+    Atendimentos já registrados a partir da agenda continuam"""
+    usuario_id = usuario_atual['usuario_id']
+    try:
+        validar_data_agenda(ocorrencia)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def cancelar(conn):
+        if ocorrencia is None:
+            return remover_agendamento(conn, usuario_id, agendamento_id)
+        encontrada = localizar_ocorrencia(conn, usuario_id, agendamento_id, hora_local(ocorrencia))
+        if encontrada is None or encontrada['situacao'] != 'agendada':
+            return False
+        if not encontrada['recorrente']:
+            return remover_agendamento(conn, usuario_id, agendamento_id)
+        registrar_excecao(conn, usuario_id, agendamento_id, encontrada['inicio'])
+        return True
+
+    if not await executar_gravacao(usuario_id, cancelar):
+        raise HTTPException(status_code=404, detail="Agendamento não encontrado")
+    return Response(status_code=204)
+
+def converter_em_atendimento(conn, usuario_id: int, agendamento_id: int, conversao: ConversaoAtendimento,
+                             cifrador: Optional[Cifrador]) -> dict:
+    """GRAVA A SESSÃO AGENDADA (JÁ PASSADA) COMO ATENDIMENTO E A MARCA COMO REALIZADA. NÃO FAZ COMMIT"""
+    ocorrencia = hora_local(conversao.ocorrencia) if conversao.ocorrencia is not None else None
+    encontrada = localizar_ocorrencia(conn, usuario_id, agendamento_id, ocorrencia)
+    if encontrada is None:
+        raise HTTPException(status_code=404, detail="Sessão não encontrada na agenda (nas séries, informe a ocorrencia)")
+    if encontrada['situacao'] != 'agendada':
+        raise HTTPException(status_code=409, detail=f"Sessão já {encontrada['situacao']}")
+    if encontrada['inicio'] > formatar_horario(datetime.now()):
+        raise HTTPException(status_code=400, detail="A sessão ainda não aconteceu")
+
+    atendimento = Atendimento(data_atendimento=date.fromisoformat(encontrada['inicio'][:10]), conteudo=conversao.conteudo,
+                              duracao_minutos=conversao.duracao_minutos or encontrada['duracao_minutos'])
+    atendimento_id = inserir_atendimento(conn, usuario_id, encontrada['cliente_id'], atendimento, cifrador)
+    registrar_excecao(conn, usuario_id, agendamento_id, encontrada['inicio'], atendimento_id)
+    return {**atendimento.model_dump(mode='json'), 'id': atendimento_id, 'cliente_id': encontrada['cliente_id'],
+            'data_registro': datetime.now().isoformat()}
+
+@router.post("/agendamentos/{agendamento_id}/atendimento", response_model=AtendimentoResponse, status_code=201)
+async def registrar_atendimento_agendado(agendamento_id: int, conversao: ConversaoAtendimento,
+                                         usuario_atual: dict = Depends(obter_usuario_atual)):
+    """Registra uma sessão agendada que já aconteceu como atendimento (data e duração vêm da agenda)"""
+    usuario_id = usuario_atual['usuario_id']
+    criado = await executar_gravacao(usuario_id, converter_em_atendimento, usuario_id, agendamento_id, conversao,
+                                     obter_cifrador(usuario_id))
+    return RespostaJSON(content=criado, status_code=201)
+
+# ROTAS DE IMPORTAÇÃO EM MASSA
+class RelatorioImportacao:
+    """ACUMULA O RESULTADO DA IMPORTAÇÃO, LIMITANDO OS ERROS DETALHADOS"""
+
+    def __init__(self):
+        self.total_linhas = 0
+        self.importados = 0
+        self.com_erro = 0
+        self.erros = []
+
+    def erro(self, linha: int, mensagens: list):
+        self.com_erro += 1
+        if len(self.erros) < IMPORTACAO_MAX_ERROS:
+            self.erros.append(ErroImportacao(linha=linha, erros=mensagens))
+
+    def resposta(self) -> ImportacaoResponse:
+        self.erros.sort(key=lambda erro: erro.linha)
+        return ImportacaoResponse(
+            total_linhas=self.total_linhas, importados=self.importados,
+            com_erro=self.com_erro, erros=self.erros
+        )
+
+SQL_INSERIR_CLIENTE = """INSERT INTO clientes
+    (usuario_id, codigo_cliente, nome_completo, nome_normalizado, email, email_indice, telefone, data_nascimento,
+     endereco, data_registro)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
+SQL_INSERIR_ATENDIMENTO = """INSERT INTO atendimentos
+    (usuario_id, cliente_id, data_atendimento, conteudo, duracao_minutos, data_registro)
+    VALUES (?, ?, ?, ?, ?, ?)"""
+
+def inserir_lote(conn, sql: str, linhas: list, montar, relatorio: RelatorioImportacao):
+    """INSERE O LOTE COM executemany NUMA TRANSAÇÃO; SE ALGUMA LINHA VIOLAR UMA RESTRIÇÃO, REFAZ LINHA A LINHA"""
+    if linhas:
+        try:
+            conn.execute("SAVEPOINT lote")
+            conn.executemany(sql, [montar(conn, item, len(linhas), indice) for indice, item in enumerate(linhas)])
+            conn.execute("RELEASE lote")
+            relatorio.importados += len(linhas)
+        except sqlite3.IntegrityError:
+            conn.execute("ROLLBACK TO lote")
+            conn.execute("RELEASE lote")
+            for item in linhas:
+                try:
+                    conn.execute("SAVEPOINT linha")
+                    conn.execute(sql, montar(conn, item, 1, 0))
+                    conn.execute("RELEASE linha")
+                    relatorio.importados += 1
+                except sqlite3.IntegrityError as e:
+                    conn.execute("ROLLBACK TO linha")
+                    conn.execute("RELEASE linha")
+                    relatorio.erro(item[0], [f"Restrição violada: {e}"])
+    conn.commit()
+
+async def importar_arquivo(usuario_id: int, arquivo: UploadFile, formato: Optional[str], modelo, preparar_lote) -> ImportacaoResponse:
+    """LÊ, VALIDA E GRAVA O ARQUIVO EM LOTES; A FAIXA DE ESCRITA É LIBERADA ENTRE UM LOTE E OUTRO"""
+    try:
+        formato = detectar_formato(arquivo.filename, arquivo.content_type, formato)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    _, pool = await pools_do_usuario(usuario_id)
+    relatorio = RelatorioImportacao()
+    registros = ler_registros(arquivo.file, formato)
+    while True:
+        validos, erros = await run_in_threadpool(validar_lote, registros, modelo, IMPORTACAO_LOTE)
+        if not validos and not erros:
+            break
+        relatorio.total_linhas += len(validos) + len(erros)
+        for linha, mensagens in erros:
+            relatorio.erro(linha, mensagens)
+
+        conn = await pool.obter_async()
+        try:
+            await rodar_no_banco(conn, preparar_lote, conn, validos, relatorio)
+        finally:
+            pool.devolver(conn)
+
+    return relatorio.resposta()
+
+@router.post("/importacao/clientes", response_model=ImportacaoResponse)
+async def importar_clientes(
+    arquivo: UploadFile = File(..., description="CSV com cabeçalho ou NDJSON (um objeto por linha) com os campos de Cliente"),
+    formato: Optional[Literal['csv', 'ndjson']] = None,
+    usuario_atual: dict = Depends(obter_usuario_atual)
+):
+    """Importa clientes em massa; linhas inválidas vão para o relatório sem interromper o restante"""
+    usuario_id = usuario_atual['usuario_id']
+    ano = date.today().year
+    cifrador = obter_cifrador(usuario_id)
+
+    def gravar(conn, validos, relatorio):
+        agora = datetime.now().isoformat()
+        primeiro = {}
+
+        def montar(conn, item, quantidade, indice):
+            # UM BLOCO DE NÚMEROS POR executemany, OU UM NÚMERO POR LINHA NO MODO LINHA A LINHA
+            if indice == 0:
+                primeiro['numero'] = reservar_numeros_cliente(conn, usuario_id, ano, quantidade)
+            _, cliente, _ = item
+            return (usuario_id, f"{ano}/{primeiro['numero'] + indice:04d}", cliente.nome_completo,
+                    normalizar_nome(cliente.nome_completo), cifrar_campo(cifrador, cliente.email, 'email'), indice_email(cliente.email),
+                    cifrar_campo(cifrador, cliente.telefone, 'telefone'),
+                    cliente.data_nascimento.isoformat(), cifrar_campo(cifrador, cliente.endereco, 'endereco'), agora)
+
+        inserir_lote(conn, SQL_INSERIR_CLIENTE, validos, montar, relatorio)
+
+    return await importar_arquivo(usuario_id, arquivo, formato, Cliente, gravar)
+
+@router.post("/importacao/atendimentos", response_model=ImportacaoResponse)
+async def importar_atendimentos(
+    arquivo: UploadFile = File(..., description="CSV ou NDJSON com os campos de Atendimento mais cliente_id ou codigo_cliente"),
+    formato: Optional[Literal['csv', 'ndjson']] = None,
+    usuario_atual: dict = Depends(obter_usuario_atual)
+):
+    """Importa atendimentos em massa para clientes do usuário, identificados por cliente_id ou codigo_cliente"""
+    usuario_id = usuario_atual['usuario_id']
+    cifrador = obter_cifrador(usuario_id)
+
+    # UMA ÚNICA CONSULTA DE POSSE EM VEZ DE UM SELECT POR LINHA
+    pool, _ = await pools_do_usuario(usuario_id)
+    conn = await pool.obter_async()
+    try:
+        linhas = await rodar_no_banco(
+            conn, lambda: conn.execute("SELECT id, codigo_cliente FROM clientes WHERE usuario_id = ?", (usuario_id,)).fetchall()
+        )
+    finally:
+        pool.devolver(conn)
+    ids_por_codigo = {linha['codigo_cliente']: linha['id'] for linha in linhas}
+    ids_do_usuario = set(ids_por_codigo.values())
+
+    def gravar(conn, validos, relatorio):
+        agora = datetime.now().isoformat()
+        resolvidos = []
+        for numero, atendimento, _ in validos:
+            cliente_id = atendimento.cliente_id
+            if cliente_id is None and atendimento.codigo_cliente is not None:
+                cliente_id = ids_por_codigo.get(atendimento.codigo_cliente)
+            if cliente_id not in ids_do_usuario:
+                relatorio.erro(numero, ["Cliente não encontrado"])
+                continue
+            resolvidos.append((numero, atendimento, cliente_id))
+
+        def montar(conn, item, quantidade, indice):
+            _, atendimento, cliente_id = item
+            return (usuario_id, cliente_id, atendimento.data_atendimento.isoformat(),
+                    cifrar_campo(cifrador, atendimento.conteudo, 'conteudo'), atendimento.duracao_minutos, agora)
+
+        inserir_lote(conn, SQL_INSERIR_ATENDIMENTO, resolvidos, montar, relatorio)
+
+    return await importar_arquivo(usuario_id, arquivo, formato, AtendimentoImportacao, gravar)
+
+
+# EXPORTAÇÃO DO PRONTUÁRIO (STREAMING)
+# Cada exportação usa uma conexão própria (fora do pool) e uma transação de
+# leitura: o snapshot fica consistente do começo ao fim e, no modo WAL, não
+# bloqueia as escritas de ninguém. O gerador é síncrono e cada bloco é lido
+# fora do event loop (iterar_no_banco), que continua livre.
+exportacoes_ativas = threading.BoundedSemaphore(EXPORTACAO_MAX_SIMULTANEAS)
+
+async def transmitir_exportacao(usuario_id: int, cliente_id: Optional[int], formato: str, comprimir: bool, nome_arquivo: str):
+    cifrador = obter_cifrador(usuario_id)
+    if not exportacoes_ativas.acquire(blocking=False):
+        raise HTTPException(status_code=503, detail="Muitas exportações em andamento, tente novamente.", headers={"Retry-After": "5"})
+    try:
+        await pools_do_usuario(usuario_id)  # GARANTE O SCHEMA DO SHARD
+        conn = await run_in_threadpool(abrir_conexao, caminho_banco_usuario(usuario_id))
+    except Exception:
+        exportacoes_ativas.release()
+        raise
+
+    liberado = []
+    def liberar(): # IDEMPOTENTE: CHAMADO NO FIM DO GERADOR E, POR GARANTIA, COMO BACKGROUND TASK
+        if not liberado:
+            liberado.append(True)
+            conn.close()
+            exportacoes_ativas.release()
+
+    try:
+        if cliente_id is not None:
+            existe = await rodar_no_banco(
+                conn, lambda: conn.execute("SELECT 1 FROM clientes WHERE id = ? AND usuario_id = ?", (cliente_id, usuario_id)).fetchone()
+            )
+            if existe is None:
+                raise HTTPException(status_code=404, detail="Cliente não encontrado")
+    except Exception:
+        liberar()
+        raise
+
+    def gerar():
+        try:
+            conn.execute("BEGIN")
+            blocos = em_blocos(GERADORES[formato](consultar_prontuario(conn, usuario_id, cliente_id, cifrador=cifrador)))
+            if comprimir:
+                blocos = comprimir_gzip(blocos)
+            yield from blocos
+        finally:
+            liberar()
+
+    tipo, extensao = FORMATOS_EXPORTACAO[formato]
+    nome_arquivo = f"{nome_arquivo}.{extensao}"
+    if comprimir:
+        tipo, nome_arquivo = 'application/gzip', nome_arquivo + '.gz'
+    return StreamingResponse(
+        iterar_no_banco(conn, gerar()), media_type=tipo, background=BackgroundTask(liberar),
+        headers={"Content-Disposition": f'attachment; filename="{nome_arquivo}"'}
+    )
 
+@router.get("/clientes/{cliente_id}/exportacao")
+async def exportar_prontuario_cliente(
+    cliente_id: int,
+    formato: Literal['ndjson', 'csv', 'json'] = 'ndjson',
+    gzip: bool = Query(False, description="Compacta o arquivo (.gz) durante a transmissão"),
+    usuario_atual: dict = Depends(obter_usuario_atual)
+):
+    """Exporta o prontuário completo de um cliente (dados + todos os atendimentos) em streaming"""
+    return await transmitir_exportacao(usuario_atual['usuario_id'], cliente_id, formato, gzip,
+                                       f"prontuario_cliente_{cliente_id}")
+
+@router.get("/exportacao")
+async def exportar_prontuarios(
+    formato: Literal['ndjson', 'csv', 'json'] = 'ndjson',
+    gzip: bool = Query(False, description="Compacta o arquivo (.gz) durante a transmissão"),
+    usuario_atual: dict = Depends(obter_usuario_atual)
+):
+    """Exporta todos os clientes e atendimentos do profissional em streaming"""
+    return await transmitir_exportacao(usuario_atual['usuario_id'], None, formato, gzip,
+                                       f"prontuarios_{date.today().isoformat()}")
+
+
+# SINCRONIZAÇÃO (BACKUP INCREMENTAL)
+sincronizador = Sincronizador(criar_armazenamento()) if ENABLE_GOOGLE_DRIVE_SYNC else None
+
+# TAREFAS DE FUNDO: COM VÁRIOS WORKERS, SÓ UM FAZ BACKUP E ARQUIVO (O LOCK
+# {DB_NAME}.lider É SOLTO PELO SISTEMA SE O PROCESSO CAIR E OUTRO ASSUME)
+lideranca = Lideranca(DB_NAME)
+
+async def assumir_tarefas_de_fundo(tarefas: list):
+    while not lideranca.tentar():
+        await asyncio.sleep(LIDERANCA_INTERVALO_SECONDS)
+    if sincronizador is not None:
+        tarefas.append(asyncio.create_task(sincronizador.executar_periodicamente(SYNC_INTERVAL_SECONDS)))
+    if ARQUIVO_IDADE_DIAS > 0:
+        tarefas.append(asyncio.create_task(arquivar_periodicamente()))
+
+@router.get("/sincronizacao/status")
+async def status_sincronizacao(usuario_atual: dict = Depends(obter_usuario_atual)):
+    """Métricas do último backup: duração, bytes enviados e bancos com alterações ainda não enviadas"""
+    if sincronizador is None:
+        return {"ativo": False}
+    return {"ativo": True, **sincronizador.status()}
+
+
+# MÉTRICAS (PROMETHEUS)
+def coletar_metricas_da_api() -> list:
+    caches = {'tokens': cache_tokens, 'respostas': cache_respostas, 'chaves_dados': chaves_dados, 'nomes': cache_nomes}
+    caches = {nome: cache for nome, cache in caches.items() if cache is not None}
+    linhas = metricas.serie_simples("prontuario_cache_acertos_total", "counter", "Acertos dos caches em memória",
+                                    {nome: cache.acertos for nome, cache in caches.items()}, "cache")
+    linhas += metricas.serie_simples("prontuario_cache_falhas_total", "counter", "Falhas dos caches em memória",
+                                     {nome: cache.falhas for nome, cache in caches.items()}, "cache")
+    for pool, nome in ((pool_leitura, 'leitura'), (pool_escrita, 'escrita')):
+        linhas += metricas.serie_simples(f"prontuario_pool_{nome}_conexoes", "gauge", f"Conexões do pool de {nome} do banco principal",
+                                         pool.estado(), "estado")
+    if ESCRITA_AGRUPADA and roteador_shards is None:
+        escritor = pool_escrita.escritor
+        linhas += metricas.serie_simples("prontuario_escrita_agrupada_total", "counter", "Transações e operações do group commit",
+                                         {'transacoes': escritor.grupos, 'operacoes': escritor.operacoes}, "tipo")
+    # CADA WORKER EXPÕE SÓ OS PRÓPRIOS NÚMEROS (O PROMETHEUS SOMA PELO pid)
+    linhas += metricas.serie_simples("prontuario_worker_lider", "gauge", "1 no worker que roda as tarefas de fundo",
+                                     {str(os.getpid()): int(lideranca.lider)}, "pid")
+    linhas += metricas.serie_simples("prontuario_invalidacoes_total", "counter", "Avisos de invalidação entre workers",
+                                     {'verificacoes': canal_invalidacao.verificacoes,
+                                      'recebidos': canal_invalidacao.avisos_recebidos}, "tipo")
+    if sincronizador is not None:
+        estado = sincronizador.status()
+        for chave, tipo in (('duracao_ultima_segundos', 'gauge'), ('bytes_enviados_ultima', 'gauge'),
+                            ('bytes_enviados_total', 'counter'), ('bancos_pendentes', 'gauge'),
+                            ('segundos_desde_ultima', 'gauge'), ('falhas', 'counter')):
+            linhas += metricas.serie_simples(f"prontuario_sincronizacao_{chave}", tipo, f"Backup: {chave}", {None: estado[chave]})
+    return linhas
+
+if METRICAS_ATIVAS:
+    metricas.registrar_coletor(coletar_metricas_da_api)
+
+    def autorizar_metricas(request: Request):
+        """TOKEN PRÓPRIO (METRICAS_TOKEN) OU, SEM ELE, SÓ CONEXÕES DA PRÓPRIA MÁQUINA"""
+        if METRICAS_TOKEN:
+            esquema, _, token = request.headers.get('authorization', '').partition(' ')
+            if esquema.lower() != 'bearer' or not hmac.compare_digest(token.encode(), METRICAS_TOKEN.encode()):
+                raise HTTPException(status_code=401, detail="Token das métricas inválido",
+                                    headers={"WWW-Authenticate": "Bearer"})
+        elif request.client is None or request.client.host not in ('127.0.0.1', '::1'):
+            raise HTTPException(status_code=403, detail="Métricas só na própria máquina (ou defina METRICAS_TOKEN)")
+
+    @app.get("/metrics", include_in_schema=False, dependencies=[Depends(autorizar_metricas)])
+    async def exportar_metricas():
+        return PlainTextResponse(metricas.exportar(), media_type="text/plain; version=0.0.4")
+
+
+# FRONTEND NA MESMA ORIGEM (FRONTEND=1): ARQUIVOS MONTADOS E COMPRIMIDOS UMA VEZ AQUI
+if FRONTEND_ATIVO:
+    app.include_router(criar_rotas_frontend(montar_frontend()))
 
 # INICIALIZAÇÃO  -- Para rodar: uvicorn main:app --reload
 app.include_router(router)
-criar_tabelas()
+# COM VÁRIOS WORKERS, CADA UM IMPORTA ESTE MÓDULO: O SCHEMA É CRIADO/MIGRADO POR UM DE CADA VEZ
+with trava_entre_processos(DB_NAME):
+    criar_tabelas()
 
 
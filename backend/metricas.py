@@ -0,0 +1,377 @@
+import bisect
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextvars import ContextVar
+
+from config import METRICAS_LIMITE_REPETICOES, METRICAS_MAX_COMANDOS, SQL_LENTO_MS, LOG_NIVEL
+
+# MÉTRICAS DE DESEMPENHO (FORMATO DO PROMETHEUS EM GET /metrics)
+# O middleware abre um "rastro" por requisição (ContextVar, que acompanha o
+# handler no threadpool e na thread da conexão). Cada comando SQL, hash de
+# senha e serialização JSON soma tempo no rastro da requisição e nas séries
+# globais. No fim, a requisição entra nos histogramas da sua rota e um comando
+# SQL repetido METRICAS_LIMITE_REPETICOES vezes ou mais conta como suspeita de
+# N+1. As séries são acumuladas em memória, por processo.
+#
+# As mensagens da API (consultas lentas, falhas das tarefas de fundo, migrações)
+# vão para loggers filhos de "prontuario"; os print ficam só nas ferramentas de
+# linha de comando.
+
+log = logging.getLogger('prontuario.metricas')
+
+BALDES_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BALDES_CONSULTAS = (1, 2, 3, 5, 10, 20, 50, 100, 500)
+SEM_ROTA = "<sem rota>"
+
+
+def configurar_log():
+    """HANDLER NO STDERR PARA O LOGGER "prontuario", SE NINGUÉM CONFIGUROU UM (uvicorn --log-config, dictConfig)"""
+    raiz = logging.getLogger('prontuario')
+    if raiz.handlers:
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    raiz.addHandler(handler)
+    raiz.setLevel(LOG_NIVEL.upper())
+    raiz.propagate = False  # SEM LINHA REPETIDA QUANDO A RAIZ TAMBÉM TEM HANDLER
+
+
+class Histograma:
+    """HISTOGRAMA CUMULATIVO COM BALDES FIXOS, UMA SÉRIE POR COMBINAÇÃO DE RÓTULOS"""
+
+    def __init__(self, nome: str, ajuda: str, rotulos: tuple, baldes: tuple = BALDES_SEGUNDOS):
+        self.nome, self.ajuda, self.rotulos, self.baldes = nome, ajuda, rotulos, baldes
+        self._series = {}  # valores dos rótulos -> [contagens por balde..., +Inf], soma
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, *rotulos):
+        indice = bisect.bisect_left(self.baldes, valor)
+        with self._lock:
+            serie = self._series.get(rotulos)
+            if serie is None:
+                serie = self._series[rotulos] = [[0] * (len(self.baldes) + 1), 0.0]
+            serie[0][indice] += 1
+            serie[1] += valor
+
+    def exportar(self) -> list:
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} histogram"]
+        with self._lock:
+            series = [(rotulos, list(contagens), soma) for rotulos, (contagens, soma) in self._series.items()]
+        for rotulos, contagens, soma in sorted(series):
+            base = formatar_rotulos(self.rotulos, rotulos)
+            acumulado = 0
+            for limite, quantidade in zip(self.baldes + ('+Inf',), contagens):
+                acumulado += quantidade
+                linhas.append(f'{self.nome}_bucket{{{base}{"," if base else ""}le="{limite}"}} {acumulado}')
+            linhas.append(f"{self.nome}_sum{{{base}}} {soma:.6f}")
+            linhas.append(f"{self.nome}_count{{{base}}} {acumulado}")
+        return linhas
+
+
+class Contador:
+    """CONTADOR MONOTÔNICO POR COMBINAÇÃO DE RÓTULOS"""
+
+    def __init__(self, nome: str, ajuda: str, rotulos: tuple):
+        self.nome, self.ajuda, self.rotulos = nome, ajuda, rotulos
+        self._series = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def somar(self, valor: float = 1, *rotulos):
+        with self._lock:
+            self._series[rotulos] += valor
+
+    def exportar(self) -> list:
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} counter"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for rotulos, valor in series:
+            linhas.append(f"{self.nome}{{{formatar_rotulos(self.rotulos, rotulos)}}} {valor:g}")
+        return linhas
+
+
+class EstatisticasSQL:
+    """EXECUÇÕES E TEMPO ACUMULADO POR COMANDO SQL (UM LOCK POR REGISTRO, NO CAMINHO QUENTE)"""
+
+    def __init__(self):
+        self._series = {}  # rótulo -> [execuções, segundos]
+        self._lock = threading.Lock()
+
+    def registrar(self, rotulo: str, execucoes: int, duracao: float):
+        with self._lock:
+            serie = self._series.get(rotulo)
+            if serie is None:
+                serie = self._series[rotulo] = [0, 0.0]
+            serie[0] += execucoes
+            serie[1] += duracao
+
+    def exportar(self) -> list:
+        with self._lock:
+            series = sorted((rotulo, tuple(serie)) for rotulo, serie in self._series.items())
+        linhas = ["# HELP prontuario_sql_comandos_total Execuções por comando SQL",
+                  "# TYPE prontuario_sql_comandos_total counter"]
+        linhas += [f'prontuario_sql_comandos_total{{sql="{escapar_rotulo(rotulo)}"}} {execucoes}'
+                   for rotulo, (execucoes, _) in series]
+        linhas += ["# HELP prontuario_sql_comandos_segundos_total Tempo acumulado por comando SQL (execução + leitura das linhas)",
+                   "# TYPE prontuario_sql_comandos_segundos_total counter"]
+        linhas += [f'prontuario_sql_comandos_segundos_total{{sql="{escapar_rotulo(rotulo)}"}} {segundos:.6f}'
+                   for rotulo, (_, segundos) in series]
+        return linhas
+
+
+def escapar_rotulo(valor) -> str:
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+def formatar_rotulos(nomes: tuple, valores: tuple) -> str:
+    return ','.join(f'{nome}="{escapar_rotulo(valor)}"' for nome, valor in zip(nomes, valores))
+
+
+requisicoes = Histograma("prontuario_http_requisicao_segundos", "Latência das requisições por rota",
+                         ("metodo", "rota", "status"))
+consultas_por_requisicao = Histograma("prontuario_sql_consultas_por_requisicao", "Comandos SQL executados por requisição",
+                                      ("rota",), BALDES_CONSULTAS)
+sql_por_requisicao = Histograma("prontuario_sql_tempo_por_requisicao_segundos", "Tempo gasto em SQL por requisição",
+                                ("rota",))
+estatisticas_sql = EstatisticasSQL()
+repeticoes_sql = Contador("prontuario_sql_repeticoes_total",
+                          "Requisições que repetiram o mesmo comando SQL (suspeita de N+1)", ("rota", "sql"))
+consultas_lentas = Contador("prontuario_sql_lentas_total", "Comandos SQL acima de SQL_LENTO_MS", ("sql",))
+hashes = Histograma("prontuario_hash_segundos", "Operações de hash/derivação de chave (bcrypt, scrypt), com a espera na fila",
+                    ("operacao",))
+serializacoes = Histograma("prontuario_json_serializacao_segundos", "Serialização das respostas JSON", ())
+
+_em_andamento = [0]
+_lock_em_andamento = threading.Lock()
+_coletores = []  # funções que devolvem linhas extras (caches, backup...)
+
+
+def registrar_coletor(coletor):
+    """coletor() -> list[str] EM FORMATO DO PROMETHEUS, CHAMADO A CADA GET /metrics"""
+    _coletores.append(coletor)
+
+
+def serie_simples(nome: str, tipo: str, ajuda: str, valores: dict, rotulo: str = None) -> list:
+    """LINHAS DE UMA MÉTRICA gauge/counter: valores = {valor_do_rotulo: número} (OU {None: número} SEM RÓTULO)"""
+    linhas = [f"# HELP {nome} {ajuda}", f"# TYPE {nome} {tipo}"]
+    for chave, valor in valores.items():
+        if valor is None:
+            continue
+        rotulos = f'{{{rotulo}="{escapar_rotulo(chave)}"}}' if rotulo else ''
+        linhas.append(f"{nome}{rotulos} {float(valor):g}")
+    return linhas
+
+
+def exportar() -> str:
+    linhas = serie_simples("prontuario_http_em_andamento", "gauge", "Requisições em andamento", {None: _em_andamento[0]})
+    for metrica in (requisicoes, consultas_por_requisicao, sql_por_requisicao, estatisticas_sql,
+                    repeticoes_sql, consultas_lentas, hashes, serializacoes):
+        linhas.extend(metrica.exportar())
+    for coletor in _coletores:
+        linhas.extend(coletor())
+    return '\n'.join(linhas) + '\n'
+
+
+# RASTRO DA REQUISIÇÃO
+class RastroRequisicao:
+    __slots__ = ('consultas', 'tempo_sql', 'tempo_hash', 'tempo_json', 'comandos', 'encerrado')
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo_sql = self.tempo_hash = self.tempo_json = 0.0
+        self.comandos = defaultdict(int)
+        self.encerrado = False
+
+
+rastro_atual = ContextVar("rastro_atual", default=None)
+
+_ESPACOS = re.compile(r'\s+')
+_comandos_normalizados = {}  # sql original -> rótulo (limitado a METRICAS_MAX_COMANDOS)
+_lock_comandos = threading.Lock()
+
+
+def rotulo_sql(sql: str) -> str:
+    """SQL EM UMA LINHA, CORTADO; ACIMA DE METRICAS_MAX_COMANDOS DISTINTOS, VIRA 'outros'"""
+    rotulo = _comandos_normalizados.get(sql)  # LEITURA SEM LOCK: O DICT SÓ GANHA CHAVES
+    if rotulo is not None:
+        return rotulo
+    with _lock_comandos:
+        if len(_comandos_normalizados) >= METRICAS_MAX_COMANDOS:
+            return "outros"
+        rotulo = _ESPACOS.sub(' ', sql).strip()[:160]
+        _comandos_normalizados[sql] = rotulo
+        return rotulo
+
+
+def registrar_consulta(sql: str, duracao: float, nova_execucao: bool = True):
+    rotulo = rotulo_sql(sql)
+    estatisticas_sql.registrar(rotulo, nova_execucao, duracao)
+    rastro = rastro_atual.get()
+    if rastro is not None and not rastro.encerrado:
+        rastro.tempo_sql += duracao
+        if nova_execucao:
+            rastro.consultas += 1
+            rastro.comandos[rotulo] += 1
+
+
+def registrar_hash(operacao: str, duracao: float):
+    hashes.observar(duracao, operacao)
+    rastro = rastro_atual.get()
+    if rastro is not None:
+        rastro.tempo_hash += duracao
+
+
+def registrar_serializacao(duracao: float):
+    serializacoes.observar(duracao)
+    rastro = rastro_atual.get()
+    if rastro is not None:
+        rastro.tempo_json += duracao
+
+
+# LOG DE CONSULTAS LENTAS (SQL_LENTO_MS > 0)
+_planos = OrderedDict()  # sql -> texto do EXPLAIN QUERY PLAN (os 256 mais recentes)
+_lock_planos = threading.Lock()
+
+
+def plano_de_consulta(conn: sqlite3.Connection, sql: str, parametros) -> str:
+    with _lock_planos:
+        if sql in _planos:
+            return _planos[sql]
+    try:
+        # CURSOR BÁSICO: O EXPLAIN NÃO ENTRA NAS MÉTRICAS
+        linhas = sqlite3.Cursor(conn).execute(f"EXPLAIN QUERY PLAN {sql}", parametros).fetchall()
+        plano = '\n'.join(f"    {'  ' * (linha[1] != 0)}{linha[3]}" for linha in linhas)
+    except sqlite3.Error as e:
+        plano = f"    (sem plano: {e})"
+    with _lock_planos:
+        _planos[sql] = plano
+        if len(_planos) > 256:
+            _planos.popitem(last=False)
+    return plano
+
+
+def registrar_consulta_lenta(conn: sqlite3.Connection, sql: str, parametros, duracao: float):
+    consultas_lentas.somar(1, rotulo_sql(sql))
+    comando = sql.lstrip()[:6].upper()
+    plano = plano_de_consulta(conn, sql, parametros) if comando in ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT') else ''
+    log.warning("Consulta lenta (%.1f ms): %s%s", duracao * 1000, _ESPACOS.sub(' ', sql).strip(), f"\n{plano}" if plano else '')
+
+
+class CursorRastreado(sqlite3.Cursor):
+    """CURSOR QUE MEDE CADA COMANDO (EXECUÇÃO + LEITURA DAS LINHAS COM fetch*)"""
+
+    _sql = None
+    _parametros = ()
+    _acumulado = 0.0
+
+    def _medir(self, duracao: float, nova_execucao: bool):
+        registrar_consulta(self._sql, duracao, nova_execucao)
+        if SQL_LENTO_MS > 0:
+            anterior = 0.0 if nova_execucao else self._acumulado
+            self._acumulado = anterior + duracao
+            limite = SQL_LENTO_MS / 1000
+            if anterior < limite <= self._acumulado:  # UM REGISTRO POR EXECUÇÃO
+                registrar_consulta_lenta(self.connection, self._sql, self._parametros, self._acumulado)
+
+    def execute(self, sql, parametros=()):
+        self._sql, self._parametros = sql, parametros
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            self._medir(time.perf_counter() - inicio, True)
+
+    def executemany(self, sql, sequencia):
+        self._sql, self._parametros = sql, ()
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, sequencia)
+        finally:
+            self._medir(time.perf_counter() - inicio, True)
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            if self._sql is not None:
+                self._medir(time.perf_counter() - inicio, False)
+
+    def fetchmany(self, size=None):
+        inicio = time.perf_counter()
+        try:
+            return super().fetchmany(self.arraysize if size is None else size)
+        finally:
+            if self._sql is not None:
+                self._medir(time.perf_counter() - inicio, False)
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            if self._sql is not None:
+                self._medir(time.perf_counter() - inicio, False)
+
+
+# MIDDLEWARE ASGI (SEM BaseHTTPMiddleware: NÃO ATRASA STREAMING NEM BACKGROUND TASKS)
+class MiddlewareMetricas:
+    """LATÊNCIA POR ROTA, SQL POR REQUISIÇÃO E HEADER Server-Timing"""
+
+    def __init__(self, app, server_timing: bool = True):
+        self.app = app
+        self.server_timing = server_timing
+
+    def rota(self, scope) -> str:
+        # O TEMPLATE DA ROTA (/clientes/{cliente_id}/), NÃO O CAMINHO: CARDINALIDADE LIMITADA
+        from starlette.routing import Match
+        for rota in scope["app"].router.routes:
+            correspondencia, _ = rota.matches(scope)
+            if correspondencia == Match.FULL:
+                return getattr(rota, "path", SEM_ROTA)
+        return SEM_ROTA
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        rastro = RastroRequisicao()
+        token = rastro_atual.set(rastro)
+        inicio = time.perf_counter()
+        estado = {"status": 500, "fim": None}
+        with _lock_em_andamento:
+            _em_andamento[0] += 1
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.start":
+                estado["status"] = mensagem["status"]
+                if self.server_timing:
+                    decorrido = (time.perf_counter() - inicio) * 1000
+                    valor = (f'sql;dur={rastro.tempo_sql * 1000:.2f};desc="{rastro.consultas} consultas", '
+                             f'hash;dur={rastro.tempo_hash * 1000:.2f}, json;dur={rastro.tempo_json * 1000:.2f}, '
+                             f'total;dur={decorrido:.2f}')
+                    mensagem["headers"] = list(mensagem.get("headers", [])) + [(b"server-timing", valor.encode())]
+            elif mensagem["type"] == "http.response.body" and not mensagem.get("more_body", False):
+                # A LATÊNCIA TERMINA NO ÚLTIMO BYTE (BACKGROUND TASKS RODAM DEPOIS E NÃO CONTAM)
+                estado["fim"] = time.perf_counter()
+                rastro.encerrado = True
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            rastro_atual.reset(token)
+            with _lock_em_andamento:
+                _em_andamento[0] -= 1
+            rastro.encerrado = True
+            rota = self.rota(scope)
+            duracao = (estado["fim"] or time.perf_counter()) - inicio
+            requisicoes.observar(duracao, scope["method"], rota, estado["status"])
+            consultas_por_requisicao.observar(rastro.consultas, rota)
+            sql_por_requisicao.observar(rastro.tempo_sql, rota)
+            for comando, vezes in rastro.comandos.items():
+                if vezes >= METRICAS_LIMITE_REPETICOES:
+                    repeticoes_sql.somar(1, rota, comando)
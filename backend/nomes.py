@@ -0,0 +1,195 @@
+"""
+BUSCA DE CLIENTES PELO NOME (AUTOCOMPLETE)
+
+clientes.nome_normalizado guarda o nome sem acentos, em minúsculas e com os
+espaços normalizados ("João  Ávila" -> "joao avila"). Quem grava clientes
+calcula a coluna em Python com normalizar_nome (cadastro, importação,
+dividir_banco); o schema não depende de nenhuma função da aplicação, então o
+banco continua editável pelo sqlite3 ou pelo DB Browser. Linhas gravadas por
+fora sem a coluna (ou com o nome trocado) são corrigidas na próxima
+inicialização. Um termo encontra o cliente quando:
+  0  o nome começa com ele            range scan em (usuario_id, nome_normalizado)
+  1  uma palavra do nome começa com ele   varredura só do índice, sem ler a tabela
+  2  o nome contém o termo (3+ letras)    FTS5 trigram clientes_nomes_fts
+e os resultados saem nessa ordem, depois pela última sessão (a mais recente
+primeiro, de resumo_clientes) e pelo nome.
+
+O cache guarda, por (usuário, termo), até BUSCA_NOMES_CANDIDATOS resultados
+com a versão dos dados do usuário (versoes_usuario: qualquer escrita invalida,
+inclusive de outro worker). Se a lista de um termo coube inteira, os termos
+que o estendem (a próxima tecla) são filtrados dela em memória, sem SQL.
+"""
+import logging
+import sqlite3
+import unicodedata
+
+from cache import CacheLRU
+from config import BUSCA_NOMES_CANDIDATOS, BUSCA_NOMES_CACHE_TAMANHO
+
+TRIGRAMA_MINIMO = 3  # o FTS5 trigram só usa o índice com 3 caracteres seguidos
+BUSCA_TRIGRAMA_DISPONIVEL = True
+
+cache_nomes = CacheLRU(BUSCA_NOMES_CACHE_TAMANHO)
+log = logging.getLogger('prontuario.nomes')
+
+
+def normalizar_nome(texto):
+    """SEM ACENTOS, casefold E UM ESPAÇO ENTRE AS PALAVRAS (O VALOR DE clientes.nome_normalizado)"""
+    if texto is None:
+        return None
+    sem_acentos = ''.join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c))
+    return ' '.join(sem_acentos.casefold().split())
+
+
+def normalizar_termo(texto: str) -> str:
+    # % E _ SÃO CURINGAS DO LIKE E NÃO APARECEM EM NOMES
+    return normalizar_nome(texto).replace('%', '').replace('_', '').strip()
+
+
+def corrigir_nomes_normalizados(conn) -> int:
+    """RECALCULA nome_normalizado ONDE ESTÁ VAZIO OU DIFERENTE DO NOME (LINHAS GRAVADAS POR FORA DA API). NÃO FAZ COMMIT"""
+    corrigidas = [(normalizado, cliente_id) for cliente_id, nome, atual in conn.execute(
+        "SELECT id, nome_completo, nome_normalizado FROM clientes"
+    ) if (normalizado := normalizar_nome(nome)) != atual]
+    conn.executemany("UPDATE clientes SET nome_normalizado = ? WHERE id = ?", corrigidas)
+    return len(corrigidas)
+
+
+def criar_busca_nomes(conn):
+    """CRIA A COLUNA NORMALIZADA, O ÍNDICE, O FTS5 TRIGRAM E OS TRIGGERS DO FTS (BANCOS ANTIGOS SÃO PREENCHIDOS)"""
+    global BUSCA_TRIGRAMA_DISPONIVEL
+    if not any(linha[1] == 'nome_normalizado' for linha in conn.execute("PRAGMA table_info(clientes)")):
+        conn.execute("ALTER TABLE clientes ADD COLUMN nome_normalizado TEXT")
+    # VERSÕES ANTERIORES CHAMAVAM A FUNÇÃO normalizar_nome NOS TRIGGERS
+    antigos = [linha[0] for linha in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'clientes' AND sql LIKE '%normalizar_nome(%'"
+    )]
+    for trigger in antigos:
+        conn.execute(f"DROP TRIGGER {trigger}")
+    # COBRE OS DOIS PRIMEIROS CRITÉRIOS SEM LER A TABELA
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_clientes_usuario_nome_normalizado ON clientes(usuario_id, nome_normalizado)")
+    corrigir_nomes_normalizados(conn)
+    conn.commit()
+
+    existia = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'clientes_nomes_fts'"
+    ).fetchone() is not None
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS clientes_nomes_fts USING fts5(
+                nome_normalizado, content='clientes', content_rowid='id', tokenize='trigram'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        # SQLITE SEM FTS5 OU ANTERIOR AO 3.34 (SEM trigram): "CONTÉM" VIRA UMA VARREDURA DO ÍNDICE
+        log.warning('Busca de nomes por trecho sem índice trigram: %s', e)
+        BUSCA_TRIGRAMA_DISPONIVEL = False
+        return
+    # FTS NOVO, OU VINDO DOS TRIGGERS ANTIGOS: AS CORREÇÕES ACIMA NÃO PASSARAM PELOS TRIGGERS
+    # DO FTS E O ÍNDICE É REFEITO A PARTIR DA TABELA (NOS OUTROS CASOS O TRIGGER DE UPDATE CUIDA)
+    if not existia or antigos:
+        conn.execute("INSERT INTO clientes_nomes_fts(clientes_nomes_fts) VALUES ('rebuild')")
+    conn.executescript('''
+        CREATE TRIGGER IF NOT EXISTS trg_clientes_nomes_fts_insert AFTER INSERT ON clientes BEGIN
+            INSERT INTO clientes_nomes_fts(rowid, nome_normalizado) VALUES (NEW.id, NEW.nome_normalizado);
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_clientes_nomes_fts_delete AFTER DELETE ON clientes BEGIN
+            INSERT INTO clientes_nomes_fts(clientes_nomes_fts, rowid, nome_normalizado)
+            VALUES ('delete', OLD.id, OLD.nome_normalizado);
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_clientes_nomes_fts_update AFTER UPDATE OF nome_normalizado ON clientes BEGIN
+            INSERT INTO clientes_nomes_fts(clientes_nomes_fts, rowid, nome_normalizado)
+            VALUES ('delete', OLD.id, OLD.nome_normalizado);
+            INSERT INTO clientes_nomes_fts(rowid, nome_normalizado) VALUES (NEW.id, NEW.nome_normalizado);
+        END;
+    ''')
+    conn.commit()
+
+
+# A MESMA CLASSIFICAÇÃO EM SQL (CONSULTA) E EM PYTHON (REFINAMENTO DO CACHE)
+SQL_BUSCA_NOMES = '''
+    SELECT c.id, c.codigo_cliente, c.nome_completo, c.status, r.ultima_data AS ultima_sessao,
+           c.nome_normalizado,
+           CASE WHEN c.nome_normalizado >= :inicio AND c.nome_normalizado < :fim THEN 0
+                WHEN instr(' ' || c.nome_normalizado, ' ' || :termo) > 0 THEN 1
+                ELSE 2 END AS ordem
+    FROM clientes c
+    LEFT JOIN resumo_clientes r ON r.usuario_id = c.usuario_id AND r.cliente_id = c.id
+    WHERE c.usuario_id = :usuario_id AND {filtro}
+    ORDER BY ordem, r.ultima_data IS NULL, r.ultima_data DESC, c.nome_completo, c.id
+    LIMIT :limite
+'''
+FILTRO_PALAVRA = ("(c.nome_normalizado >= :inicio AND c.nome_normalizado < :fim"
+                  " OR instr(' ' || c.nome_normalizado, ' ' || :termo) > 0)")
+FILTRO_TRIGRAMA = "c.id IN (SELECT rowid FROM clientes_nomes_fts WHERE nome_normalizado LIKE :padrao)"
+FILTRO_TRECHO = "instr(c.nome_normalizado, :termo) > 0"
+
+
+def classificar(nome_normalizado: str, termo: str):
+    """0 PREFIXO DO NOME, 1 PREFIXO DE UMA PALAVRA, 2 TRECHO (3+ CARACTERES), None NÃO ENCONTRA"""
+    if nome_normalizado.startswith(termo):
+        return 0
+    if f' {termo}' in f' {nome_normalizado}':
+        return 1
+    if len(termo) >= TRIGRAMA_MINIMO and termo in nome_normalizado:
+        return 2
+    return None
+
+
+def ordenar(encontrados: list) -> list:
+    """(item, normalizado, ordem) NA ORDEM DO SQL: ORDEM, ÚLTIMA SESSÃO (MAIS RECENTE; SEM SESSÃO POR ÚLTIMO), NOME, id"""
+    encontrados = sorted(encontrados, key=lambda trio: (trio[0]['nome_completo'], trio[0]['id']))
+    encontrados.sort(key=lambda trio: trio[0]['ultima_sessao'] or '', reverse=True)
+    encontrados.sort(key=lambda trio: trio[2])
+    return encontrados
+
+
+def consultar_nomes(conn, usuario_id: int, termo: str) -> tuple:
+    """ATÉ BUSCA_NOMES_CANDIDATOS RESULTADOS EM ORDEM; DEVOLVE (itens, normalizados, completo)"""
+    if len(termo) < TRIGRAMA_MINIMO:
+        filtro = FILTRO_PALAVRA
+    else:
+        filtro = FILTRO_TRIGRAMA if BUSCA_TRIGRAMA_DISPONIVEL else FILTRO_TRECHO
+    # PREFIXO COMO FAIXA: 'ana' <= nome < 'anb' (O SUCESSOR DO ÚLTIMO CARACTERE)
+    linhas = conn.execute(SQL_BUSCA_NOMES.format(filtro=filtro), {
+        'usuario_id': usuario_id, 'termo': termo, 'padrao': f'%{termo}%',
+        'inicio': termo, 'fim': termo[:-1] + chr(ord(termo[-1]) + 1), 'limite': BUSCA_NOMES_CANDIDATOS + 1,
+    }).fetchall()
+    completo = len(linhas) <= BUSCA_NOMES_CANDIDATOS
+    linhas = linhas[:BUSCA_NOMES_CANDIDATOS]
+    itens = [{'id': linha[0], 'codigo_cliente': linha[1], 'nome_completo': linha[2], 'status': linha[3],
+              'ultima_sessao': linha[4]} for linha in linhas]
+    return itens, [linha[5] for linha in linhas], completo
+
+
+def refinar_do_cache(usuario_id: int, termo: str, versao: int):
+    """FILTRA O RESULTADO COMPLETO DE UM PREFIXO DO TERMO JÁ EM CACHE; None SE NÃO HOUVER"""
+    for tamanho in range(len(termo) - 1, 0, -1):
+        # A LISTA DE UM TERMO CURTO NÃO TEM OS "CONTÉM" QUE UM TERMO DE 3+ CARACTERES ENCONTRA
+        if tamanho < TRIGRAMA_MINIMO <= len(termo):
+            return None
+        guardado = cache_nomes.obter((usuario_id, termo[:tamanho]))
+        if guardado is None or guardado[0] != versao or not guardado[3]:
+            continue
+        _, itens, normalizados, _ = guardado
+        encontrados = []
+        for item, normalizado in zip(itens, normalizados):
+            ordem = classificar(normalizado, termo)
+            if ordem is not None:
+                encontrados.append((item, normalizado, ordem))
+        encontrados = ordenar(encontrados)
+        return [trio[0] for trio in encontrados], [trio[1] for trio in encontrados], True
+    return None
+
+
+def buscar_por_nome(conn, usuario_id: int, texto: str, limite: int, versao: int) -> list:
+    """AUTOCOMPLETE: OS limite PRIMEIROS CLIENTES DO USUÁRIO PARA O TEXTO DIGITADO (limite <= BUSCA_NOMES_CANDIDATOS)"""
+    termo = normalizar_termo(texto)
+    chave = (usuario_id, termo)
+    guardado = cache_nomes.obter(chave)
+    if guardado is not None and guardado[0] == versao:
+        return guardado[1][:limite]
+    refinado = refinar_do_cache(usuario_id, termo, versao)
+    itens, normalizados, completo = refinado or consultar_nomes(conn, usuario_id, termo)
+    cache_nomes.guardar(chave, (versao, itens, normalizados, completo))
+    return itens[:limite]
@@ -0,0 +1,249 @@
+"""
+RESUMOS DO DASHBOARD MANTIDOS POR TRIGGERS
+
+Três tabelas agregadas, atualizadas a cada INSERT/UPDATE/DELETE em
+atendimentos (e em clientes, para as contagens de clientes):
+  resumo_usuarios  por profissional: clientes, clientes ativos, sessões, minutos, última sessão
+  resumo_clientes  por cliente: sessões, minutos, última sessão
+  resumo_mensal    por profissional e mês ('AAAA-MM'): sessões, minutos, última sessão
+O dashboard lê algumas linhas dessas tabelas, sem percorrer o histórico.
+
+Para reconstruir a partir dos dados (banco antigo, shards copiados, conferência):
+
+    cd backend
+    python resumos.py                      # banco principal (DB_NAME)
+    python resumos.py --shards             # cada banco em DB_SHARDS_DIR
+    python resumos.py --banco outro.db --usuario 7
+"""
+import argparse
+import glob
+import os
+import time
+from datetime import date
+
+from config import DB_NAME, DB_SHARDS_DIR
+from database import abrir_conexao
+
+TABELAS_RESUMO = ('resumo_usuarios', 'resumo_clientes', 'resumo_mensal')
+
+SQL_TABELAS_RESUMO = '''
+    CREATE TABLE IF NOT EXISTS resumo_usuarios (
+        usuario_id INTEGER PRIMARY KEY,
+        clientes INTEGER NOT NULL DEFAULT 0,
+        clientes_ativos INTEGER NOT NULL DEFAULT 0,
+        sessoes INTEGER NOT NULL DEFAULT 0,
+        minutos INTEGER NOT NULL DEFAULT 0,
+        ultima_data DATE
+    );
+    CREATE TABLE IF NOT EXISTS resumo_clientes (
+        usuario_id INTEGER NOT NULL,
+        cliente_id INTEGER NOT NULL,
+        sessoes INTEGER NOT NULL,
+        minutos INTEGER NOT NULL,
+        ultima_data DATE,
+        PRIMARY KEY (usuario_id, cliente_id)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS resumo_mensal (
+        usuario_id INTEGER NOT NULL,
+        mes TEXT NOT NULL,
+        sessoes INTEGER NOT NULL,
+        minutos INTEGER NOT NULL,
+        ultima_data DATE,
+        PRIMARY KEY (usuario_id, mes)
+    ) WITHOUT ROWID;
+    -- "atendidos recentemente" do dashboard: range scan do fim do índice
+    CREATE INDEX IF NOT EXISTS idx_resumo_clientes_ultima ON resumo_clientes(usuario_id, ultima_data DESC);
+'''
+
+
+def somar_atendimento(linha: str) -> str:
+    """SQL DE TRIGGER QUE ACRESCENTA O ATENDIMENTO {linha} (NEW) AOS TRÊS RESUMOS"""
+    return f'''
+        INSERT INTO resumo_clientes (usuario_id, cliente_id, sessoes, minutos, ultima_data)
+        VALUES ({linha}.usuario_id, {linha}.cliente_id, 1, {linha}.duracao_minutos, {linha}.data_atendimento)
+        ON CONFLICT (usuario_id, cliente_id) DO UPDATE SET
+            sessoes = sessoes + 1, minutos = minutos + excluded.minutos,
+            ultima_data = MAX(COALESCE(ultima_data, ''), excluded.ultima_data);
+        INSERT INTO resumo_mensal (usuario_id, mes, sessoes, minutos, ultima_data)
+        VALUES ({linha}.usuario_id, substr({linha}.data_atendimento, 1, 7), 1, {linha}.duracao_minutos, {linha}.data_atendimento)
+        ON CONFLICT (usuario_id, mes) DO UPDATE SET
+            sessoes = sessoes + 1, minutos = minutos + excluded.minutos,
+            ultima_data = MAX(COALESCE(ultima_data, ''), excluded.ultima_data);
+        INSERT INTO resumo_usuarios (usuario_id, sessoes, minutos, ultima_data)
+        VALUES ({linha}.usuario_id, 1, {linha}.duracao_minutos, {linha}.data_atendimento)
+        ON CONFLICT (usuario_id) DO UPDATE SET
+            sessoes = sessoes + 1, minutos = minutos + excluded.minutos,
+            ultima_data = MAX(COALESCE(ultima_data, ''), excluded.ultima_data);
+    '''
+
+
+def subtrair_atendimento(linha: str) -> str:
+    """SQL DE TRIGGER QUE RETIRA O ATENDIMENTO {linha} (OLD) DOS TRÊS RESUMOS.
+    A última data só é recalculada quando a sessão retirada era a mais recente
+    (consulta pelo índice do cliente / do mês; o resumo do usuário sai do mensal)"""
+    return f'''
+        UPDATE resumo_clientes SET
+            sessoes = sessoes - 1, minutos = minutos - {linha}.duracao_minutos,
+            ultima_data = CASE WHEN {linha}.data_atendimento < ultima_data THEN ultima_data ELSE (
+                SELECT MAX(data_atendimento) FROM atendimentos
+                WHERE usuario_id = {linha}.usuario_id AND cliente_id = {linha}.cliente_id
+            ) END
+        WHERE usuario_id = {linha}.usuario_id AND cliente_id = {linha}.cliente_id;
+        DELETE FROM resumo_clientes
+        WHERE usuario_id = {linha}.usuario_id AND cliente_id = {linha}.cliente_id AND sessoes <= 0;
+        UPDATE resumo_mensal SET
+            sessoes = sessoes - 1, minutos = minutos - {linha}.duracao_minutos,
+            ultima_data = CASE WHEN {linha}.data_atendimento < ultima_data THEN ultima_data ELSE (
+                SELECT MAX(data_atendimento) FROM atendimentos
+                WHERE usuario_id = {linha}.usuario_id
+                  AND data_atendimento >= resumo_mensal.mes || '-01' AND data_atendimento < resumo_mensal.mes || '-99'
+            ) END
+        WHERE usuario_id = {linha}.usuario_id AND mes = substr({linha}.data_atendimento, 1, 7);
+        DELETE FROM resumo_mensal
+        WHERE usuario_id = {linha}.usuario_id AND mes = substr({linha}.data_atendimento, 1, 7) AND sessoes <= 0;
+        UPDATE resumo_usuarios SET
+            sessoes = sessoes - 1, minutos = minutos - {linha}.duracao_minutos,
+            ultima_data = (SELECT MAX(ultima_data) FROM resumo_mensal WHERE usuario_id = {linha}.usuario_id)
+        WHERE usuario_id = {linha}.usuario_id;
+    '''
+
+
+def contar_cliente(linha: str, sinal: str) -> str:
+    """SQL DE TRIGGER QUE SOMA (+) OU SUBTRAI (-) O CLIENTE {linha} NAS CONTAGENS DO USUÁRIO"""
+    return f'''
+        INSERT INTO resumo_usuarios (usuario_id, clientes, clientes_ativos)
+        VALUES ({linha}.usuario_id, {sinal}1, {sinal}({linha}.status = 'ativo'))
+        ON CONFLICT (usuario_id) DO UPDATE SET
+            clientes = clientes + excluded.clientes, clientes_ativos = clientes_ativos + excluded.clientes_ativos;
+    '''
+
+
+def criar_resumos(conn):
+    """CRIA AS TABELAS E TRIGGERS DOS RESUMOS; NA PRIMEIRA VEZ, POPULA COM OS DADOS EXISTENTES.
+    Tudo na mesma transação: nenhuma escrita fica de fora entre o backfill e os triggers"""
+    novo = not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'resumo_usuarios'"
+    ).fetchone()
+    gatilhos = {
+        'trg_atendimentos_resumo_insert': ('AFTER INSERT ON atendimentos', somar_atendimento('NEW')),
+        'trg_atendimentos_resumo_delete': ('AFTER DELETE ON atendimentos', subtrair_atendimento('OLD')),
+        'trg_atendimentos_resumo_update': (
+            'AFTER UPDATE OF usuario_id, cliente_id, data_atendimento, duracao_minutos ON atendimentos',
+            subtrair_atendimento('OLD') + somar_atendimento('NEW')
+        ),
+        'trg_clientes_resumo_insert': ('AFTER INSERT ON clientes', contar_cliente('NEW', '+')),
+        'trg_clientes_resumo_delete': ('AFTER DELETE ON clientes', contar_cliente('OLD', '-')),
+        'trg_clientes_resumo_update': (
+            'AFTER UPDATE OF usuario_id, status ON clientes',
+            contar_cliente('OLD', '-') + contar_cliente('NEW', '+')
+        ),
+    }
+    # executescript faz COMMIT do que estiver pendente antes; o BEGIN explícito
+    # mantém tabelas, triggers e backfill como uma unidade
+    script = ['BEGIN IMMEDIATE;', SQL_TABELAS_RESUMO]
+    script += [f'CREATE TRIGGER IF NOT EXISTS {nome} {evento} BEGIN {corpo} END;'
+               for nome, (evento, corpo) in gatilhos.items()]
+    if novo:
+        script += [sql for sql, _ in montar_reconstrucao(None)]
+    script.append('COMMIT;')
+    conn.executescript('\n'.join(script))
+
+
+def montar_reconstrucao(usuario_id) -> list:
+    """[(sql, parametros)] QUE REFAZEM OS RESUMOS DE UM USUÁRIO (OU DE TODOS, COM None)"""
+    filtro, parametros = ('WHERE usuario_id = ?', (usuario_id,)) if usuario_id is not None else ('', ())
+    comandos = [(f'DELETE FROM {tabela} {filtro};', parametros) for tabela in TABELAS_RESUMO]
+    comandos += [
+        (f'''INSERT INTO resumo_clientes (usuario_id, cliente_id, sessoes, minutos, ultima_data)
+            SELECT usuario_id, cliente_id, COUNT(*), SUM(duracao_minutos), MAX(data_atendimento)
+            FROM atendimentos {filtro} GROUP BY usuario_id, cliente_id;''', parametros),
+        (f'''INSERT INTO resumo_mensal (usuario_id, mes, sessoes, minutos, ultima_data)
+            SELECT usuario_id, substr(data_atendimento, 1, 7), COUNT(*), SUM(duracao_minutos), MAX(data_atendimento)
+            FROM atendimentos {filtro} GROUP BY usuario_id, substr(data_atendimento, 1, 7);''', parametros),
+        (f'''INSERT INTO resumo_usuarios (usuario_id, clientes, clientes_ativos, sessoes, minutos, ultima_data)
+            SELECT usuario_id, SUM(clientes), SUM(ativos), SUM(sessoes), SUM(minutos), MAX(ultima_data) FROM (
+                SELECT usuario_id, COUNT(*) AS clientes, SUM(status = 'ativo') AS ativos,
+                       0 AS sessoes, 0 AS minutos, NULL AS ultima_data
+                FROM clientes {filtro} GROUP BY usuario_id
+                UNION ALL
+                SELECT usuario_id, 0, 0, SUM(sessoes), SUM(minutos), MAX(ultima_data)
+                FROM resumo_mensal {filtro} GROUP BY usuario_id
+            ) GROUP BY usuario_id;''', parametros * 2),
+    ]
+    return comandos
+
+
+def reconstruir_resumos(conn, usuario_id=None):
+    """REFAZ OS RESUMOS A PARTIR DE clientes E atendimentos NUMA TRANSAÇÃO"""
+    with conn:
+        for sql, parametros in montar_reconstrucao(usuario_id):
+            conn.execute(sql, parametros)
+
+
+def meses_anteriores(hoje: date, quantidade: int) -> list:
+    """['AAAA-MM', ...] DO MAIS ANTIGO ATÉ O MÊS DE hoje"""
+    meses = []
+    ano, mes = hoje.year, hoje.month
+    for _ in range(quantidade):
+        meses.append(f'{ano:04d}-{mes:02d}')
+        ano, mes = (ano - 1, 12) if mes == 1 else (ano, mes - 1)
+    return meses[::-1]
+
+
+def consultar_resumo(conn, usuario_id: int, hoje: date, meses: int = 12, recentes: int = 5) -> dict:
+    """LÊ O DASHBOARD: UMA LINHA DO USUÁRIO, ATÉ `meses` LINHAS MENSAIS E `recentes` CLIENTES"""
+    linha = conn.execute(
+        "SELECT clientes, clientes_ativos, sessoes, minutos, ultima_data FROM resumo_usuarios WHERE usuario_id = ?",
+        (usuario_id,)
+    ).fetchone()
+    clientes, ativos, sessoes, minutos, ultima = tuple(linha) if linha else (0, 0, 0, 0, None)
+
+    janela = meses_anteriores(hoje, meses)
+    por_mes = {mes: (s, m) for mes, s, m in conn.execute(
+        "SELECT mes, sessoes, minutos FROM resumo_mensal WHERE usuario_id = ? AND mes BETWEEN ? AND ?",
+        (usuario_id, janela[0], janela[-1])
+    )}
+    serie = [{'mes': mes, 'sessoes': por_mes.get(mes, (0, 0))[0], 'minutos': por_mes.get(mes, (0, 0))[1]}
+             for mes in janela]
+
+    atendidos = conn.execute('''
+        SELECT r.cliente_id, c.nome_completo, r.ultima_data, r.sessoes
+        FROM resumo_clientes r JOIN clientes c ON c.id = r.cliente_id
+        WHERE r.usuario_id = ? ORDER BY r.ultima_data DESC LIMIT ?
+    ''', (usuario_id, recentes)).fetchall()
+
+    return {
+        'clientes': clientes, 'clientes_ativos': ativos,
+        'sessoes': sessoes, 'minutos': minutos, 'ultima_sessao': ultima,
+        'mes_atual': serie[-1], 'meses': serie,
+        'clientes_recentes': [
+            {'cliente_id': c, 'nome_completo': nome, 'ultima_sessao': data, 'sessoes': s}
+            for c, nome, data, s in atendidos
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--banco", default=DB_NAME, help="banco a reconstruir (padrão: DB_NAME)")
+    parser.add_argument("--shards", action="store_true", help="reconstrói cada banco em DB_SHARDS_DIR")
+    parser.add_argument("--usuario", type=int, help="só os resumos deste usuário")
+    args = parser.parse_args()
+
+    from main import criar_schema_dados
+
+    bancos = sorted(glob.glob(os.path.join(DB_SHARDS_DIR, '*_atendimentos.db'))) if args.shards else [args.banco]
+    for banco in bancos:
+        conn = abrir_conexao(banco)
+        try:
+            criar_schema_dados(conn)  # TABELAS E TRIGGERS EM DIA ANTES DE RECONSTRUIR
+            inicio = time.perf_counter()
+            reconstruir_resumos(conn, args.usuario)
+            linhas = {tabela: conn.execute(f"SELECT COUNT(*) FROM {tabela}").fetchone()[0] for tabela in TABELAS_RESUMO}
+            print({"banco": banco, "segundos": round(time.perf_counter() - inicio, 2), **linhas})
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
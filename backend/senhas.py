@@ -0,0 +1,84 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from fastapi import HTTPException
+from config import BCRYPT_ROUNDS, HASH_WORKERS, HASH_FILA_MAXIMA
+from metricas import registrar_hash
+
+# HASH DE SENHAS FORA DO THREADPOOL DAS ROTAS
+# O bcrypt libera o GIL, então um pool de threads próprio já roda os hashes em
+# paralelo sem ocupar as threads que atendem o resto da API. A fila é limitada:
+# numa rajada de logins, o excedente recebe 503 em vez de acumular latência.
+# O pool nasce no primeiro uso e o shutdown da API só o descarta: se a API
+# subir de novo no mesmo processo (testes, benchmarks), um novo é criado.
+
+executor_hash = None
+_pendentes = 0
+_lock_pendentes = threading.Lock()
+
+
+def hash_senha(senha: str) -> str: # CRIPTOGRAFA COM BCRYPT
+    return bcrypt.hashpw(senha.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
+
+
+def verificar_senha(senha: str, senha_hash: str) -> bool: # VERIFICA SE A SENHA CORRESPONDE AO HASH
+    return bcrypt.checkpw(senha.encode('utf-8'), senha_hash.encode('utf-8'))
+
+
+def custo_do_hash(senha_hash: str) -> int: # FORMATO: $2b$<custo>$<salt+hash>
+    try:
+        return int(senha_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return 0
+
+
+def precisa_rehash(senha_hash: str) -> bool:
+    return custo_do_hash(senha_hash) != BCRYPT_ROUNDS
+
+
+def obter_pool_hash() -> ThreadPoolExecutor:
+    global executor_hash
+    with _lock_pendentes:
+        if executor_hash is None:
+            executor_hash = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='bcrypt')
+        return executor_hash
+
+
+async def executar_no_pool_hash(funcao, *args):
+    """EXECUTA UMA OPERAÇÃO DE BCRYPT NO POOL DEDICADO, RESPEITANDO O LIMITE DA FILA"""
+    global _pendentes
+    with _lock_pendentes:
+        if _pendentes >= HASH_WORKERS + HASH_FILA_MAXIMA:
+            raise HTTPException(
+                status_code=503,
+                detail="Muitas requisições de autenticação, tente novamente.",
+                headers={"Retry-After": "1"}
+            )
+        _pendentes += 1
+    inicio = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(obter_pool_hash(), funcao, *args)
+    finally:
+        registrar_hash(funcao.__name__, time.perf_counter() - inicio)
+        with _lock_pendentes:
+            _pendentes -= 1
+
+
+async def hash_senha_async(senha: str) -> str:
+    return await executar_no_pool_hash(hash_senha, senha)
+
+
+async def verificar_senha_async(senha: str, senha_hash: str) -> bool:
+    return await executar_no_pool_hash(verificar_senha, senha, senha_hash)
+
+
+def fechar_pool_hash():
+    global executor_hash
+    with _lock_pendentes:
+        executor, executor_hash = executor_hash, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
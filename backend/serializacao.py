@@ -0,0 +1,48 @@
+import json
+import time
+from datetime import date, datetime
+
+from fastapi import Response
+
+from metricas import registrar_serializacao
+
+try:
+    import orjson
+except ImportError:  # SEM orjson, CAI NO json DA BIBLIOTECA PADRÃO (MESMA SAÍDA, MAIS LENTO)
+    orjson = None
+
+# SERIALIZAÇÃO RÁPIDA DAS LISTAGENS
+# As linhas do SQLite viram dicts e vão direto para bytes JSON, sem montar um
+# modelo Pydantic por linha nem revalidar contra o response_model (o FastAPI
+# não valida quando a rota devolve um Response pronto). As datas já estão
+# gravadas em ISO 8601, então a saída é a mesma que o Pydantic geraria.
+# O response_model continua declarado na rota, e o OpenAPI não muda.
+
+
+def _padrao_json(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+def json_bytes(conteudo) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(conteudo)
+    return json.dumps(conteudo, ensure_ascii=False, separators=(',', ':'), default=_padrao_json).encode('utf-8')
+
+
+class RespostaJSON(Response):
+    """JSONResponse SERIALIZADA COM orjson (QUANDO INSTALADO)"""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        inicio = time.perf_counter()
+        corpo = json_bytes(content)
+        registrar_serializacao(time.perf_counter() - inicio)
+        return corpo
+
+
+def linhas_para_dicts(linhas, campos: list) -> list:
+    """CONVERTE LINHAS DO SQLITE EM DICTS; AS PRIMEIRAS COLUNAS DA CONSULTA DEVEM SER `campos`, NESSA ORDEM"""
+    return [dict(zip(campos, linha)) for linha in linhas]
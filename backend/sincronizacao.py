@@ -0,0 +1,389 @@
+import argparse
+import asyncio
+import glob
+import hashlib
+import io
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime
+
+try:
+    from google.oauth2 import service_account
+    from googleapiclient.discovery import build
+    from googleapiclient.http import MediaIoBaseDownload, MediaIoBaseUpload
+except ImportError:  # SÓ É NECESSÁRIO COM SYNC_DESTINO=google_drive
+    service_account = build = MediaIoBaseDownload = MediaIoBaseUpload = None
+
+from starlette.concurrency import run_in_threadpool
+
+from config import (
+    DB_NAME, DB_BUSY_TIMEOUT_MS, DB_SHARDS_ATIVO, DB_SHARDS_DIR,
+    SYNC_DESTINO, SYNC_DIR_LOCAL, GOOGLE_DRIVE_CREDENCIAIS, GOOGLE_DRIVE_PASTA_ID,
+    SYNC_BLOCO_BYTES, SYNC_NIVEL_COMPRESSAO, SYNC_MANTER_VERSOES
+)
+
+# SINCRONIZAÇÃO (BACKUP INCREMENTAL) DOS BANCOS
+# A cada ciclo, cada banco alterado desde o último envio é copiado com a API
+# de backup do SQLite (uma transação de leitura: no modo WAL os escritores não
+# esperam). A cópia preserva o layout das páginas, então é cortada em blocos de
+# tamanho fixo identificados pelo SHA-256: só os blocos que o destino ainda não
+# tem são compactados (zlib) e enviados. Um manifesto JSON por versão lista os
+# blocos em ordem; restaurar é baixar e concatenar.
+#
+# Objetos no destino:
+#   blocos/{sha256}                      bloco compactado (imutável, compartilhado entre versões e bancos)
+#   manifestos/{banco}/{AAAAMMDDTHHMMSSffffff}.json
+
+log = logging.getLogger('prontuario.sincronizacao')
+
+
+class Armazenamento:
+    """INTERFACE DOS DESTINOS DE BACKUP: OBJETOS IMUTÁVEIS IDENTIFICADOS POR NOME"""
+
+    def enviar(self, nome: str, dados: bytes):
+        raise NotImplementedError
+
+    def baixar(self, nome: str) -> bytes:
+        raise NotImplementedError
+
+    def listar(self, prefixo: str) -> list:
+        raise NotImplementedError
+
+    def remover(self, nome: str):
+        raise NotImplementedError
+
+
+class ArmazenamentoLocal(Armazenamento):
+    """OBJETOS COMO ARQUIVOS NUMA PASTA (DISCO EXTERNO, PASTA SINCRONIZADA, TESTES)"""
+
+    def __init__(self, diretorio: str):
+        self.diretorio = diretorio
+        os.makedirs(diretorio, exist_ok=True)
+
+    def _caminho(self, nome: str) -> str:
+        return os.path.join(self.diretorio, *nome.split('/'))
+
+    def enviar(self, nome: str, dados: bytes):
+        caminho = self._caminho(nome)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        # GRAVA AO LADO E RENOMEIA: UM OBJETO NUNCA FICA PELA METADE
+        with open(caminho + '.parcial', 'wb') as arquivo:
+            arquivo.write(dados)
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+        os.replace(caminho + '.parcial', caminho)
+
+    def baixar(self, nome: str) -> bytes:
+        with open(self._caminho(nome), 'rb') as arquivo:
+            return arquivo.read()
+
+    def listar(self, prefixo: str) -> list:
+        nomes = []
+        for raiz, _, arquivos in os.walk(self.diretorio):
+            relativo = os.path.relpath(raiz, self.diretorio).replace(os.sep, '/')
+            for arquivo in arquivos:
+                if arquivo.endswith('.parcial'):
+                    continue
+                nome = arquivo if relativo == '.' else f"{relativo}/{arquivo}"
+                if nome.startswith(prefixo):
+                    nomes.append(nome)
+        return sorted(nomes)
+
+    def remover(self, nome: str):
+        try:
+            os.remove(self._caminho(nome))
+        except FileNotFoundError:
+            pass
+
+
+class ArmazenamentoGoogleDrive(Armazenamento):
+    """OBJETOS COMO ARQUIVOS NUMA PASTA DO GOOGLE DRIVE (CONTA DE SERVIÇO COM ACESSO À PASTA)"""
+
+    def __init__(self, credenciais: str, pasta_id: str):
+        if build is None:
+            raise RuntimeError("SYNC_DESTINO=google_drive exige os pacotes 'google-api-python-client' e 'google-auth'")
+        if not pasta_id:
+            raise RuntimeError("Defina GOOGLE_DRIVE_PASTA_ID com o id da pasta de backup no Drive")
+        escopos = ['https://www.googleapis.com/auth/drive']
+        self._servico = build('drive', 'v3', cache_discovery=False,
+                              credentials=service_account.Credentials.from_service_account_file(credenciais, scopes=escopos))
+        self._pasta = pasta_id
+        self._ids = {}  # nome -> id do arquivo no Drive
+        self._lock = threading.Lock()
+
+    def _id(self, nome: str):
+        with self._lock:
+            if nome in self._ids:
+                return self._ids[nome]
+        nome_escapado = nome.replace("\\", "\\\\").replace("'", "\\'")
+        arquivos = self._servico.files().list(
+            q=f"name = '{nome_escapado}' and '{self._pasta}' in parents and trashed = false",
+            fields='files(id)', pageSize=1
+        ).execute().get('files', [])
+        if not arquivos:
+            return None
+        with self._lock:
+            self._ids[nome] = arquivos[0]['id']
+        return arquivos[0]['id']
+
+    def enviar(self, nome: str, dados: bytes):
+        midia = MediaIoBaseUpload(io.BytesIO(dados), mimetype='application/octet-stream',
+                                  resumable=len(dados) > 5 * 1024 * 1024)
+        criado = self._servico.files().create(
+            body={'name': nome, 'parents': [self._pasta]}, media_body=midia, fields='id'
+        ).execute()
+        with self._lock:
+            self._ids[nome] = criado['id']
+
+    def baixar(self, nome: str) -> bytes:
+        arquivo_id = self._id(nome)
+        if arquivo_id is None:
+            raise FileNotFoundError(nome)
+        buffer = io.BytesIO()
+        download = MediaIoBaseDownload(buffer, self._servico.files().get_media(fileId=arquivo_id))
+        concluido = False
+        while not concluido:
+            _, concluido = download.next_chunk()
+        return buffer.getvalue()
+
+    def listar(self, prefixo: str) -> list:
+        nomes, pagina = [], None
+        while True:
+            resposta = self._servico.files().list(
+                q=f"'{self._pasta}' in parents and trashed = false",
+                fields='nextPageToken, files(id, name)', pageSize=1000, pageToken=pagina
+            ).execute()
+            with self._lock:
+                for arquivo in resposta.get('files', []):
+                    self._ids[arquivo['name']] = arquivo['id']
+                    if arquivo['name'].startswith(prefixo):
+                        nomes.append(arquivo['name'])
+            pagina = resposta.get('nextPageToken')
+            if not pagina:
+                return sorted(nomes)
+
+    def remover(self, nome: str):
+        arquivo_id = self._id(nome)
+        if arquivo_id is not None:
+            self._servico.files().delete(fileId=arquivo_id).execute()
+            with self._lock:
+                self._ids.pop(nome, None)
+
+
+def criar_armazenamento(destino: str = SYNC_DESTINO) -> Armazenamento:
+    if destino == 'local':
+        return ArmazenamentoLocal(SYNC_DIR_LOCAL)
+    if destino == 'google_drive':
+        return ArmazenamentoGoogleDrive(GOOGLE_DRIVE_CREDENCIAIS, GOOGLE_DRIVE_PASTA_ID)
+    raise ValueError(f"SYNC_DESTINO desconhecido: {destino!r} (use 'google_drive' ou 'local')")
+
+
+def bancos_configurados() -> list:
+    """O BANCO PRINCIPAL E, COM SHARDS, O BANCO DE CADA PROFISSIONAL"""
+    bancos = [DB_NAME]
+    if DB_SHARDS_ATIVO:
+        bancos.extend(sorted(glob.glob(os.path.join(DB_SHARDS_DIR, '*.db'))))
+    return bancos
+
+
+def assinatura(caminho: str) -> tuple:
+    # TAMANHO E MTIME DO BANCO E DO WAL: QUALQUER COMMIT MUDA UM DOS DOIS
+    partes = []
+    for arquivo in (caminho, caminho + '-wal'):
+        try:
+            estado = os.stat(arquivo)
+            partes.extend((estado.st_size, estado.st_mtime_ns))
+        except FileNotFoundError:
+            partes.extend((None, None))
+    return tuple(partes)
+
+
+class Sincronizador:
+    """ENVIA CÓPIAS INCREMENTAIS DOS BANCOS PARA UM Armazenamento E MANTÉM AS MÉTRICAS DO ÚLTIMO CICLO"""
+
+    def __init__(self, armazenamento: Armazenamento, listar_bancos=bancos_configurados,
+                 bloco_bytes: int = SYNC_BLOCO_BYTES, manter: int = SYNC_MANTER_VERSOES,
+                 nivel_compressao: int = SYNC_NIVEL_COMPRESSAO):
+        self.armazenamento = armazenamento
+        self.listar_bancos = listar_bancos
+        self.bloco_bytes = bloco_bytes
+        self.manter = manter
+        self.nivel_compressao = nivel_compressao
+        self._conhecidos = None  # hashes dos blocos que o destino já tem (carregado no primeiro ciclo)
+        self._enviados = {}      # banco -> assinatura do arquivo no último envio
+        self._lock = threading.Lock()
+        self.metricas = {
+            'sincronizacoes': 0, 'falhas': 0, 'ultimo_erro': None,
+            'ultima_sincronizacao': None, 'duracao_ultima_segundos': None,
+            'bancos_enviados_ultima': 0, 'blocos_enviados_ultima': 0, 'blocos_reaproveitados_ultima': 0,
+            'bytes_enviados_ultima': 0, 'bytes_enviados_total': 0, 'bytes_bancos_ultima': 0,
+        }
+
+    @staticmethod
+    def nome_banco(caminho: str) -> str:
+        return os.path.normpath(caminho).replace(os.sep, '/')
+
+    def pendentes(self) -> list:
+        """BANCOS COM ALTERAÇÕES AINDA NÃO ENVIADAS"""
+        return [caminho for caminho in self.listar_bancos()
+                if self._enviados.get(self.nome_banco(caminho)) != assinatura(caminho)]
+
+    def status(self) -> dict:
+        ultima = self.metricas['ultima_sincronizacao']
+        return {
+            **self.metricas,
+            'em_andamento': self._lock.locked(),
+            'bancos_pendentes': len(self.pendentes()),
+            'segundos_desde_ultima': round(time.time() - ultima, 1) if ultima else None,
+        }
+
+    def sincronizar(self) -> dict:
+        """UM CICLO COMPLETO (BLOQUEANTE). FALHAS FICAM NAS MÉTRICAS E O BANCO VOLTA NO PRÓXIMO CICLO"""
+        with self._lock:
+            inicio = time.perf_counter()
+            ciclo = {'bancos_enviados_ultima': 0, 'blocos_enviados_ultima': 0,
+                     'blocos_reaproveitados_ultima': 0, 'bytes_enviados_ultima': 0, 'bytes_bancos_ultima': 0}
+            try:
+                if self._conhecidos is None:
+                    self._conhecidos = {nome.rsplit('/', 1)[1] for nome in self.armazenamento.listar('blocos/')}
+                podados = False
+                for caminho in self.pendentes():
+                    podados |= self._sincronizar_banco(caminho, ciclo)
+                if podados:
+                    self._coletar_blocos_orfaos()
+            except Exception as e:
+                self.metricas['falhas'] += 1
+                self.metricas['ultimo_erro'] = f"{type(e).__name__}: {e}"
+                log.exception('Falha na sincronização')
+            else:
+                self.metricas['sincronizacoes'] += 1
+                self.metricas['ultimo_erro'] = None
+                self.metricas['ultima_sincronizacao'] = time.time()
+            self.metricas.update(ciclo)
+            self.metricas['bytes_enviados_total'] += ciclo['bytes_enviados_ultima']
+            self.metricas['duracao_ultima_segundos'] = round(time.perf_counter() - inicio, 3)
+            return dict(self.metricas)
+
+    def _sincronizar_banco(self, caminho: str, ciclo: dict) -> bool:
+        banco = self.nome_banco(caminho)
+        # A ASSINATURA É LIDA ANTES DA CÓPIA: UM COMMIT DURANTE A CÓPIA FICA PENDENTE PARA O PRÓXIMO CICLO
+        estado = assinatura(caminho)
+        with tempfile.TemporaryDirectory(prefix="prontuario-sync-") as pasta:
+            copia = os.path.join(pasta, 'copia.db')
+            origem = sqlite3.connect(caminho, timeout=DB_BUSY_TIMEOUT_MS / 1000)
+            destino = sqlite3.connect(copia)
+            try:
+                origem.backup(destino)
+            finally:
+                destino.close()
+                origem.close()
+
+            blocos, total = [], hashlib.sha256()
+            with open(copia, 'rb') as arquivo:
+                while True:
+                    bloco = arquivo.read(self.bloco_bytes)
+                    if not bloco:
+                        break
+                    total.update(bloco)
+                    digest = hashlib.sha256(bloco).hexdigest()
+                    if digest in self._conhecidos:
+                        ciclo['blocos_reaproveitados_ultima'] += 1
+                    else:
+                        dados = zlib.compress(bloco, self.nivel_compressao)
+                        self.armazenamento.enviar(f"blocos/{digest}", dados)
+                        self._conhecidos.add(digest)
+                        ciclo['blocos_enviados_ultima'] += 1
+                        ciclo['bytes_enviados_ultima'] += len(dados)
+                    blocos.append(digest)
+                tamanho = arquivo.tell()
+
+        # O MANIFESTO SÓ É GRAVADO DEPOIS DE TODOS OS BLOCOS: NUNCA APONTA PARA BLOCO AUSENTE
+        manifesto = json.dumps({
+            'banco': banco, 'criado_em': datetime.now().isoformat(), 'tamanho': tamanho,
+            'sha256': total.hexdigest(), 'bloco_bytes': self.bloco_bytes, 'blocos': blocos,
+        }).encode()
+        self.armazenamento.enviar(f"manifestos/{banco}/{datetime.now().strftime('%Y%m%dT%H%M%S%f')}.json", manifesto)
+        ciclo['bytes_enviados_ultima'] += len(manifesto)
+        ciclo['bytes_bancos_ultima'] += tamanho
+        ciclo['bancos_enviados_ultima'] += 1
+        self._enviados[banco] = estado
+        return self._podar(banco)
+
+    def _podar(self, banco: str) -> bool:
+        manifestos = self.armazenamento.listar(f"manifestos/{banco}/")
+        antigos = manifestos[:-self.manter] if self.manter > 0 else []
+        for nome in antigos:
+            self.armazenamento.remover(nome)
+        return bool(antigos)
+
+    def _coletar_blocos_orfaos(self):
+        # BLOCOS QUE NENHUM MANIFESTO RESTANTE (DE NENHUM BANCO) USA
+        em_uso = set()
+        for nome in self.armazenamento.listar('manifestos/'):
+            em_uso.update(json.loads(self.armazenamento.baixar(nome))['blocos'])
+        for digest in self._conhecidos - em_uso:
+            self.armazenamento.remover(f"blocos/{digest}")
+        self._conhecidos &= em_uso
+
+    async def executar_periodicamente(self, intervalo: float):
+        """LAÇO DO LIFESPAN: SINCRONIZA AO SUBIR E DEPOIS A CADA intervalo SEGUNDOS"""
+        while True:
+            await run_in_threadpool(self.sincronizar)
+            await asyncio.sleep(intervalo)
+
+
+def versoes(armazenamento: Armazenamento, banco: str) -> list:
+    return [nome.rsplit('/', 1)[1][:-len('.json')] for nome in armazenamento.listar(f"manifestos/{banco}/")]
+
+
+def restaurar(armazenamento: Armazenamento, banco: str, destino: str, versao: str = None) -> dict:
+    """RECONSTRÓI O ARQUIVO DO BANCO A PARTIR DE UM MANIFESTO (O MAIS RECENTE, SE versao FOR None)"""
+    disponiveis = versoes(armazenamento, banco)
+    if not disponiveis:
+        raise FileNotFoundError(f"Nenhuma cópia de {banco} no destino")
+    versao = versao or disponiveis[-1]
+    manifesto = json.loads(armazenamento.baixar(f"manifestos/{banco}/{versao}.json"))
+    total = hashlib.sha256()
+    with open(destino + '.parcial', 'wb') as arquivo:
+        for digest in manifesto['blocos']:
+            bloco = zlib.decompress(armazenamento.baixar(f"blocos/{digest}"))
+            total.update(bloco)
+            arquivo.write(bloco)
+    if total.hexdigest() != manifesto['sha256']:
+        os.remove(destino + '.parcial')
+        raise ValueError(f"Cópia {versao} de {banco} corrompida (SHA-256 não confere)")
+    os.replace(destino + '.parcial', destino)
+    return {'banco': banco, 'versao': versao, 'criado_em': manifesto['criado_em'], 'tamanho': manifesto['tamanho']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backup incremental dos bancos (mesmo destino da API: SYNC_DESTINO)")
+    parser.add_argument("--destino-tipo", default=SYNC_DESTINO, choices=("google_drive", "local"))
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    comandos.add_parser("agora", help="envia agora os bancos alterados")
+    listar = comandos.add_parser("versoes", help="lista as cópias de um banco")
+    listar.add_argument("--banco", default=DB_NAME)
+    restaurar_parser = comandos.add_parser("restaurar", help="reconstrói um banco a partir de uma cópia")
+    restaurar_parser.add_argument("--banco", default=DB_NAME, help="nome do banco no destino (ex.: shards/3_atendimentos.db)")
+    restaurar_parser.add_argument("--destino", required=True, help="arquivo a criar (não use o banco em uso pela API)")
+    restaurar_parser.add_argument("--versao", help="padrão: a mais recente")
+    args = parser.parse_args()
+
+    armazenamento = criar_armazenamento(args.destino_tipo)
+    if args.comando == "agora":
+        print(Sincronizador(armazenamento).sincronizar())
+    elif args.comando == "versoes":
+        for versao in versoes(armazenamento, Sincronizador.nome_banco(args.banco)):
+            print(versao)
+    else:
+        print(restaurar(armazenamento, Sincronizador.nome_banco(args.banco), args.destino, args.versao))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+# O BANCO É CRIADO NO DIRETÓRIO ATUAL QUANDO main É IMPORTADO: OS TESTES RODAM NUMA PASTA
+# TEMPORÁRIA, COM CRIPTOGRAFIA LIGADA (COBRE O CAMINHO CIFRADO) E UM SEGREDO PRÓPRIO
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(tempfile.mkdtemp(prefix="prontuario-testes-"))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+os.environ.update({"CRIPTOGRAFIA": "1", "CIPTHER_SUITE_PASSWORD": "segredo-dos-testes", "DB_SHARDS": "0",
+                   "SYNC": "0", "ARQUIVO_IDADE_DIAS": "0", "WEB_CONCURRENCY": "1"})
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+
+numeros = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def api():
+    return main
+
+
+@pytest.fixture(scope="session")
+def http():
+    with TestClient(main.app) as cliente:
+        yield cliente
+
+
+@pytest.fixture
+def usuario(http):
+    """PROFISSIONAL NOVO A CADA TESTE: {'id', 'username', 'senha', 'headers'}"""
+    username = f"teste_{next(numeros)}"
+    senha = "senha-do-teste"
+    resposta = http.post("/auth/cadastro", json={
+        "username": username, "nome": "Profissional de Teste", "senha": senha,
+        "pergunta_seguranca": "Nome do primeiro pet?", "resposta_seguranca": "Rex"
+    })
+    assert resposta.status_code == 201, resposta.text
+    corpo = resposta.json()
+    return {"id": corpo["usuario"]["id"], "username": username, "senha": senha,
+            "headers": {"Authorization": f"Bearer {corpo['access_token']}"}}
+
+
+@pytest.fixture
+def novo_cliente(http, usuario):
+    """CADASTRA UM CLIENTE DO usuario E DEVOLVE O JSON DA RESPOSTA"""
+    def cadastrar(nome, email=None, **extras):
+        # O ÍNDICE ÚNICO DO EMAIL VALE PARA O BANCO TODO: O PADRÃO LEVA UM NÚMERO
+        dados = {"nome_completo": nome, "email": email or f"cliente{next(numeros)}@teste.local",
+                 "telefone": "11999999999", "data_nascimento": "1990-05-17", "endereco": "Rua das Flores, 10"}
+        dados.update(extras)
+        resposta = http.post("/clientes/", headers=usuario["headers"], json=dados)
+        assert resposta.status_code == 201, resposta.text
+        return resposta.json()
+    return cadastrar
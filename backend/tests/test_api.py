@@ -0,0 +1,258 @@
+import base64
+import json
+import sqlite3
+
+import pytest
+
+# TESTES DE PONTA A PONTA PELA API (TestClient): PAGINAÇÃO POR CURSOR, IMPORTAÇÃO, AGENDA,
+# CRIPTOGRAFIA COM ÍNDICE CEGO DO EMAIL E ETag/304. RODAR DE backend/:  python -m pytest -q
+
+
+def cursor_com(*valores) -> str:
+    return base64.urlsafe_b64encode(json.dumps(valores).encode()).decode()
+
+
+# PAGINAÇÃO POR CURSOR
+
+def test_paginas_de_clientes_cobrem_todos_sem_repetir(http, usuario, novo_cliente):
+    # NOMES REPETIDOS: O DESEMPATE PELO id NÃO PODE PULAR NEM REPETIR NINGUÉM
+    nomes = ["Carla Souza", "Ana Lima", "Bruno Alves", "Ana Lima", "Daniel Rocha", "Ana Lima", "Elisa Prado"]
+    ids = [novo_cliente(nome, email=f"pagina{i}@teste.local")["id"] for i, nome in enumerate(nomes)]
+
+    vistos, cursor, paginas = [], None, 0
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        resposta = http.get("/clientes/", headers=usuario["headers"], params=params)
+        assert resposta.status_code == 200
+        assert len(resposta.json()) <= 2
+        vistos.extend(resposta.json())
+        paginas += 1
+        cursor = resposta.headers.get("X-Proximo-Cursor")
+        if cursor is None:
+            break
+
+    assert paginas == 4
+    assert sorted(c["id"] for c in vistos) == sorted(ids)
+    assert [(c["nome_completo"], c["id"]) for c in vistos] == sorted((c["nome_completo"], c["id"]) for c in vistos)
+
+
+def test_paginas_de_atendimentos_do_mais_recente_ao_mais_antigo(http, usuario, novo_cliente):
+    cliente_id = novo_cliente("Paciente Paginado")["id"]
+    for dia in range(1, 6):
+        resposta = http.post(f"/clientes/{cliente_id}/atendimentos/", headers=usuario["headers"], json={
+            "data_atendimento": f"2025-03-0{dia}", "conteudo": f"Sessão número {dia}", "duracao_minutos": 50})
+        assert resposta.status_code == 201
+
+    primeira = http.get(f"/clientes/{cliente_id}/atendimentos/", headers=usuario["headers"], params={"limit": 3})
+    segunda = http.get(f"/clientes/{cliente_id}/atendimentos/", headers=usuario["headers"],
+                       params={"limit": 3, "cursor": primeira.headers["X-Proximo-Cursor"]})
+    datas = [a["data_atendimento"] for a in primeira.json() + segunda.json()]
+    assert datas == [f"2025-03-0{dia}" for dia in range(5, 0, -1)]
+    assert "X-Proximo-Cursor" not in segunda.headers
+
+
+@pytest.mark.parametrize("cursor", [
+    "nao-e-base64!!",
+    base64.urlsafe_b64encode(b"nao e json").decode(),
+    cursor_com("Ana"),                   # FALTA O id
+    cursor_com(1, "Ana"),                # TIPOS TROCADOS
+    cursor_com("Ana", True),             # bool NÃO É id
+    cursor_com("Ana", 2 ** 63),          # NÃO CABE NO INTEGER DO SQLITE
+    cursor_com("Ana", 1.5),
+    cursor_com("\ud800", 1),             # SURROGATE SOLTO
+])
+def test_cursor_invalido_de_clientes_responde_400(http, usuario, cursor):
+    resposta = http.get("/clientes/", headers=usuario["headers"], params={"cursor": cursor})
+    assert resposta.status_code == 400
+    assert resposta.json()["detail"] == "Cursor inválido."
+
+
+@pytest.mark.parametrize("cursor", [cursor_com(1, "2025-03-01"), cursor_com("2025-03-01", False), cursor_com("2025-03-01")])
+def test_cursor_invalido_de_atendimentos_responde_400(http, usuario, novo_cliente, cursor):
+    cliente_id = novo_cliente("Paciente Cursor")["id"]
+    resposta = http.get(f"/clientes/{cliente_id}/atendimentos/", headers=usuario["headers"], params={"cursor": cursor})
+    assert resposta.status_code == 400
+
+
+# IMPORTAÇÃO
+
+CABECALHO_CLIENTES = "nome_completo,email,telefone,data_nascimento,endereco\n"
+
+
+def test_importacao_relata_linhas_invalidas_e_grava_as_validas(http, usuario):
+    csv = (CABECALHO_CLIENTES
+           + "Maria Importada,maria@import.local,11988887777,1985-02-03,Rua A\n"
+           + "Data Errada,errada@import.local,11988887777,ontem,Rua B\n"
+           + "Futuro,futuro@import.local,11988887777,2999-01-01,\n"
+           + "João Importado,joao@import.local,11988886666,1979-11-30,\n")
+    resposta = http.post("/importacao/clientes", headers=usuario["headers"],
+                         files={"arquivo": ("clientes.csv", csv.encode("utf-8"), "text/csv")})
+    assert resposta.status_code == 200
+    relatorio = resposta.json()
+    assert (relatorio["total_linhas"], relatorio["importados"], relatorio["com_erro"]) == (4, 2, 2)
+    # LINHA CONTADA COMO NO ARQUIVO: O CABEÇALHO É A LINHA 1
+    assert [erro["linha"] for erro in relatorio["erros"]] == [3, 4]
+    assert all(erro["erros"] for erro in relatorio["erros"])
+
+    nomes = {c["nome_completo"] for c in http.get("/clientes/", headers=usuario["headers"]).json()}
+    assert nomes == {"Maria Importada", "João Importado"}
+
+
+def test_importacao_de_atendimentos_aponta_cliente_inexistente(http, usuario, novo_cliente):
+    cliente_id = novo_cliente("Paciente Importado")["id"]
+    linhas = [
+        {"cliente_id": cliente_id, "data_atendimento": "2025-01-10", "conteudo": "Primeira sessão", "duracao_minutos": 50},
+        {"cliente_id": 999999, "data_atendimento": "2025-01-11", "conteudo": "Cliente de outro", "duracao_minutos": 50},
+        {"cliente_id": cliente_id, "data_atendimento": "2025-01-12", "conteudo": "curto", "duracao_minutos": 5},
+    ]
+    ndjson = "\n".join(json.dumps(linha) for linha in linhas).encode()
+    resposta = http.post("/importacao/atendimentos", headers=usuario["headers"],
+                         files={"arquivo": ("atendimentos.ndjson", ndjson, "application/x-ndjson")})
+    assert resposta.status_code == 200
+    relatorio = resposta.json()
+    assert (relatorio["importados"], relatorio["com_erro"]) == (1, 2)
+    assert [erro["linha"] for erro in relatorio["erros"]] == [2, 3]
+
+
+def test_importacao_fora_de_utf8_vira_erro_no_relatorio(http, usuario):
+    csv = (CABECALHO_CLIENTES + "José da Conceição,jose@import.local,11977776666,1970-07-07,Praça Sé\n").encode("latin-1")
+    resposta = http.post("/importacao/clientes", headers=usuario["headers"],
+                         files={"arquivo": ("latin1.csv", csv, "text/csv")})
+    assert resposta.status_code == 200
+    relatorio = resposta.json()
+    assert relatorio["importados"] == 0
+    assert relatorio["com_erro"] == 1
+    assert "UTF-8" in relatorio["erros"][0]["erros"][0]
+
+
+# AGENDA
+
+def agendar(http, usuario, cliente_id, inicio, **extras):
+    return http.post("/agendamentos/", headers=usuario["headers"],
+                     json={"cliente_id": cliente_id, "inicio": inicio, "duracao_minutos": 50, **extras})
+
+
+def test_serie_semanal_expandida_e_conflitos(http, usuario, novo_cliente):
+    cliente_id = novo_cliente("Paciente Agendado")["id"]
+    serie = agendar(http, usuario, cliente_id, "2030-03-04T14:00", intervalo_semanas=1, repetir_ate="2030-04-29")
+    assert serie.status_code == 201
+
+    semana = http.get("/agendamentos/", headers=usuario["headers"], params={"visao": "semana", "data": "2030-03-13"})
+    assert [o["inicio"] for o in semana.json()] == ["2030-03-11T14:00"]
+    mes = http.get("/agendamentos/", headers=usuario["headers"], params={"visao": "mes", "data": "2030-04-15"})
+    assert [o["inicio"][:10] for o in mes.json()] == ["2030-04-01", "2030-04-08", "2030-04-15", "2030-04-22", "2030-04-29"]
+    depois = http.get("/agendamentos/", headers=usuario["headers"], params={"visao": "semana", "data": "2030-05-06"})
+    assert depois.json() == []
+
+    # CRUZA UMA REPETIÇÃO DA SÉRIE; LOGO DEPOIS DO FIM DA SÉRIE, LIVRE
+    conflito = agendar(http, usuario, cliente_id, "2030-03-18T14:30")
+    assert conflito.status_code == 409
+    assert conflito.json()["detail"]["conflitos"]
+    assert agendar(http, usuario, cliente_id, "2030-05-06T14:00").status_code == 201
+    assert agendar(http, usuario, cliente_id, "2030-03-18T14:50").status_code == 201
+
+    # CANCELAR UMA OCORRÊNCIA LIBERA SÓ AQUELE HORÁRIO
+    cancelada = http.delete(f"/agendamentos/{serie.json()['id']}", headers=usuario["headers"],
+                            params={"ocorrencia": "2030-03-25T14:00"})
+    assert cancelada.status_code == 204
+    assert agendar(http, usuario, cliente_id, "2030-03-25T14:00").status_code == 201
+    assert agendar(http, usuario, cliente_id, "2030-04-01T14:00").status_code == 409
+
+
+@pytest.mark.parametrize("visao,data", [("mes", "0001-01-01"), ("semana", "0001-01-01"), ("mes", "9999-12-31"),
+                                        ("dia", "1899-12-31"), ("semana", "9999-12-31")])
+def test_calendario_nas_bordas_responde_400(http, usuario, visao, data):
+    resposta = http.get("/agendamentos/", headers=usuario["headers"], params={"visao": visao, "data": data})
+    assert resposta.status_code == 400
+
+
+@pytest.mark.parametrize("extras", [
+    {"inicio": "0001-01-01T10:00"},
+    {"inicio": "9999-12-31T23:00"},
+    {"inicio": "2030-03-04T10:00", "intervalo_semanas": 1, "repetir_ate": "9999-12-31"},
+])
+def test_agendamento_fora_das_datas_aceitas_responde_422(http, usuario, novo_cliente, extras):
+    cliente_id = novo_cliente("Paciente Borda")["id"]
+    resposta = http.post("/agendamentos/", headers=usuario["headers"],
+                         json={"cliente_id": cliente_id, "duracao_minutos": 50, **extras})
+    assert resposta.status_code == 422
+
+
+def test_cancelar_ocorrencia_fora_das_datas_aceitas_responde_400(http, usuario):
+    resposta = http.delete("/agendamentos/1", headers=usuario["headers"], params={"ocorrencia": "9999-12-31T23:30"})
+    assert resposta.status_code == 400
+
+
+# CRIPTOGRAFIA E ÍNDICE CEGO DO EMAIL
+
+def test_campos_cifrados_no_disco_e_legiveis_depois_de_novo_login(http, api, usuario, novo_cliente):
+    cliente = novo_cliente("Paciente Sigiloso", email="sigilo@teste.local", endereco="Rua Secreta, 42")
+    http.post(f"/clientes/{cliente['id']}/atendimentos/", headers=usuario["headers"], json={
+        "data_atendimento": "2025-06-01", "conteudo": "Relato confidencial da sessão", "duracao_minutos": 50})
+
+    with sqlite3.connect(api.DB_NAME) as conn:
+        email, endereco, email_indice = conn.execute(
+            "SELECT email, endereco, email_indice FROM clientes WHERE id = ?", (cliente["id"],)).fetchone()
+        conteudo, = conn.execute("SELECT conteudo FROM atendimentos WHERE cliente_id = ?", (cliente["id"],)).fetchone()
+    assert isinstance(email, bytes) and b"sigilo" not in email
+    assert isinstance(endereco, bytes) and b"Secreta" not in endereco
+    assert isinstance(conteudo, bytes) and "confidencial".encode() not in conteudo
+    assert email_indice == api.indice_email("sigilo@teste.local")
+
+    # SEM A CHAVE EM MEMÓRIA É PRECISO ENTRAR DE NOVO; A SENHA ABRE A MESMA CHAVE DE DADOS
+    api.chaves_dados.limpar()
+    login = http.post("/auth/login", json={"username": usuario["username"], "senha": usuario["senha"]})
+    assert login.status_code == 200
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    lido = http.get(f"/clientes/{cliente['id']}/", headers=headers).json()
+    assert (lido["email"], lido["endereco"]) == ("sigilo@teste.local", "Rua Secreta, 42")
+    atendimentos = http.get(f"/clientes/{cliente['id']}/atendimentos/", headers=headers).json()
+    assert atendimentos[0]["conteudo"] == "Relato confidencial da sessão"
+
+
+def test_email_repetido_recusado_mesmo_cifrado(http, usuario, novo_cliente):
+    novo_cliente("Primeira Pessoa", email="Unico@Teste.local")
+    for email in ("Unico@Teste.local", "unico@teste.local", "  UNICO@TESTE.LOCAL "):
+        resposta = http.post("/clientes/", headers=usuario["headers"], json={
+            "nome_completo": "Outra Pessoa", "email": email, "telefone": "11999999999", "data_nascimento": "1990-01-01"})
+        assert resposta.status_code == 400, email
+    assert novo_cliente("Terceira Pessoa", email="outro@teste.local")["email"] == "outro@teste.local"
+
+
+def test_importacao_recusa_email_ja_cadastrado(http, usuario, novo_cliente):
+    novo_cliente("Ja Cadastrada", email="repetido@import.local")
+    csv = CABECALHO_CLIENTES + "Nova Cadastrada,REPETIDO@import.local,11999999999,1990-01-01,\n"
+    relatorio = http.post("/importacao/clientes", headers=usuario["headers"],
+                          files={"arquivo": ("c.csv", csv.encode(), "text/csv")}).json()
+    assert (relatorio["importados"], relatorio["com_erro"]) == (0, 1)
+
+
+# ETag / 304
+
+def test_etag_responde_304_ate_os_dados_mudarem(http, usuario, novo_cliente):
+    novo_cliente("Paciente Cacheado")
+    primeira = http.get("/clientes/", headers=usuario["headers"])
+    etag = primeira.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    igual = http.get("/clientes/", headers={**usuario["headers"], "If-None-Match": etag})
+    assert igual.status_code == 304
+    assert igual.content == b""
+    assert igual.headers["ETag"] == etag
+
+    novo_cliente("Paciente Novo")
+    mudou = http.get("/clientes/", headers={**usuario["headers"], "If-None-Match": etag})
+    assert mudou.status_code == 200
+    assert mudou.headers["ETag"] != etag
+    assert len(mudou.json()) == 2
+
+
+def test_etag_e_por_usuario(http, usuario, novo_cliente):
+    novo_cliente("Paciente Particular")
+    etag = http.get("/clientes/", headers=usuario["headers"]).headers["ETag"]
+    outro = http.post("/auth/cadastro", json={
+        "username": f"{usuario['username']}_outro", "nome": "Outro", "senha": "senha-do-outro",
+        "pergunta_seguranca": "Cor?", "resposta_seguranca": "Azul"}).json()
+    resposta = http.get("/clientes/", headers={"Authorization": f"Bearer {outro['access_token']}", "If-None-Match": etag})
+    assert resposta.status_code == 200
+    assert resposta.json() == []
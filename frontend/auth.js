@@ -2,7 +2,8 @@
 // auth.js - Gerenciamento Centralizado de Autenticação
 // ============================================
 
-const API_BASE_URL = 'http://127.0.0.1:8000';
+// Servido pela API (FRONTEND=1), a página traz <meta name="api-base" content="">: mesma origem
+const API_BASE_URL = document.querySelector('meta[name="api-base"]')?.content ?? 'http://127.0.0.1:8000';
 
 async function fazerLogin(username, senha ) {
     try {
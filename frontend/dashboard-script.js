@@ -55,31 +55,54 @@ function mostrarSecao(secaoId, event) {
 // FUNÇÕES DE CLIENTES
 // ============================================
 
-async function buscarClientes() {
+const CLIENTES_POR_PAGINA = 50;
+const SUGESTOES_BUSCA = 20;
+let cursorClientes = null;
+let buscaAtual = 0;      // descarta respostas de buscas já substituídas por outra tecla
+let esperaBusca = null;
+
+// Lista alfabética, uma página por vez (o servidor devolve o cursor da próxima)
+async function buscarClientes(proximaPagina = false) {
+    const busca = ++buscaAtual;
     try {
+        if (!proximaPagina) {
+            cursorClientes = null;
+            document.getElementById('busca-cliente').value = '';
+        }
         document.getElementById('status-clientes').textContent = '⏳ Carregando clientes...';
-        
-        const response = await fazerRequisicaoAutenticada('/clientes/');
-        
+
+        let url = `/clientes/?limit=${CLIENTES_POR_PAGINA}`;
+        if (proximaPagina && cursorClientes) {
+            url += `&cursor=${encodeURIComponent(cursorClientes)}`;
+        }
+        const response = await fazerRequisicaoAutenticada(url);
+
         if (!response.ok) {
             throw new Error('Erro ao buscar clientes');
         }
 
         const clientes = await response.json();
+        if (busca !== buscaAtual) {
+            return;
+        }
+        cursorClientes = response.headers.get('X-Proximo-Cursor');
         document.getElementById('status-clientes').textContent = '';
-        exibirClientes(clientes);
+        exibirClientes(clientes, proximaPagina);
     } catch (error) {
         console.error('Erro ao buscar clientes:', error);
         document.getElementById('status-clientes').textContent = `❌ ${error.message}`;
     }
 }
 
-function exibirClientes(clientes) {
+function exibirClientes(clientes, acrescentar = false) {
     const lista = document.getElementById('lista-clientes');
-    lista.innerHTML = '';
+    if (!acrescentar) {
+        lista.innerHTML = '';
+    }
+    document.getElementById('btn-mais-clientes').style.display = cursorClientes ? 'inline-block' : 'none';
 
-    if (clientes.length === 0) {
-        lista.innerHTML = '<p>Nenhum cliente cadastrado ainda.</p>';
+    if (clientes.length === 0 && !acrescentar) {
+        lista.innerHTML = '<p>Nenhum cliente encontrado.</p>';
         return;
     }
 
@@ -87,48 +110,61 @@ function exibirClientes(clientes) {
         const card = document.createElement('div');
         card.className = 'cliente-card';
         card.onclick = () => window.location.href = `detalhe.html?id=${cliente.id}`;
-        
+
+        // A busca pelo nome traz só nome, código e última sessão; a listagem traz os contatos
         card.innerHTML = `
             <h3>${cliente.nome_completo}</h3>
             <p><strong>Código:</strong> ${cliente.codigo_cliente}</p>
-            <p><strong>Email:</strong> ${cliente.email}</p>
-            <p><strong>Telefone:</strong> ${cliente.telefone}</p>
+            ${'email' in cliente ? `<p><strong>Email:</strong> ${cliente.email}</p>` : ''}
+            ${'telefone' in cliente ? `<p><strong>Telefone:</strong> ${cliente.telefone}</p>` : ''}
+            ${cliente.ultima_sessao ? `<p><strong>Última sessão:</strong> ${new Date(cliente.ultima_sessao + 'T00:00:00').toLocaleDateString('pt-BR')}</p>` : ''}
         `;
-        
+
         lista.appendChild(card);
     });
 }
 
+// Busca enquanto digita: cada tecla (com uma pequena espera) vai ao /clientes/busca,
+// que procura pelo nome no servidor e devolve só as primeiras sugestões
 function filtrarClientes() {
-    const busca = document.getElementById('busca-cliente').value.toLowerCase().trim();
-    
+    const busca = document.getElementById('busca-cliente').value.trim();
+    clearTimeout(esperaBusca);
+
     if (busca.length === 0) {
         // Se limpou a busca, limpa a lista
+        buscaAtual++;
+        cursorClientes = null;
         document.getElementById('lista-clientes').innerHTML = '';
+        document.getElementById('status-clientes').textContent = '';
+        document.getElementById('btn-mais-clientes').style.display = 'none';
         return;
     }
-    
-    if (busca.length < 3) {
-        // Não busca com menos de 3 caracteres
-        return;
-    }
-    
-    const cards = document.querySelectorAll('.cliente-card');
-    
-    if (cards.length === 0) {
-        // Se não tem clientes carregados, carrega ao digitar
-        buscarClientes();
-        return;
-    }
 
-    cards.forEach(card => {
-        const texto = card.textContent.toLowerCase();
-        if (texto.includes(busca)) {
-            card.style.display = 'block';
-        } else {
-            card.style.display = 'none';
+    esperaBusca = setTimeout(() => buscarClientesPorNome(busca), 200);
+}
+
+async function buscarClientesPorNome(termo) {
+    const busca = ++buscaAtual;
+    try {
+        const response = await fazerRequisicaoAutenticada(
+            `/clientes/busca?q=${encodeURIComponent(termo)}&limit=${SUGESTOES_BUSCA}`
+        );
+
+        if (!response.ok) {
+            throw new Error('Erro ao buscar clientes');
+        }
+
+        const clientes = await response.json();
+        if (busca !== buscaAtual) {
+            return;
         }
-    });
+        cursorClientes = null;
+        document.getElementById('status-clientes').textContent = '';
+        exibirClientes(clientes);
+    } catch (error) {
+        console.error('Erro ao buscar clientes:', error);
+        document.getElementById('status-clientes').textContent = `❌ ${error.message}`;
+    }
 }
 
 async function handleCadastroCliente(event) {
@@ -3,6 +3,7 @@
 // ============================================
 
 let clienteIdGlobal = null;
+let cursorAtendimentos = null;
 
 window.addEventListener('DOMContentLoaded', () => {
     console.log('Página de detalhes carregada');
@@ -23,30 +24,31 @@ window.addEventListener('DOMContentLoaded', () => {
         document.getElementById('usuario-nome').textContent = `Olá, ${usuario.nome}`;
     }
 
-    // Carrega informações do cliente
-    buscarInfoCliente(clienteIdGlobal);
-    
-    // Carrega atendimentos automaticamente
-    buscarAtendimentos();
+    // Carrega cliente e primeira página de atendimentos numa única requisição
+    buscarDetalhesCliente(clienteIdGlobal);
 });
 
 // ============================================
 // FUNÇÕES DE CLIENTE
 // ============================================
 
-async function buscarInfoCliente(clienteId) {
+async function buscarDetalhesCliente(clienteId) {
     try {
-        const response = await fazerRequisicaoAutenticada(`/clientes/${clienteId}/`);
-        
+        const response = await fazerRequisicaoAutenticada(`/clientes/${clienteId}/detalhes/`);
+
         if (!response.ok) {
             throw new Error('Cliente não encontrado');
         }
 
-        const cliente = await response.json();
-        exibirInfoCliente(cliente);
+        // Cliente, estatísticas e primeira página; as próximas páginas vêm de buscarAtendimentos(true)
+        const detalhes = await response.json();
+        exibirInfoCliente(detalhes.cliente);
+        cursorAtendimentos = detalhes.proximo_cursor;
+        exibirAtendimentos(detalhes.atendimentos);
     } catch (error) {
-        console.error('Erro ao buscar info do cliente:', error);
+        console.error('Erro ao buscar detalhes do cliente:', error);
         document.getElementById('cliente-nome').textContent = `❌ ${error.message}`;
+        document.getElementById('lista-atendimentos').innerHTML = `<p>❌ ${error.message}</p>`;
     }
 }
 
@@ -63,19 +65,28 @@ function exibirInfoCliente(cliente) {
 // FUNÇÕES DE ATENDIMENTOS
 // ============================================
 
-async function buscarAtendimentos() {
+async function buscarAtendimentos(proximaPagina = false) {
     try {
         const lista = document.getElementById('lista-atendimentos');
-        lista.innerHTML = '<p class="carregando">⏳ Carregando atendimentos...</p>';
+        if (!proximaPagina) {
+            cursorAtendimentos = null;
+            lista.innerHTML = '<p class="carregando">⏳ Carregando atendimentos...</p>';
+        }
 
-        const response = await fazerRequisicaoAutenticada(`/clientes/${clienteIdGlobal}/atendimentos/`);
+        let url = `/clientes/${clienteIdGlobal}/atendimentos/`;
+        if (proximaPagina && cursorAtendimentos) {
+            url += `?cursor=${encodeURIComponent(cursorAtendimentos)}`;
+        }
+
+        const response = await fazerRequisicaoAutenticada(url);
         
         if (!response.ok) {
             throw new Error('Erro ao buscar atendimentos');
         }
 
         const atendimentos = await response.json();
-        exibirAtendimentos(atendimentos);
+        cursorAtendimentos = response.headers.get('X-Proximo-Cursor');
+        exibirAtendimentos(atendimentos, proximaPagina);
     } catch (error) {
         console.error('Erro ao buscar atendimentos:', error);
         document.getElementById('lista-atendimentos').innerHTML = 
@@ -83,11 +94,18 @@ async function buscarAtendimentos() {
     }
 }
 
-function exibirAtendimentos(atendimentos) {
+function exibirAtendimentos(atendimentos, acrescentar = false) {
     const lista = document.getElementById('lista-atendimentos');
-    lista.innerHTML = '';
+    const botaoMais = document.getElementById('btn-carregar-mais');
+    if (!acrescentar) {
+        lista.innerHTML = '';
+    }
+
+    if (botaoMais) {
+        botaoMais.style.display = cursorAtendimentos ? 'inline-block' : 'none';
+    }
 
-    if (atendimentos.length === 0) {
+    if (atendimentos.length === 0 && !acrescentar) {
         lista.innerHTML = '<p>Nenhum atendimento registrado.</p>';
         return;
     }
@@ -1,5 +1,5 @@
 // ===== CONFIGURAÇÃO =====
-const API_URL = 'http://127.0.0.1:8000';
+const API_URL = document.querySelector('meta[name="api-base"]')?.content ?? 'http://127.0.0.1:8000';
 let tokenAtual = null;
 let usuarioAtual = null;
 let clienteSelecionado = null;